@@ -12,6 +12,7 @@ from common.OpTestSystem import OpTestSystem, OpSystemState, OpTestFSPSystem, Op
 from common.OpTestHost import OpTestHost
 from common.OpTestIPMI import OpTestIPMI
 from common.OpTestOpenBMC import HostManagement
+from common.OpTestRedfish import RedfishManagement
 from common.OpTestWeb import OpTestWeb
 import argparse
 
@@ -77,6 +78,21 @@ class OpTestConfiguration():
         bmcgroup.add_argument("--bmc-passwordipmi", help="IPMI password for BMC")
         bmcgroup.add_argument("--bmc-prompt", default="#",
                               help="Prompt for BMC ssh session")
+        bmcgroup.add_argument("--bmc-management", default="rest",
+                              choices=['rest', 'redfish'],
+                              help="OpenBMC power, state, sensor and SEL control: the D-Bus REST API,"
+                              " or Redfish (bulk $expand reads where the BMC supports them)")
+        bmcgroup.add_argument("--fsp-status-session", action='store_true', default=False,
+                              help="[FSP Only] Open a second telnet session for state and"
+                              " progress code queries, so they run alongside long FSP commands")
+        bmcgroup.add_argument("--ipmi-backend", default="ipmitool",
+                              choices=['ipmitool', 'shell', 'native'],
+                              help="How to issue out-of-band IPMI commands: fork ipmitool per command,"
+                              " pipeline them through one 'ipmitool shell',"
+                              " or keep a native RMCP+ session open (both fall back to ipmitool)")
+        bmcgroup.add_argument("--ipmi-max-inflight", type=int, default=4,
+                              help="Most out-of-band IPMI commands to have outstanding"
+                              " against the BMC when running read-only ones concurrently")
         bmcgroup.add_argument("--qemu-binary", default="qemu-system-ppc64",
                               help="[QEMU Only] qemu simulator binary")
 
@@ -87,6 +103,9 @@ class OpTestConfiguration():
         hostgroup.add_argument("--host-lspci", help="Known 'lspci -n -m' for host")
         hostgroup.add_argument("--host-prompt", default="#",
                                help="Prompt for Host SSH session")
+        hostgroup.add_argument("--host-ssh-channels", type=int, default=4,
+                               help="Most commands to run at once over the Host's"
+                               " multiplexed SSH connection")
 
         hostgroup.add_argument("--platform",
                                help="Platform (used for EnergyScale tests)",
@@ -107,8 +126,15 @@ class OpTestConfiguration():
                               help="petitboot rootfs to use/flash. Not all platforms support this option")
         imagegroup.add_argument("--noflash", action='store_true', default=False,
                                 help="Even if images are specified, don't flash them")
+        imagegroup.add_argument("--force-flash", action='store_true', default=False,
+                                help="Copy and flash images even if the BMC/FSP already has them")
         imagegroup.add_argument("--only-flash", action='store_true', default=False,
                                 help="Only flash, don't run any tests (even if specified)")
+        imagegroup.add_argument("--pnor-flash-mode", choices=['full', 'diff'], default='full',
+                                help="full: erase and write the whole PNOR. diff: write only the partitions that differ from flash (pflash only)")
+        imagegroup.add_argument("--image-compression", choices=['none', 'auto', 'gzip', 'xz'],
+                                default='auto',
+                                help="Compress images copied to the BMC/FSP over SSH. auto: gzip (or xz) if the BMC can decompress it and the image compresses. Uploads over the OpenBMC REST API are only compressed with gzip")
         imagegroup.add_argument("--pflash",
                                 help="pflash to copy to BMC (if needed)")
 
@@ -130,12 +156,15 @@ class OpTestConfiguration():
         host = OpTestHost(self.args.host_ip,
                           self.args.host_user,
                           self.args.host_password,
-                          self.args.bmc_ip)
+                          self.args.bmc_ip,
+                          i_sshChannels=self.args.host_ssh_channels)
         if self.args.bmc_type in ['AMI']:
             ipmi = OpTestIPMI(self.args.bmc_ip,
                               self.args.bmc_usernameipmi,
                               self.args.bmc_passwordipmi,
-                              self.args.ffdcdir, host=host)
+                              self.args.ffdcdir, host=host,
+                              backend=self.args.ipmi_backend,
+                              max_inflight=self.args.ipmi_max_inflight)
             web = OpTestWeb(self.args.bmc_ip,
                             self.args.bmc_usernameipmi,
                             self.args.bmc_passwordipmi)
@@ -144,6 +173,7 @@ class OpTestConfiguration():
                             password=self.args.bmc_password,
                             ipmi=ipmi,
                             web=web,
+                            image_compression=self.args.image_compression,
             )
             self.op_system = OpTestSystem(
                 i_ffdcDir=self.args.ffdcdir,
@@ -155,11 +185,15 @@ class OpTestConfiguration():
             ipmi = OpTestIPMI(self.args.bmc_ip,
                               self.args.bmc_usernameipmi,
                               self.args.bmc_passwordipmi,
-                              self.args.ffdcdir, host=host)
+                              self.args.ffdcdir, host=host,
+                              backend=self.args.ipmi_backend,
+                              max_inflight=self.args.ipmi_max_inflight)
             bmc = OpTestFSP(self.args.bmc_ip,
                             self.args.bmc_username,
                             self.args.bmc_password,
                             ipmi=ipmi,
+                            image_compression=self.args.image_compression,
+                            status_session=self.args.fsp_status_session,
             )
             self.op_system = OpTestFSPSystem(
                 i_ffdcDir=self.args.ffdcdir,
@@ -171,25 +205,37 @@ class OpTestConfiguration():
             ipmi = OpTestIPMI(self.args.bmc_ip,
                               self.args.bmc_usernameipmi,
                               self.args.bmc_passwordipmi,
-                              self.args.ffdcdir, host=host)
+                              self.args.ffdcdir, host=host,
+                              backend=self.args.ipmi_backend,
+                              max_inflight=self.args.ipmi_max_inflight)
             rest_api = HostManagement(self.args.bmc_ip,
                                 self.args.bmc_username,
                                 self.args.bmc_password)
             bmc = OpTestOpenBMC(self.args.bmc_ip,
                                 self.args.bmc_username,
                                 self.args.bmc_password,
-                                ipmi=ipmi, rest_api=rest_api)
+                                ipmi=ipmi, rest_api=rest_api,
+                                logdir=self.args.ffdcdir,
+                                image_compression=self.args.image_compression)
+            management = None
+            if self.args.bmc_management == 'redfish':
+                management = RedfishManagement(self.args.bmc_ip,
+                                               self.args.bmc_username,
+                                               self.args.bmc_password)
             self.op_system = OpTestOpenBMCSystem(
+                i_ffdcDir=self.args.ffdcdir,
                 host=host,
                 bmc=bmc,
                 state=self.startState,
+                management=management,
             )
         elif self.args.bmc_type in ['qemu']:
             print repr(self.args)
             bmc = OpTestQemu(self.args.qemu_binary,
                              self.args.flash_skiboot,
                              self.args.flash_kernel,
-                             self.args.flash_initramfs)
+                             self.args.flash_initramfs,
+                             logdir=self.args.ffdcdir)
             self.op_system = OpTestQemuSystem(host=host, bmc=bmc)
         # Check that the bmc_type exists in our loaded addons then create our objects
         elif self.args.bmc_type in optAddons:
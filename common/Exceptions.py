@@ -50,3 +50,25 @@ class KernelConfigNotSet(Exception):
         self.opt = opt
     def __str__(self):
         return "Kernel config %s not present" % (self.opt)
+
+class BootFailure(Exception):
+    def __init__(self, milestone, signature):
+        self.milestone = milestone
+        self.signature = signature
+    def __str__(self):
+        return "Host %s during boot: '%s'" % (self.milestone, self.signature)
+
+class FFSError(Exception):
+    def __init__(self, source, reason):
+        self.source = source
+        self.reason = reason
+    def __str__(self):
+        return "Bad FFS image %s: %s" % (self.source, self.reason)
+
+class WebSocketError(Exception):
+    def __init__(self, url, reason, status=None):
+        self.url = url
+        self.reason = reason
+        self.status = status
+    def __str__(self):
+        return "WebSocket %s: %s" % (self.url, self.reason)
@@ -34,23 +34,33 @@ import sys
 import time
 import pexpect
 import os.path
+import shutil
+import tempfile
 try:
     import pxssh
 except ImportError:
     from pexpect import pxssh
 import subprocess
+from collections import namedtuple
 from OpTestIPMI import OpTestIPMI
 from OpTestConstants import OpTestConstants as BMC_CONST
 from OpTestError import OpTestError
 from OpTestWeb import OpTestWeb
 from Exceptions import CommandFailed
+from OpTestConsole import run_framed, run_batch_framed
+from OpTestSFTP import SFTPEngine
+from OpTestImageCache import ImageCache
+from OpTestFFS import FFSImage
+
+FlashDiff = namedtuple('FlashDiff', 'written skipped bytes_written bytes_skipped')
 
 class SSHConnectionState():
     DISCONNECTED = 0
     CONNECTED = 1
 
 class OpTestBMC():
-    def __init__(self, ip=None, username=None, password=None, i_ffdcDir=None, ipmi=None, rest=None, web=None):
+    def __init__(self, ip=None, username=None, password=None, i_ffdcDir=None, ipmi=None, rest=None, web=None,
+                 image_compression=None):
         self.cv_bmcIP = ip
         self.cv_bmcUser = username
         self.cv_bmcPasswd = password
@@ -59,6 +69,8 @@ class OpTestBMC():
         self.rest = rest
         self.cv_WEB = web
         self.state = SSHConnectionState.DISCONNECTED
+        self.image_cache = None
+        self.image_compression = image_compression
 
     def bmc_host(self):
         return self.cv_bmcIP
@@ -129,17 +141,20 @@ class OpTestBMC():
         return self.pxssh
 
     def run_command(self, command, timeout=300):
-        c = self.get_console()
-        c.sendline(command)
-        c.expect("\n") # from us
-        c.expect("\[PEXPECT\]#$", timeout=timeout)
-        output = c.before.splitlines()
-        c.sendline("echo $?")
-        c.expect("\[PEXPECT\]#$", timeout=timeout)
-        exitcode = int(''.join(c.before.splitlines()[1:]))
-        if exitcode != 0:
-            raise CommandFailed(command, output, exitcode)
-        return output
+        return run_framed(self.get_console(), command, timeout, prompt="\[PEXPECT\]#$")
+
+    ##
+    # @brief Run a list of commands in one exchange
+    #
+    # @return list of CommandResult, or raise CommandFailed for the first
+    #         failing command (the rest are not run)
+    #
+    def run_batch(self, commands, timeout=300, ignore_fail=False):
+        return run_batch_framed(self.get_console(), commands, timeout,
+                                prompt="\[PEXPECT\]#$", ignore_fail=ignore_fail)
+
+    def run_batch_ignore_fail(self, commands, timeout=60):
+        return self.run_batch(commands, timeout, ignore_fail=True)
 
     # This command just runs and returns the ouput & ignores the failure
     def run_command_ignore_fail(self, command, timeout=60):
@@ -188,26 +203,30 @@ class OpTestBMC():
         return BMC_CONST.FW_SUCCESS
 
     ##
-    # @brief This function copies the given image to the BMC /tmp dir
+    # @brief Record of the images staged on and flashed from this BMC
     #
-    # @return the rsync command return code
+    # @return OpTestImageCache.ImageCache
     #
-    def image_transfer(self,i_imageName, copy_as=None):
+    def get_image_cache(self):
+        if self.image_cache is None:
+            self.image_cache = ImageCache(SFTPEngine(self.cv_bmcIP, self.cv_bmcUser,
+                                                     self.cv_bmcPasswd,
+                                                     compress=self.image_compression))
+        return self.image_cache
 
-        img_path = i_imageName
-        rsync_cmd = 'rsync -P -v -e "ssh -k -o StrictHostKeyChecking=no" %s %s@%s:/tmp' % (img_path, self.cv_bmcUser, self.cv_bmcIP)
-        if copy_as:
-            rsync_cmd = rsync_cmd + '/' + copy_as
+    ##
+    # @brief This function copies the given image to the BMC /tmp dir,
+    #        unless the image cache shows it is already there
+    #
+    # @param force @type bool: copy it even if it is
+    #
+    # @return 0 or raise OpTestError
+    #
+    def image_transfer(self,i_imageName, copy_as=None, force=False):
 
-        print rsync_cmd
-        rsync = pexpect.spawn(rsync_cmd)
-        rsync.logfile = sys.stdout
-        rsync.expect('assword: ')
-        rsync.sendline(self.cv_bmcPasswd)
-        rsync.expect('total size is', timeout=1800)
-        rsync.expect(pexpect.EOF)
-        rsync.close()
-        return rsync.exitstatus
+        dest = '/tmp/' + (copy_as or os.path.basename(i_imageName))
+        self.get_image_cache().stage(i_imageName, dest, force)
+        return 0
 
 
     ##
@@ -239,6 +258,69 @@ class OpTestBMC():
         rc = self.run_command(cmd, timeout=1800)
         return rc
 
+    ##
+    # @brief Flash only the partitions of a PNOR image that differ from what
+    #        is in flash.
+    #
+    #        The TOC of the local image gives the partitions. Each is read
+    #        back from flash and hashed on the BMC, and those whose hash
+    #        differs from the local copy are copied over and written one by
+    #        one. Reads and writes go by address range, so ECC protected
+    #        partitions are compared and written byte for byte.
+    #
+    # @param i_image @type string: local PNOR image
+    # @param i_pflash_dir @type string: directory of pflash on the BMC, None
+    #        for the one on the PATH
+    #
+    # @return FlashDiff of the partitions written and skipped and their bytes
+    #
+    def pnor_img_flash_diff(self, i_image, i_pflash_dir=None):
+        pflash = os.path.join(i_pflash_dir, "pflash") if i_pflash_dir else "pflash"
+        image = FFSImage.from_file(i_image)
+        parts = image.ranges()
+        flash = self.pnor_flash_hashes(parts, pflash)
+        written = [p for p in parts if flash.get((p.base, p.size)) != image.sha256(p)]
+        skipped = [p for p in parts if p not in written]
+        workdir = tempfile.mkdtemp(prefix='op-test-pnor-')
+        try:
+            for p in written:
+                l_file = os.path.join(workdir, "%s.part" % p.name)
+                with open(l_file, 'wb') as f:
+                    f.write(image.read(p))
+                self.image_transfer(l_file)
+                print "# Writing %s (%d bytes at 0x%x)" % (p.name, p.size, p.base)
+                self.run_command("%s -e -f -p /tmp/%s.part -a %d -s %d" % (
+                    pflash, p.name, p.base, p.size), timeout=1800)
+                self.run_command("rm -f /tmp/%s.part" % p.name)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        diff = FlashDiff([p.name for p in written], [p.name for p in skipped],
+                         sum(p.size for p in written), sum(p.size for p in skipped))
+        print "# PNOR %s: wrote %d partitions (%d bytes), skipped %d unchanged (%d bytes)" % (
+            os.path.basename(i_image), len(diff.written), diff.bytes_written,
+            len(diff.skipped), diff.bytes_skipped)
+        return diff
+
+    ##
+    # @brief SHA-256 of what flash holds in each partition's range, read
+    #        back and hashed on the BMC in one command
+    #
+    # @return dict of (base, size) to hex SHA-256, missing where the read failed
+    #
+    def pnor_flash_hashes(self, parts, pflash="pflash"):
+        ranges = ' '.join("%d:%d" % (p.base, p.size) for p in parts)
+        output = self.run_command_ignore_fail(
+            "for r in %s; do %s -r /tmp/op-test-part -a ${r%%:*} -s ${r#*:} >/dev/null 2>&1"
+            " && echo \"$r $(sha256sum < /tmp/op-test-part)\"; done;"
+            " rm -f /tmp/op-test-part" % (ranges, pflash), timeout=1800)
+        hashes = {}
+        for l in output:
+            f = l.split()
+            if len(f) >= 2 and ':' in f[0]:
+                base, size = f[0].split(':')
+                hashes[(int(base), int(size))] = f[1]
+        return hashes
+
     def skiboot_img_flash_ami(self, i_pflash_dir, i_imageName):
         cmd = i_pflash_dir + '/pflash -p /tmp/%s -e -f -P PAYLOAD' % i_imageName
         rc = self.run_command(cmd, timeout=1800)
@@ -0,0 +1,656 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestConsole.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestConsole
+#  Background reader for host consoles (IPMI SOL, the OpenBMC host console
+#  and qemu).
+#
+#  A ConsoleReader thread drains the console child continuously, whether or
+#  not a test is currently expect()ing on it, so a verbose IPL never stalls
+#  on a full pty and every byte reaches stdout and the per-session FFDC log.
+#  Output is kept in a bounded ring indexed by absolute stream offset.
+#
+#  ConsoleStream is what get_console() hands out: a pexpect object reading
+#  from that ring, so expect()/sendline() callers are unchanged. Code that
+#  only needs to know when something appeared can subscribe() a set of
+#  patterns instead and wait on the event.
+#
+#  CommandFrame is the one way run_command() talks to a shell on any of
+#  the consoles (and over SSH): output and exit code come back in a single
+#  exchange between unique begin/end markers. CommandBatch frames a whole
+#  list of commands the same way for run_batch().
+
+import os
+import re
+import sys
+import time
+import random
+import itertools
+import threading
+from collections import deque, namedtuple
+
+import pexpect
+from pexpect.spawnbase import SpawnBase
+
+from Exceptions import CommandFailed
+
+##
+# @brief Path of the FFDC log for one console session, or None
+#
+# @param logdir @type string: FFDC directory, may be None
+# @param name @type string: console name, e.g. 'host-sol'
+#
+def console_log_path(logdir, name):
+    if not logdir:
+        return None
+    return os.path.join(logdir, '%s-%s.log' % (name, time.strftime('%Y%m%d-%H%M%S')))
+
+##
+# @brief One subscription to a set of patterns on a ConsoleReader.
+#
+#        The waiter fires once count matches have been seen (count=0 never
+#        fires, for callback-only subscriptions). Matches are counted from
+#        the point of subscription on and never overlap.
+#
+class ConsoleWaiter():
+    def __init__(self, patterns, count=1, callback=None):
+        if not isinstance(patterns, (list, tuple)):
+            patterns = [patterns]
+        self.patterns = [re.compile(p) for p in patterns]
+        self.regex = re.compile('|'.join('(?:%s)' % p for p in patterns))
+        self.count = count
+        self.callback = callback
+        self.seen = 0
+        self.match = None
+        self.index = None
+        self.end = None
+        self.pos = 0
+        self.eof = False
+        self.event = threading.Event()
+
+    ##
+    # @brief Scan console text for matches
+    #
+    # @param text @type string: text to search
+    # @param start @type int: stream offset of text[0]
+    # @param new_from @type int: matches must end after this offset
+    #
+    # @return True once the waiter is done
+    #
+    def feed(self, text, start, new_from):
+        for m in self.regex.finditer(text):
+            m_start = start + m.start()
+            m_end = start + m.end()
+            if m_end <= new_from or m_start < self.pos:
+                continue
+            self.pos = m_end
+            self.seen += 1
+            self.match = m
+            self.end = m_end
+            self.index = 0
+            for i, p in enumerate(self.patterns):
+                if p.match(m.group(0)):
+                    self.index = i
+                    break
+            if self.callback:
+                self.callback(self, m)
+            if self.count and self.seen >= self.count:
+                self.event.set()
+                return True
+        return False
+
+    def close(self, eof=False):
+        self.eof = eof
+        self.event.set()
+
+    def done(self):
+        return self.event.is_set()
+
+    ##
+    # @brief Block until the waiter fires, the console goes away or timeout
+    #
+    # @return the last re match object, or None
+    #
+    def wait(self, timeout=None):
+        self.event.wait(timeout)
+        if self.count and self.seen >= self.count:
+            return self.match
+        return None
+
+##
+# @brief Thread that is the sole reader of a pexpect console child.
+#
+#        Every chunk read is echoed (stdout by default), appended to the
+#        session log and kept in a ring of at most ring_size bytes. Readers
+#        that fall more than ring_size behind skip ahead; the log always has
+#        everything.
+#
+class ConsoleReader(threading.Thread):
+    READ_SIZE = 4096
+    OVERLAP = 4096
+
+    def __init__(self, child, logfile=None, echo=sys.stdout, ring_size=1024 * 1024):
+        threading.Thread.__init__(self, name='console-reader')
+        self.daemon = True
+        self.child = child
+        self.echo = echo
+        self.ring_size = ring_size
+        self.chunks = deque()
+        self.start_offset = 0
+        self.end_offset = 0
+        self.size = 0
+        self.tail = ''
+        self.waiters = []
+        self.listeners = []
+        self.eof = False
+        self.running = True
+        self.last_data = time.time()
+        self.cond = threading.Condition()
+        self.logfile = logfile
+        self.log = None
+        if logfile:
+            try:
+                self.log = open(logfile, 'a')
+            except IOError as e:
+                print "Unable to open console log %s: %s" % (logfile, str(e))
+
+    def run(self):
+        try:
+            while self.running:
+                try:
+                    data = self.child.read_nonblocking(self.READ_SIZE, timeout=0.5)
+                except pexpect.TIMEOUT:
+                    continue
+                except (pexpect.EOF, OSError, ValueError):
+                    break
+                self.feed(data)
+        finally:
+            with self.cond:
+                self.eof = True
+                for w in self.waiters:
+                    w.close(eof=True)
+                self.waiters = []
+                for fn in self.listeners:
+                    fn(self.end_offset, None)
+                self.cond.notify_all()
+            if self.log:
+                self.log.close()
+
+    def feed(self, data):
+        if self.echo:
+            self.echo.write(data)
+            self.echo.flush()
+        if self.log:
+            self.log.write(data)
+            self.log.flush()
+        with self.cond:
+            offset = self.end_offset
+            window_start = offset - len(self.tail)
+            window = self.tail + data
+            self.chunks.append((offset, data))
+            self.end_offset += len(data)
+            self.size += len(data)
+            while self.size - len(self.chunks[0][1]) >= self.ring_size:
+                self.size -= len(self.chunks.popleft()[1])
+            self.start_offset = self.chunks[0][0]
+            self.tail = window[-self.OVERLAP:]
+            self.last_data = time.time()
+            self.waiters = [w for w in self.waiters
+                            if not w.feed(window, window_start, offset)]
+            for fn in self.listeners:
+                fn(offset, data)
+            self.cond.notify_all()
+
+    ##
+    # @brief Text held in the ring from offset since on
+    #
+    def text(self, since):
+        since = max(since, self.start_offset)
+        return ''.join(d[max(0, since - o):] for o, d in self.chunks if o + len(d) > since)
+
+    ##
+    # @brief Read up to size bytes from stream offset pos
+    #
+    # @return (new offset, data)
+    #
+    # @raise pexpect.TIMEOUT if nothing arrived in timeout seconds
+    # @raise pexpect.EOF if the console has gone away and all was read
+    #
+    def read(self, pos, size, timeout=None):
+        with self.cond:
+            if timeout is not None:
+                end_time = time.time() + timeout
+            while pos >= self.end_offset and not self.eof:
+                if timeout is None:
+                    self.cond.wait(1)
+                    continue
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    raise pexpect.TIMEOUT('Timeout reading console')
+                self.cond.wait(remaining)
+            if pos >= self.end_offset:
+                raise pexpect.EOF('Console closed')
+            if pos < self.start_offset:
+                print "# Console reader skipped %d bytes (see console log)" % (self.start_offset - pos)
+                pos = self.start_offset
+            data = []
+            want = size
+            for o, d in self.chunks:
+                if o + len(d) <= pos:
+                    continue
+                piece = d[pos - o:pos - o + want] if o < pos else d[:want]
+                data.append(piece)
+                pos += len(piece)
+                want -= len(piece)
+                if want <= 0:
+                    break
+            return pos, ''.join(data)
+
+    ##
+    # @brief Wait for patterns to appear on the console
+    #
+    # @param patterns @type list: regular expressions
+    # @param count @type int: fire after this many matches (0 = never)
+    # @param callback: called with (waiter, match) on every match
+    # @param since @type int: also search output from this stream offset on
+    #
+    # @return ConsoleWaiter
+    #
+    def subscribe(self, patterns, count=1, callback=None, since=None):
+        w = ConsoleWaiter(patterns, count, callback)
+        with self.cond:
+            if since is not None and since < self.end_offset:
+                since = max(since, self.start_offset)
+                if w.feed(self.text(since), since, since):
+                    return w
+            w.pos = max(w.pos, self.end_offset if since is None else since)
+            if self.eof:
+                w.close(eof=True)
+            else:
+                self.waiters.append(w)
+        return w
+
+    def unsubscribe(self, waiter):
+        with self.cond:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+        waiter.close()
+
+    ##
+    # @brief Have fn(offset, data) called with every chunk read, and with
+    #        data None once the console is gone
+    #
+    # @param replay @type bool: first pass it the output still in the ring
+    #
+    def add_listener(self, fn, replay=False):
+        with self.cond:
+            if replay and self.end_offset > self.start_offset:
+                fn(self.start_offset, self.text(self.start_offset))
+            if self.eof:
+                fn(self.end_offset, None)
+            else:
+                self.listeners.append(fn)
+
+    def remove_listener(self, fn):
+        with self.cond:
+            if fn in self.listeners:
+                self.listeners.remove(fn)
+
+    def stop(self):
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(2)
+
+##
+# @brief pexpect object over a ConsoleReader, what get_console() returns.
+#
+#        Reads come from the reader's ring; writes, isalive() and
+#        terminate()/close() go to the real child.
+#
+class ConsoleStream(SpawnBase):
+    def __init__(self, child, logfile=None, echo=sys.stdout, ring_size=1024 * 1024):
+        self.child = child
+        SpawnBase.__init__(self, timeout=child.timeout, maxread=ConsoleReader.READ_SIZE)
+        self.child_fd = child.child_fd
+        self.closed = False
+        self.pos = 0
+        self.reader = ConsoleReader(child, logfile=logfile, echo=echo, ring_size=ring_size)
+        self.reader.start()
+
+    def _get_delaybeforesend(self):
+        return self.child.delaybeforesend
+
+    def _set_delaybeforesend(self, value):
+        self.child.delaybeforesend = value
+
+    delaybeforesend = property(_get_delaybeforesend, _set_delaybeforesend)
+
+    def read_nonblocking(self, size=1, timeout=-1):
+        if timeout == -1:
+            timeout = self.timeout
+        try:
+            self.pos, s = self.reader.read(self.pos, size, timeout)
+        except pexpect.EOF:
+            self.flag_eof = True
+            raise
+        self._log(s, 'read')
+        return s
+
+    def send(self, s):
+        return self.child.send(s)
+
+    def sendline(self, s=''):
+        return self.child.sendline(s)
+
+    def sendcontrol(self, char):
+        return self.child.sendcontrol(char)
+
+    def sendeof(self):
+        return self.child.sendeof()
+
+    def isalive(self):
+        return self.reader.is_alive() and self.child.isalive()
+
+    def terminate(self, force=False):
+        r = self.child.terminate(force)
+        self.reader.stop()
+        return r
+
+    def close(self, force=True):
+        self.reader.stop()
+        self.child.close(force)
+        self.closed = True
+
+    ##
+    # @brief Subscribe to patterns on this console, see ConsoleReader.subscribe
+    #
+    # @param recent @type bool: also match output that has arrived but not
+    #        yet been consumed by expect()
+    #
+    def subscribe(self, patterns, count=1, callback=None, recent=True):
+        since = self.pos - len(self.buffer) if recent else None
+        return self.reader.subscribe(patterns, count, callback, since)
+
+    def unsubscribe(self, waiter):
+        self.reader.unsubscribe(waiter)
+
+    def add_listener(self, fn, replay=False):
+        self.reader.add_listener(fn, replay)
+
+    def remove_listener(self, fn):
+        self.reader.remove_listener(fn)
+
+    ##
+    # @brief Consume everything up to stream offset, e.g. the end of a
+    #        waiter's match, so later expect()s start after it
+    #
+    def skip_to(self, offset):
+        buffered = self.pos - len(self.buffer)
+        if offset <= buffered:
+            return
+        if offset <= self.pos:
+            self.buffer = self.buffer[offset - buffered:]
+        else:
+            self.buffer = ''
+            self.pos = offset
+
+    ##
+    # @brief Seconds since the console last produced any output
+    #
+    def idle(self):
+        return time.time() - self.reader.last_data
+
+    def __str__(self):
+        return '%s: offset %d, %d bytes buffered, reader %s' % (
+            self.child.name, self.pos, len(self.buffer),
+            'running' if self.reader.is_alive() else 'stopped')
+
+##
+# @brief One shell command framed so that its output and exit code come
+#        back in one exchange, instead of waiting for the prompt and then
+#        sending 'echo $?' and waiting for it again.
+#
+#        The command is sent as
+#            echo @@OPT"B<id>"@@; <command>; echo @@OPT"E<id>:$?"@@
+#        The quotes keep the terminal's echo of that line from matching
+#        the markers, which only appear once the shell prints them.
+#
+class CommandFrame():
+    session = '%04x' % random.randint(0, 0xffff)
+    counter = itertools.count(1)
+
+    def __init__(self, command):
+        self.command = command
+        self.id = '%s%d' % (self.session, next(self.counter))
+        separator = ' ' if command.rstrip().endswith('&') else '; '
+        self.line = 'echo @@OPT"B%s"@@; %s%secho @@OPT"E%s:$?"@@' % (
+            self.id, command, separator, self.id)
+        self.begin = re.escape('@@OPTB%s@@' % self.id) + r'\r?\n'
+        self.end = re.escape('@@OPTE%s:' % self.id) + r'(\d+)@@'
+        self.output = None
+        self.exitcode = None
+
+    ##
+    # @brief Wait for the framed output
+    #
+    # @param console: pexpect object the line was sent on
+    # @param timeout @type int: seconds, for each of the two markers
+    # @param abort @type list: patterns that abandon the wait, e.g. a
+    #        BMC disconnect notice
+    #
+    # @return None once output and exitcode are set, otherwise the index
+    #         into abort of the pattern that matched
+    #
+    # @raise pexpect.TIMEOUT
+    #
+    def expect(self, console, timeout=60, abort=[]):
+        rc = console.expect(abort + [self.begin], timeout)
+        if rc < len(abort):
+            return rc
+        rc = console.expect(abort + [self.end], timeout)
+        if rc < len(abort):
+            return rc
+        self.output = console.before
+        self.exitcode = int(console.match.group(1))
+        return None
+
+##
+# @brief run_command() for consoles that need nothing more than the framing
+#
+# @param console: pexpect object at a shell prompt
+# @param prompt: the prompt pattern, consumed after the command
+# @param partial @type bool: on timeout return whatever output there is
+#        so far instead of raising, as the host and qemu consoles always
+#        have. The command may still be running.
+#
+# @return list of output lines or raise CommandFailed
+#
+def run_framed(console, command, timeout=60, prompt=r"\[console-pexpect\]#$",
+               partial=False):
+    frame = CommandFrame(command)
+    console.sendline(frame.line)
+    try:
+        frame.expect(console, timeout)
+        # Comes straight after the end marker, this is not another round trip
+        console.expect(prompt, timeout)
+    except pexpect.TIMEOUT:
+        if not partial:
+            raise CommandFailed(command, "TIMEOUT", -1)
+        if frame.output is None:
+            # minus the echo of the command line, if it's still in there
+            return (console.before or '').split(frame.line)[-1].splitlines()
+    res = frame.output.splitlines()
+    if frame.exitcode != 0:
+        raise CommandFailed(command, res, frame.exitcode)
+    return res
+
+CommandResult = namedtuple('CommandResult', 'command output exitcode elapsed')
+
+##
+# @brief A list of shell commands framed into one line, run in order in
+#        the current shell (so cd and variables carry over, like separate
+#        run_command() calls), with an end marker carrying each exit code
+#        and a timestamp.
+#
+#        Unless ignore_fail, the commands after the first failing one are
+#        skipped, as a loop of run_command() calls would stop at the
+#        exception. A final marker says the batch is over either way.
+#
+class CommandBatch():
+    STAMP = '$(date +%s.%N 2>/dev/null)'
+
+    def __init__(self, commands, ignore_fail=False):
+        self.commands = list(commands)
+        self.id = '%s%d' % (CommandFrame.session, next(CommandFrame.counter))
+        parts = ['echo @@OPT"B%s:%s"@@' % (self.id, self.STAMP)]
+        for n, command in enumerate(self.commands):
+            separator = ' ' if command.rstrip().endswith('&') else '; '
+            step = '%s%sOPT_R=$?; echo @@OPT"E%s.%d:$OPT_R:%s"@@' % (
+                command, separator, self.id, n, self.STAMP)
+            if n and not ignore_fail:
+                step = '[ $OPT_R = 0 ] && { %s; }' % step
+            parts.append(step)
+        parts.append('echo @@OPT"Z%s"@@' % self.id)
+        self.line = '; '.join(parts)
+        self.begin = re.escape('@@OPTB%s:' % self.id) + r'([^@]*)@@\r?\n'
+        self.end = re.escape('@@OPTE%s.' % self.id) + r'(\d+):(\d+):([^@]*)@@\r?\n'
+        self.final = re.escape('@@OPTZ%s@@' % self.id)
+        self.results = []
+
+    def stamp(self, text, fallback):
+        try:
+            return float(text)
+        except ValueError:
+            return fallback
+
+    def add(self, n, output, exitcode, stamp, last):
+        self.results.append(CommandResult(self.commands[n], output.splitlines(),
+                                          exitcode, stamp - last))
+
+    ##
+    # @brief The command that was running when the batch stopped short,
+    #        the last one if all their results are in and it was the
+    #        prompt or the end of the output after them that went missing
+    #
+    def pending(self):
+        return self.commands[min(len(self.results), len(self.commands) - 1)]
+
+    ##
+    # @brief Wait for every command's output on a console. Without a usable
+    #        clock on the target, elapsed is taken from when output arrives.
+    #
+    # @return None once results are complete, otherwise the index into
+    #         abort of the pattern that matched
+    #
+    # @raise pexpect.TIMEOUT, timeout applying to each command
+    #
+    def expect(self, console, timeout=60, abort=[]):
+        rc = console.expect(abort + [self.begin], timeout)
+        if rc < len(abort):
+            return rc
+        last = self.stamp(console.match.group(1), time.time())
+        while True:
+            rc = console.expect(abort + [self.end, self.final], timeout)
+            if rc < len(abort):
+                return rc
+            if rc == len(abort) + 1:
+                return None
+            n, exitcode, stamp = console.match.groups()
+            stamp = self.stamp(stamp, time.time())
+            self.add(int(n), console.before, int(exitcode), stamp, last)
+            last = stamp
+
+    ##
+    # @brief Results from the complete output of the batch, e.g. an SSH
+    #        exec channel's stdout. Without a clock elapsed is None.
+    #
+    # @return False if the output was cut short
+    #
+    def parse(self, text):
+        m = re.search(self.begin, text)
+        if not m:
+            return False
+        last = self.stamp(m.group(1), None)
+        end = re.compile(self.end)
+        pos = m.end()
+        m = end.search(text, pos)
+        while m:
+            n, exitcode, stamp = m.groups()
+            stamp = self.stamp(stamp, None)
+            output = text[pos:m.start()]
+            if stamp is None or last is None:
+                self.results.append(CommandResult(self.commands[int(n)], output.splitlines(),
+                                                  int(exitcode), None))
+            else:
+                self.add(int(n), output, int(exitcode), stamp, last)
+            last = stamp
+            pos = m.end()
+            m = end.search(text, pos)
+        return re.search(self.final, text[pos:]) is not None
+
+    ##
+    # @brief Raise for the first failure, as run_command() would have
+    #
+    def check(self):
+        for result in self.results:
+            if result.exitcode != 0:
+                raise CommandFailed(result.command, result.output, result.exitcode)
+
+##
+# @brief Split commands into CommandBatch lines a terminal will take whole
+#        (the canonical mode line limit is 4096 bytes)
+#
+def command_batches(commands, ignore_fail=False, max_line=2048):
+    group = []
+    for command in commands:
+        if group and len(CommandBatch(group + [command], ignore_fail).line) > max_line:
+            yield CommandBatch(group, ignore_fail)
+            group = []
+        group.append(command)
+    if group:
+        yield CommandBatch(group, ignore_fail)
+
+##
+# @brief run_batch() for consoles that need nothing more than the framing:
+#        each line is one round trip rather than one (or two) per command.
+#
+# @return list of CommandResult, or raise CommandFailed for the first
+#         failing command unless ignore_fail
+#
+def run_batch_framed(console, commands, timeout=60, prompt=r"\[console-pexpect\]#$",
+                     ignore_fail=False):
+    results = []
+    for batch in command_batches(commands, ignore_fail):
+        console.sendline(batch.line)
+        try:
+            batch.expect(console, timeout)
+            console.expect(prompt, timeout)
+        except pexpect.TIMEOUT:
+            raise CommandFailed(batch.pending(), "TIMEOUT", -1)
+        results.extend(batch.results)
+        if not ignore_fail:
+            batch.check()
+    return results
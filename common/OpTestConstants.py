@@ -112,6 +112,7 @@ class OpTestConstants():
     HOST_BRINGUP_TIME = 80
     SHORT_WAIT_IPL = 10
     SHORT_WAIT_STANDBY_DELAY = 5
+    SENSOR_POLL_DELAY = 1
     LONG_WAIT_IPL = 50
     HOST_REBOOT_DELAY = 100
     WEB_UPDATE_DELAY = 600
@@ -122,6 +123,7 @@ class OpTestConstants():
     CHECKSTOP_ERROR_DELAY = 150
     SYSTEM_STANDBY_STATE_DELAY = 120
     PETITBOOT_TIMEOUT = 1500
+    CONSOLE_IDLE_TIMEOUT = 400
 
     PING_RETRY_POWERCYCLE = 7
     PING_RETRY_FOR_STABILITY = 5
@@ -141,9 +143,16 @@ class OpTestConstants():
     CMD_NOT_FOUND = 'command not found'
     CHASSIS_POWER_RESET = "Chassis Power Control: Reset"
     CHASSIS_SOFT_OFF = 'S5/G2: soft-off'
+    HOST_STATUS_WORKING = 'S0/G0: working'
     OS_BOOT_COMPLETE = 'boot completed'
     OCC_DEVICE_ENABLED = "Device Enabled"
 
+    # State offsets (IPMI spec table 42-3) of the SENSOR_HOST_STATUS and
+    # SENSOR_OS_BOOT discrete sensors that mean the same as the strings above
+    HOST_STATUS_S0_WORKING = [0]
+    HOST_STATUS_S5_SOFT_OFF = [5]
+    OS_BOOT_COMPLETED = range(7)
+
     # BMC ACTIVE SIDES
     PRIMARY_SIDE = "0x0080"
     GOLDEN_SIDE = "0x0180"
@@ -325,6 +334,7 @@ class OpTestConstants():
     # OOB IPMI commands
     IPMI_CHASSIS_POH = "chassis poh"
     IPMI_CHASSIS_STATUS = "chassis status"
+    IPMI_CHASSIS_POWER_STATUS = "chassis power status"
     IPMI_CHASSIS_RESTART_CAUSE = "chassis restart_cause"
     IPMI_CHASSIS_POLICY_LIST = "chassis policy list"
     IPMI_CHASSIS_POLICY_ALWAYS_ON = "chassis policy always-on"
@@ -0,0 +1,304 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestFFS.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestFFS
+#  Reader for PNOR images: the FFS partition table (TOC) at the start, as
+#  laid out by skiboot's libflash/ffs.h, and the ECC that protects most
+#  partitions, as in libflash/ecc.c.
+#
+#  Images are memory mapped and partitions handed out as buffers into the
+#  map, so listing the TOC of a 64MB image reads a few KB of it and
+#  extracting a partition copies nothing until it is written out. The ECC
+#  check works on whole columns of bytes at a time (translate and long
+#  integer XOR), not word by word in Python.
+
+import mmap
+import struct
+import hashlib
+import binascii
+from collections import namedtuple, OrderedDict
+
+from Exceptions import FFSError
+
+FFS_MAGIC = 0x50415254 # "PART"
+FFS_VERSION_1 = 1
+
+# magic version size entry_size entry_count block_size block_count resvd[4] checksum
+FFS_HDR = struct.Struct('>7I4II')
+# name base size pid id type flags actual resvd[4] user[16] checksum
+FFS_ENTRY = struct.Struct('>16s7I4I16II')
+
+FFS_TYPE_DATA = 1
+FFS_TYPE_LOGICAL = 2
+FFS_TYPE_PARTITION = 3
+
+# in the low half of the first user word
+FFS_ENTRY_INTEG_ECC = 0x8000
+
+# Enough of the start of flash to hold any TOC
+FFS_TOC_READ_SIZE = 0x8000
+
+# Each 8 byte big-endian data word is followed by an ECC byte whose bit i
+# is the parity of the word masked with ECC_MATRIX[i]
+ECC_MATRIX = [0x0000e8423c0f99ff, 0x00e8423c0f99ff00, 0xe8423c0f99ff0000,
+              0x423c0f99ff0000e8, 0x3c0f99ff0000e842, 0x0f99ff0000e8423c,
+              0x99ff0000e8423c0f, 0xff0000e8423c0f99]
+
+def _parity(v):
+    return bin(v).count('1') & 1
+
+# ECC is linear, so ECC_TABLES[k] translates byte k of a word (0 the most
+# significant) into its share of the ECC byte
+ECC_TABLES = [''.join(chr(sum(_parity((ECC_MATRIX[i] >> (56 - 8 * k)) & 0xff & v) << i
+                              for i in range(8)))
+                      for v in range(256))
+              for k in range(8)]
+_NONZERO = '\x00' + '\x01' * 255
+_NOT_ERASED = '\x01' * 255 + '\x00'
+
+##
+# @brief One TOC entry, base and size in bytes
+#
+FFSPartition = namedtuple('FFSPartition', 'name id base size actual type flags ecc')
+
+##
+# @brief XOR of the big-endian 32 bit words of data, 0 over a whole
+#        header or entry with a good checksum
+#
+def ffs_checksum(data):
+    words = struct.unpack('>%dI' % (len(data) / 4), data)
+    return reduce(lambda a, b: a ^ b, words, 0)
+
+def _to_int(data):
+    return int(binascii.hexlify(data), 16) if data else 0
+
+def _to_bytes(value, length):
+    return binascii.unhexlify('%0*x' % (2 * length, value)) if length else ''
+
+##
+# @brief ECC bytes of a string of 8 byte words, one per word
+#
+def ecc_generate(data, offset=0, words=None, step=8):
+    if words is None:
+        words = (len(data) - offset) / step
+    end = offset + words * step
+    value = 0
+    for k in range(8):
+        value ^= _to_int(data[offset + k:end:step].translate(ECC_TABLES[k]))
+    return _to_bytes(value, words)
+
+##
+# @brief Add ECC to data, as pflash does writing an ECC partition
+#
+# @return the data with an ECC byte after every 8 bytes (the last word
+#         padded with 0xff)
+#
+def ecc_encode(data):
+    data = data + '\xff' * (-len(data) % 8)
+    words = len(data) / 8
+    out = bytearray(words * 9)
+    for k in range(8):
+        out[k::9] = data[k::8]
+    out[8::9] = ecc_generate(data)
+    return str(out)
+
+##
+# @brief Check the ECC of length bytes of data from offset
+#
+#        Words that are all 0xff, ECC byte included, are erased flash, not
+#        errors.
+#
+# @return list of offsets of the 9 byte words with a bad ECC byte
+#
+def ecc_check(data, offset, length):
+    words = length / 9
+    end = offset + words * 9
+    syndromes = _to_int(ecc_generate(data, offset, words, 9)) ^ \
+        _to_int(data[offset + 8:end:9])
+    if not syndromes:
+        return []
+    bad = _to_int(_to_bytes(syndromes, words).translate(_NONZERO))
+    erased = 0
+    for k in range(9):
+        erased |= _to_int(data[offset + k:end:9].translate(_NOT_ERASED))
+    bad = _to_bytes(bad & erased, words)
+    errors = []
+    i = bad.find('\x01')
+    while i >= 0:
+        errors.append(offset + i * 9)
+        i = bad.find('\x01', i + 1)
+    return errors
+
+##
+# @brief Drop the ECC bytes from data
+#
+def ecc_strip(data):
+    out = bytearray(data[:len(data) / 9 * 9])
+    del out[8::9]
+    return str(out)
+
+class FFSImage():
+
+    ##
+    # @param data: the image (a string or buffer), or at least its TOC
+    # @param source: name for error messages
+    #
+    def __init__(self, data, source='PNOR'):
+        self.data = data
+        self.source = source
+        self.partitions = OrderedDict()
+        self.parse()
+
+    ##
+    # @brief Map a PNOR image file
+    #
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as f:
+            if not f.read(1):
+                raise FFSError(path, "empty file")
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(data, path)
+        except FFSError:
+            data.close()
+            raise
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def parse(self):
+        if len(self.data) < FFS_HDR.size:
+            raise FFSError(self.source, "too short for an FFS header")
+        hdr = FFS_HDR.unpack_from(self.data, 0)
+        magic, version, size, entry_size, entry_count, block_size, block_count = hdr[:7]
+        if magic != FFS_MAGIC:
+            raise FFSError(self.source, "no FFS magic (0x%08x)" % magic)
+        if version != FFS_VERSION_1:
+            raise FFSError(self.source, "unknown FFS version %d" % version)
+        if ffs_checksum(self.data[:FFS_HDR.size]) != 0:
+            raise FFSError(self.source, "bad header checksum")
+        if entry_size != FFS_ENTRY.size:
+            raise FFSError(self.source, "unexpected entry size %d" % entry_size)
+        self.block_size = block_size
+        self.block_count = block_count
+        self.toc_size = size * block_size
+        end = FFS_HDR.size + entry_count * entry_size
+        if len(self.data) < end:
+            raise FFSError(self.source, "TOC runs past the end of the image")
+        for i in range(entry_count):
+            offset = FFS_HDR.size + i * entry_size
+            raw = self.data[offset:offset + entry_size]
+            if ffs_checksum(raw) != 0:
+                raise FFSError(self.source, "bad checksum on entry %d" % i)
+            e = FFS_ENTRY.unpack(raw)
+            name = e[0].split('\0', 1)[0]
+            p = FFSPartition(name, e[4], e[1] * block_size, e[2] * block_size, e[7],
+                             e[5], e[6], bool(e[12] & FFS_ENTRY_INTEG_ECC))
+            self.partitions[name] = p
+
+    ##
+    # @return FFSPartition or raise FFSError
+    #
+    def partition(self, name):
+        if name not in self.partitions:
+            raise FFSError(self.source, "no partition %s" % name)
+        return self.partitions[name]
+
+    ##
+    # @brief Partitions with space of their own: a partition lying wholly
+    #        inside another one is left to its container
+    #
+    def ranges(self):
+        parts = self.partitions.values()
+        return [p for p in parts
+                if not any(o is not p and o.base <= p.base and p.base + p.size <= o.base + o.size
+                           and (o.size > p.size or o.id < p.id) for o in parts)]
+
+    ##
+    # @brief Raw contents of a partition (ECC bytes included), as a buffer
+    #        into the image
+    #
+    def read(self, part):
+        if part.base + part.size > len(self.data):
+            raise FFSError(self.source, "partition %s runs past the end of the image"
+                           % part.name)
+        return buffer(self.data, part.base, part.size)
+
+    def sha256(self, part):
+        return hashlib.sha256(self.read(part)).hexdigest()
+
+    ##
+    # @brief Write a partition to a file
+    #
+    # @param strip_ecc @type bool: leave out the ECC bytes of an ECC
+    #        protected partition
+    #
+    def extract(self, part, path, strip_ecc=False):
+        data = self.read(part)
+        if strip_ecc and part.ecc:
+            data = ecc_strip(data)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    ##
+    # @return list of offsets of bad ECC words in part, empty if it has no ECC
+    #
+    def verify_ecc(self, part):
+        if not part.ecc:
+            return []
+        self.read(part)
+        return ecc_check(self.data, part.base, part.size)
+
+    ##
+    # @brief Check the ECC of every ECC protected partition (the TOC
+    #        checksums were checked on parsing)
+    #
+    # @return dict of partition name to offsets of its bad ECC words, for
+    #         the partitions that have any
+    #
+    def verify(self):
+        errors = OrderedDict()
+        for part in self.partitions.values():
+            bad = self.verify_ecc(part)
+            if bad:
+                errors[part.name] = bad
+        return errors
+
+    ##
+    # @brief The TOC as pflash --info lists it
+    #
+    def info(self):
+        return ["ID=%02d %15s 0x%08x..0x%08x (actual=0x%08x) [%s]" % (
+            p.id, p.name, p.base, p.base + p.size, p.actual, 'E' if p.ecc else '-')
+            for p in self.partitions.values()]
@@ -35,17 +35,39 @@ import os
 import pexpect
 import sys
 import commands
+from collections import namedtuple
 
 from OpTestTConnection import TConnection
 from OpTestASM import OpTestASM
 from OpTestConstants import OpTestConstants as BMC_CONST
 from OpTestError import OpTestError
+from OpTestSFTP import SFTPEngine
+from OpTestImageCache import ImageCache
 
 Possible_Hyp_value = {'01': 'PowerVM', '03': 'PowerKVM'}
 Possible_Sys_State = {'terminated':0, 'standby':1, 'prestandby':2, 'ipling':3, 'runtime':4}
 
+FSPStatus = namedtuple('FSPStatus', 'state progress_code hyp_mode')
+
+##
+# @brief The IPL progress code in a listing of /opt/p1/srci/curripl
+#
+def parse_progress_code(curripl):
+    tmp = curripl.split('.')
+    if len(tmp) == 3:
+        return tmp[2]
+    else:
+        return str(tmp)
+
 #Contains most of the common methods to interface with FSP.
 class OpTestFSP():
+    # seconds between status polls: POLL_MIN after a change, doubling
+    # up to POLL_MAX while nothing changes
+    POLL_MIN = 1
+    POLL_MAX = BMC_CONST.SHORT_WAIT_STANDBY_DELAY
+    STATUS_COMMAND = ("echo state=$(smgr mfgState); "
+                      "echo ipl=$(ls /opt/p1/srci/curripl); "
+                      "echo hyp=$(registry -Hr menu/HypMode)")
 
     ##
     # @brief Initialize this object
@@ -54,8 +76,12 @@ class OpTestFSP():
     # @param i_fspUser @type string: Userid to log into the FSP
     # @param i_fspPasswd @type string: Password of the userid to log into the FSP
     # @param i_ffdcDir @type string: Optional param to indicate where to write FFDC
+    # @param status_session @type bool: keep a second telnet session for
+    #        state and progress code queries, so they don't wait behind a
+    #        long command on the first
     #
-    def __init__(self, i_fspIP, i_fspUser, i_fspPasswd, i_ffdcDir=None, ipmi=None, rest=None):
+    def __init__(self, i_fspIP, i_fspUser, i_fspPasswd, i_ffdcDir=None, ipmi=None, rest=None,
+                 image_compression=None, status_session=False):
         self.host_name = i_fspIP
         self.user_name = i_fspUser
         self.password = i_fspPasswd
@@ -63,6 +89,10 @@ class OpTestFSP():
         self.cv_ASM = OpTestASM(i_fspIP, i_fspUser, i_fspPasswd)
         self.cv_IPMI = ipmi
         self.rest = rest
+        self.image_cache = None
+        self.image_compression = image_compression
+        self.status_session = status_session
+        self.fspc_status = None
 
     def bmc_host(self):
         return self.cv_ASM.host_name
@@ -76,6 +106,19 @@ class OpTestFSP():
     def get_host_console(self):
         return self.cv_IPMI.get_host_console()
 
+    ##
+    # @brief Record of the lids staged on and installed on this FSP, over
+    #        SSH (so sshd has to be running on the FSP)
+    #
+    # @return OpTestImageCache.ImageCache
+    #
+    def get_image_cache(self):
+        if self.image_cache is None:
+            self.image_cache = ImageCache(SFTPEngine(self.host_name, self.user_name,
+                                                     self.password,
+                                                     compress=self.image_compression))
+        return self.image_cache
+
     ##
     # @brief Get FSP telnet console
     #
@@ -86,16 +129,28 @@ class OpTestFSP():
         self.fspc.login()
         self.fsp_name = self.fspc.run_command("hostname")
         print "Established Connection with FSP: {0} ".format(self.fsp_name)
+        if self.status_session:
+            self.fspc_status = TConnection(self.host_name, self.user_name, self.password,
+                                           self.prompt)
+            self.fspc_status.login()
+
+    ##
+    # @brief The telnet session for state queries: the second one if there
+    #        is one, otherwise the only one
+    #
+    def status_console(self):
+        return self.fspc_status or self.fspc
 
     ##
     # @brief Execute and return the output of an FSP command
     #
     # @param command @type string: Command to execute in FSP
+    # @param timeout @type int: seconds it may take, None to wait for ever
     #
     # @returns res @type string: output of command
     #
-    def fsp_run_command(self, command):
-        res = self.fspc.run_command(command)
+    def fsp_run_command(self, command, timeout=None):
+        res = self.fspc.run_command(command, timeout)
         return res
 
     def reboot(self):
@@ -107,19 +162,56 @@ class OpTestFSP():
     # @returns string: ipl progress code
     #
     def get_progress_code(self):
-        tmp = self.fspc.run_command("ls /opt/p1/srci/curripl")
-        tmp = tmp.split('.')
-        if len(tmp) == 3:
-            return tmp[2]
-        else:
-            return str(tmp)
+        return parse_progress_code(self.status_console().run_command("ls /opt/p1/srci/curripl"))
+
+    ##
+    # @brief System state, IPL progress code and hypervisor mode, in one
+    #        FSP command
+    # @returns FSPStatus
+    #
+    def status_snapshot(self):
+        values = {}
+        for line in self.status_console().run_command(self.STATUS_COMMAND).splitlines():
+            key, _, value = line.partition('=')
+            values[key] = value.strip()
+        return FSPStatus(values.get('state', ''), parse_progress_code(values.get('ipl', '')),
+                         values.get('hyp', ''))
+
+    ##
+    # @brief Poll status_snapshot() until the system is in one of states:
+    #        every POLL_MIN seconds while the state or progress code keeps
+    #        changing, backing off to POLL_MAX while they don't
+    #
+    # @param timeout @type int: minutes, None to wait for ever
+    # @param message @type string: OpTestError message on timeout
+    #
+    # @returns FSPStatus in one of states, or raises OpTestError
+    #
+    def wait_for_state(self, states, timeout=10, message="Timeout"):
+        end = None if timeout is None else time.time() + 60*timeout
+        interval = self.POLL_MIN
+        last = None
+        while True:
+            status = self.status_snapshot()
+            if status != last:
+                print "Current system status: %s" % status.state
+                print "Current progress code: %s" % status.progress_code
+                interval = self.POLL_MIN
+            else:
+                interval = min(interval * 2, self.POLL_MAX)
+            last = status
+            if status.state in states:
+                return status
+            if end is not None and time.time() > end:
+                raise OpTestError(message)
+            time.sleep(interval)
 
     ##
     # @brief Check for system runtime state
     # @returns True if system is in runtime else False
     #
     def is_sys_powered_on(self):
-        state = self.fspc.run_command("smgr mfgState")
+        state = self.status_console().run_command("smgr mfgState")
         state = state.rstrip('\n')
         if state == 'runtime':
             return True
@@ -130,7 +222,7 @@ class OpTestFSP():
     # @returns True if system is in standby state else False
     #
     def is_sys_standby(self):
-        state = self.fspc.run_command("smgr mfgState")
+        state = self.status_console().run_command("smgr mfgState")
         state = state.rstrip('\n')
         if state == 'standby':
             return True
@@ -142,7 +234,7 @@ class OpTestFSP():
     # @returns string: current system state
     #
     def get_sys_status(self):
-        state = self.fspc.run_command("smgr mfgState")
+        state = self.status_console().run_command("smgr mfgState")
         state = state.rstrip('\n')
         return state
 
@@ -162,16 +254,8 @@ class OpTestFSP():
     # @returns True if all commands executed.
     #
     def clear_fsp_errors(self):
-        #clear errl logs
-        self.fspc.run_command("errl -p")
-        #clear gard
-        self.fspc.run_command("gard --clr all")
-
-        #clear fipsdump
-        self.fspc.run_command("fipsdump -i")
-
-        #clear sysdump
-        self.fspc.run_command("sysdump -idall")
+        # errl logs, gard, fipsdumps and sysdumps, sent in one go
+        self.fspc.run_commands(["errl -p", "gard --clr all", "fipsdump -i", "sysdump -idall"])
         return True
 
     ##
@@ -180,8 +264,7 @@ class OpTestFSP():
     #          False:If system fails to reach standby.
     #
     def power_off_sys(self):
-        state = self.fspc.run_command("smgr mfgState")
-        state = state.rstrip('\n')
+        state = self.status_snapshot().state
         if state == 'standby':
             return True
         elif state == 'runtime' or state == 'ipling':
@@ -190,8 +273,7 @@ class OpTestFSP():
             output = output.rstrip('\n')
             if output.find("success"):
                 print "Waiting for system to reach standby..."
-                while not self.is_sys_standby():
-                    time.sleep(5)
+                self.wait_for_state(['standby'], timeout=None)
                 print "Powered OFF"
                 return True
             else:
@@ -207,12 +289,11 @@ class OpTestFSP():
     #          False:If system fails to reach runtime
     #
     def power_on_sys(self):
-        state = self.fspc.run_command("smgr mfgState")
-        state = state.rstrip('\n')
-        time_me = 0
+        status = self.status_snapshot()
+        state = status.state
         if state == 'standby':
             # just make sure we are booting in OPAL mode
-            if self.fspc.run_command("registry -Hr menu/HypMode") != '03':
+            if status.hyp_mode != '03':
                 print "Not in OPAL mode, switching to OPAL Hypervisor mode"
                 self.fspc.run_command("registry -Hw menu/HypMode 03")
             print "Powering on the system: " + state
@@ -220,17 +301,14 @@ class OpTestFSP():
             output = output.rstrip('\n')
             if output.find("success"):
                 print "Waiting for system to reach runtime..."
-                while not self.is_sys_powered_on():
-                    print "Current system state: {0}, progress code: {1} ".format(self.get_sys_status(), self.get_progress_code())
-                    time_me += 5
-                    if time_me > 1200:
-                        print "System not yet runtime even after 20minutes?"
-                        print "Lets consider this as failed case and return"
-                        return False
-                    else:
-                        time.sleep(5)
+                try:
+                    status = self.wait_for_state(['runtime'], timeout=20)
+                except OpTestError:
+                    print "System not yet runtime even after 20minutes?"
+                    print "Lets consider this as failed case and return"
+                    return False
                 print "PowerOn Successful"
-                print "System at runtime and current progress code: "+self.get_progress_code()
+                print "System at runtime and current progress code: "+status.progress_code
                 return True
             else:
                 print "Poweron Failed"
@@ -274,18 +352,7 @@ class OpTestFSP():
     # @returns 0 on success or throws exception
     #
     def wait_for_standby(self, timeout=10):
-        timeout = time.time() + 60*timeout
-        while True:
-            if self.is_sys_standby():
-                print "Current system status: %s" % self.get_sys_status()
-                print "Current progress code: %s" % self.get_progress_code()
-                break
-            print "Current system status: %s" % self.get_sys_status()
-            print "Current progress code: %s" % self.get_progress_code()
-            if time.time() > timeout:
-                l_msg = "Standby timeout"
-                raise OpTestError(l_msg)
-            time.sleep(BMC_CONST.SHORT_WAIT_STANDBY_DELAY)
+        self.wait_for_state(['standby'], timeout, "Standby timeout")
         return BMC_CONST.FW_SUCCESS
 
     ##
@@ -293,32 +360,13 @@ class OpTestFSP():
     # @returns 0 on success or throws exception
     #
     def wait_for_ipling(self, timeout=10):
-        timeout = time.time() + 60*timeout
-        while True:
-            if self.get_sys_status() == "ipling":
-                print "Current system status: %s" % self.get_sys_status()
-                print "Current progress code: %s" % self.get_progress_code()
-                break
-            print "Current system status: %s" % self.get_sys_status()
-            print "Current progress code: %s" % self.get_progress_code()
-            if time.time() > timeout:
-                l_msg = "IPL timeout"
-                raise OpTestError(l_msg)
-            time.sleep(5)
+        self.wait_for_state(['ipling'], timeout, "IPL timeout")
         return BMC_CONST.FW_SUCCESS
 
     def wait_for_dump_to_start(self):
-        count = 0
         # Dump maximum can start in one minute(So lets wait for 3 mins)
-        while count < 3:
-            if self.get_sys_status() == "dumping":
-                return True
-            count += 1
-            time.sleep(60)
-        else:
-            print "Current system status: %s" % self.get_sys_status()
-            print "Current progress code: %s" % self.get_progress_code()
-            raise OpTestError("System dump not started even after 3 minutes")
+        self.wait_for_state(['dumping'], 3, "System dump not started even after 3 minutes")
+        return True
 
 
     ##
@@ -326,18 +374,7 @@ class OpTestFSP():
     # @returns 0 on success or throws exception
     #
     def wait_for_runtime(self, timeout=10):
-        timeout = time.time() + 60*timeout
-        while True:
-            if self.is_sys_powered_on():
-                print "Current system status: %s" % self.get_sys_status()
-                print "Current progress code: %s" % self.get_progress_code()
-                break
-            print "Current system status: %s" % self.get_sys_status()
-            print "Current progress code: %s" % self.get_progress_code()
-            if time.time() > timeout:
-                l_msg = "IPL timeout"
-                raise OpTestError(l_msg)
-            time.sleep(5)
+        self.wait_for_state(['runtime'], timeout, "IPL timeout")
         return BMC_CONST.FW_SUCCESS
 
     def enable_system_dump(self):
@@ -395,9 +432,9 @@ class OpTestFSP():
         print "FSP: Running the command 'fipsdump -u'"
         state = self.fspc.run_command("fipsdump -u")
         time.sleep(60)
-        dumpname = self.fspc.run_command("fipsdump -l | sed 's/\ .*//'")
+        dumpname, size_fsp = self.fspc.run_commands(["fipsdump -l | sed 's/\ .*//'",
+                                                     "fipsdump -l | awk '{print $2}'"])
         print "fipsdump name : %s" % dumpname
-        size_fsp = self.fspc.run_command("fipsdump -l | awk '{print $2}'")
         return dumpname, size_fsp
 
     ##
@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestHTTP.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestHTTP
+#  HTTPS client for BMC REST APIs that keeps its connections open.
+#
+#  HTTPSPool hands out up to max_connections HTTP/1.1 connections to one
+#  BMC and puts them back after each request, so a polling loop does one
+#  TLS handshake instead of one per request. Cookies the BMC sets (the
+#  session after a login) are kept in memory for the pool, not in a file.
+#  As with curl -k, the BMC's certificate is not checked: BMCs come with
+#  self-signed ones.
+
+import ssl
+import time
+import select
+import Queue
+import socket
+import Cookie
+import httplib
+import threading
+from collections import namedtuple
+
+HTTPResponse = namedtuple('HTTPResponse', 'status reason headers body latency')
+
+class KeepAliveConnection(httplib.HTTPSConnection):
+
+    def __init__(self, host, timeout, context, on_connect):
+        httplib.HTTPSConnection.__init__(self, host, timeout=timeout, context=context)
+        self.on_connect = on_connect
+
+    def connect(self):
+        httplib.HTTPSConnection.connect(self)
+        # headers and body go out in separate writes, don't let the
+        # second wait on the ACK of the first
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.on_connect()
+
+class HTTPSPool():
+    # requests that can be sent again when the response was lost: a POST
+    # or PUT may have powered the host on or reset the BMC already
+    IDEMPOTENT = ('GET', 'HEAD', 'OPTIONS')
+
+    ##
+    # @brief Initialize this object, nothing connects until the first request
+    #
+    # @param host @type string: "ip" or "ip:port"
+    # @param max_connections @type int: most requests in flight at once
+    # @param timeout @type int: seconds to wait on the socket
+    #
+    def __init__(self, host, max_connections=2, timeout=60):
+        self.host = host
+        self.timeout = timeout
+        self.context = ssl._create_unverified_context()
+        self.idle = Queue.LifoQueue()
+        self.slots = threading.Semaphore(max_connections)
+        self.cookies = Cookie.SimpleCookie()
+        self.cookie_lock = threading.Lock()
+        self.connects = 0
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+    def connected(self):
+        with self.stats_lock:
+            self.connects += 1
+
+    def acquire(self):
+        self.slots.acquire()
+        try:
+            conn = self.idle.get_nowait()
+        except Queue.Empty:
+            return KeepAliveConnection(self.host, self.timeout, self.context, self.connected)
+        # an idle connection with something to read has been closed by
+        # the BMC, reopen it rather than find out after sending
+        if conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+            conn.close()
+        return conn
+
+    def release(self, conn):
+        self.idle.put(conn)
+        self.slots.release()
+
+    def cookie_header(self):
+        with self.cookie_lock:
+            return '; '.join('%s=%s' % (k, m.value) for k, m in self.cookies.items())
+
+    def store_cookies(self, response):
+        with self.cookie_lock:
+            for header in response.msg.getheaders('set-cookie'):
+                self.cookies.load(header)
+
+    def clear_cookies(self):
+        with self.cookie_lock:
+            self.cookies.clear()
+
+    ##
+    # @brief Send a request and read the whole response
+    #
+    #        A kept-alive connection the BMC has closed in the meantime is
+    #        reopened and the request sent again, once: any request that
+    #        failed going out, only IDEMPOTENT ones that failed waiting for
+    #        the response, which the BMC may have acted on.
+    #
+    # @param body: string, or file to stream from its current position
+    #
+    # @return HTTPResponse, or raise socket.error/httplib.HTTPException
+    #
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        cookies = self.cookie_header()
+        if cookies:
+            headers['Cookie'] = cookies
+        start = time.time()
+        position = body.tell() if hasattr(body, 'tell') else None
+        conn = self.acquire()
+        try:
+            while True:
+                reused = conn.sock is not None
+                sent = False
+                try:
+                    conn.request(method, path, body, headers)
+                    sent = True
+                    response = conn.getresponse()
+                    data = response.read()
+                    break
+                except (socket.error, httplib.HTTPException):
+                    conn.close()
+                    if not reused or (sent and method not in self.IDEMPOTENT):
+                        self.account(method, path, None, time.time() - start)
+                        raise
+                    if position is not None:
+                        body.seek(position)
+            if response.will_close:
+                conn.close()
+        finally:
+            self.release(conn)
+        self.store_cookies(response)
+        latency = time.time() - start
+        self.account(method, path, response.status, latency)
+        return HTTPResponse(response.status, response.reason, dict(response.getheaders()),
+                            data, latency)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except Queue.Empty:
+                break
+
+    def account(self, method, path, status, latency):
+        with self.stats_lock:
+            stat = self.stats.setdefault('%s %s' % (method, path.split('?')[0]),
+                                         {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0})
+            stat['count'] += 1
+            stat['total'] += latency
+            stat['max'] = max(stat['max'], latency)
+            if status is None or status >= 400:
+                stat['errors'] += 1
+
+    ##
+    # @brief Per endpoint latency and error counts
+    #
+    # @return dict of "METHOD path" to dict with count, errors (HTTP status
+    #         400 and up, or no response), average and max (seconds)
+    #
+    def report(self):
+        with self.stats_lock:
+            report = {}
+            for endpoint, stat in self.stats.items():
+                report[endpoint] = {'count': stat['count'], 'errors': stat['errors'],
+                                    'average': stat['total'] / stat['count'],
+                                    'max': stat['max']}
+            return report
@@ -53,6 +53,10 @@ from OpTestConstants import OpTestConstants as BMC_CONST
 from OpTestError import OpTestError
 from OpTestUtil import OpTestUtil
 from Exceptions import CommandFailed, NoKernelConfig, KernelModuleNotLoaded, KernelConfigNotSet
+from OpTestConsole import run_framed, run_batch_framed
+from OpTestSSH import SSHChannelPool
+from OpTestHostFacts import HostFacts, module_name
+from OpTestSysfs import SysfsAgent
 
 class SSHConnectionState():
     DISCONNECTED = 0
@@ -124,16 +128,21 @@ class SSHConnection():
 
     def run_command(self, command, timeout=300):
         c = self.get_console()
-        c.sendline(command)
-        c.expect("\n") # from us
-        c.expect(c.PROMPT, timeout=timeout)
-        output = c.before.splitlines()
-        c.sendline("echo $?")
-        c.prompt(timeout)
-        exitcode = int(''.join(c.before.splitlines()[1:]))
-        if exitcode != 0:
-            raise CommandFailed(command, output, exitcode)
-        return output
+        return run_framed(c, command, timeout, prompt=c.PROMPT)
+
+    ##
+    # @brief Run a list of commands in one exchange
+    #
+    # @return list of CommandResult, or raise CommandFailed for the first
+    #         failing command (the rest are not run)
+    #
+    def run_batch(self, commands, timeout=300, ignore_fail=False):
+        c = self.get_console()
+        return run_batch_framed(c, commands, timeout, prompt=c.PROMPT,
+                                ignore_fail=ignore_fail)
+
+    def run_batch_ignore_fail(self, commands, timeout=60):
+        return self.run_batch(commands, timeout, ignore_fail=True)
 
     # This command just runs and returns the ouput & ignores the failure
     def run_command_ignore_fail(self, command, timeout=60):
@@ -153,8 +162,10 @@ class OpTestHost():
     # @param i_hostpasswd @type string: Password of the userid to log into the host
     # @param i_bmcip @type string: IP Address of the bmc
     # @param i_ffdcDir @type string:specifies the directory under which to save all FFDC data
+    # @param i_sshChannels @type int: most commands to run at once on the SSH channel pool
     #
-    def __init__(self, i_hostip, i_hostuser, i_hostpasswd, i_bmcip, i_ffdcDir=None):
+    def __init__(self, i_hostip, i_hostuser, i_hostpasswd, i_bmcip, i_ffdcDir=None,
+                 i_sshChannels=4):
         self.ip = i_hostip
         self.user = i_hostuser
         self.passwd = i_hostpasswd
@@ -164,6 +175,10 @@ class OpTestHost():
         parent_dir = os.path.dirname(os.path.abspath(__file__))
         self.results_dir = self.cv_ffdcDir
         self.ssh = SSHConnection(i_hostip, i_hostuser, i_hostpasswd)
+        self.ssh_pool = SSHChannelPool(i_hostip, i_hostuser, i_hostpasswd,
+                                       max_channels=i_sshChannels, fallback=self.ssh)
+        self.facts = HostFacts(self.ssh)
+        self.sysfs = SysfsAgent(self.ssh)
 
     def hostname(self):
         return self.ip
@@ -177,6 +192,23 @@ class OpTestHost():
     def get_ssh_connection(self):
         return self.ssh
 
+    ##
+    # @brief Independent SSH exec channels, for stateless commands that may
+    #        run concurrently. get_ssh_connection() is the stateful shell.
+    #
+    # @return SSHChannelPool
+    #
+    def get_ssh_pool(self):
+        return self.ssh_pool
+
+    ##
+    # @brief Facts about the running OS, probed once per boot
+    #
+    # @return HostFacts
+    #
+    def get_facts(self):
+        return self.facts.get()
+
     ##
     # @brief Get and Record Ubunto OS level
     #
@@ -184,8 +216,7 @@ class OpTestHost():
     #         or raise OpTestError
     #
     def host_get_OS_Level(self):
-        l_oslevel = self.ssh.run_command("cat /etc/os-release", timeout=60)
-        return '\n'.join(l_oslevel)
+        return self.facts.get().os_release
 
 
     ##
@@ -268,6 +299,55 @@ class OpTestHost():
     def host_run_command(self, i_cmd, timeout=1500):
         return self.ssh.run_command(i_cmd, timeout)
 
+    ##
+    # @brief Run a list of commands on the shared shell in one exchange
+    #
+    # @return list of CommandResult or raise CommandFailed
+    #
+    def host_run_batch(self, i_cmds, timeout=1500):
+        return self.ssh.run_batch(i_cmds, timeout)
+
+    ##
+    # @brief Read all the sysfs/procfs files matching some globs in one exchange
+    #
+    # @param i_globs @type list: e.g. ["/sys/devices/system/cpu/cpu*/online"]
+    #
+    # @return SysfsValues, dict of path to contents
+    #
+    def host_read_sysfs(self, i_globs, timeout=60):
+        return self.sysfs.query(i_globs, timeout)
+
+    ##
+    # @brief Run a command on its own SSH channel rather than the shared shell
+    #
+    # @return list of output lines or raise CommandFailed
+    #
+    def host_exec_command(self, i_cmd, timeout=1500):
+        return self.ssh_pool.run_command(i_cmd, timeout)
+
+    def host_save_log(self, i_prefix, i_data):
+        if not self.results_dir:
+            print i_data
+            return
+        l_res = (time.asctime(time.localtime())).replace(" ", "_")
+        fn = os.path.join(self.results_dir, "%s_%s.log" % (i_prefix, l_res))
+        print fn
+        with open(fn, 'w') as f:
+            f.write(i_data)
+
+    ##
+    # @brief Gather OPAL message log and kernel dmesg log side by side on
+    #        separate SSH channels, storing them in the FFDC dir
+    #
+    def host_gather_logs(self):
+        l_msglog, l_dmesg = self.ssh_pool.map([BMC_CONST.OPAL_MSG_LOG, "dmesg"])
+        for l_result, l_prefix in [(l_msglog, "Opal_msglog"), (l_dmesg, "Kernel_dmesg_log")]:
+            if l_result.exitcode != 0:
+                raise CommandFailed(l_result.command,
+                                    (l_result.stdout + l_result.stderr).splitlines(),
+                                    l_result.exitcode)
+            self.host_save_log(l_prefix, l_result.stdout)
+
     ##
     # @brief It will gather OPAL Message logs and store the copy in a logfile
     #        which will be stored in FFDC dir.
@@ -276,21 +356,11 @@ class OpTestHost():
     #
     def host_gather_opal_msg_log(self):
         try:
-            l_data = '\n'.join(self.host_run_command(BMC_CONST.OPAL_MSG_LOG))
+            l_data = '\n'.join(self.host_exec_command(BMC_CONST.OPAL_MSG_LOG))
         except OpTestError:
             l_msg = "Failed to gather OPAL message logs"
             raise OpTestError(l_msg)
-
-        if not self.results_dir:
-            print l_data
-            return
-
-        l_res = (time.asctime(time.localtime())).replace(" ", "_")
-        l_logFile = "Opal_msglog_%s.log" % l_res
-        fn = os.path.join(self.results_dir, l_logFile)
-        print fn
-        with open(fn, 'w') as f:
-            f.write(l_data)
+        self.host_save_log("Opal_msglog", l_data)
 
 
     ##
@@ -319,8 +389,7 @@ class OpTestHost():
     #         or raise OpTestError
     #
     def host_get_kernel_version(self):
-        l_kernel = self.ssh.run_command("uname -a | awk {'print $3'}", timeout=60)
-        l_kernel = ''.join(l_kernel)
+        l_kernel = self.facts.get().kernel
         print l_kernel
         return l_kernel
 
@@ -343,25 +412,7 @@ class OpTestHost():
     #                             or raise OpTestError if config option is not set in file.
     #
     def host_check_config(self, i_kernel, i_config):
-        l_file = "/boot/config-%s" % i_kernel
-        try:
-            l_res = self.ssh.run_command("test -e %s" % l_file, timeout=60)
-        except CommandFailed as c:
-            raise NoKernelConfig(i_kernel, l_file)
-
-        print "Config file is available"
-        l_cmd = "cat %s" % (l_file)
-        l_res = self.ssh.run_command(l_cmd, timeout=60)
-        config_opts = {}
-        for o in l_res:
-            m = re.match('# (.*) is not set', o)
-            if m:
-                config_opts[m.group(0)]='n'
-            else:
-                if '=' in o:
-                    opt, val = o.split("=")
-                    config_opts[opt] = val
-
+        config_opts = self.facts.kernel_config(i_kernel)
         if config_opts.get(i_config) not in ["y","m"]:
                 raise KernelConfigNotSet(i_config)
 
@@ -593,13 +644,14 @@ class OpTestHost():
     # @return BMC_CONST.FW_SUCCESS or raise OpTestError
     #
     def host_load_module(self, i_module):
-        try:
-            l_res = self.host_run_command("modprobe %s" % i_module)
-        except CommandFailed as c:
+        l_modprobe, l_modules = self.ssh.run_batch_ignore_fail(["modprobe %s" % i_module,
+                                                                "cat /proc/modules"])
+        if l_modprobe.exitcode != 0:
+            c = CommandFailed(l_modprobe.command, l_modprobe.output, l_modprobe.exitcode)
             l_msg = "Error in loading the module %s, modprobe failed: %s" % (i_module,str(c))
             raise OpTestError(l_msg)
-        l_res = self.host_run_command("lsmod | grep -i --color=never %s" % i_module)
-        if re.search(i_module, ''.join(l_res)):
+        self.facts.update_modules(l_modules.output)
+        if module_name(i_module) in self.facts.modules:
             print "%s module is loaded" % i_module
             return BMC_CONST.FW_SUCCESS
         else:
@@ -739,19 +791,11 @@ class OpTestHost():
     #
     def host_gather_kernel_log(self):
         try:
-            l_data = self.host_run_command("dmesg")
+            l_data = '\n'.join(self.host_exec_command("dmesg"))
         except OpTestError:
             l_msg = "Failed to gather kernel dmesg log"
             raise OpTestError(l_msg)
-        if not self.results_dir:
-            print l_data
-            return
-        l_res = (time.asctime(time.localtime())).replace(" ", "_")
-        l_logFile = "Kernel_dmesg_log_%s.log" % l_res
-        fn = os.path.join(self.results_dir, l_logFile)
-        print fn
-        with open(fn, 'w') as f:
-            f.write(l_data)
+        self.host_save_log("Kernel_dmesg_log", l_data)
         return BMC_CONST.FW_SUCCESS
 
     ##
@@ -0,0 +1,139 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestHostFacts.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestHostFacts
+#  Facts about the running host OS that don't change until it reboots:
+#  OS release, kernel version, the kernel config and (kept up to date by
+#  OpTestHost) the loaded modules.
+#
+#  They are all collected by one batched probe the first time any of them
+#  is asked for, and then served from memory until OpTestSystem leaves the
+#  OS state. The boot_id recorded with them means a probe of the same boot
+#  (say after an SSH reconnect) doesn't pull the kernel config again.
+
+import re
+
+from Exceptions import CommandFailed, NoKernelConfig
+
+BOOT_ID = "/proc/sys/kernel/random/boot_id"
+
+##
+# @brief Parse a kernel .config
+#
+# @return dict of CONFIG_ option to value, 'n' for "is not set"
+#
+def parse_kernel_config(lines):
+    config = {}
+    for l in lines:
+        m = re.match('# (CONFIG_\w+) is not set', l)
+        if m:
+            config[m.group(1)] = 'n'
+        elif '=' in l and not l.startswith('#'):
+            opt, val = l.split('=', 1)
+            config[opt] = val.strip('"')
+    return config
+
+##
+# @brief Module names as in /proc/modules, where '-' is always '_'
+#
+def module_name(name):
+    return name.replace('-', '_')
+
+class HostFacts():
+
+    ##
+    # @param console: the host shell, anything with run_batch_ignore_fail()
+    #
+    def __init__(self, console):
+        self.console = console
+        self.boot_id = None
+        self.os_release = None
+        self.kernel = None
+        self.modules = None
+        # kernel version to parsed config, for the boot in boot_id
+        self.configs = {}
+        self.valid = False
+
+    ##
+    # @brief Forget everything, the next lookup probes the host again
+    #
+    def invalidate(self):
+        self.valid = False
+
+    def probe(self):
+        # Skip transferring the config if this is still the boot we have it for
+        known = self.boot_id if self.configs else ''
+        results = self.console.run_batch_ignore_fail(
+            ["cat %s" % BOOT_ID,
+             "cat /etc/os-release",
+             "uname -r",
+             "test \"$(cat %s)\" = '%s' || cat /boot/config-$(uname -r)" % (BOOT_ID, known),
+             "cat /proc/modules"])
+        boot_id, os_release, kernel, config, modules = results
+        if boot_id.exitcode != 0 or kernel.exitcode != 0:
+            failed = boot_id if boot_id.exitcode != 0 else kernel
+            raise CommandFailed(failed.command, failed.output, failed.exitcode)
+        if ''.join(boot_id.output).strip() != self.boot_id:
+            self.configs = {}
+        self.boot_id = ''.join(boot_id.output).strip()
+        self.os_release = '\n'.join(os_release.output)
+        self.kernel = ''.join(kernel.output).strip()
+        if config.exitcode == 0 and config.output:
+            self.configs[self.kernel] = parse_kernel_config(config.output)
+        self.update_modules(modules.output)
+        self.valid = True
+        print "# Host facts for boot %s: kernel %s, %d modules loaded" % (
+            self.boot_id, self.kernel, len(self.modules))
+
+    def get(self):
+        if not self.valid:
+            self.probe()
+        return self
+
+    ##
+    # @param lines @type list: /proc/modules
+    #
+    def update_modules(self, lines):
+        self.modules = set(l.split()[0] for l in lines if l.strip())
+
+    ##
+    # @brief Config of the running kernel, or of another installed one
+    #
+    # @return dict of option to value or raise NoKernelConfig
+    #
+    def kernel_config(self, kernel=None):
+        self.get()
+        kernel = kernel or self.kernel
+        if kernel not in self.configs:
+            l_file = "/boot/config-%s" % kernel
+            results = self.console.run_batch_ignore_fail(["cat %s" % l_file])
+            if results[0].exitcode != 0:
+                raise NoKernelConfig(kernel, l_file)
+            self.configs[kernel] = parse_kernel_config(results[0].output)
+        return self.configs[kernel]
+
+    def module_loaded(self, name):
+        return module_name(name) in self.get().modules
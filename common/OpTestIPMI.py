@@ -32,32 +32,49 @@
 #  in OpenPower systems
 
 import time
+import atexit
 import subprocess
 import os
+import re
 import pexpect
 import sys
 import commands
+import json
+import threading
+import socket
+import Queue
+import array
+from collections import namedtuple
 #from subprocess import check_output
 from OpTestConstants import OpTestConstants as BMC_CONST
 from OpTestError import OpTestError
 from OpTestUtil import OpTestUtil
 from Exceptions import CommandFailed
 from Exceptions import BMCDisconnected
+from OpTestRMCP import RMCPPlusSession, IPMICompletionCode, COMPLETION_CODES
+from OpTestSEL import IPMISELCursor
+from OpTestConsole import ConsoleStream, CommandFrame, command_batches, console_log_path
 
 class IPMITool():
+    # Each run() forks its own ipmitool, so several threads may share one
+    concurrent = True
+
     def __init__(self, method='lanplus', binary='ipmitool',
-                 ip=None, username=None, password=None):
+                 ip=None, username=None, password=None, port=None):
         self.method = 'lanplus'
         self.ip = ip
         self.username = username
         self.password = password
         self.binary = binary
+        self.port = port
 
     def binary_name(self):
         return self.binary
 
     def arguments(self):
         s = ' -H %s -I %s' % (self.ip, self.method)
+        if self.port:
+            s += ' -p %s' % (self.port)
         if self.username:
             s += ' -U %s' % (self.username)
         if self.password:
@@ -93,6 +110,781 @@ class IPMITool():
             output = cmd.communicate()[0]
             return output
 
+    ##
+    # @brief Run an 'ipmitool raw' command and decode its hex dump
+    #
+    # @return list of response bytes, or None if the command failed
+    #
+    def raw_bytes(self, cmd):
+        try:
+            output = self.run(cmd, logcmd=False)
+        except (CommandFailed, OpTestError):
+            return None
+        try:
+            return [int(b, 16) for b in output.split()]
+        except ValueError:
+            return None
+
+##
+# @brief IPMITool backend that answers the common raw, chassis and mc
+#        commands over one persistent native RMCP+ session (see OpTestRMCP)
+#        and forks ipmitool for everything else. The output of run() mimics
+#        ipmitool, so callers do not need to know which path was taken.
+#
+#        If the session can't be set up the command goes to ipmitool
+#        instead. Once a request has gone out, only commands that are safe
+#        to repeat (status, bootdev, power on/off) are retried through
+#        ipmitool: the BMC may have acted on a power cycle or reset whose
+#        response was lost, so those raise instead.
+#
+class IPMILanTool(IPMITool):
+    POWER_ACTIONS = {'off': (0x00, 'Down/Off'),
+                     'on': (0x01, 'Up/On'),
+                     'cycle': (0x02, 'Cycle'),
+                     'reset': (0x03, 'Reset'),
+                     'diag': (0x04, 'Diag'),
+                     'soft': (0x05, 'Soft')}
+    BOOT_DEVICES = {'none': 0x00, 'pxe': 0x04, 'disk': 0x08, 'safe': 0x0c,
+                    'diag': 0x10, 'cdrom': 0x14, 'bios': 0x18, 'floppy': 0x3c}
+    concurrent = False
+
+    def __init__(self, method='lanplus', binary='ipmitool',
+                 ip=None, username=None, password=None, port=None,
+                 cipher_suite=3):
+        IPMITool.__init__(self, method=method, binary=binary, ip=ip,
+                          username=username, password=password, port=port)
+        self.session = RMCPPlusSession(ip, username, password,
+                                       port=port or 623,
+                                       cipher_suite=cipher_suite)
+
+    def run(self, cmd, background=False, cmdprefix=None, logcmd=True):
+        native = None
+        if not background and not cmdprefix:
+            native = self.native_command(cmd)
+        if native:
+            handler, repeatable = native
+            if logcmd:
+                print "[rmcp+ %s] %s" % (self.ip, cmd.strip())
+            try:
+                self.session.open()
+            except (OpTestError, socket.error) as e:
+                print "# Native IPMI session failed (%s), falling back to %s" % (
+                    str(e), self.binary)
+                return IPMITool.run(self, cmd, background, cmdprefix, logcmd)
+            try:
+                return handler()
+            except OpTestError as e:
+                if not repeatable:
+                    raise OpTestError("Native IPMI '%s' failed after the request went out,"
+                                      " not repeating it: %s" % (cmd.strip(), str(e)))
+                print "# Native IPMI failed (%s), falling back to %s" % (str(e), self.binary)
+        return IPMITool.run(self, cmd, background, cmdprefix, logcmd)
+
+    ##
+    # @brief Map an ipmitool command line onto a native handler
+    #
+    # @return (callable producing ipmitool style output, whether running
+    #         the command twice is harmless), or None if the command has to
+    #         go through the ipmitool binary
+    #
+    def native_command(self, cmd):
+        if [c for c in '|;&<>`$' if c in cmd]:
+            return None
+        args = cmd.split()
+        if len(args) > 2 and args[0] == 'raw':
+            try:
+                values = [int(a, 0) for a in args[1:]]
+            except ValueError:
+                return None
+            if [v for v in values if v < 0 or v > 0xff]:
+                return None
+            # could be anything, a power control included
+            return (lambda: self.raw(values[0], values[1], values[2:])), False
+        if args[:1] == ['chassis'] and args[1:2] == ['power']:
+            args = args[1:]
+        if len(args) == 2 and args[0] == 'power':
+            if args[1] == 'status':
+                return self.power_status, True
+            if args[1] in self.POWER_ACTIONS:
+                return (lambda: self.power_control(args[1])), args[1] in ['on', 'off']
+        if len(args) == 3 and args[:2] == ['chassis', 'bootdev'] \
+           and args[2] in self.BOOT_DEVICES:
+            return (lambda: self.bootdev(args[2])), True
+        if len(args) == 3 and args[:2] == ['mc', 'reset'] \
+           and args[2] in ['cold', 'warm']:
+            return (lambda: self.mc_reset(args[2])), False
+        return None
+
+    def raw(self, netfn, cmd, data):
+        code, rsp = self.session.raw(netfn, cmd, ''.join(chr(d) for d in data))
+        if code != 0:
+            return "Unable to send RAW command (channel=0x0 netfn=0x%x lun=0x0 cmd=0x%x rsp=0x%x): %s\n" % (
+                netfn, cmd, code, COMPLETION_CODES.get(code, "Unknown"))
+        output = ''
+        for i, b in enumerate(bytearray(rsp)):
+            if i and i % 16 == 0:
+                output += '\n'
+            output += ' %02x' % b
+        return output + '\n'
+
+    def power_status(self):
+        rsp = self.session.request(0x00, 0x01)
+        return "Chassis Power is %s\n" % ('on' if ord(rsp[0]) & 0x01 else 'off')
+
+    def power_control(self, action):
+        value, name = self.POWER_ACTIONS[action]
+        try:
+            self.session.request(0x00, 0x02, chr(value))
+        except IPMICompletionCode as e:
+            return "Set Chassis Power Control to %s failed: %s\n" % (
+                name, COMPLETION_CODES.get(e.code, "Unknown"))
+        return "Chassis Power Control: %s\n" % name
+
+    def bootdev(self, device):
+        flags = chr(0x05) + chr(0x80) + chr(self.BOOT_DEVICES[device]) + '\x00\x00\x00'
+        try:
+            self.session.request(0x00, 0x08, flags)
+        except IPMICompletionCode as e:
+            return "Error setting Chassis Boot Parameter 5: %s\n" % (
+                COMPLETION_CODES.get(e.code, "Unknown"))
+        return "Set Boot Device to %s\n" % device
+
+    def mc_reset(self, kind):
+        try:
+            self.session.request(0x06, 0x02 if kind == 'cold' else 0x03)
+        except IPMICompletionCode as e:
+            return "MC reset command failed: %s\n" % COMPLETION_CODES.get(e.code, "Unknown")
+        # The BMC is about to go away, the session goes with it
+        self.session.discard()
+        return "Sent %s reset command to MC\n" % kind
+
+IPMI_QUERY_COMMANDS = ['sdr', 'sensor', 'sel', 'fru', 'mc', 'chassis', 'power', 'lan',
+                      'dcmi', 'user', 'channel', 'session']
+IPMI_ACTION_WORDS = set(['set', 'clear', 'reset', 'cycle', 'soft', 'diag', 'write', 'edit',
+                         'delete', 'add', 'thresh', 'setenables', 'activate', 'deactivate',
+                         'upgrade', 'fill', 'selftest'])
+
+##
+# @brief Whether running an ipmitool command line a second time, after the
+#        first attempt may or may not have reached the BMC, is harmless:
+#        queries, and settings that end up the same either way (bootdev,
+#        power on/off). Power cycles, resets, clears, raw and event
+#        commands are not.
+#
+def ipmi_repeatable(cmd):
+    args = cmd.split()
+    return bool(args) and args[0] in IPMI_QUERY_COMMANDS \
+        and not IPMI_ACTION_WORDS.intersection(args)
+
+##
+# @brief IPMITool backend that keeps one long-lived 'ipmitool ... shell'
+#        child and pipelines commands through it, so each command costs a
+#        round trip on an existing session rather than a fork plus session
+#        setup. Every command is followed by an 'echo' of a unique sentinel
+#        which frames its output.
+#
+#        Commands the shell cannot run (background, cmdprefix, shell pipes
+#        other than a trailing literal '| grep') are forked as before. If
+#        the shell dies or wedges, a fresh one is started for the next
+#        command, and the command is re-run with a fork if it hadn't gone
+#        out yet or ipmi_repeatable() says it is safe to.
+#
+class IPMIShellTool(IPMITool):
+    PROMPT = 'ipmitool> '
+    GREP = re.compile(r"^(.*?)\s*\|\s*grep\s+(?:'([^']*)'|\"([^\"]*)\"|(\S+))\s*$")
+    concurrent = False
+
+    def __init__(self, method='lanplus', binary='ipmitool',
+                 ip=None, username=None, password=None, port=None,
+                 timeout=120, idle_limit=40, logdir=None):
+        IPMITool.__init__(self, method=method, binary=binary, ip=ip,
+                          username=username, password=password, port=port)
+        self.shell = None
+        self.logdir = logdir
+        self.timeout = timeout
+        # Most BMCs time out an idle session after about a minute, rather
+        # than find out the hard way we restart the shell after idle_limit.
+        self.idle_limit = idle_limit
+        self.last_used = 0
+        self.sentinel = 0
+        self.latencies = []
+        self.fallbacks = 0
+        self.sent = False
+        atexit.register(self.finish)
+
+    def start_shell(self):
+        self.stop_shell()
+        cmd = self.binary + self.arguments() + 'shell'
+        print cmd
+        self.shell = pexpect.spawn(cmd)
+        self.shell.expect_exact(self.PROMPT, timeout=60)
+        self.last_used = time.time()
+
+    def stop_shell(self):
+        if self.shell is None:
+            return
+        try:
+            if self.shell.isalive():
+                self.shell.sendline('exit')
+                self.shell.expect(pexpect.EOF, timeout=5)
+        except pexpect.ExceptionPexpect:
+            pass
+        self.shell.terminate(force=True)
+        self.shell = None
+
+    def run(self, cmd, background=False, cmdprefix=None, logcmd=True):
+        if background or cmdprefix:
+            return IPMITool.run(self, cmd, background, cmdprefix, logcmd)
+        pattern = None
+        m = self.GREP.match(cmd.strip())
+        if m:
+            cmd, pattern = m.group(1), m.group(2) or m.group(3) or m.group(4)
+            if re.search(r'[][.*^$\\]', pattern):
+                return IPMITool.run(self, m.group(0), background, cmdprefix, logcmd)
+        if [c for c in '|;&<>`$' if c in cmd]:
+            return IPMITool.run(self, cmd, background, cmdprefix, logcmd)
+
+        if logcmd:
+            print "[ipmitool shell %s] %s" % (self.ip, cmd.strip())
+        start = time.time()
+        try:
+            output = self.shell_command(cmd.strip())
+        except pexpect.ExceptionPexpect as e:
+            self.stop_shell()
+            if self.sent and not ipmi_repeatable(cmd):
+                # it may have been carried out, don't do it twice
+                raise OpTestError("ipmitool shell failed (%s) running '%s', not repeating it"
+                                  % (type(e).__name__, cmd.strip()))
+            print "# ipmitool shell failed (%s), falling back to fork per command" % type(e).__name__
+            self.fallbacks += 1
+            output = IPMITool.run(self, cmd, logcmd=logcmd)
+        else:
+            self.latencies.append(time.time() - start)
+            if logcmd:
+                print "# ipmitool shell: %.3fs" % self.latencies[-1]
+        if pattern is not None:
+            output = ''.join(l for l in output.splitlines(True) if pattern in l)
+        return output
+
+    def shell_command(self, cmd):
+        self.sent = False
+        if self.shell is None or not self.shell.isalive() \
+           or time.time() - self.last_used > self.idle_limit:
+            self.start_shell()
+        self.sentinel += 1
+        marker = '__OPTEST_IPMI_%d__' % self.sentinel
+        self.sent = True
+        self.shell.sendline(cmd)
+        self.shell.sendline('echo %s' % marker)
+        # The echoed input line reads 'ipmitool> echo <marker>', only the
+        # output of the echo command has the marker at the start of a line.
+        self.shell.expect('\n%s\r?\n' % marker, timeout=self.timeout)
+        self.last_used = time.time()
+        lines = [l for l in self.shell.before.replace('\r', '').split('\n')
+                 if not l.startswith(self.PROMPT.strip())]
+        # The tty echo of the command itself, when its prompt was already
+        # consumed (first command after the shell started)
+        if lines and lines[0].strip() == cmd:
+            lines.pop(0)
+        output = '\n'.join(lines).strip('\n')
+        return output + '\n' if output else ''
+
+    ##
+    # @brief Per-command latency seen through the shell
+    #
+    # @return dict with count, average, max (seconds) and fork fallbacks
+    #
+    def latency_report(self):
+        report = {'count': len(self.latencies), 'average': 0.0,
+                  'max': 0.0, 'fallbacks': self.fallbacks}
+        if self.latencies:
+            report['average'] = sum(self.latencies) / len(self.latencies)
+            report['max'] = max(self.latencies)
+        return report
+
+    ##
+    # @brief At exit: close the shell, print the latency report and keep it
+    #        with the FFDC
+    #
+    def finish(self):
+        self.stop_shell()
+        if not self.latencies and not self.fallbacks:
+            return
+        report = self.latency_report()
+        line = ("ipmitool shell %s: %d commands, average %.3fs, max %.3fs, %d fork fallbacks"
+                % (self.ip, report['count'], report['average'], report['max'],
+                   report['fallbacks']))
+        print line
+        if self.logdir:
+            try:
+                with open(os.path.join(self.logdir, 'ipmitool_shell_latency.log'), 'a') as f:
+                    f.write(line + '\n')
+            except IOError as e:
+                print "# Could not write the ipmitool shell latency log: %s" % e
+
+# Typed records for the ipmitool listings we look at. namedtuples keep
+# one record about the size of a plain tuple, with no per-record dict.
+SDRRecord = namedtuple('SDRRecord', 'name number status entity value unit state')
+SensorRecord = namedtuple('SensorRecord',
+                          'name value unit status lnr lcr lnc unc ucr unr reading')
+SELEntry = namedtuple('SELEntry', 'id date time sensor event direction data')
+FRUDevice = namedtuple('FRUDevice', 'description id fields')
+DCMIPowerReading = namedtuple('DCMIPowerReading',
+                              'instantaneous minimum maximum average timestamp period state')
+
+def ipmi_float(s):
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+##
+# @brief Rows parsed from one fetch of an ipmitool listing. The name index
+#        and the columns are built on first use and then shared by every
+#        check made against the same fetch. Numeric columns are arrays of
+#        doubles, with NaN where there is no reading.
+#
+class IPMITable():
+    def __init__(self, rows, numeric=()):
+        self.rows = rows
+        self.numeric = numeric
+        self.index = None
+        self.columns = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, i):
+        return self.rows[i]
+
+    ##
+    # @brief First record whose key (name, or id for SEL entries) matches
+    #
+    def get(self, key, default=None):
+        if self.index is None:
+            self.index = {}
+            for row in self.rows:
+                self.index.setdefault(row[0], row)
+        return self.index.get(key, default)
+
+    ##
+    # @brief All the values of one field
+    #
+    # @return array('d') for numeric fields, tuple otherwise
+    #
+    def column(self, field):
+        if field not in self.columns:
+            values = [getattr(row, field) for row in self.rows]
+            if field in self.numeric:
+                nan = float('nan')
+                values = array.array('d', [nan if v is None else v for v in values])
+            else:
+                values = tuple(values)
+            self.columns[field] = values
+        return self.columns[field]
+
+    ##
+    # @brief Records with the given text in any of their string fields
+    #
+    def find(self, text):
+        return [row for row in self.rows
+                if any(isinstance(f, str) and text in f for f in row)]
+
+##
+# @brief Parse 'sdr elist' lines such as
+#        Host Status      | 50h | ok  | 35.1 | S0/G0: working
+#        Ambient Temp     | 01h | ok  | 64.1 | 27 degrees C
+#
+def parse_sdr_elist(output):
+    rows = []
+    for line in output.splitlines():
+        f = line.split('|')
+        if len(f) < 5:
+            continue
+        number = f[1].strip()
+        if not number.endswith('h'):
+            continue
+        try:
+            number = int(number[:-1], 16)
+        except ValueError:
+            continue
+        reading = f[4].strip()
+        value, unit, state = None, '', reading
+        head = reading.split(' ', 1)
+        if len(head) == 2:
+            value = ipmi_float(head[0])
+            if value is not None:
+                unit, state = head[1], ''
+        rows.append(SDRRecord(f[0].strip(), number, f[2].strip(), f[3].strip(),
+                              value, unit, state))
+    return IPMITable(rows, numeric=('value',))
+
+##
+# @brief Parse 'sensor list' lines such as
+#        Ambient Temp | 27.000 | degrees C | ok | na | na | na | na | 45.000 | na
+#        Host Status  | 0x0    | discrete  | 0x0180| na | na | na | na | na | na
+#
+def parse_sensor_list(output):
+    rows = []
+    for line in output.splitlines():
+        f = [x.strip() for x in line.split('|')]
+        if len(f) < 10:
+            continue
+        rows.append(SensorRecord(f[0], ipmi_float(f[1]), f[2], f[3],
+                                 ipmi_float(f[4]), ipmi_float(f[5]), ipmi_float(f[6]),
+                                 ipmi_float(f[7]), ipmi_float(f[8]), ipmi_float(f[9]),
+                                 f[1]))
+    return IPMITable(rows, numeric=('value', 'lnr', 'lcr', 'lnc', 'unc', 'ucr', 'unr'))
+
+##
+# @brief Parse 'sel elist' (or 'sel list') lines such as
+#        1a | 06/14/2017 | 10:22:03 | OS Boot #0x51 | boot completed | Asserted
+#        Anything past the direction column ends up in data.
+#
+def parse_sel_list(output):
+    rows = []
+    for line in output.splitlines():
+        f = line.split('|', 6)
+        if len(f) < 5:
+            continue
+        try:
+            record_id = int(f[0], 16)
+        except ValueError:
+            continue
+        rows.append(SELEntry(record_id, f[1].strip(), f[2].strip(), f[3].strip(),
+                             f[4].strip(), f[5].strip() if len(f) > 5 else '',
+                             f[6].strip() if len(f) > 6 else ''))
+    return IPMITable(rows)
+
+##
+# @brief Parse 'fru print' into one FRUDevice per 'FRU Device Description'
+#        block, keyed by the description
+#
+def parse_fru_print(output):
+    rows = []
+    fields = None
+    for line in output.splitlines():
+        if ':' not in line:
+            continue
+        key, value = [x.strip() for x in line.split(':', 1)]
+        if key == 'FRU Device Description':
+            m = re.search(r'\(ID (\d+)\)', value)
+            fields = {}
+            rows.append(FRUDevice(value, int(m.group(1)) if m else None, fields))
+        elif fields is not None:
+            fields[key] = value
+    return IPMITable(rows)
+
+##
+# @brief Parse 'dcmi power reading'
+#
+# @return DCMIPowerReading, powers in Watts and period in seconds,
+#         or None if the output isn't a power reading
+#
+def parse_dcmi_power_reading(output):
+    values = {}
+    for line in output.splitlines():
+        if ':' not in line:
+            continue
+        key, value = [x.strip() for x in line.split(':', 1)]
+        values[key.lower()] = value
+    def watts(key):
+        return ipmi_float(values.get(key, '').split(' ')[0])
+    if 'instantaneous power reading' not in values:
+        return None
+    return DCMIPowerReading(watts('instantaneous power reading'),
+                            watts('minimum during sampling period'),
+                            watts('maximum during sampling period'),
+                            watts('average power reading over sample period'),
+                            values.get('ipmi timestamp'),
+                            ipmi_float(values.get('sampling period', '').split(' ')[0]),
+                            values.get('power reading state is'))
+
+##
+# @brief Parse 'chassis power status', i.e. 'Chassis Power is on'
+#
+# @return 'on' or 'off', or None if the output isn't a power status
+#
+def parse_chassis_power_status(output):
+    m = re.search(r'^Chassis Power is (on|off)\s*$', output, re.MULTILINE)
+    if m:
+        return m.group(1)
+    return None
+
+IPMI_PARSERS = {
+    'sdr elist': parse_sdr_elist,
+    'sensor list': parse_sensor_list,
+    'sel elist': parse_sel_list,
+    'sel list': parse_sel_list,
+    'fru print': parse_fru_print,
+    'dcmi power reading': parse_dcmi_power_reading,
+    'chassis power status': parse_chassis_power_status,
+}
+
+##
+# @brief Local copy of the BMC's SDR repository, reduced to a map of sensor
+#        name to sensor number, so a single sensor can be read with one
+#        Get Sensor Reading instead of walking the whole repository
+#        with 'sdr elist' each time.
+#
+#        The repository is walked at most once per BMC boot (invalidate()
+#        after any BMC reset) and the result is stored in cache_dir, keyed by
+#        the BMC firmware version from Get Device ID, so later runs against
+#        the same firmware do not walk it at all.
+#
+class SDRCache():
+    DEFAULT_DIR = os.path.expanduser('~/.cache/op-test/sdr')
+
+    def __init__(self, ipmitool, ip, cache_dir=None):
+        self.ipmitool = ipmitool
+        self.ip = ip
+        self.cache_dir = cache_dir or self.DEFAULT_DIR
+        self.version = None
+        self.sensors = None
+
+    ##
+    # @brief Forget the in-memory copy, e.g. after the BMC was reset or
+    #        reflashed. The firmware version is read again on next use.
+    #
+    def invalidate(self):
+        self.version = None
+        self.sensors = None
+
+    ##
+    # @brief BMC firmware revision and auxiliary revision from Get Device ID
+    #
+    # @return string such as '2.22-000000bb' or None if it can't be read
+    #
+    def firmware_version(self):
+        rsp = self.ipmitool.raw_bytes('raw 0x06 0x01')
+        if rsp is None or len(rsp) < 4:
+            return None
+        version = '%d.%02x' % (rsp[2] & 0x7f, rsp[3])
+        if len(rsp) >= 15:
+            version += '-' + ''.join(['%02x' % b for b in rsp[11:15]])
+        return version
+
+    def cache_file(self):
+        return os.path.join(self.cache_dir, '%s-%s.json' % (self.ip, self.version))
+
+    ##
+    # @brief Make sure the sensor map is loaded: from memory, else from the
+    #        on-disk cache for this firmware version, else by walking the SDR.
+    #
+    def load(self):
+        if self.sensors is not None:
+            return self.sensors
+        self.version = self.firmware_version()
+        if self.version is not None:
+            try:
+                with open(self.cache_file()) as f:
+                    self.sensors = json.load(f)
+                return self.sensors
+            except (IOError, ValueError):
+                pass
+        self.refresh()
+        return self.sensors
+
+    ##
+    # @brief Walk the SDR repository once and rebuild the sensor map
+    #
+    def refresh(self):
+        self.sensors = self.parse_elist(self.ipmitool.run('sdr elist'))
+        if self.version is None or not self.sensors:
+            return
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(self.cache_file(), 'w') as f:
+                json.dump(self.sensors, f)
+        except (IOError, OSError) as e:
+            print "Unable to save SDR cache %s: %s" % (self.cache_file(), str(e))
+
+    ##
+    # @brief Reduce 'sdr elist' output to a map of sensor name to number
+    #
+    # @return dict of sensor name to sensor number. Where several
+    #         sensors share a name the first one wins.
+    #
+    @staticmethod
+    def parse_elist(output):
+        sensors = {}
+        for record in parse_sdr_elist(output):
+            sensors.setdefault(record.name, record.number)
+        return sensors
+
+    def sensor_number(self, name):
+        return self.load().get(name)
+
+    ##
+    # @brief Read one discrete sensor with a single Get Sensor Reading
+    #
+    # @param name @type string: sensor name as shown by 'sdr elist'
+    #
+    # @return set of asserted state offsets, or None if the sensor isn't in
+    #         the SDR or its reading is unavailable, in which case callers
+    #         should fall back to 'sdr elist'.
+    #
+    def get_sensor_states(self, name):
+        number = self.sensor_number(name)
+        if number is None:
+            return None
+        rsp = self.ipmitool.raw_bytes('raw 0x04 0x2d 0x%02x' % number)
+        # reading, flags, state bits 0-7 [, state bits 8-14]
+        if rsp is None or len(rsp) < 3 or rsp[1] & 0x20:
+            return None
+        bits = rsp[2]
+        if len(rsp) > 3:
+            bits |= (rsp[3] & 0x7f) << 8
+        return set([i for i in range(15) if bits & (1 << i)])
+
+##
+# @brief Outcome of one command run by IPMIExecutor. wait() blocks until the
+#        command has run; output is the ipmitool output including the
+#        trailing exit code line, like OpTestOOBIPMI's run_ipmi_cmd sees it.
+#
+class IPMICommandResult():
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.output = None
+        self.exitcode = None
+        self.error = None
+        self.latency = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        return self
+
+    def failed(self):
+        return self.error is not None or self.exitcode != 0
+
+##
+# @brief Runs read-only ipmitool commands on a pool of worker threads.
+#
+#        However many executors there are, at most max_inflight commands
+#        are outstanding against any one BMC, counting the ones run one at
+#        a time through run(): the first executor created for a BMC sets
+#        the limit. Backends that hold a single session (shell, native)
+#        can't be shared between threads, so the workers fork ipmitool
+#        with the same credentials instead.
+#
+class IPMIExecutor():
+    inflight = {}
+    inflight_lock = threading.Lock()
+
+    def __init__(self, ipmitool, max_inflight=4):
+        if not ipmitool.concurrent:
+            ipmitool = IPMITool(method=ipmitool.method, binary=ipmitool.binary,
+                                ip=ipmitool.ip,
+                                username=ipmitool.username,
+                                password=ipmitool.password,
+                                port=ipmitool.port)
+        self.ipmitool = ipmitool
+        with IPMIExecutor.inflight_lock:
+            self.slots = IPMIExecutor.inflight.setdefault(
+                ipmitool.ip, threading.BoundedSemaphore(max_inflight))
+        self.queue = Queue.Queue()
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+        self.workers = []
+        for i in range(max_inflight):
+            worker = threading.Thread(target=self.worker)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    ##
+    # @brief Queue a command
+    #
+    # @return IPMICommandResult to wait() on
+    #
+    def submit(self, cmd):
+        result = IPMICommandResult(cmd)
+        self.queue.put(result)
+        return result
+
+    ##
+    # @brief Run a list of commands concurrently and wait for all of them
+    #
+    # @return list of IPMICommandResult in the order of cmds
+    #
+    def map(self, cmds):
+        results = [self.submit(cmd) for cmd in cmds]
+        for result in results:
+            result.wait()
+        return results
+
+    ##
+    # @brief Run one command in the calling thread, taking an in-flight
+    #        slot like the workers do
+    #
+    # @param ipmitool @type IPMITool: tool to run it with, e.g. the
+    #        caller's own single session backend; the executor's if None
+    #
+    # @return IPMICommandResult, already done
+    #
+    def run(self, cmd, ipmitool=None):
+        result = IPMICommandResult(cmd)
+        self.execute(result, ipmitool or self.ipmitool, logcmd=True)
+        return result
+
+    def shutdown(self):
+        for worker in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def worker(self):
+        while True:
+            result = self.queue.get()
+            if result is None:
+                return
+            self.execute(result, self.ipmitool)
+
+    def execute(self, result, ipmitool, logcmd=False):
+        with self.slots:
+            start = time.time()
+            try:
+                result.output = ipmitool.run(result.cmd + "; echo $?",
+                                             logcmd=logcmd)
+                result.exitcode = int(result.output.splitlines()[-1])
+            except (OpTestError, ValueError, IndexError) as e:
+                result.error = str(e)
+            result.latency = time.time() - start
+        self.account(result)
+        result.done.set()
+
+    def account(self, result):
+        with self.stats_lock:
+            stat = self.stats.setdefault(result.cmd, {'count': 0, 'errors': 0,
+                                                      'total': 0.0, 'max': 0.0})
+            stat['count'] += 1
+            stat['total'] += result.latency
+            stat['max'] = max(stat['max'], result.latency)
+            if result.failed():
+                stat['errors'] += 1
+
+    ##
+    # @brief Per command latency and error counts
+    #
+    # @return dict of cmd to dict with count, errors, average and max (seconds)
+    #
+    def report(self):
+        with self.stats_lock:
+            report = {}
+            for cmd, stat in self.stats.items():
+                report[cmd] = {'count': stat['count'], 'errors': stat['errors'],
+                               'average': stat['total'] / stat['count'],
+                               'max': stat['max']}
+            return report
+
+BMC_DISCONNECT = 'SOL session closed by BMC'
+
 class IPMIConsoleState():
     DISCONNECTED = 0
     CONNECTED = 1
@@ -139,16 +931,16 @@ class IPMIConsole():
 
         cmd = self.ipmitool.binary_name() + self.ipmitool.arguments() + ' sol activate'
         print cmd
-        solChild = pexpect.spawn(cmd,logfile=sys.stdout)
+        solChild = pexpect.spawn(cmd)
         self.state = IPMIConsoleState.CONNECTED
-        self.sol = solChild
+        self.sol = ConsoleStream(solChild, logfile=console_log_path(self.logdir, 'host-sol'))
         if self.delaybeforesend:
 	    self.sol.delaybeforesend = self.delaybeforesend
         self.sol.expect_exact('[SOL Session operational.  Use ~? for help]')
         # we pause for a moment to allow ipmitool to catch up with
         # itself and to start accepting input
         time.sleep(0.2)
-        return solChild
+        return self.sol
 
     def get_console(self):
         if self.state == IPMIConsoleState.DISCONNECTED:
@@ -189,71 +981,23 @@ class IPMIConsole():
 
     def run_command(self, command, timeout=60):
         console = self.get_console()
-        BMC_DISCONNECT = 'SOL session closed by BMC'
+        frame = CommandFrame(command)
         try:
-            console.sendline(command)
-            console.expect("\n") # from us
-            rc = console.expect([BMC_DISCONNECT, "\[console-pexpect\]#$"], timeout)
-            if rc == 0:
-                raise BMCDisconnected(BMC_DISCONNECT)
-            output = console.before
-            console.sendline("echo $?")
-            rc = console.expect([BMC_DISCONNECT, "\n"]) # from us
-            if rc == 0:
+            console.sendline(frame.line)
+            if frame.expect(console, timeout, abort=[BMC_DISCONNECT]) == 0:
                 raise BMCDisconnected(BMC_DISCONNECT)
             rc = console.expect([BMC_DISCONNECT, "\[console-pexpect\]#$"], timeout)
             if rc == 0:
                 raise BMCDisconnected(BMC_DISCONNECT)
-            exitcode = int(console.before)
-            print "# LAST COMMAND EXIT CODE %d (%s)" % (exitcode, repr(console.before))
+            output = frame.output
+            exitcode = frame.exitcode
+            print "# LAST COMMAND EXIT CODE %d" % exitcode
         except pexpect.TIMEOUT as e:
             print e
-            print "# TIMEOUT waiting for command to finish."
-            print "# Attempting to control-c"
-            try:
-                console.sendcontrol('c')
-                rc = console.expect([BMC_DISCONNECT, "\[console-pexpect\]#$"], 10)
-                if rc == 0:
-                    print "# BMC Disconnect while cancelling timed-out command"
-                    print "# Failing test, disconnecting/reconnecting"
-                    self.terminate()
-                    raise CommandFailed("ipmitool", BMC_DISCONNECT, -1)
-                if rc == 1:
-                    raise CommandFailed(command, "TIMEOUT", -1)
-            except pexpect.TIMEOUT:
-                print "# Timeout trying to kill timed-out command."
-                print "# Failing current command and attempting to continue"
-                self.terminate()
-                raise CommandFailed("ipmitool", "timeout", -1)
+            self.cancel_timed_out(console, command)
             raise e
         except BMCDisconnected as e:
-            print "# %s" % str(e)
-            print "# We can possibly continue..."
-            print "# Failing current command and attempting to continue"
-            self.terminate()
-            self.connect()
-            console = self.get_console()
-            print "# On reconnect, attempt to cancel last command (ctrl-c)"
-            # Note: this is a terrible idea. If BMC vendors created reliable
-            # SoL implementations this kind of crap wouldn't be needed.
-            # This is incorrect on so many levels it's not funny. For a start,
-            # we really don't want to send random control characters during
-            # boot!
-            console.sendcontrol('c')
-            try:
-                rc = console.expect([BMC_DISCONNECT,
-                                     "\[console-pexpect\]#$"], 10)
-                if rc == 0:
-                    self.terminate()
-                    raise BMCDisconnected(BMC_DISCONNECT)
-            except pexpect.TIMEOUT:
-                print "# No response from BMC... trying 'mc reset cold'"
-                self.mc_reset()
-                self.terminate()
-                self.connect()
-                console = self.get_console()
-                console.sendcontrol('c')
-            raise CommandFailed("ipmitool", BMC_DISCONNECT, -1)
+            self.recover_disconnect(e)
 
         if rc == 1:
             res = output
@@ -266,6 +1010,87 @@ class IPMIConsole():
             res = res.split(command)
             return res[-1].splitlines()
 
+    ##
+    # @brief Run a list of commands in one exchange
+    #
+    # @return list of CommandResult, or raise CommandFailed for the first
+    #         failing command (the rest are not run)
+    #
+    def run_batch(self, commands, timeout=60, ignore_fail=False):
+        console = self.get_console()
+        results = []
+        for batch in command_batches(commands, ignore_fail):
+            try:
+                console.sendline(batch.line)
+                if batch.expect(console, timeout, abort=[BMC_DISCONNECT]) == 0:
+                    raise BMCDisconnected(BMC_DISCONNECT)
+                rc = console.expect([BMC_DISCONNECT, "\[console-pexpect\]#$"], timeout)
+                if rc == 0:
+                    raise BMCDisconnected(BMC_DISCONNECT)
+            except pexpect.TIMEOUT as e:
+                print e
+                self.cancel_timed_out(console, batch.pending())
+                raise e
+            except BMCDisconnected as e:
+                self.recover_disconnect(e)
+            for result in batch.results:
+                print "# %s: EXIT CODE %d" % (result.command, result.exitcode)
+            results.extend(batch.results)
+            if not ignore_fail:
+                batch.check()
+        return results
+
+    def run_batch_ignore_fail(self, commands, timeout=60):
+        return self.run_batch(commands, timeout, ignore_fail=True)
+
+    def cancel_timed_out(self, console, command):
+        print "# TIMEOUT waiting for command to finish."
+        print "# Attempting to control-c"
+        try:
+            console.sendcontrol('c')
+            rc = console.expect([BMC_DISCONNECT, "\[console-pexpect\]#$"], 10)
+            if rc == 0:
+                print "# BMC Disconnect while cancelling timed-out command"
+                print "# Failing test, disconnecting/reconnecting"
+                self.terminate()
+                raise CommandFailed("ipmitool", BMC_DISCONNECT, -1)
+            if rc == 1:
+                raise CommandFailed(command, "TIMEOUT", -1)
+        except pexpect.TIMEOUT:
+            print "# Timeout trying to kill timed-out command."
+            print "# Failing current command and attempting to continue"
+            self.terminate()
+            raise CommandFailed("ipmitool", "timeout", -1)
+
+    def recover_disconnect(self, e):
+        print "# %s" % str(e)
+        print "# We can possibly continue..."
+        print "# Failing current command and attempting to continue"
+        self.terminate()
+        self.connect()
+        console = self.get_console()
+        print "# On reconnect, attempt to cancel last command (ctrl-c)"
+        # Note: this is a terrible idea. If BMC vendors created reliable
+        # SoL implementations this kind of crap wouldn't be needed.
+        # This is incorrect on so many levels it's not funny. For a start,
+        # we really don't want to send random control characters during
+        # boot!
+        console.sendcontrol('c')
+        try:
+            rc = console.expect([BMC_DISCONNECT,
+                                 "\[console-pexpect\]#$"], 10)
+            if rc == 0:
+                self.terminate()
+                raise BMCDisconnected(BMC_DISCONNECT)
+        except pexpect.TIMEOUT:
+            print "# No response from BMC... trying 'mc reset cold'"
+            self.mc_reset()
+            self.terminate()
+            self.connect()
+            console = self.get_console()
+            console.sendcontrol('c')
+        raise CommandFailed("ipmitool", BMC_DISCONNECT, -1)
+
     # This command just runs and returns the ouput & ignores the failure
     def run_command_ignore_fail(self, command, timeout=60):
         try:
@@ -275,18 +1100,39 @@ class IPMIConsole():
         return output
 
 class OpTestIPMI():
-    def __init__(self, i_bmcIP, i_bmcUser, i_bmcPwd, i_ffdcDir, host=None, delaybeforesend=None):
+    def __init__(self, i_bmcIP, i_bmcUser, i_bmcPwd, i_ffdcDir, host=None,
+                 delaybeforesend=None, backend='ipmitool', max_inflight=4):
         self.cv_bmcIP = i_bmcIP
         self.cv_bmcUser = i_bmcUser
         self.cv_bmcPwd = i_bmcPwd
         self.cv_ffdcDir = i_ffdcDir
-        self.ipmitool = IPMITool(method='lanplus',
-                                 ip=i_bmcIP,
-                                 username=i_bmcUser,
-                                 password=i_bmcPwd)
+        if backend == 'native':
+            self.ipmitool = IPMILanTool(method='lanplus',
+                                        ip=i_bmcIP,
+                                        username=i_bmcUser,
+                                        password=i_bmcPwd)
+        elif backend == 'shell':
+            self.ipmitool = IPMIShellTool(method='lanplus',
+                                          ip=i_bmcIP,
+                                          username=i_bmcUser,
+                                          password=i_bmcPwd,
+                                          logdir=i_ffdcDir)
+        else:
+            self.ipmitool = IPMITool(method='lanplus',
+                                     ip=i_bmcIP,
+                                     username=i_bmcUser,
+                                     password=i_bmcPwd)
         self.console = IPMIConsole(ipmitool=self.ipmitool,
                                    logdir=i_ffdcDir,
                                    delaybeforesend=delaybeforesend)
+        self.sdr_cache = SDRCache(self.ipmitool, i_bmcIP)
+        self.max_inflight = max_inflight
+        self.executor = None
+        self.parsed = {}
+        l_sel_log = None
+        if i_ffdcDir:
+            l_sel_log = os.path.join(i_ffdcDir, 'host_sel_elist.log')
+        self.sel_cursor = IPMISELCursor(self.ipmitool, self.sdr_cache, l_sel_log)
         self.util = OpTestUtil()
         self.host = host
 
@@ -294,6 +1140,60 @@ class OpTestIPMI():
     def get_host_console(self):
         return self.console
 
+    ##
+    # @brief Run one of the commands in IPMI_PARSERS and parse its output.
+    #        The result is kept, so several checks against the same state
+    #        can share one fetch by passing i_cached=True.
+    #
+    # @param i_cmd @type string: e.g. 'sdr elist', 'sel elist', 'fru print'
+    # @param i_cached @type bool: reuse the last fetch of i_cmd if there is one
+    #
+    # @return IPMITable (DCMIPowerReading for 'dcmi power reading', 'on' or
+    #         'off' for 'chassis power status')
+    #
+    def ipmi_fetch(self, i_cmd, i_cached=False):
+        if i_cached and i_cmd in self.parsed:
+            return self.parsed[i_cmd]
+        l_result = IPMI_PARSERS[i_cmd](self.ipmitool.run(i_cmd))
+        self.parsed[i_cmd] = l_result
+        return l_result
+
+    def ipmi_get_sdr_records(self, i_cached=False):
+        return self.ipmi_fetch(BMC_CONST.BMC_SDR_ELIST, i_cached)
+
+    def ipmi_get_sensor_records(self, i_cached=False):
+        return self.ipmi_fetch(BMC_CONST.IPMI_SENSOR_LIST, i_cached)
+
+    def ipmi_get_sel_records(self, i_cached=False):
+        return self.ipmi_fetch(BMC_CONST.IPMI_SEL_ELIST, i_cached)
+
+    def ipmi_get_fru_devices(self, i_cached=False):
+        return self.ipmi_fetch(BMC_CONST.IPMI_FRU_PRINT, i_cached)
+
+    def ipmi_get_power_reading(self, i_cached=False):
+        return self.ipmi_fetch(BMC_CONST.IPMI_DCMI_POWER_READING, i_cached)
+
+    ##
+    # @brief Whether a discrete sensor reads the given state, from a fresh
+    #        'sdr elist'
+    #
+    # @param i_sensor @type string: sensor name, e.g. BMC_CONST.SENSOR_HOST_STATUS
+    # @param i_state @type string: state text, e.g. BMC_CONST.HOST_STATUS_WORKING
+    #
+    # @return True or False, or None if there's no such sensor
+    #
+    def ipmi_sensor_reads(self, i_sensor, i_state):
+        l_record = self.ipmi_get_sdr_records().get(i_sensor)
+        if l_record is None:
+            return None
+        return i_state in l_record.state
+
+    # Get the IPMIExecutor for running read-only commands concurrently
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = IPMIExecutor(self.ipmitool, self.max_inflight)
+        return self.executor
+
     ##
     # @brief This function clears the sensor data
     #
@@ -308,6 +1208,7 @@ class OpTestIPMI():
             while (retries > 0):
                 output = self.ipmitool.run('sel elist')
                 if 'no entries' in output:
+                    self.sel_cursor.reset()
                     return BMC_CONST.FW_SUCCESS
                 else:
                     l_msg = "Sensor data still has entries!"
@@ -402,6 +1303,32 @@ class OpTestIPMI():
             raise Exception("IPMI 'chassis power diag' failed: %s " % r)
 
 
+    ##
+    # @brief Poll one discrete sensor with Get Sensor Reading, using the sensor
+    #        number from the SDR cache, until one of the given state offsets
+    #        is asserted.
+    #
+    # @param i_sensor @type string: sensor name, e.g. BMC_CONST.SENSOR_HOST_STATUS
+    # @param i_offsets @type list: state offsets to wait for
+    # @param i_deadline @type float: time.time() at which to give up
+    # @param i_msg @type string: OpTestError message on timeout
+    #
+    # @return True once the state is reached, None if the sensor can't be read
+    #         directly and the caller should fall back to 'sdr elist'
+    #         or raise OpTestError
+    #
+    def ipmi_wait_for_sensor_state(self, i_sensor, i_offsets, i_deadline, i_msg):
+        while True:
+            l_states = self.sdr_cache.get_sensor_states(i_sensor)
+            if l_states is None:
+                return None
+            if l_states.intersection(i_offsets):
+                return True
+            if time.time() > i_deadline:
+                print i_msg
+                raise OpTestError(i_msg)
+            time.sleep(BMC_CONST.SENSOR_POLL_DELAY)
+
     ##
     # @brief This function starts the sol capture and waits for the IPL to end. The
     #        marker for IPL completion is the Host Status sensor which reflects the ACPI
@@ -417,13 +1344,17 @@ class OpTestIPMI():
     def ipl_wait_for_working_state(self, timeout=10):
         sol = self.console.get_console()
         timeout = time.time() + 60*timeout
-        cmd = 'sdr elist |grep \'Host Status\''
-        output = self.ipmitool.run(cmd)
-        if not "Host Status" in output:
+        if self.ipmi_wait_for_sensor_state(BMC_CONST.SENSOR_HOST_STATUS,
+                                           BMC_CONST.HOST_STATUS_S0_WORKING,
+                                           timeout, "IPL timeout"):
+            print "Host Status is S0/G0: working, IPL finished"
+            return self.ipl_deactivate_sol()
+        if self.ipmi_sensor_reads(BMC_CONST.SENSOR_HOST_STATUS,
+                                  BMC_CONST.HOST_STATUS_WORKING) is None:
             return BMC_CONST.FW_PARAMETER
         while True:
-            output = self.ipmitool.run(cmd)
-            if 'S0/G0: working' in output:
+            if self.ipmi_sensor_reads(BMC_CONST.SENSOR_HOST_STATUS,
+                                      BMC_CONST.HOST_STATUS_WORKING):
                 print "Host Status is S0/G0: working, IPL finished"
                 break
             if time.time() > timeout:
@@ -431,7 +1362,9 @@ class OpTestIPMI():
                 print l_msg
                 raise OpTestError(l_msg)
             time.sleep(5)
+        return self.ipl_deactivate_sol()
 
+    def ipl_deactivate_sol(self):
         try:
             self.ipmitool.run('sol deactivate')
             self.console.terminate()
@@ -454,13 +1387,18 @@ class OpTestIPMI():
     #
     def ipmi_ipl_wait_for_working_state_v1(self, timeout=10):
         timeout = time.time() + 60*timeout
-        cmd = 'sdr elist |grep \'Host Status\''
-        output = self.ipmitool.run(cmd)
-        if not "Host Status" in output:
+        if self.ipmi_wait_for_sensor_state(BMC_CONST.SENSOR_HOST_STATUS,
+                                           BMC_CONST.HOST_STATUS_S0_WORKING,
+                                           timeout, "IPL timeout"):
+            print "Host Status is S0/G0: working, IPL finished"
+            return BMC_CONST.FW_SUCCESS
+        l_working = self.ipmi_sensor_reads(BMC_CONST.SENSOR_HOST_STATUS,
+                                           BMC_CONST.HOST_STATUS_WORKING)
+        if l_working is None:
             return BMC_CONST.FW_PARAMETER
 
         while True:
-            if 'S0/G0: working' in output:
+            if l_working:
                 print "Host Status is S0/G0: working, IPL finished"
                 break
             if time.time() > timeout:
@@ -468,7 +1406,8 @@ class OpTestIPMI():
                 print l_msg
                 raise OpTestError(l_msg)
             time.sleep(5)
-            output = self.ipmitool.run(cmd)
+            l_working = self.ipmi_sensor_reads(BMC_CONST.SENSOR_HOST_STATUS,
+                                               BMC_CONST.HOST_STATUS_WORKING)
         return BMC_CONST.FW_SUCCESS
 
     def ipmi_ipl_wait_for_login(self, l_con, timeout=10):
@@ -509,15 +1448,19 @@ class OpTestIPMI():
     #
     def ipmi_wait_for_standby_state(self, i_timeout=120):
         l_timeout = time.time() + i_timeout
-        l_cmd = 'sdr elist |grep \'Host Status\''
-        wait_for = BMC_CONST.CHASSIS_SOFT_OFF
-        output = self.ipmitool.run(l_cmd)
-        if not "Host Status" in output:
-            l_cmd = 'power status'
-            wait_for = 'Chassis Power is off'
+        if self.ipmi_wait_for_sensor_state(BMC_CONST.SENSOR_HOST_STATUS,
+                                           BMC_CONST.HOST_STATUS_S5_SOFT_OFF,
+                                           l_timeout, "Standby timeout"):
+            print "Host Status is S5/G2: soft-off, system reached standby"
+            return BMC_CONST.FW_SUCCESS
+        def standby():
+            l_soft_off = self.ipmi_sensor_reads(BMC_CONST.SENSOR_HOST_STATUS,
+                                                BMC_CONST.CHASSIS_SOFT_OFF)
+            if l_soft_off is None:
+                return self.ipmi_power_status() == BMC_CONST.CHASSIS_POWER_OFF
+            return l_soft_off
         while True:
-            l_output = self.ipmitool.run(l_cmd)
-            if wait_for in l_output:
+            if standby():
                 print "Host Status is S5/G2: soft-off, system reached standby"
                 break
             if time.time() > l_timeout:
@@ -543,13 +1486,17 @@ class OpTestIPMI():
     #
     def ipmi_wait_for_os_boot_complete(self, i_timeout=10):
         l_timeout = time.time() + 60*i_timeout
-        l_cmd = 'sdr elist |grep \'OS Boot\''
-        output = self.ipmitool.run(l_cmd)
-        if not "OS Boot" in output:
+        if self.ipmi_wait_for_sensor_state(BMC_CONST.SENSOR_OS_BOOT,
+                                           BMC_CONST.OS_BOOT_COMPLETED,
+                                           l_timeout, "IPL timeout"):
+            print "Host OS is booted"
+            return BMC_CONST.FW_SUCCESS
+        if self.ipmi_sensor_reads(BMC_CONST.SENSOR_OS_BOOT,
+                                  BMC_CONST.OS_BOOT_COMPLETE) is None:
             return BMC_CONST.FW_PARAMETER
         while True:
-            l_output = self.ipmitool.run(l_cmd)
-            if BMC_CONST.OS_BOOT_COMPLETE in l_output:
+            if self.ipmi_sensor_reads(BMC_CONST.SENSOR_OS_BOOT,
+                                      BMC_CONST.OS_BOOT_COMPLETE):
                 print "Host OS is booted"
                 break
             if time.time() > l_timeout:
@@ -573,13 +1520,18 @@ class OpTestIPMI():
     #
     def ipmi_wait_for_os_boot_complete_v1(self, i_timeout=10):
         l_timeout = time.time() + 60*i_timeout
-        l_cmd = 'sdr elist |grep \'OS Boot\''
-        l_output = self.ipmitool.run(l_cmd)
-        if not "OS Boot" in l_output:
+        if self.ipmi_wait_for_sensor_state(BMC_CONST.SENSOR_OS_BOOT,
+                                           BMC_CONST.OS_BOOT_COMPLETED,
+                                           l_timeout, "IPL timeout"):
+            print "Host OS is booted"
+            return BMC_CONST.FW_SUCCESS
+        l_complete = self.ipmi_sensor_reads(BMC_CONST.SENSOR_OS_BOOT,
+                                            BMC_CONST.OS_BOOT_COMPLETE)
+        if l_complete is None:
             return BMC_CONST.FW_PARAMETER
 
         while True:
-            if BMC_CONST.OS_BOOT_COMPLETE in l_output:
+            if l_complete:
                 print "Host OS is booted"
                 break
             if time.time() > l_timeout:
@@ -587,18 +1539,30 @@ class OpTestIPMI():
                 print l_msg
                 raise OpTestError(l_msg)
             time.sleep(BMC_CONST.SHORT_WAIT_IPL)
-            l_output = self.ipmitool.run(l_cmd)
+            l_complete = self.ipmi_sensor_reads(BMC_CONST.SENSOR_OS_BOOT,
+                                                BMC_CONST.OS_BOOT_COMPLETE)
 
         return BMC_CONST.FW_SUCCESS
 
 
     ##
-    # @brief This function dumps the sel log and looks for specific hostboot error
-    #        log string
+    # @brief This function fetches the sel records added since the last check,
+    #        appends them to host_sel_elist.log in the FFDC directory and looks
+    #        for specific hostboot error log string in them. Falls back to
+    #        dumping the whole sel log if it can't be read record by record.
     #
     # @return BMC_CONST.FW_SUCCESS or raise OpTestError
     #
     def ipmi_sel_check(self, i_string="Transition to Non-recoverable"):
+        l_matches = self.sel_cursor.check(i_string)
+        if l_matches is not None:
+            if l_matches:
+                l_msg = 'Error log(s) detected during IPL. Please see %s' % self.sel_cursor.logfile
+                print l_msg
+                print '\n'.join([str(r) for r in l_matches])
+                raise OpTestError(l_msg)
+            return BMC_CONST.FW_SUCCESS
+
         output = self.ipmitool.run('sel elist')
 
         if self.cv_ffdcDir:
@@ -623,10 +1587,11 @@ class OpTestIPMI():
     #         "Chassis Power is on" or "Chassis Power is off"
     #
     def ipmi_power_status(self):
-        l_output = self.ipmitool.run('chassis power status')
-        if('on' in l_output):
+        l_output = self.ipmitool.run(BMC_CONST.IPMI_CHASSIS_POWER_STATUS)
+        l_state = parse_chassis_power_status(l_output)
+        if l_state == 'on':
             return BMC_CONST.CHASSIS_POWER_ON
-        elif('off' in l_output):
+        elif l_state == 'off':
             return BMC_CONST.CHASSIS_POWER_OFF
         else:
             raise OpTestError("Can't recognize chassis power status: " + str(l_output))
@@ -642,6 +1607,7 @@ class OpTestIPMI():
         print ("Applying Cold reset.")
         rc = self.ipmitool.run(BMC_CONST.BMC_COLD_RESET)
         if BMC_CONST.BMC_PASS_COLD_RESET in rc:
+            self.sdr_cache.invalidate()
             time.sleep(BMC_CONST.SHORT_WAIT_IPL)
             self.util.PingFunc(self.cv_bmcIP, BMC_CONST.PING_RETRY_FOR_STABILITY)
             l_finalstatus = self.ipmi_power_status()
@@ -670,6 +1636,7 @@ class OpTestIPMI():
         rc = self.ipmitool.run(l_cmd)
         if BMC_CONST.BMC_PASS_WARM_RESET in rc:
             print rc
+            self.sdr_cache.invalidate()
             time.sleep(BMC_CONST.BMC_WARM_RESET_DELAY)
             self.util.PingFunc(self.cv_bmcIP, BMC_CONST.PING_RETRY_FOR_STABILITY)
             l_finalstatus = self.ipmi_power_status()
@@ -1097,9 +2064,8 @@ class OpTestIPMI():
         # example ssample: OCC Active | 08h | ok  | 210.0 |)
 
         # Get sensor ids to enable all OCCs
-        l_status = l_status.rsplit("\n", 1)[0].split("\n")
-        for i in range(len(l_status)):
-            l_sensor_id = l_status[i].split("|")[1].strip()[:2]
+        for l_sensor in parse_sdr_elist(l_status):
+            l_sensor_id = '%02x' % l_sensor.number
             self.ipmitool.run(BMC_CONST.BMC_OCC_SENSOR +
                               l_sensor_id + BMC_CONST.BMC_ENABLE_OCC)
 
@@ -1117,11 +2083,10 @@ class OpTestIPMI():
         l_status = self.ipmi_get_occ_status()
 
         # Get sensor ids to disable all OCCs
-        l_status = l_status.rsplit("\n", 1)[0].split("\n")
-        for i in range(len(l_status)):
-            l_sensor_id = l_status[i].split("|")[1].strip()[:2]
+        for l_sensor in parse_sdr_elist(l_status):
+            l_sensor_id = '%02x' % l_sensor.number
             self.ipmitool.run(BMC_CONST.BMC_OCC_SENSOR +
-                                   l_sensor_id + BMC_CONST.BMC_DISABLE_OCC)
+                              l_sensor_id + BMC_CONST.BMC_DISABLE_OCC)
 
         return BMC_CONST.FW_SUCCESS
 
@@ -0,0 +1,247 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestImageCache.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestImageCache
+#  Record of the firmware images staged on and flashed from a BMC/FSP.
+#
+#  A manifest kept on the target lists the SHA-256 and size of every image
+#  op-test copied there ("staged", by file) or flashed ("flashed", by pflash
+#  partition or by the file the image was installed as). Before copying or
+#  flashing an image again the flash tests look it up: a staged file is
+#  trusted if its size and mtime still match the manifest and a few blocks
+#  sampled at random still hash the same as the local image, which costs one
+#  round trip instead of a full upload. An image flashed into a pflash
+#  partition (or as a whole PNOR) is checked the same way, reading a few
+#  blocks back from flash with pflash. Flashing by other means (HPM or FSP
+#  code update, pflash writes from the host) makes the flash records
+#  worthless, so those paths call forget_flashed(). The manifest lives in
+#  /tmp, so a BMC reboot forgets it and the next run flashes again.
+#  --force-flash ignores the manifest.
+
+import os
+import re
+import pipes
+import random
+import hashlib
+from collections import namedtuple, OrderedDict
+
+from OpTestSFTP import local_sha256
+
+MANIFEST = '/tmp/op-test-images.manifest'
+
+# Slot of a whole PNOR image, which replaces every partition
+PNOR = 'PNOR'
+
+BLOCK = 64 * 1024
+SPOT_CHECKS = 4
+
+# pflash on the PATH, or where the AMI flash tests copy it
+PFLASH = "P=$(command -v pflash 2>/dev/null || echo /tmp/pflash)"
+
+ImageEntry = namedtuple('ImageEntry', 'sha256 size stamp')
+
+_local_hashes = {}
+
+##
+# @brief SHA-256 of a local image, computed once per version of the file
+#
+def image_sha256(path):
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime)
+    if key not in _local_hashes:
+        _local_hashes[key] = local_sha256(path)
+    return _local_hashes[key]
+
+class ImageCache():
+
+    ##
+    # @param engine @type SFTPEngine: connection to the BMC/FSP
+    #
+    def __init__(self, engine, manifest=MANIFEST):
+        self.engine = engine
+        self.manifest = manifest
+        self.entries = None
+
+    def load(self):
+        if self.entries is None:
+            self.entries = OrderedDict()
+            rc, output = self.engine.execute("cat %s 2>/dev/null" % self.manifest)
+            for l in output.splitlines():
+                f = l.split(None, 4)
+                if len(f) == 5:
+                    kind, sha256, size, stamp, key = f
+                    self.entries[(kind, key)] = ImageEntry(sha256, int(size), stamp)
+        return self.entries
+
+    def save(self):
+        lines = ["%s %s %d %s %s" % (kind, e.sha256, e.size, e.stamp, key)
+                 for (kind, key), e in self.entries.items()]
+        rc, output = self.engine.execute("printf '%%s\\n' %s > %s.new && mv %s.new %s" % (
+            ' '.join(pipes.quote(l) for l in lines), self.manifest, self.manifest,
+            self.manifest))
+        if rc != 0:
+            print "# Can't write image manifest %s on %s" % (self.manifest, self.engine.ip)
+
+    ##
+    # @brief Size and mtime of a file on the target, as "size:mtime"
+    #
+    def stamp(self, path):
+        rc, output = self.engine.execute("stat -c %%s:%%Y %s" % pipes.quote(path))
+        if rc != 0 or not output.strip():
+            return None
+        return output.strip()
+
+    def blocks(self, size):
+        count = max((size + BLOCK - 1) / BLOCK, 1)
+        picks = set([0, count - 1])
+        picks.update(random.sample(xrange(count), min(SPOT_CHECKS - 2, count)))
+        return sorted(picks)
+
+    ##
+    # @brief Check the file at path still is the local image, by its size
+    #        and mtime and the hashes of a few blocks, in one command
+    #
+    def spot_check(self, local, path, entry):
+        blocks = self.blocks(entry.size)
+        rc, output = self.engine.execute(
+            "stat -c %%s:%%Y %s && for n in %s; do "
+            "dd if=%s bs=%d skip=$n count=1 2>/dev/null | sha256sum; done" % (
+                pipes.quote(path), ' '.join(str(n) for n in blocks),
+                pipes.quote(path), BLOCK))
+        lines = output.split()
+        if rc != 0 or not lines or lines[0] != entry.stamp:
+            return False
+        remote = [l for l in lines[1:] if l != '-']
+        return remote == self.local_hashes(local, blocks)
+
+    def local_hashes(self, local, blocks):
+        expected = []
+        with open(local, 'rb') as f:
+            for n in blocks:
+                f.seek(n * BLOCK)
+                expected.append(hashlib.sha256(f.read(BLOCK)).hexdigest())
+        return expected
+
+    ##
+    # @brief Offset of a pflash partition, from 'pflash -i'
+    #
+    # @return offset or None if there's no such partition (or no pflash)
+    #
+    def partition_base(self, partition):
+        rc, output = self.engine.execute("%s; $P -i" % PFLASH)
+        for l in output.splitlines():
+            m = re.match(r'\s*ID=\d+\s+(\S+)\s+0x([0-9a-fA-F]+)\.\.', l)
+            if m and m.group(1) == partition:
+                return int(m.group(2), 16)
+        return None
+
+    ##
+    # @brief Check flash still holds the local image, by reading a few
+    #        blocks back with pflash and hashing them, in one command
+    #
+    # @param slot @type string: pflash partition the image starts at, or
+    #        PNOR for a whole image at offset 0
+    #
+    def flash_spot_check(self, local, slot, entry):
+        base = 0 if slot == PNOR else self.partition_base(slot)
+        if base is None:
+            return False
+        blocks = self.blocks(entry.size)
+        ranges = ' '.join("%d:%d" % (base + n * BLOCK, min(BLOCK, entry.size - n * BLOCK))
+                          for n in blocks)
+        rc, output = self.engine.execute(
+            "%s; for r in %s; do $P -r /tmp/op-test-spot -a ${r%%%%:*} -s ${r#*:}"
+            " >/dev/null 2>&1 && sha256sum < /tmp/op-test-spot || echo failed; done;"
+            " rm -f /tmp/op-test-spot" % (PFLASH, ranges))
+        remote = [l.split()[0] for l in output.splitlines() if l.split()]
+        return remote == self.local_hashes(local, blocks)
+
+    def verify(self, kind, key, local):
+        entry = self.load().get((kind, key))
+        if entry is None or entry.size != os.path.getsize(local) \
+           or entry.sha256 != image_sha256(local):
+            return False
+        if not key.startswith('/'):
+            return self.flash_spot_check(local, key, entry)
+        return self.spot_check(local, key, entry)
+
+    def record(self, kind, key, local):
+        stamp = self.stamp(key) if key.startswith('/') else '-'
+        self.load()[(kind, key)] = ImageEntry(image_sha256(local), os.path.getsize(local),
+                                              stamp or '-')
+        self.save()
+
+    def forget(self, kind, key):
+        if self.load().pop((kind, key), None):
+            self.save()
+
+    ##
+    # @brief Drop every flash record, call before flash is written other
+    #        than through record_flash()'s callers
+    #
+    def forget_flashed(self):
+        entries = self.load()
+        flashed = [k for k in entries if k[0] == 'flashed']
+        for k in flashed:
+            del entries[k]
+        if flashed:
+            self.save()
+
+    ##
+    # @brief Copy local to remote unless it is already there
+    #
+    # @param force @type bool: copy even if the manifest says it is there
+    #
+    # @return True if it was copied
+    #
+    def stage(self, local, remote, force=False):
+        if not force and self.verify('staged', remote, local):
+            print "# %s is already at %s:%s (sha256 %s), not copying it" % (
+                local, self.engine.ip, remote, image_sha256(local))
+            return False
+        self.engine.put(local, remote)
+        self.record('staged', remote, local)
+        return True
+
+    ##
+    # @param slot @type string: pflash partition (PNOR for a whole image),
+    #        or the file the image was installed as
+    #
+    # @return True if local is what was last flashed into slot
+    #
+    def flashed(self, local, slot):
+        return self.verify('flashed', slot, local)
+
+    ##
+    # @brief Note that local has just been flashed into slot
+    #
+    def record_flash(self, local, slot):
+        entries = self.load()
+        for kind, key in entries.keys():
+            if kind == 'flashed' and not key.startswith('/') \
+               and (slot == PNOR) != (key == PNOR):
+                del entries[(kind, key)]
+        self.record('flashed', slot, local)
@@ -0,0 +1,300 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestMilestones.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestMilestones
+#  Boot milestone recognition on the host console.
+#
+#  All the signatures we care about during an IPL (hostboot, skiboot,
+#  kernel, Petitboot, kexec, login and the checkstop/panic ones) go into
+#  one Aho-Corasick automaton. BootMilestones is attached to the console
+#  reader and steps the automaton over each chunk of output exactly once,
+#  recording a timestamped MilestoneEvent per hit, so the state machine in
+#  OpTestSystem waits on events rather than re-running expect() over the
+#  whole IPL for every step.
+
+import time
+import threading
+from collections import deque, namedtuple
+
+import pexpect
+
+from Exceptions import BootFailure
+
+class BootMilestone():
+    HOSTBOOT = 'hostboot'
+    SKIBOOT = 'skiboot'
+    KERNEL = 'kernel'
+    PETITBOOT = 'petitboot'
+    KEXEC = 'kexec'
+    LOGIN = 'login'
+    CHECKSTOP = 'checkstop'
+    PANIC = 'panic'
+
+# (milestone, literal console signature)
+SIGNATURES = [
+    (BootMilestone.HOSTBOOT, '--== Welcome to Hostboot'),
+    (BootMilestone.SKIBOOT, 'OPAL skiboot-'),
+    (BootMilestone.SKIBOOT, 'SkiBoot skiboot-'),
+    (BootMilestone.KERNEL, 'Linux version '),
+    (BootMilestone.PETITBOOT, 'Petitboot'),
+    (BootMilestone.PETITBOOT, 'x=exit'),
+    (BootMilestone.KEXEC, 'Performing kexec'),
+    (BootMilestone.KEXEC, 'kexec_core: Starting new kernel'),
+    (BootMilestone.LOGIN, 'login: '),
+    (BootMilestone.CHECKSTOP, 'Unrecoverable HMI exception'),
+    (BootMilestone.CHECKSTOP, 'Reboot requested due to Platform error'),
+    (BootMilestone.PANIC, 'Kernel panic - not syncing'),
+]
+
+FAILURES = [BootMilestone.CHECKSTOP, BootMilestone.PANIC]
+# what comes after firmware, a skiboot signature after any of these is a
+# new IPL
+PAST_FIRMWARE = set([BootMilestone.KERNEL, BootMilestone.PETITBOOT,
+                     BootMilestone.KEXEC, BootMilestone.LOGIN])
+
+MilestoneEvent = namedtuple('MilestoneEvent',
+                            'seq milestone text timestamp console offset')
+
+##
+# @brief Aho-Corasick automaton over a list of literal strings, compiled
+#        to a DFA so each input character is one dict lookup.
+#
+#        The state is kept between feed() calls, so a signature split
+#        across two console reads is still found.
+#
+class MultiPatternMatcher():
+    def __init__(self, patterns):
+        self.patterns = patterns
+        goto = [{}]
+        fail = [0]
+        out = [[]]
+        for i, p in enumerate(patterns):
+            s = 0
+            for c in p:
+                if c not in goto[s]:
+                    goto.append({})
+                    fail.append(0)
+                    out.append([])
+                    goto[s][c] = len(goto) - 1
+                s = goto[s][c]
+            out[s].append(i)
+
+        # Breadth first, so fail[] of shorter prefixes is known first
+        self.delta = [None] * len(goto)
+        self.delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for c, t in goto[s].items():
+                queue.append(t)
+                fail[t] = self.delta[fail[s]].get(c, 0)
+                out[t] = out[t] + out[fail[t]]
+            self.delta[s] = dict(self.delta[fail[s]])
+            self.delta[s].update(goto[s])
+        self.out = [tuple(o) for o in out]
+        self.state = 0
+
+    def reset(self):
+        self.state = 0
+
+    ##
+    # @brief Step the automaton over data
+    #
+    # @return list of (end index in data, pattern index)
+    #
+    def feed(self, data):
+        delta = self.delta
+        out = self.out
+        state = self.state
+        hits = []
+        i = 0
+        for c in data:
+            i += 1
+            state = delta[state].get(c, 0)
+            if out[state]:
+                for p in out[state]:
+                    hits.append((i, p))
+        self.state = state
+        return hits
+
+##
+# @brief Boot milestones seen on the host console.
+#
+#        Waiting consumes events, much like expect() consumes the pexpect
+#        buffer: wait_for() only looks at events after the last one it
+#        returned, and never at events from before the current boot.
+#
+class BootMilestones():
+    def __init__(self, history=1024):
+        self.matcher = MultiPatternMatcher([s for m, s in SIGNATURES])
+        self.events = deque(maxlen=history)
+        self.seq = 0
+        self.consumed = 0
+        self.boot_seq = 1
+        self.boot_time = None
+        self.boot_seen = set()
+        self.last_data = time.time()
+        self.console = None
+        self.eof = False
+        self.cond = threading.Condition()
+
+    ##
+    # @brief Track milestones on console, from the output it still holds on
+    #
+    # @param console @type ConsoleStream: what get_console() returned
+    #
+    # @return False if the console can't be tracked
+    #
+    def attach(self, console):
+        if console is self.console:
+            return True
+        if not hasattr(console, 'add_listener'):
+            return False
+        with self.cond:
+            self.console = console
+            self.eof = False
+            self.matcher.reset()
+        console.add_listener(self.feed, replay=True)
+        return True
+
+    def feed(self, offset, data):
+        if data is None:
+            with self.cond:
+                self.eof = True
+                self.cond.notify_all()
+            return
+        hits = self.matcher.feed(data)
+        now = time.time()
+        with self.cond:
+            self.last_data = now
+            for end, i in hits:
+                milestone, text = SIGNATURES[i]
+                self.seq += 1
+                self.events.append(MilestoneEvent(self.seq, milestone, text, now,
+                                                  self.console, offset + end))
+                # hostboot starts a new IPL: anything before it belongs to
+                # the previous boot. So does skiboot (qemu, FSP systems) if
+                # it's the first firmware seen, or the boot had got past
+                # firmware, but not another skiboot line in the same boot.
+                if milestone == BootMilestone.HOSTBOOT \
+                   or (milestone == BootMilestone.SKIBOOT
+                       and (self.boot_seen & PAST_FIRMWARE
+                            or not self.boot_seen & set([BootMilestone.HOSTBOOT,
+                                                         BootMilestone.SKIBOOT]))):
+                    self.boot_seq = self.seq
+                    if self.boot_seen or self.boot_time is None:
+                        self.boot_time = now
+                    self.boot_seen = set()
+                self.boot_seen.add(milestone)
+            if hits:
+                self.cond.notify_all()
+
+    ##
+    # @brief Forget unconsumed events, call when powering the host on.
+    #        The console being quiet before now doesn't count as idle.
+    #
+    def new_boot(self):
+        with self.cond:
+            self.consumed = self.seq
+            self.boot_seq = self.seq + 1
+            self.boot_time = time.time()
+            self.boot_seen = set()
+            self.last_data = self.boot_time
+
+    ##
+    # @brief Consume every event seen so far, call when sending input that
+    #        makes the console print signatures again (e.g. a ctrl-L
+    #        redraw of Petitboot), so later waits don't return on them
+    #
+    def consume(self):
+        with self.cond:
+            self.consumed = self.seq
+
+    ##
+    # @brief Wait for milestones, consuming events up to the one returned
+    #
+    # @param milestones @type list: BootMilestone values to wait for
+    # @param count @type int: return the count'th matching event
+    # @param timeout @type int: overall timeout in seconds, None for ever
+    # @param idle @type int: give up if the console is silent this long,
+    #        counted from the call at the earliest
+    #
+    # @return MilestoneEvent
+    #
+    # @raise BootFailure on a checkstop/panic signature
+    # @raise pexpect.TIMEOUT, pexpect.EOF
+    #
+    def wait_for(self, milestones, count=1, timeout=None, idle=None):
+        start = time.time()
+        if timeout is not None:
+            end_time = start + timeout
+        with self.cond:
+            while True:
+                threshold = max(self.consumed, self.boot_seq - 1)
+                matched = []
+                for e in self.events:
+                    if e.seq <= threshold:
+                        continue
+                    if e.milestone in FAILURES:
+                        self.consumed = e.seq
+                        raise BootFailure(e.milestone, e.text)
+                    if e.milestone in milestones:
+                        matched.append(e)
+                        if len(matched) == count:
+                            self.consumed = e.seq
+                            return e
+                if self.eof:
+                    raise pexpect.EOF("Console closed waiting for %s" % ', '.join(milestones))
+                now = time.time()
+                if timeout is not None and now > end_time:
+                    raise pexpect.TIMEOUT("No %s after %ds" % (', '.join(milestones), timeout))
+                quiet = now - max(self.last_data, start)
+                if idle is not None and quiet > idle:
+                    raise pexpect.TIMEOUT("No %s, console idle for %ds"
+                                          % (', '.join(milestones), quiet))
+                self.cond.wait(1)
+
+    def timeline_events(self):
+        return [e for e in self.events if e.seq >= self.boot_seq]
+
+    ##
+    # @brief First occurrence of each milestone in the current boot
+    #
+    # @return string like "hostboot +0.0s, skiboot +41.3s, ..."
+    #
+    def timeline(self):
+        with self.cond:
+            seen = []
+            first = []
+            for e in self.timeline_events():
+                if e.milestone not in seen:
+                    seen.append(e.milestone)
+                    first.append(e)
+            if not first:
+                return ''
+            start = self.boot_time or first[0].timestamp
+            return ', '.join('%s +%.1fs' % (e.milestone, e.timestamp - start)
+                             for e in first)
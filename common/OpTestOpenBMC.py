@@ -17,12 +17,22 @@
 # implied. See the License for the specific language governing
 # permissions and limitations under the License.
 
+import os
 import re
 import sys
 import time
+import zlib
+import shlex
+import socket
+import httplib
+import hashlib
+import tarfile
+import tempfile
+import threading
 import pexpect
 import subprocess
 import json
+from collections import namedtuple
 
 try:
     import pxssh
@@ -31,7 +41,12 @@ except ImportError:
 from OpTestIPMI import OpTestIPMI
 from OpTestUtil import OpTestUtil
 from OpTestBMC import OpTestBMC
-from Exceptions import CommandFailed
+from OpTestSFTP import AUTO_RATIO
+from OpTestHTTP import HTTPSPool
+from Exceptions import CommandFailed, WebSocketError
+from OpTestWebSocket import WebSocket
+from OpTestSEL import SELCursor, SELRecord
+from OpTestConsole import ConsoleStream, console_log_path, run_framed, run_batch_framed
 from common.OpTestError import OpTestError
 from OpTestConstants import OpTestConstants as BMC_CONST
 
@@ -49,12 +64,13 @@ class ConsoleState():
     CONNECTED = 1
 
 class HostConsole():
-    def __init__(self, host, username, password, port=22):
+    def __init__(self, host, username, password, port=22, logdir=None):
         self.state = ConsoleState.DISCONNECTED
         self.host = host
         self.username = username
         self.password = password
         self.port = port
+        self.logdir = logdir
 
     def terminate(self):
         if self.state == ConsoleState.CONNECTED:
@@ -90,10 +106,10 @@ class HostConsole():
                + " -l %s %s" % (self.username, self.host)
            )
         print cmd
-        solChild = pexpect.spawn(cmd,logfile=sys.stdout)
+        solChild = pexpect.spawn(cmd)
         self.state = ConsoleState.CONNECTED
-        self.sol = solChild
-        return solChild
+        self.sol = ConsoleStream(solChild, logfile=console_log_path(self.logdir, 'host-console'))
+        return self.sol
 
     def get_console(self):
         if self.state == ConsoleState.DISCONNECTED:
@@ -111,28 +127,29 @@ class HostConsole():
 
         return self.sol
 
+    ##
+    # @brief Run a command on the host console
+    #
+    # @return list of output lines, or raise CommandFailed if it exits
+    #         non-zero. On timeout, the output so far rather than an
+    #         exception, as it always has been (the command may still be
+    #         running).
+    #
     def run_command(self, command, timeout=60):
-        console = self.get_console()
-        console.sendline(command)
-        console.expect("\n") # from us
-        rc = console.expect(["\[console-pexpect\]#$",pexpect.TIMEOUT], timeout)
-        output = console.before
-
-        console.sendline("echo $?")
-        console.expect("\n") # from us
-        rc = console.expect(["\[console-pexpect\]#$",pexpect.TIMEOUT], timeout)
-        exitcode = int(console.before)
-
-        if rc == 0:
-            res = output
-            res = res.splitlines()
-            if exitcode != 0:
-                raise CommandFailed(command, res, exitcode)
-            return res
-        else:
-            res = console.before
-            res = res.split(command)
-            return res[-1].splitlines()
+        return run_framed(self.get_console(), command, timeout, partial=True)
+
+    ##
+    # @brief Run a list of commands in one exchange
+    #
+    # @return list of CommandResult, or raise CommandFailed for the first
+    #         failing command (the rest are not run)
+    #
+    def run_batch(self, commands, timeout=60, ignore_fail=False):
+        return run_batch_framed(self.get_console(), commands, timeout,
+                                ignore_fail=ignore_fail)
+
+    def run_batch_ignore_fail(self, commands, timeout=60):
+        return self.run_batch(commands, timeout, ignore_fail=True)
 
     # This command just runs and returns the ouput & ignores the failure
     # A straight copy of what's in OpTestIPMI
@@ -268,15 +285,410 @@ class CurlTool():
     def log_result(self):
         self.logresult = True
 
+##
+# @brief CurlTool's feed_data()/run() over an HTTPSPool: one kept-alive
+#        connection instead of a curl process and TLS handshake per call,
+#        and the session cookie in memory instead of ./cjar. A request
+#        answered with "Login required" logs in again through relogin and
+#        is sent once more.
+#
+class RestTool():
+    def __init__(self, ip=None, username=None, password=None, relogin=None,
+                 max_connections=2, timeout=60):
+        self.ip = ip
+        self.username = username
+        self.password = password
+        self.relogin = relogin
+        self.pool = HTTPSPool(ip, max_connections=max_connections, timeout=timeout)
+        self.logresult = True
+        self.feed_data()
+
+    ##
+    # @brief Same arguments as CurlTool.feed_data(), data and header as
+    #        quoted for a shell; operation is accepted and ignored, the
+    #        cookies are always sent and kept
+    #
+    def feed_data(self, dbus_object=None, action=None,
+                  operation=None, command=None,
+                  data=None, header=None, upload_file=None):
+        self.object = dbus_object
+        self.action = action
+        self.operation = operation
+        self.command = command or "GET"
+        self.data = ' '.join(shlex.split(data)) if data else None
+        self.header = ' '.join(shlex.split(header)) if header else "Content-Type: application/json"
+        self.upload_file = upload_file
+
+    def path(self):
+        s = '/' + (self.object or '').strip('/')
+        if self.action:
+            s += '/' + self.action.strip('/')
+        return s
+
+    def request(self, command, path, data, header, upload_file):
+        name, value = header.split(':', 1)
+        headers = {name.strip(): value.strip()}
+        print "%s https://%s%s%s" % (command, self.ip, path,
+                                     " < %s" % upload_file if upload_file else "")
+        try:
+            if upload_file:
+                with open(upload_file, 'rb') as f:
+                    response = self.pool.request(command, path, f, headers)
+            else:
+                response = self.pool.request(command, path, data, headers)
+        except (socket.error, httplib.HTTPException) as e:
+            l_msg = "REST request %s %s to %s failed: %s" % (command, path, self.ip, e)
+            print l_msg
+            raise OpTestError(l_msg)
+        return response.body
+
+    ##
+    # @return the response body, or raise FailedCurlInvocation if the BMC
+    #         says the request failed
+    #
+    def run(self):
+        return self.call(self.command, self.path(), self.data, self.header, self.upload_file)
+
+    ##
+    # @brief One request, without going through feed_data()
+    #
+    # @param log @type bool: print the response (if logresult is set)
+    #
+    def call(self, command, path, data=None, header="Content-Type: application/json",
+             upload_file=None, log=True):
+        args = (command, path, data, header, upload_file)
+        output = self.request(*args)
+        if '"description": "Login required"' in output and self.relogin \
+           and path not in ("/login", "/logout"):
+            print "# REST session expired, logging in again"
+            self.pool.clear_cookies()
+            self.relogin()
+            output = self.request(*args)
+        if self.logresult and log:
+            print output
+        if '"status": "error"' in output:
+            print output
+            raise FailedCurlInvocation("%s %s" % args[:2], output)
+        return output
+
+    def log_result(self):
+        self.logresult = True
+
+    ##
+    # @return dict of "METHOD path" to dict with count, errors, average and
+    #         max (seconds), as HTTPSPool.report()
+    #
+    def report(self):
+        return self.pool.report()
+
+    def close(self):
+        self.pool.close()
+
+SOFTWARE_PATH = '/xyz/openbmc_project/software/'
+
+##
+# @brief One software image; purpose and activation are the last part of
+#        the D-Bus enum ('Host', 'Ready'), data the whole object
+#
+SoftwareImage = namedtuple('SoftwareImage', 'id purpose activation priority version data')
+
+##
+# @brief The BMC's software images as of one software/enumerate, indexed
+#        by purpose and activation state, each index in priority order
+#        (0, the image that boots, first)
+#
+class SoftwareInventory():
+    def __init__(self, enumerate_data):
+        self.by_id = {}
+        self.by_purpose = {}
+        self.by_activation = {}
+        for path, data in enumerate_data.items():
+            if not path.startswith(SOFTWARE_PATH):
+                continue
+            id = path[len(SOFTWARE_PATH):]
+            # associations (functional, active, ...) and other children
+            # aren't images
+            if '/' in id or 'Purpose' not in data:
+                continue
+            image = SoftwareImage(id, str(data['Purpose']).split('.')[-1],
+                                  str(data.get('Activation', '')).split('.')[-1],
+                                  data.get('Priority'), data.get('Version'), data)
+            self.by_id[id] = image
+        for image in sorted(self.by_id.values(), key=self.order):
+            self.by_purpose.setdefault(image.purpose, []).append(image)
+            self.by_activation.setdefault(image.activation, []).append(image)
+
+    @staticmethod
+    def order(image):
+        return (image.priority is None, image.priority, image.id)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def image(self, id):
+        return self.by_id.get(id)
+
+    ##
+    # @return list of SoftwareImage in priority order, of one purpose
+    #         and/or activation state if given
+    #
+    def images(self, purpose=None, activation=None):
+        if purpose is not None:
+            images = self.by_purpose.get(purpose, [])
+            if activation is not None:
+                images = [i for i in images if i.activation == activation]
+            return images
+        if activation is not None:
+            return self.by_activation.get(activation, [])
+        return sorted(self.by_id.values(), key=self.order)
+
+    def ids(self, purpose=None, activation=None):
+        return [i.id for i in self.images(purpose, activation)]
+
+    ##
+    # @return the Active image of purpose the BMC boots (lowest priority),
+    #         or None
+    #
+    def boot_image(self, purpose):
+        active = self.images(purpose, 'Active')
+        return active[0] if active else None
+
+# Object trees whose property changes BMCStateCache subscribes to
+STATE_PATHS = ['/xyz/openbmc_project/state', '/org/openbmc/sensors/host/BootProgress',
+               '/xyz/openbmc_project/software']
+
+##
+# @brief Properties of BMC D-Bus objects kept current by the property change
+#        notifications of OpenBMC's /subscribe websocket, for the wait
+#        helpers to block on instead of polling.
+#
+#        A background thread holds the subscription and reconnects when it
+#        drops (a BMC reboot). While it is down, or if the BMC has no
+#        /subscribe, wait() GETs the object every POLL seconds as the wait
+#        helpers always did; while it is up, only every RECHECK seconds in
+#        case a notification went missing.
+#
+class BMCStateCache():
+    POLL = 5
+    RECHECK = 60
+
+    ##
+    # @param rest @type HostManagement
+    #
+    def __init__(self, rest, paths=STATE_PATHS):
+        self.rest = rest
+        self.paths = paths
+        self.objects = {}
+        self.updates = {}
+        self.cond = threading.Condition()
+        self.live = False
+        self.unsupported = False
+        # bumped on every (re)subscription, for waiters to GET again
+        self.generation = 0
+        self.events = 0
+        self.thread = None
+        self.ws = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        if self.unsupported or (self.thread and self.thread.is_alive()):
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        ws = self.ws
+        if ws:
+            ws.close()
+        if self.thread:
+            self.thread.join(5)
+
+    def subscribe(self):
+        ws = WebSocket(self.rest.hostname, "/subscribe",
+                       {"Cookie": self.rest.curl.pool.cookie_header()})
+        ws.connect()
+        ws.send(json.dumps({"paths": self.paths}))
+        return ws
+
+    def run(self):
+        failed = False
+        while not self.stopped.is_set():
+            try:
+                self.ws = self.subscribe()
+            except WebSocketError as e:
+                if e.status in (404, 405, 501):
+                    print "# BMC has no event subscription (%s), polling for state" % e
+                    self.unsupported = True
+                    return
+                if not failed:
+                    print "# No BMC event subscription yet (%s), polling for state" % e
+                    failed = True
+                self.stopped.wait(self.POLL)
+                continue
+            print "# Subscribed to BMC state changes"
+            failed = False
+            with self.cond:
+                self.live = True
+                self.generation += 1
+                self.cond.notify_all()
+            try:
+                while not self.stopped.is_set():
+                    message = self.ws.recv(1)
+                    if message is not None:
+                        self.event(message)
+            except WebSocketError as e:
+                if not self.stopped.is_set():
+                    print "# BMC event subscription lost (%s), polling until it is back" % e
+            finally:
+                self.ws.close()
+                self.ws = None
+                with self.cond:
+                    self.live = False
+                    self.cond.notify_all()
+
+    def event(self, message):
+        try:
+            event = json.loads(message)
+        except ValueError:
+            return
+        props = dict(event.get('properties') or {})
+        for interface in (event.get('interfaces') or {}).values():
+            props.update(interface)
+        path = event.get('path')
+        if not path or not props:
+            return
+        with self.cond:
+            self.objects.setdefault(path, {}).update(props)
+            self.updates[path] = self.updates.get(path, 0) + 1
+            self.events += 1
+            self.cond.notify_all()
+
+    ##
+    # @brief GET an object into the cache, unless a notification for it
+    #        comes in meanwhile (which is newer)
+    #
+    # @return its properties, {} if the BMC has no such object, None if
+    #         the BMC didn't answer
+    #
+    def refresh(self, path):
+        with self.cond:
+            before = self.updates.get(path, 0)
+        try:
+            output = self.rest.curl.call("GET", path, log=False)
+            props = json.loads(output)['data']
+        except FailedCurlInvocation as f:
+            return {} if '"message": "404 Not Found"' in f.output else None
+        except (OpTestError, ValueError, KeyError):
+            return None
+        if not isinstance(props, dict):
+            return None
+        with self.cond:
+            if self.updates.get(path, 0) == before:
+                self.objects[path] = dict(props)
+            return dict(self.objects.get(path, props))
+
+    ##
+    # @brief Wait for a property to take a value accept() takes
+    #
+    # @param accept: function of the value, true once the wait is over
+    # @param timeout @type int: seconds
+    #
+    # @return the value, None if the object doesn't have the property, or
+    #         raise OpTestError at timeout
+    #
+    def wait(self, path, prop, accept, timeout, what):
+        self.start()
+        end = time.time() + timeout
+        checked = None
+        generation = None
+        shown = None
+        while True:
+            interval = self.RECHECK if self.live else self.POLL
+            if checked is None or time.time() - checked >= interval \
+               or generation != self.generation:
+                generation = self.generation
+                props = self.refresh(path)
+                checked = time.time()
+                if props is not None and prop not in props:
+                    return None
+            with self.cond:
+                value = self.objects.get(path, {}).get(prop)
+                if value != shown:
+                    print "%s %s: %s" % (path, prop, value)
+                    shown = value
+                if value is not None and accept(value):
+                    return value
+                now = time.time()
+                if now > end:
+                    raise OpTestError("Timeout waiting for %s" % what)
+                if self.live == (interval == self.RECHECK) and generation == self.generation:
+                    self.nap(max(0.0, min(end, checked + interval) - now) + 0.01)
+
+    ##
+    # @brief cond.wait(seconds), but woken as soon as notified: a timed
+    #        Condition.wait() only looks every 50ms
+    #
+    def nap(self, seconds):
+        timer = threading.Timer(seconds, self.wake)
+        timer.daemon = True
+        timer.start()
+        try:
+            self.cond.wait()
+        finally:
+            timer.cancel()
+
+    def wake(self):
+        with self.cond:
+            self.cond.notify_all()
+
+##
+# @brief SELCursor over the OpenBMC REST API: list the logging entries
+#        and only GET the ones newer than the last entry seen.
+#
+class RestSELCursor(SELCursor):
+    def __init__(self, rest, logfile=None):
+        SELCursor.__init__(self, logfile=logfile)
+        self.rest = rest
+
+    def fetch(self):
+        ids = self.rest.get_sel_entry_ids()
+        if self.last_id is not None and ids and max(ids) < self.last_id:
+            # entries were deleted and the ids started over
+            self.reset()
+        records = []
+        for id in ids:
+            if self.last_id is None or id > self.last_id:
+                records.append(self.record(self.rest.get_sel_entry(id)))
+        return records
+
+    @staticmethod
+    def record(entry):
+        stamp = entry.get('Timestamp', 0) / 1000
+        text = '%4d | %s | %s | %s | %s' % (
+            entry['Id'],
+            time.strftime('%m/%d/%Y | %H:%M:%S', time.gmtime(stamp)),
+            str(entry.get('Severity', '')).split('.')[-1],
+            entry.get('Message', ''),
+            ' '.join(entry.get('AdditionalData', [])))
+        return SELRecord(entry['Id'], text)
+
 class HostManagement():
     def __init__(self, ip=None, username=None, password=None):
         self.hostname = ip
         self.username = username
         self.password = password
-        self.curl = CurlTool(ip=ip,
+        self.curl = RestTool(ip=ip,
                              username=username,
-                             password=password)
+                             password=password,
+                             relogin=self.login)
         self.util = OpTestUtil()
+        self.sel_cursor = RestSELCursor(self)
+        self.state = BMCStateCache(self)
+        # whether the BMC takes gzipped uploads, None until we know
+        self.accepts_compressed = None
         self.login()
 
     '''
@@ -418,6 +830,41 @@ class HostManagement():
         print repr(sels)
         return sels
 
+    '''
+    List SEL entry paths only (no content):
+    curl -b cjar -k -H "Content-Type: application/json" -X GET \
+    https://bmc/xyz/openbmc_project/logging/list
+    '''
+    def get_sel_entry_ids(self):
+        obj = "/xyz/openbmc_project/logging/list"
+        self.curl.feed_data(dbus_object=obj, operation='r', command="GET")
+        data = json.loads(self.curl.run())
+        ids = []
+        for k in data['data']:
+            m = re.match(r"/xyz/openbmc_project/logging/entry/(\d{1,})$", k)
+            if m:
+                ids.append(int(m.group(1)))
+        return sorted(ids)
+
+    '''
+    Get one SEL entry:
+    curl -b cjar -k -H "Content-Type: application/json" -X GET \
+    https://bmc/xyz/openbmc_project/logging/entry/<id>
+    '''
+    def get_sel_entry(self, id):
+        obj = "/xyz/openbmc_project/logging/entry/%s" % id
+        self.curl.feed_data(dbus_object=obj, operation='r', command="GET")
+        return json.loads(self.curl.run())['data']
+
+    ##
+    # @brief Fetch the SEL entries added since the last call and look for
+    #        an error string in them
+    #
+    # @return list of matching SELRecord
+    #
+    def check_sel(self, i_string):
+        return self.sel_cursor.check(i_string)
+
     def clear_sel_by_id(self):
         print "Clearing SEL entries by id"
         list = self.get_sel_ids()
@@ -476,38 +923,34 @@ class HostManagement():
     everything is going to be a steaming pile of fail.
     '''
     def wait_for_chassis_state(self, target_state, chassis=0, timeout=10):
-        data = '\'{"data" : []}\''
         obj = "/xyz/openbmc_project/state/chassis%d" % chassis
-        self.curl.feed_data(dbus_object=obj, operation='r', command="GET", data=data)
-        timeout = time.time() + 60*timeout
         target_state = "xyz.openbmc_project.State.Chassis.PowerState.%s" % target_state
-        while True:
-            output = self.curl.run()
-            result = json.loads(output)
-            print repr(result)
-            if result.get('data') is None or result.get('data').get('CurrentPowerState') is None:
-                return None
-            state = result['data']['CurrentPowerState']
-            print "System state: %s (target %s)" % (state, target_state)
-            if state == target_state:
-                break
-            if time.time() > timeout:
-                raise OpTestError("Timeout waiting for chassis state to become %s" % target_state)
-            time.sleep(5)
+        state = self.state.wait(obj, "CurrentPowerState", lambda s: s == target_state,
+                                60*timeout, "chassis state to become %s" % target_state)
+        if state is None:
+            return None
         return True
-        
 
     def wait_for_standby(self, timeout=10):
         r = self.wait_for_chassis_state("Off", timeout=timeout)
         if r is None:
             print "Falling back to old BootProgress"
-            return old_wait_for_standby(timeout)
+            return self.old_wait_for_standby(timeout)
+        return r
 
     def wait_for_runtime(self, timeout=10):
         r = self.wait_for_chassis_state("On", timeout=timeout)
         if r is None:
             print "Falling back to old BootProgress"
-            return old_wait_for_standby(timeout)
+            return self.old_wait_for_runtime(timeout)
+        return r
+
+    ##
+    # @brief Subscribe to BMC state changes now rather than at the first
+    #        wait
+    #
+    def subscribe(self):
+        self.state.start()
 
     '''
     Boot progress
@@ -515,45 +958,20 @@ class HostManagement():
     -X GET https://bmc//org/openbmc/sensors/host/BootProgress
     '''
     def old_wait_for_runtime(self, timeout=10):
-        data = '\'{"data" : []}\''
         obj = "/org/openbmc/sensors/host/BootProgress"
-        self.curl.feed_data(dbus_object=obj, operation='r', command="GET", data=data)
-        timeout = time.time() + 60*timeout
-        while True:
-            output = self.curl.run()
-            result = json.loads(output)
-            print repr(result)
-            state = result['data']['value']
-            print "System state: %s" % state
-            if state == 'FW Progress, Starting OS':
-                print "System FW booted to runtime: IPL finished"
-                break
-            if time.time() > timeout:
-                l_msg = "IPL timeout"
-                print l_msg
-                raise OpTestError(l_msg)
-            time.sleep(5)
+        state = self.state.wait(obj, "value", lambda s: s == 'FW Progress, Starting OS',
+                                60*timeout, "IPL")
+        if state is None:
+            raise OpTestError("No BootProgress on the BMC")
+        print "System FW booted to runtime: IPL finished"
         return True
 
     def old_wait_for_standby(self, timeout=10):
-        data = '\'{"data" : []}\''
         obj = "/org/openbmc/sensors/host/BootProgress"
-        self.curl.feed_data(dbus_object=obj, operation='r', command="GET", data=data)
-        timeout = time.time() + 60*timeout
-        while True:
-            output = self.curl.run()
-            result = json.loads(output)
-            print repr(result)
-            state = result['data']['value']
-            print "System state: %s" % state
-            if state == 'Off':
-                print "System reached standby state"
-                break
-            if time.time() > timeout:
-                l_msg = "Standby timeout"
-                print l_msg
-                raise OpTestError(l_msg)
-            time.sleep(5)
+        state = self.state.wait(obj, "value", lambda s: s == 'Off', 60*timeout, "standby")
+        if state is None:
+            raise OpTestError("No BootProgress on the BMC")
+        print "System reached standby state"
         return True
 
     '''
@@ -579,37 +997,27 @@ class HostManagement():
         return self.curl.run()
 
     def wait_for_bmc_runtime(self, timeout=10):
-        timeout = time.time() + 60*timeout
-        output = ""
-        while True:
-            if '"description": "Login required"' in output:
-                self.login()
-            try:
-                output = self.get_bmc_state()
-            except:
-                pass
-            if '"data": "xyz.openbmc_project.State.BMC.BMCState.Ready"' in output:
-                print "BMC is UP & Ready"
-                break
-            if time.time() > timeout:
-                l_msg = "BMC Ready timeout"
-                print l_msg
-                raise OpTestError(l_msg)
-            time.sleep(5)
+        obj = "/xyz/openbmc_project/state/bmc0"
+        state = self.state.wait(obj, "CurrentBMCState",
+                                lambda s: s == "xyz.openbmc_project.State.BMC.BMCState.Ready",
+                                60*timeout, "BMC Ready")
+        if state is None:
+            raise OpTestError("No CurrentBMCState on the BMC")
+        print "BMC is UP & Ready"
         return True
 
-    def get_list_of_image_ids(self):
-        obj = "/xyz/openbmc_project/software/enumerate"
-        self.curl.feed_data(dbus_object=obj, operation='rw', command="GET")
-        output = self.curl.run()
-        r = json.loads(output)
-        print repr(r)
-        ids = []
-        for k in r['data']:
-            m = re.match(r'/xyz/openbmc_project/software/(.*)', k)
-            if m:
-                ids.append(m.group(1))
+    ##
+    # @brief Every software image in one request
+    #
+    # @return SoftwareInventory
+    #
+    def software_enumerate(self):
+        self.curl.feed_data(dbus_object="/xyz/openbmc_project/software/enumerate",
+                            operation='rw', command="GET")
+        return SoftwareInventory(json.loads(self.curl.run())['data'])
 
+    def get_list_of_image_ids(self):
+        ids = self.software_enumerate().ids()
         print "List of images id's: %s" % ids
         return ids
 
@@ -618,35 +1026,168 @@ class HostManagement():
         self.curl.feed_data(dbus_object=obj, operation='rw', command="GET")
         return json.loads(self.curl.run())
 
+    ##
+    # @brief Version an image tarball declares in its MANIFEST, which is
+    #        what the BMC shows as the uploaded image's Version
+    #
+    # @return version string, or None if image isn't a tarball with one
+    #
+    @staticmethod
+    def image_manifest_version(image):
+        try:
+            with tarfile.open(image) as tar:
+                manifest = tar.extractfile('MANIFEST').read()
+        except (tarfile.TarError, KeyError, AttributeError, IOError):
+            return None
+        for line in manifest.splitlines():
+            if line.startswith('version='):
+                return line[len('version='):].strip()
+        return None
+
     """
     Upload a image
     curl   -b cjar  -c cjar   -k  -H  'Content-Type: application/octet-stream'   -T witherspoon.pnor.squashfs.tar  
     -X POST https://bmc//upload/image
     """
-    def upload_image(self, image):
+    def upload_image(self, image, compress=False):
+        if compress and self.accepts_compressed is not False:
+            if self.upload_compressed(image):
+                return
         header = " \'Content-Type: application/octet-stream\' "
         obj = "/upload/image"
         self.curl.feed_data(dbus_object=obj, operation='rw', command="POST", header=header, upload_file=image)
         self.curl.run()
 
+    ##
+    # @brief Upload a gzipped copy of image, checked to decompress to the
+    #        original first, and see whether the BMC takes it. The BMC
+    #        side check is that the new image carries the Version from
+    #        the tarball's MANIFEST; an image without one can only be
+    #        checked to have shown up. Nothing is uploaded if the BMC
+    #        already has that Version (it wouldn't make a new image of it),
+    #        and an image the BMC made of the gzip as some other Version is
+    #        deleted again.
+    #
+    # @return True if the image is on the BMC (with the right Version),
+    #         False if it didn't compress or the BMC didn't take it
+    #
+    def upload_compressed(self, image, timeout=60):
+        version = self.image_manifest_version(image)
+        inventory = self.software_enumerate()
+        if version is not None and version in [inventory.image(id).version
+                                               for id in inventory.ids()]:
+            print "# BMC already has version %s of %s, not uploading it again" % (
+                version, image)
+            return True
+        size = os.path.getsize(image)
+        packed = tempfile.NamedTemporaryFile(prefix='op-test-', suffix='.gz')
+        try:
+            sha256 = hashlib.sha256()
+            c = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            with open(image, 'rb') as f:
+                for data in iter(lambda: f.read(1024 * 1024), ''):
+                    sha256.update(data)
+                    packed.write(c.compress(data))
+            packed.write(c.flush())
+            packed.flush()
+            wire = packed.tell()
+            if wire > AUTO_RATIO * size:
+                print "# %s doesn't compress, uploading it as it is" % image
+                return False
+            packed.seek(0)
+            d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            check = hashlib.sha256()
+            for data in iter(lambda: packed.read(1024 * 1024), ''):
+                check.update(d.decompress(data))
+            check.update(d.flush())
+            if check.hexdigest() != sha256.hexdigest():
+                print "# gzipped %s doesn't decompress to the original, uploading it as it is" % image
+                return False
+
+            before = set(inventory.ids())
+            start = time.time()
+            self.upload_image(packed.name)
+            seconds = time.time() - start
+            end = time.time() + timeout
+            while time.time() < end:
+                inventory = self.software_enumerate()
+                new = [inventory.image(id) for id in set(inventory.ids()) - before]
+                if new:
+                    if version is None:
+                        print "# No MANIFEST version in %s, can only tell the BMC " \
+                            "took a new image" % image
+                    elif version not in [i.version for i in new]:
+                        print "# BMC took the gzipped %s as version %s, not %s, " \
+                            "uploading it as it is" % (image, ', '.join(
+                                str(i.version) for i in new), version)
+                        for i in new:
+                            self.delete_image(i.id)
+                        self.accepts_compressed = False
+                        return False
+                    self.accepts_compressed = True
+                    print "# Uploaded %s: %d bytes as %d gzipped (%.1f:1) in %.1fs, " \
+                        "%.1f MB/s effective" % (image, size, wire, float(size) / max(wire, 1),
+                                                  seconds, size / max(seconds, 0.001) / 1048576)
+                    return True
+                time.sleep(5)
+            # maybe just slow, so not taken as the BMC refusing gzip
+            print "# No new image from the gzipped %s within %ds, uploading it " \
+                "as it is" % (image, timeout)
+            return False
+        finally:
+            packed.close()
+
+    def delete_image(self, id):
+        print "Deleting image %s" % id
+        data = '\'{"data" : []}\''
+        obj = "/xyz/openbmc_project/software/%s/action/Delete" % id
+        self.curl.feed_data(dbus_object=obj, operation='rw', command="POST", data=data)
+        self.curl.run()
+
     # priority 0 -primary (Boot side of the image)
     def get_image_priority(self, id):
-        output = self.image_data(id)
-        print repr(output)
-        return output['data']['Priority']
+        return self.software_enumerate().image(id).priority
+
+    ##
+    # @brief Wait for image id to reach activation
+    #
+    # @param activation @type string: 'Ready', 'Active', ...
+    #
+    # @return SoftwareImage or raise OpTestError
+    #
+    def wait_for_image_activation(self, id, activation, timeout=10):
+        obj = SOFTWARE_PATH + id
+        done = lambda s: s.split('.')[-1] in (activation, "Failed")
+        state = self.state.wait(obj, "Activation", done, 60*timeout,
+                                "image %s to become %s" % (id, activation))
+        if state is None:
+            raise OpTestError("No image %s on the BMC" % id)
+        if state.split('.')[-1] != activation:
+            raise OpTestError("Image %s failed to activate" % id)
+        with self.state.cond:
+            return SoftwareInventory({obj: self.state.objects[obj]}).image(id)
 
     def image_ready_for_activation(self, id, timeout=10):
+        self.wait_for_image_activation(id, "Ready", timeout)
+        print "Image upload is successful & Ready for activation"
+        return True
+
+    ##
+    # @brief Wait for an uploaded image of purpose to be Ready
+    #
+    # @return its id (the one that would boot first if there are several),
+    #         or raise OpTestError
+    #
+    def wait_for_ready_image(self, purpose="Host", timeout=10):
         timeout = time.time() + 60*timeout
         while True:
-            output = self.image_data(id)
-            print repr(output)
-            if output['data']['Activation'] == "xyz.openbmc_project.Software.Activation.Activations.Ready":
-                print "Image upload is successful & Ready for activation"
-                break
+            ready = self.software_enumerate().ids(purpose, "Ready")
+            if ready:
+                print "%s image ready for activation: %s" % (purpose, ready[0])
+                return ready[0]
             if time.time() > timeout:
-                raise OpTestError("Image is not ready for activation/Timeout happened")
+                raise OpTestError("No %s image ready for activation/Timeout happened" % purpose)
             time.sleep(5)
-        return True
 
     """
     Activate a image
@@ -661,31 +1202,19 @@ class HostManagement():
         self.curl.run()
 
     def wait_for_image_active_complete(self, id, timeout=10):
-        timeout = time.time() + 60*timeout
-        while True:
-            output = self.image_data(id)
-            if output['data']['Activation'] == 'xyz.openbmc_project.Software.Activation.Activations.Activating':
-                print "Image activation is in progress"
-            if output['data']['Activation'] == 'xyz.openbmc_project.Software.Activation.Activations.Active':
-                print "Image activated successfully, Good to go for power on...."
-                break
-            if time.time() > timeout:
-                raise OpTestError("Image is failed to activate/Timeout happened")
-            time.sleep(5)
+        self.wait_for_image_activation(id, "Active", timeout)
+        print "Image activated successfully, Good to go for power on...."
         return True
 
     def host_image_ids(self):
-        l = self.get_list_of_image_ids()
-        for id in l:
-            i = self.image_data(id)
-            if i['data']['Purpose'] != 'xyz.openbmc_project.Software.Version.VersionPurpose.Host':
-                l.remove(id)
+        l = self.software_enumerate().ids("Host")
         print "Host Image IDS: %s" % repr(l)
         return l
 
 
 class OpTestOpenBMC():
-    def __init__(self, ip=None, username=None, password=None, ipmi=None, rest_api=None):
+    def __init__(self, ip=None, username=None, password=None, ipmi=None, rest_api=None,
+                 logdir=None, image_compression=None):
         self.hostname = ip
         self.username = username
         self.password = password
@@ -695,21 +1224,19 @@ class OpTestOpenBMC():
         # We kind of hack our way into pxssh by setting original_prompt
         # to also be \n, which appears to fool it enough to allow us
         # continue.
-        self.console = HostConsole(ip, username, password, port=2200)
+        self.console = HostConsole(ip, username, password, port=2200, logdir=logdir)
         self.bmc = OpTestBMC(ip=self.hostname,
                             username=self.username,
-                            password=self.password)
+                            password=self.password,
+                            image_compression=image_compression)
 
     def has_new_pnor_code_update(self):
         if self.has_vpnor is not None:
             return self.has_vpnor
-        list = self.rest_api.get_list_of_image_ids()
-        for id in list:
-            i = self.rest_api.image_data(id)
-            if i['data']['Purpose'] == 'xyz.openbmc_project.Software.Version.VersionPurpose.Host':
-                print "Host image"
-                self.has_vpnor = True
-                return True
+        if self.rest_api.software_enumerate().images("Host"):
+            print "Host image"
+            self.has_vpnor = True
+            return True
         print "# Checking for pflash os BMC to determine update method"
         self.has_vpnor = not self.bmc.validate_pflash_tool()
         return self.has_vpnor
@@ -719,12 +1246,18 @@ class OpTestOpenBMC():
         # After a BMC reboot REST API needs login again
         self.rest_api.login()
 
-    def image_transfer(self, i_imageName):
-        self.bmc.image_transfer(i_imageName)
+    def image_transfer(self, i_imageName, copy_as=None, force=False):
+        self.bmc.image_transfer(i_imageName, copy_as, force)
+
+    def get_image_cache(self):
+        return self.bmc.get_image_cache()
 
     def pnor_img_flash_openbmc(self, pnor_name):
         self.bmc.pnor_img_flash_openbmc(pnor_name)
 
+    def pnor_img_flash_diff(self, i_image):
+        return self.bmc.pnor_img_flash_diff(i_image)
+
     def skiboot_img_flash_openbmc(self, lid_name):
         if not self.has_new_pnor_code_update():
             self.bmc.skiboot_img_flash_openbmc(lid_name)
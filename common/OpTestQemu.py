@@ -26,17 +26,20 @@ import pexpect
 import subprocess
 
 from common.Exceptions import CommandFailed
+from common.OpTestConsole import ConsoleStream, console_log_path, run_framed, run_batch_framed
 
 class ConsoleState():
     DISCONNECTED = 0
     CONNECTED = 1
 
 class QemuConsole():
-    def __init__(self, qemu_binary=None, skiboot=None, kernel=None, initramfs=None):
+    def __init__(self, qemu_binary=None, skiboot=None, kernel=None, initramfs=None,
+                 logdir=None):
         self.qemu_binary = qemu_binary
         self.skiboot = skiboot
         self.kernel = kernel
         self.initramfs = initramfs
+        self.logdir = logdir
         self.state = ConsoleState.DISCONNECTED
 
     def terminate(self):
@@ -67,10 +70,10 @@ class QemuConsole():
                + " -initrd %s" % (self.initramfs)
            )
         print cmd
-        solChild = pexpect.spawn(cmd,logfile=sys.stdout)
+        solChild = pexpect.spawn(cmd)
         self.state = ConsoleState.CONNECTED
-        self.sol = solChild
-        return solChild
+        self.sol = ConsoleStream(solChild, logfile=console_log_path(self.logdir, 'qemu-console'))
+        return self.sol
 
     def get_console(self):
         if self.state == ConsoleState.DISCONNECTED:
@@ -88,28 +91,29 @@ class QemuConsole():
 
         return self.sol
 
+    ##
+    # @brief Run a command on the host console
+    #
+    # @return list of output lines, or raise CommandFailed if it exits
+    #         non-zero. On timeout, the output so far rather than an
+    #         exception, as it always has been (the command may still be
+    #         running).
+    #
     def run_command(self, command, timeout=60):
-        console = self.get_console()
-        console.sendline(command)
-        console.expect("\n") # from us
-        rc = console.expect(["\[console-pexpect\]#$",pexpect.TIMEOUT], timeout)
-        output = console.before
-
-        console.sendline("echo $?")
-        console.expect("\n") # from us
-        rc = console.expect(["\[console-pexpect\]#$",pexpect.TIMEOUT], timeout)
-        exitcode = int(console.before)
-
-        if rc == 0:
-            res = output
-            res = res.splitlines()
-            if exitcode != 0:
-                raise CommandFailed(command, res, exitcode)
-            return res
-        else:
-            res = console.before
-            res = res.split(command)
-            return res[-1].splitlines()
+        return run_framed(self.get_console(), command, timeout, partial=True)
+
+    ##
+    # @brief Run a list of commands in one exchange
+    #
+    # @return list of CommandResult, or raise CommandFailed for the first
+    #         failing command (the rest are not run)
+    #
+    def run_batch(self, commands, timeout=60, ignore_fail=False):
+        return run_batch_framed(self.get_console(), commands, timeout,
+                                ignore_fail=ignore_fail)
+
+    def run_batch_ignore_fail(self, commands, timeout=60):
+        return self.run_batch(commands, timeout, ignore_fail=True)
 
 class QemuIPMI():
     def __init__(self, console):
@@ -125,8 +129,9 @@ class QemuIPMI():
         return 0
 
 class OpTestQemu():
-    def __init__(self, qemu_binary=None, skiboot=None, kernel=None, initramfs=None):
-        self.console = QemuConsole(qemu_binary, skiboot, kernel, initramfs)
+    def __init__(self, qemu_binary=None, skiboot=None, kernel=None, initramfs=None,
+                 logdir=None):
+        self.console = QemuConsole(qemu_binary, skiboot, kernel, initramfs, logdir=logdir)
         self.ipmi = QemuIPMI(self.console)
 
     def get_host_console(self):
@@ -0,0 +1,448 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestRMCP.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestRMCP
+#  Native IPMI 2.0 (RMCP+) lanplus client
+#
+#  Keeps a single authenticated RMCP+ session open to the BMC so that an IPMI
+#  request costs one UDP round trip instead of a fork of ipmitool plus a full
+#  session handshake. Only what op-test needs is implemented:
+#  RAKP-HMAC-SHA1 authentication, HMAC-SHA1-96 integrity and, when PyCrypto
+#  (or pycryptodome) is installed, AES-CBC-128 confidentiality.
+
+import os
+import time
+import struct
+import socket
+import hmac
+import hashlib
+import threading
+
+try:
+    from Crypto.Cipher import AES
+except ImportError:
+    AES = None
+
+from OpTestError import OpTestError
+
+RMCP_HEADER = '\x06\x00\xff\x07'
+AUTHTYPE_NONE = 0x00
+AUTHTYPE_RMCPP = 0x06
+
+PAYLOAD_IPMI = 0x00
+PAYLOAD_OPEN_SESSION_REQ = 0x10
+PAYLOAD_OPEN_SESSION_RSP = 0x11
+PAYLOAD_RAKP1 = 0x12
+PAYLOAD_RAKP2 = 0x13
+PAYLOAD_RAKP3 = 0x14
+PAYLOAD_RAKP4 = 0x15
+
+PAYLOAD_ENCRYPTED = 0x80
+PAYLOAD_AUTHENTICATED = 0x40
+
+BMC_ADDR = 0x20
+CONSOLE_ADDR = 0x81
+
+NETFN_CHASSIS = 0x00
+NETFN_SENSOR = 0x04
+NETFN_APP = 0x06
+NETFN_STORAGE = 0x0a
+
+CMD_GET_DEVICE_ID = 0x01
+CMD_COLD_RESET = 0x02
+CMD_WARM_RESET = 0x03
+CMD_GET_CHANNEL_AUTH_CAP = 0x38
+CMD_SET_SESSION_PRIV = 0x3b
+CMD_CLOSE_SESSION = 0x3c
+
+PRIV_ADMIN = 0x04
+
+# cipher suite id -> (authentication, integrity, confidentiality) algorithm
+CIPHER_SUITES = {
+    1: (0x01, 0x00, 0x00),
+    2: (0x01, 0x01, 0x00),
+    3: (0x01, 0x01, 0x01),
+}
+
+COMPLETION_CODES = {
+    0xc0: "Node busy",
+    0xc1: "Invalid command",
+    0xc3: "Timeout",
+    0xc5: "Reservation cancelled or invalid",
+    0xc7: "Request data length invalid",
+    0xc9: "Parameter out of range",
+    0xcb: "Requested sensor, data, or record not found",
+    0xcc: "Invalid data field in request",
+    0xd4: "Insufficient privilege level",
+    0xd5: "Command not supported in present state",
+    0xff: "Unspecified error",
+}
+
+class IPMICompletionCode(Exception):
+    def __init__(self, netfn, cmd, code):
+        self.netfn = netfn
+        self.cmd = cmd
+        self.code = code
+
+    def __str__(self):
+        return "IPMI request netfn=0x%x cmd=0x%x failed: %s (0x%02x)" % (
+            self.netfn, self.cmd,
+            COMPLETION_CODES.get(self.code, "Unknown"), self.code)
+
+def hmac_sha1(key, data):
+    return hmac.new(key, data, hashlib.sha1).digest()
+
+def ipmi_checksum(data):
+    return (0x100 - (sum(bytearray(data)) & 0xff)) & 0xff
+
+##
+# @brief Pack an IPMB style message. Requests and responses share the layout,
+#        a response simply carries the completion code as its first data byte
+#        and the odd (response) netfn.
+#
+def pack_ipmi_message(dst_addr, netfn, src_addr, seq, cmd, data=''):
+    head = chr(dst_addr) + chr(netfn << 2)
+    body = chr(src_addr) + chr((seq & 0x3f) << 2) + chr(cmd) + data
+    return head + chr(ipmi_checksum(head)) + body + chr(ipmi_checksum(body))
+
+##
+# @brief Unpack an IPMB style message
+#
+# @return (netfn, seq, cmd, data)
+#
+def unpack_ipmi_message(msg):
+    if len(msg) < 7:
+        raise OpTestError("IPMI message too short (%d bytes)" % len(msg))
+    if ipmi_checksum(msg[:2]) != ord(msg[2]) or \
+       ipmi_checksum(msg[3:-1]) != ord(msg[-1]):
+        raise OpTestError("IPMI message checksum mismatch")
+    return ord(msg[1]) >> 2, ord(msg[4]) >> 2, ord(msg[5]), msg[6:-1]
+
+##
+# @brief Derive the K1 (integrity) and K2 (confidentiality) keys from the
+#        session integrity key.
+#
+def derive_keys(sik):
+    return hmac_sha1(sik, '\x01' * 20), hmac_sha1(sik, '\x02' * 20)
+
+##
+# @brief Frames and unframes RMCP+ packets for one session. Shared by the
+#        client session and the stand-in BMC so both sides agree on the wire
+#        format.
+#
+class RMCPPlusCodec():
+    def __init__(self, integrity=0, confidentiality=0):
+        self.integrity = integrity
+        self.confidentiality = confidentiality
+        self.k1 = None
+        self.k2 = None
+
+    def set_sik(self, sik):
+        self.k1, self.k2 = derive_keys(sik)
+
+    def active(self):
+        return self.k1 is not None
+
+    def encrypt(self, data):
+        iv = os.urandom(16)
+        pad = (16 - (len(data) + 1) % 16) % 16
+        data += ''.join(chr(i) for i in range(1, pad + 1)) + chr(pad)
+        return iv + AES.new(self.k2[:16], AES.MODE_CBC, iv).encrypt(data)
+
+    def decrypt(self, data):
+        iv, body = data[:16], data[16:]
+        plain = AES.new(self.k2[:16], AES.MODE_CBC, iv).decrypt(body)
+        return plain[:-(ord(plain[-1]) + 1)]
+
+    def wrap(self, payload_type, payload, sid=0, seq=0):
+        secure = self.active() and payload_type == PAYLOAD_IPMI
+        if secure and self.confidentiality:
+            payload = self.encrypt(payload)
+            payload_type |= PAYLOAD_ENCRYPTED
+        if secure and self.integrity:
+            payload_type |= PAYLOAD_AUTHENTICATED
+        msg = struct.pack('<BBIIH', AUTHTYPE_RMCPP, payload_type, sid, seq,
+                          len(payload)) + payload
+        if payload_type & PAYLOAD_AUTHENTICATED:
+            pad = (4 - (len(msg) + 2) % 4) % 4
+            msg += '\xff' * pad + chr(pad) + '\x07'
+            msg += hmac_sha1(self.k1, msg)[:12]
+        return RMCP_HEADER + msg
+
+    ##
+    # @return (payload type, session id, session sequence, payload)
+    #
+    def unwrap(self, packet):
+        if packet[:4] != RMCP_HEADER or len(packet) < 16:
+            raise OpTestError("Not an RMCP+ IPMI packet")
+        if ord(packet[4]) != AUTHTYPE_RMCPP:
+            raise OpTestError("Unexpected RMCP auth type 0x%02x" % ord(packet[4]))
+        ptype, sid, seq, length = struct.unpack('<BIIH', packet[5:16])
+        payload = packet[16:16 + length]
+        if ptype & PAYLOAD_AUTHENTICATED:
+            if hmac_sha1(self.k1, packet[4:-12])[:12] != packet[-12:]:
+                raise OpTestError("RMCP+ integrity check failed")
+        if ptype & PAYLOAD_ENCRYPTED:
+            payload = self.decrypt(payload)
+        return ptype & 0x3f, sid, seq, payload
+
+##
+# @brief One persistent RMCP+ session to a BMC.
+#
+#        The session is opened lazily on the first request, re-opened if the
+#        BMC drops it, and kept alive from a background thread so that long
+#        gaps between test steps do not let the BMC time it out.
+#
+class RMCPPlusSession():
+    def __init__(self, ip, username=None, password=None, port=623,
+                 cipher_suite=3, privilege=PRIV_ADMIN,
+                 timeout=1.0, retries=4, keepalive=30):
+        self.ip = ip
+        self.port = port
+        self.username = username or ''
+        self.password = password or ''
+        self.cipher_suite = cipher_suite
+        self.privilege = privilege
+        self.timeout = timeout
+        self.retries = retries
+        self.keepalive = keepalive
+        self.lock = threading.RLock()
+        self.sock = None
+        self.codec = None
+        self.console_sid = 0
+        self.bmc_sid = 0
+        self.seq = 0
+        self.rq_seq = 0
+        self.last_used = 0
+        self.keepalive_thread = None
+        self.stop_keepalive = threading.Event()
+        self.requests = 0
+        self.request_time = 0.0
+
+    def is_open(self):
+        return self.codec is not None and self.codec.active()
+
+    def open(self):
+        with self.lock:
+            if self.is_open():
+                return
+            if self.cipher_suite not in CIPHER_SUITES:
+                raise OpTestError("Unsupported IPMI cipher suite %d" % self.cipher_suite)
+            auth, integ, conf = CIPHER_SUITES[self.cipher_suite]
+            if conf and AES is None:
+                raise OpTestError("Cipher suite %d needs AES, install pycrypto"
+                                  % self.cipher_suite)
+            self._close_socket()
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.settimeout(self.timeout)
+            self.sock.connect((self.ip, self.port))
+            self.codec = RMCPPlusCodec(integ, conf)
+            try:
+                self._handshake(auth, integ, conf)
+            except Exception:
+                self._close_socket()
+                raise
+            self.seq = 0
+            self.last_used = time.time()
+            self.request(NETFN_APP, CMD_SET_SESSION_PRIV, chr(self.privilege))
+            self._start_keepalive()
+
+    def close(self):
+        with self.lock:
+            self.stop_keepalive.set()
+            if self.is_open():
+                try:
+                    self.request(NETFN_APP, CMD_CLOSE_SESSION,
+                                 struct.pack('<I', self.bmc_sid))
+                except (OpTestError, IPMICompletionCode):
+                    pass
+            self._close_socket()
+
+    ##
+    # @brief Forget the session without telling the BMC, for when the BMC is
+    #        known to have dropped it (e.g. after an mc reset).
+    #
+    def discard(self):
+        with self.lock:
+            self.stop_keepalive.set()
+            self._close_socket()
+
+    def _close_socket(self):
+        if self.sock:
+            self.sock.close()
+        self.sock = None
+        self.codec = None
+
+    def _exchange(self, packet, accept):
+        for attempt in range(self.retries):
+            try:
+                self.sock.send(packet)
+                return self._recv_until(accept)
+            except (OpTestError, socket.error):
+                continue
+        raise OpTestError("No RMCP+ response from %s:%d" % (self.ip, self.port))
+
+    def _handshake_step(self, req_type, payload, rsp_type):
+        packet = self.codec.wrap(req_type, payload)
+        def accept(reply):
+            ptype, sid, seq, data = self.codec.unwrap(reply)
+            if ptype == rsp_type:
+                return data
+        data = self._exchange(packet, accept)
+        if ord(data[1]) != 0:
+            raise OpTestError("RMCP+ session setup rejected by BMC "
+                              "(payload 0x%02x, status 0x%02x)"
+                              % (rsp_type, ord(data[1])))
+        return data
+
+    def _handshake(self, auth, integ, conf):
+        self.console_sid = struct.unpack('<I', os.urandom(4))[0] | 1
+        algos = (struct.pack('<BxxBBxxx', 0x00, 8, auth)
+                 + struct.pack('<BxxBBxxx', 0x01, 8, integ)
+                 + struct.pack('<BxxBBxxx', 0x02, 8, conf))
+        req = struct.pack('<BBxxI', 0, self.privilege, self.console_sid) + algos
+        rsp = self._handshake_step(PAYLOAD_OPEN_SESSION_REQ, req,
+                                   PAYLOAD_OPEN_SESSION_RSP)
+        self.bmc_sid = struct.unpack('<I', rsp[8:12])[0]
+
+        # Name-only lookup, as ipmitool does by default
+        role = self.privilege | 0x10
+        user = chr(role) + chr(len(self.username)) + self.username
+        rm = os.urandom(16)
+        req = struct.pack('<BxxxI', 0, self.bmc_sid) + rm + chr(role) + '\x00\x00' \
+              + chr(len(self.username)) + self.username
+        rsp = self._handshake_step(PAYLOAD_RAKP1, req, PAYLOAD_RAKP2)
+        rc, guid, auth_code = rsp[8:24], rsp[24:40], rsp[40:60]
+
+        kuid = self.password.ljust(20, '\x00')[:20]
+        expect = hmac_sha1(kuid, struct.pack('<II', self.console_sid, self.bmc_sid)
+                           + rm + rc + guid + user)
+        if auth_code != expect:
+            raise OpTestError("RMCP+ RAKP2 check failed, wrong IPMI username/password?")
+        sik = hmac_sha1(kuid, rm + rc + user)
+
+        req = struct.pack('<BBxxI', 0, 0, self.bmc_sid) \
+              + hmac_sha1(kuid, rc + struct.pack('<I', self.console_sid) + user)
+        rsp = self._handshake_step(PAYLOAD_RAKP3, req, PAYLOAD_RAKP4)
+        if rsp[8:20] != hmac_sha1(sik, rm + struct.pack('<I', self.console_sid) + guid)[:12]:
+            raise OpTestError("RMCP+ RAKP4 integrity check failed")
+        self.codec.set_sik(sik)
+
+    ##
+    # @brief Send one IPMI request over the session
+    #
+    # @return (completion code, response data)
+    #
+    def raw(self, netfn, cmd, data=''):
+        with self.lock:
+            if not self.is_open():
+                self.open()
+            start = time.time()
+            self.rq_seq = (self.rq_seq + 1) & 0x3f
+            rq_seq = self.rq_seq
+            msg = pack_ipmi_message(BMC_ADDR, netfn, CONSOLE_ADDR, rq_seq, cmd, data)
+            def accept(reply):
+                ptype, sid, seq, payload = self.codec.unwrap(reply)
+                if ptype != PAYLOAD_IPMI or sid != self.console_sid:
+                    return None
+                r_netfn, r_seq, r_cmd, r_data = unpack_ipmi_message(payload)
+                if r_seq == rq_seq and r_cmd == cmd and r_netfn == netfn | 1:
+                    return r_data
+            # Each retransmit gets a fresh session sequence number, the BMC
+            # is entitled to drop anything it has already seen.
+            for attempt in range(self.retries):
+                self.seq = (self.seq + 1) & 0xffffffff or 1
+                packet = self.codec.wrap(PAYLOAD_IPMI, msg, self.bmc_sid, self.seq)
+                try:
+                    self.sock.send(packet)
+                    r_data = self._recv_until(accept)
+                except (OpTestError, socket.error):
+                    continue
+                self.last_used = time.time()
+                self.requests += 1
+                self.request_time += self.last_used - start
+                return ord(r_data[0]), r_data[1:]
+            # Session is most likely gone (BMC reset, timed out)
+            self._close_socket()
+            raise OpTestError("IPMI request netfn=0x%x cmd=0x%x timed out" % (netfn, cmd))
+
+    def _recv_until(self, accept):
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            try:
+                reply = self.sock.recv(1024)
+            except socket.error:
+                # timed out, or ICMP unreachable from the last send
+                break
+            try:
+                result = accept(reply)
+            except OpTestError:
+                continue
+            if result is not None:
+                return result
+        raise OpTestError("timeout")
+
+    ##
+    # @brief Send one IPMI request, raise IPMICompletionCode on failure
+    #
+    # @return response data (without completion code)
+    #
+    def request(self, netfn, cmd, data=''):
+        code, rsp = self.raw(netfn, cmd, data)
+        if code != 0:
+            raise IPMICompletionCode(netfn, cmd, code)
+        return rsp
+
+    def _start_keepalive(self):
+        if not self.keepalive:
+            return
+        # Each thread has its own stop event: one still winding down after
+        # discard() sees its own event set and exits, whatever happens here
+        self.stop_keepalive.set()
+        self.stop_keepalive = threading.Event()
+        self.keepalive_thread = threading.Thread(target=self._keepalive_loop,
+                                                 args=(self.stop_keepalive,))
+        self.keepalive_thread.daemon = True
+        self.keepalive_thread.start()
+
+    def _keepalive_loop(self, stop):
+        while not stop.wait(self.keepalive / 2.0):
+            if not self.is_open():
+                continue
+            if time.time() - self.last_used < self.keepalive:
+                continue
+            try:
+                self.request(NETFN_APP, CMD_GET_DEVICE_ID)
+            except (OpTestError, IPMICompletionCode) as e:
+                print "# RMCP+ keepalive failed: %s" % str(e)
+
+    ##
+    # @brief Average request latency seen on this session, in seconds
+    #
+    def average_latency(self):
+        if not self.requests:
+            return 0.0
+        return self.request_time / self.requests
@@ -0,0 +1,374 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestRedfish.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestRedfish
+#  OpenBMC management over Redfish, for OpTestOpenBMCSystem in place of
+#  the D-Bus REST paths of HostManagement (--bmc-management redfish).
+#
+#  Collections (sensors, event log, inventory) are read whole with $expand
+#  when the service root says the BMC supports it, so a chassis full of
+#  sensors is one request rather than one per sensor; on a BMC without
+#  $expand the same trees are walked a resource at a time. Requests go over
+#  one kept-alive HTTPSPool with a session token.
+
+import re
+import json
+import time
+import socket
+import httplib
+
+from OpTestHTTP import HTTPSPool
+from OpTestSEL import SELCursor, SELRecord
+from OpTestUtil import OpTestUtil
+from OpTestConstants import OpTestConstants as BMC_CONST
+from common.OpTestError import OpTestError
+
+SERVICE_ROOT = '/redfish/v1'
+SESSIONS = SERVICE_ROOT + '/SessionService/Sessions'
+CHASSIS = SERVICE_ROOT + '/Chassis'
+SYSTEM = SERVICE_ROOT + '/Systems/system'
+MANAGER = SERVICE_ROOT + '/Managers/bmc'
+EVENT_LOG = SYSTEM + '/LogServices/EventLog'
+# BootProgress.LastState from which the host counts as at runtime: hostboot
+# is done and skiboot (then petitboot or the OS) is up
+RUNTIME_BOOT_PROGRESS = ('SystemHardwareInitializationComplete', 'OSBootStarted',
+                         'OSRunning')
+
+##
+# @brief SELCursor over the Redfish event log: all entries in one expanded
+#        read, the ones newer than the last entry seen kept. Entry ids are
+#        plain numbers on a D-Bus backed log and <timestamp>_<n> on
+#        bmcweb's journal backed one, so records are ordered by the numbers
+#        in the id, then by Created.
+#
+class RedfishSELCursor(SELCursor):
+    def __init__(self, redfish, logfile=None):
+        SELCursor.__init__(self, logfile=logfile)
+        self.redfish = redfish
+
+    @staticmethod
+    def order(entry):
+        return (tuple(int(n) for n in re.findall(r'\d+', str(entry.get('Id', '')))),
+                entry.get('Created', ''))
+
+    def fetch(self):
+        entries = sorted(self.redfish.log_entries(), key=self.order)
+        if self.last_id is not None and entries and self.order(entries[-1]) < self.last_id:
+            # the log was cleared and the ids started over
+            self.reset()
+        return [self.record(e) for e in entries
+                if self.last_id is None or self.order(e) > self.last_id]
+
+    @classmethod
+    def record(cls, entry):
+        return SELRecord(cls.order(entry), '%4s | %s | %s | %s' % (
+            entry.get('Id', ''), entry.get('Created', ''), entry.get('Severity', ''),
+            entry.get('Message', '')))
+
+class RedfishManagement():
+    POLL = 5
+
+    def __init__(self, ip=None, username=None, password=None, max_connections=2,
+                 timeout=60):
+        self.hostname = ip
+        self.username = username
+        self.password = password
+        self.pool = HTTPSPool(ip, max_connections=max_connections, timeout=timeout)
+        self.util = OpTestUtil()
+        self.token = None
+        self.session = None
+        self.features = None
+        self.sel_cursor = RedfishSELCursor(self)
+        self.login()
+
+    def login(self):
+        self.token = None
+        status, headers, data = self.request('POST', SESSIONS, {
+            'UserName': self.username, 'Password': self.password}, relogin=False)
+        if status >= 400 or 'x-auth-token' not in headers:
+            raise OpTestError("Redfish login to %s failed: %d %s" % (
+                self.hostname, status, self.message(data)))
+        self.token = headers['x-auth-token']
+        self.session = headers.get('location')
+
+    def logout(self):
+        if self.session:
+            self.request('DELETE', self.session, relogin=False)
+        self.token = self.session = None
+
+    @staticmethod
+    def message(data):
+        error = data.get('error', {}) if isinstance(data, dict) else {}
+        return error.get('message', '')
+
+    ##
+    # @return (status, headers, decoded JSON body) of one request, logging
+    #         in again once if the session has gone
+    #
+    def request(self, method, path, body=None, relogin=True):
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if self.token:
+            headers['X-Auth-Token'] = self.token
+        payload = json.dumps(body) if body is not None else None
+        try:
+            response = self.pool.request(method, path, payload, headers)
+        except (socket.error, httplib.HTTPException) as e:
+            raise OpTestError("Redfish %s %s to %s failed: %s" % (method, path,
+                                                                   self.hostname, e))
+        if response.status == 401 and relogin and self.token:
+            print "# Redfish session expired, logging in again"
+            self.login()
+            return self.request(method, path, body, relogin=False)
+        try:
+            data = json.loads(response.body) if response.body.strip() else {}
+        except ValueError:
+            data = {}
+        return response.status, response.headers, data
+
+    def call(self, method, path, body=None):
+        status, headers, data = self.request(method, path, body)
+        if status >= 400:
+            raise OpTestError("Redfish %s %s failed: %d %s" % (method, path, status,
+                                                               self.message(data)))
+        return data
+
+    def get(self, path):
+        return self.call('GET', path)
+
+    ##
+    # @brief A collection with all its pages of Members
+    #
+    def get_all(self, path):
+        data = self.get(path)
+        next_link = data.pop('Members@odata.nextLink', None)
+        while next_link:
+            page = self.get(next_link)
+            data['Members'] = data.get('Members', []) + page.get('Members', [])
+            next_link = page.get('Members@odata.nextLink')
+        return data
+
+    def protocol_features(self):
+        if self.features is None:
+            self.features = self.get(SERVICE_ROOT).get('ProtocolFeaturesSupported', {})
+        return self.features
+
+    def can_expand(self, levels):
+        expand = self.protocol_features().get('ExpandQuery', {})
+        return bool(expand.get('NoLinks') and expand.get('Levels')
+                    and expand.get('MaxLevels', 1) >= levels)
+
+    def can_select(self):
+        return bool(self.protocol_features().get('SelectQuery'))
+
+    ##
+    # @brief A resource with its subordinate resources (not those under
+    #        Links) filled in, levels deep: $expand=. in one request if the
+    #        BMC can, a GET per resource if not
+    #
+    def expand(self, path, levels=1):
+        if self.can_expand(levels):
+            return self.get_all('%s?$expand=.($levels=%d)' % (path, levels))
+        return self.walk(self.get_all(path), levels)
+
+    def walk(self, value, levels):
+        if levels == 0:
+            return value
+        if isinstance(value, list):
+            return [self.walk(v, levels) for v in value]
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        for key, v in value.items():
+            if key == 'Links':
+                result[key] = v
+            elif isinstance(v, dict) and v.keys() == ['@odata.id']:
+                result[key] = self.walk(self.get_all(v['@odata.id']), levels - 1)
+            elif isinstance(v, list):
+                result[key] = [self.walk(self.get_all(m['@odata.id']), levels - 1)
+                               if isinstance(m, dict) and m.keys() == ['@odata.id']
+                               else self.walk(m, levels) for m in v]
+            else:
+                result[key] = self.walk(v, levels)
+        return result
+
+    ##
+    # @brief Some properties of one resource, with $select if the BMC can
+    #
+    def select(self, path, *properties):
+        if self.can_select():
+            return self.get('%s?$select=%s' % (path, ','.join(properties)))
+        data = self.get(path)
+        return dict((p, data[p]) for p in properties if p in data)
+
+    ##
+    # @return list of sensor resources of every chassis, one request per
+    #         chassis and one for the chassis list
+    #
+    def sensors(self):
+        readings = []
+        for chassis in self.expand(CHASSIS)['Members']:
+            if 'Sensors' in chassis:
+                readings += self.expand(chassis['Sensors']['@odata.id'])['Members']
+        for s in readings:
+            print "%-40s %12s %-10s %s" % (s.get('Name', s.get('Id')), s.get('Reading'),
+                                          s.get('ReadingUnits', ''),
+                                          s.get('Status', {}).get('Health', ''))
+        return readings
+
+    ##
+    # @return dict of the system (processors, memory, ...) and the
+    #         chassis, two requests
+    #
+    def get_inventory(self):
+        inventory = {'System': self.expand(SYSTEM, 2), 'Chassis': self.expand(CHASSIS)}
+        for name in ('Processors', 'Memory'):
+            members = inventory['System'].get(name, {}).get('Members', [])
+            print "%s: %d" % (name, len(members))
+            for m in members:
+                print "  %-20s %-30s %s" % (m.get('Id'), m.get('Model', m.get('PartNumber', '')),
+                                            m.get('Status', {}).get('State', ''))
+        return inventory
+
+    def log_entries(self):
+        return self.expand(EVENT_LOG + '/Entries')['Members']
+
+    def check_sel(self, i_string):
+        return self.sel_cursor.check(i_string)
+
+    ##
+    # @brief Redfish clears the whole event log in one action, there are
+    #        no ids to go through
+    #
+    def clear_sel_by_id(self):
+        self.clear_sel()
+
+    def clear_sel(self):
+        print "Clearing the event log"
+        self.call('POST', EVENT_LOG + '/Actions/LogService.ClearLog', {})
+
+    def reset_system(self, reset_type):
+        self.call('POST', SYSTEM + '/Actions/ComputerSystem.Reset', {'ResetType': reset_type})
+
+    def power_on(self):
+        self.reset_system('On')
+
+    def power_off(self):
+        self.reset_system('ForceOff')
+
+    def power_soft(self):
+        self.reset_system('GracefulShutdown')
+
+    def soft_reboot(self):
+        self.reset_system('GracefulRestart')
+
+    def hard_reboot(self):
+        self.reset_system('ForceRestart')
+
+    def get_power_state(self):
+        return self.select(SYSTEM, 'PowerState').get('PowerState')
+
+    def get_bmc_state(self):
+        return self.select(MANAGER, 'Status').get('Status', {}).get('State')
+
+    def set_boot_override(self, enabled, target):
+        self.call('PATCH', SYSTEM, {'Boot': {'BootSourceOverrideEnabled': enabled,
+                                             'BootSourceOverrideTarget': target}})
+
+    def set_bootdev_to_setup(self):
+        self.set_boot_override('Once', 'BiosSetup')
+
+    def set_bootdev_to_none(self):
+        self.set_boot_override('Disabled', 'None')
+
+    def wait_for_power_state(self, target, timeout=10):
+        end = time.time() + 60*timeout
+        shown = None
+        while True:
+            state = self.get_power_state()
+            if state != shown:
+                print "System power state: %s (target %s)" % (state, target)
+                shown = state
+            if state == target:
+                return True
+            if time.time() > end:
+                raise OpTestError("Timeout waiting for power state to become %s" % target)
+            time.sleep(self.POLL)
+
+    def wait_for_standby(self, timeout=10):
+        return self.wait_for_power_state('Off', timeout)
+
+    ##
+    # @brief Wait for the host to be at runtime: BootProgress.LastState at
+    #        one of RUNTIME_BOOT_PROGRESS, or just PowerState On on a BMC
+    #        that doesn't report BootProgress. PowerState goes On long
+    #        before the host has booted.
+    #
+    def wait_for_runtime(self, timeout=10):
+        end = time.time() + 60*timeout
+        shown = None
+        while True:
+            data = self.select(SYSTEM, 'PowerState', 'BootProgress')
+            progress = (data.get('BootProgress') or {}).get('LastState')
+            state = (data.get('PowerState'), progress)
+            if state != shown:
+                print "System power state: %s, boot progress: %s" % state
+                shown = state
+            if progress is not None:
+                if progress in RUNTIME_BOOT_PROGRESS:
+                    return True
+            elif state[0] == 'On':
+                return True
+            if time.time() > end:
+                raise OpTestError("Timeout waiting for the host to reach runtime")
+            time.sleep(self.POLL)
+
+    def wait_for_bmc_runtime(self, timeout=10):
+        end = time.time() + 60*timeout
+        while True:
+            try:
+                if self.get_bmc_state() == 'Enabled':
+                    print "BMC is UP & Ready"
+                    return True
+            except OpTestError:
+                pass
+            if time.time() > end:
+                raise OpTestError("BMC Ready timeout")
+            time.sleep(self.POLL)
+
+    def bmc_reset(self):
+        self.call('POST', MANAGER + '/Actions/Manager.Reset', {'ResetType': 'GracefulRestart'})
+        time.sleep(10)
+        self.util.PingFunc(self.hostname, BMC_CONST.PING_RETRY_FOR_STABILITY)
+        time.sleep(5) # Need some stablity here
+        self.login()
+        self.wait_for_bmc_runtime()
+
+    ##
+    # @return dict of "METHOD path" to dict with count, errors, average and
+    #         max (seconds), as HTTPSPool.report()
+    #
+    def report(self):
+        return self.pool.report()
@@ -0,0 +1,334 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestSEL.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestSEL
+#  Incremental readers for the BMC event log.
+#
+#  A SELCursor remembers the last record it has seen, so each check only
+#  fetches, logs and scans the records added since the previous one instead
+#  of the whole log. IPMISELCursor reads the SEL with one 'sel elist' the
+#  first time and walks what is added after it with Get SEL Entry
+#  chaining, the OpenBMC REST flavour lives in OpTestOpenBMC.
+
+import os
+import time
+
+from OpTestError import OpTestError
+from Exceptions import CommandFailed
+
+SENSOR_TYPES = {
+    0x01: 'Temperature', 0x02: 'Voltage', 0x03: 'Current', 0x04: 'Fan',
+    0x05: 'Physical Security', 0x06: 'Platform Security', 0x07: 'Processor',
+    0x08: 'Power Supply', 0x09: 'Power Unit', 0x0a: 'Cooling Device',
+    0x0b: 'Other', 0x0c: 'Memory', 0x0d: 'Drive Slot / Bay',
+    0x0e: 'POST Memory Resize', 0x0f: 'System Firmware Progress',
+    0x10: 'Event Logging Disabled', 0x11: 'Watchdog1', 0x12: 'System Event',
+    0x13: 'Critical Interrupt', 0x14: 'Button', 0x15: 'Module / Board',
+    0x16: 'Microcontroller', 0x17: 'Add-in Card', 0x18: 'Chassis',
+    0x19: 'Chip Set', 0x1a: 'Other FRU', 0x1b: 'Cable / Interconnect',
+    0x1c: 'Terminator', 0x1d: 'System Boot Initiated', 0x1e: 'Boot Error',
+    0x1f: 'OS Boot', 0x20: 'OS Critical Stop', 0x21: 'Slot / Connector',
+    0x22: 'System ACPI Power State', 0x23: 'Watchdog2', 0x24: 'Platform Alert',
+    0x25: 'Entity Presence', 0x26: 'Monitor ASIC', 0x27: 'LAN',
+    0x28: 'Management Subsys Health', 0x29: 'Battery', 0x2a: 'Session Audit',
+    0x2b: 'Version Change', 0x2c: 'FRU State',
+}
+
+# Event offsets for the threshold (0x01) and generic (0x02-0x0c) event types
+GENERIC_EVENTS = {
+    0x01: ['Lower Non-critical going low', 'Lower Non-critical going high',
+           'Lower Critical going low', 'Lower Critical going high',
+           'Lower Non-recoverable going low', 'Lower Non-recoverable going high',
+           'Upper Non-critical going low', 'Upper Non-critical going high',
+           'Upper Critical going low', 'Upper Critical going high',
+           'Upper Non-recoverable going low', 'Upper Non-recoverable going high'],
+    0x02: ['Transition to Idle', 'Transition to Active', 'Transition to Busy'],
+    0x03: ['State Deasserted', 'State Asserted'],
+    0x04: ['Predictive Failure Deasserted', 'Predictive Failure Asserted'],
+    0x05: ['Limit Not Exceeded', 'Limit Exceeded'],
+    0x06: ['Performance Met', 'Performance Lags'],
+    0x07: ['Transition to OK', 'Transition to Non-critical from OK',
+           'Transition to Critical from less severe',
+           'Transition to Non-recoverable from less severe',
+           'Transition to Non-critical from more severe',
+           'Transition to Critical from Non-recoverable',
+           'Transition to Non-recoverable', 'Monitor', 'Informational'],
+    0x08: ['Device Absent', 'Device Present'],
+    0x09: ['Device Disabled', 'Device Enabled'],
+    0x0a: ['Transition to Running', 'Transition to In Test',
+           'Transition to Power Off', 'Transition to On Line',
+           'Transition to Off Line', 'Transition to Off Duty',
+           'Transition to Degraded', 'Transition to Power Save',
+           'Install Error'],
+    0x0b: ['Fully Redundant', 'Redundancy Lost', 'Redundancy Degraded',
+           'Non-Redundant: Sufficient from Redundant',
+           'Non-Redundant: Sufficient from Insufficient',
+           'Non-Redundant: Insufficient Resources',
+           'Redundancy Degraded from Fully Redundant',
+           'Redundancy Degraded from Non-Redundant'],
+    0x0c: ['D0 Power State', 'D1 Power State', 'D2 Power State', 'D3 Power State'],
+}
+
+# Sensor-specific (event type 0x6f) offsets for the sensor types the
+# OpenPOWER firmware reports on
+SENSOR_SPECIFIC_EVENTS = {
+    0x07: ['IERR', 'Thermal Trip', 'FRB1/BIST failure',
+           'FRB2/Hang in POST failure', 'FRB3/Processor startup/init failure',
+           'Configuration Error', 'SM BIOS Uncorrectable CPU-complex Error',
+           'Presence detected', 'Disabled', 'Terminator presence detected',
+           'Throttled', 'Uncorrectable machine check exception',
+           'Correctable machine check error'],
+    0x0c: ['Correctable ECC', 'Uncorrectable ECC', 'Parity',
+           'Memory Scrub Error', 'Memory Device Disabled',
+           'Correctable ECC logging limit reached', 'Presence Detected',
+           'Configuration Error', 'Spare', 'Throttled',
+           'Critical Overtemperature'],
+    0x0f: ['System Firmware Error', 'System Firmware Hang',
+           'System Firmware Progress'],
+    0x12: ['System Reconfigured', 'OEM System boot event',
+           'Undetermined system hardware failure',
+           'Entry added to auxiliary log', 'PEF Action',
+           'Timestamp Clock Sync'],
+    0x1f: ['A: boot completed', 'C: boot completed', 'PXE boot completed',
+           'Diagnostic boot completed', 'CD-ROM boot completed',
+           'ROM boot completed', 'boot completed - device not specified'],
+    0x20: ['Stop during OS load/init', 'Run-time stop', 'OS graceful stop',
+           'OS graceful shutdown', 'PEF initiated soft shutdown',
+           'Agent not responding'],
+    0x22: ['S0/G0: working',
+           'S1: sleeping with system hw & processor context maintained',
+           'S2: sleeping, processor context lost',
+           'S3: sleeping, processor & hw context lost, memory retained',
+           'S4: non-volatile sleep/suspend-to-disk', 'S5/G2: soft-off',
+           'S4/S5: soft-off', 'G3: mechanical off',
+           'Sleeping in S1/S2/S3 state', 'G1: sleeping',
+           'S5: entered by override', 'Legacy ON state', 'Legacy OFF state',
+           'Unknown'],
+    0x25: ['Present', 'Absent', 'Disabled'],
+}
+
+##
+# @brief One event log record. text is what error strings are matched
+#        against and what goes in the FFDC log.
+#
+class SELRecord():
+    def __init__(self, record_id, text):
+        self.id = record_id
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+##
+# @brief A 16 byte IPMI SEL record, decoded along the lines of 'sel elist'
+#
+class IPMISELRecord(SELRecord):
+    def __init__(self, data, sensor_names=None):
+        self.data = data
+        SELRecord.__init__(self, data[0] | (data[1] << 8),
+                           self.decode(data, sensor_names or {}))
+
+    @staticmethod
+    def decode(data, sensor_names):
+        raw = ' '.join(['%02x' % b for b in data])
+        record_id = data[0] | (data[1] << 8)
+        if data[2] >= 0xc0:
+            return '%4x | OEM record %02x | %s' % (record_id, data[2], raw)
+        stamp = data[3] | (data[4] << 8) | (data[5] << 16) | (data[6] << 24)
+        if stamp < 0x20000000:
+            when = 'Pre-Init   |  %010d' % stamp
+        else:
+            when = time.strftime('%m/%d/%Y | %H:%M:%S', time.gmtime(stamp))
+        sensor_type, sensor = data[10], data[11]
+        sensor = '%s %s' % (SENSOR_TYPES.get(sensor_type, 'Unknown #0x%02x' % sensor_type),
+                            sensor_names.get(sensor, '#0x%02x' % sensor))
+        event_type, offset = data[12] & 0x7f, data[13] & 0x0f
+        if event_type == 0x6f:
+            events = SENSOR_SPECIFIC_EVENTS.get(sensor_type, [])
+        else:
+            events = GENERIC_EVENTS.get(event_type, [])
+        if offset < len(events):
+            event = events[offset]
+        else:
+            event = 'Event type 0x%02x offset 0x%02x' % (event_type, offset)
+        direction = 'Deasserted' if data[12] & 0x80 else 'Asserted'
+        return '%4x | %s | %s | %s | %s | %s' % (record_id, when, sensor,
+                                                 event, direction, raw)
+
+##
+# @brief Remembers the last event log record seen and hands out only the
+#        records added after it. Subclasses implement fetch().
+#
+#        New records are appended to logfile, which is rolled over to
+#        logfile.1 once it grows beyond max_log_size bytes.
+#
+class SELCursor():
+    def __init__(self, logfile=None, max_log_size=4 * 1024 * 1024):
+        self.logfile = logfile
+        self.max_log_size = max_log_size
+        self.last_id = None
+
+    ##
+    # @brief Fetch the records after self.last_id (all of them if None)
+    #
+    # @return list of SELRecord, or None if the log can't be read this way
+    #
+    def fetch(self):
+        raise NotImplementedError
+
+    ##
+    # @brief Start again from the first record, e.g. after clearing the log
+    #
+    def reset(self):
+        self.last_id = None
+
+    ##
+    # @brief Records added since the previous call, which are also appended
+    #        to the FFDC log
+    #
+    # @return list of SELRecord, or None if the log can't be read this way
+    #
+    def read_new(self):
+        records = self.fetch()
+        if not records:
+            return records
+        self.last_id = records[-1].id
+        self.log(records)
+        return records
+
+    ##
+    # @brief Look for an error string in the records added since the last call
+    #
+    # @return list of matching SELRecord, or None if the log can't be read
+    #
+    def check(self, i_string):
+        records = self.read_new()
+        if records is None:
+            return None
+        return [r for r in records if i_string in r.text]
+
+    def log(self, records):
+        if not self.logfile:
+            return
+        try:
+            if os.path.exists(self.logfile) \
+               and os.path.getsize(self.logfile) > self.max_log_size:
+                os.rename(self.logfile, self.logfile + '.1')
+            with open(self.logfile, 'a') as f:
+                for r in records:
+                    f.write(r.text + '\n')
+        except (IOError, OSError) as e:
+            print "Unable to write SEL log %s: %s" % (self.logfile, str(e))
+
+##
+# @brief SELCursor over IPMI. Get SEL Info tells whether anything was added
+#        or erased since the last look. The whole SEL (at the start, or
+#        after it was cleared) is read with one 'sel elist', as a Get SEL
+#        Entry each is a round trip each on the ipmitool backend. Records
+#        added after that are walked with Get SEL Entry, starting from the
+#        next-record pointer of the last record seen.
+#
+class IPMISELCursor(SELCursor):
+    LAST_ENTRY = 0xffff
+
+    def __init__(self, ipmitool, sdr_cache=None, logfile=None):
+        SELCursor.__init__(self, logfile=logfile)
+        self.ipmitool = ipmitool
+        self.sdr_cache = sdr_cache
+        self.added = None
+        self.erased = None
+
+    def reset(self):
+        SELCursor.reset(self)
+        self.added = None
+
+    def get_entry(self, record_id):
+        rsp = self.ipmitool.raw_bytes('raw 0x0a 0x43 0x00 0x00 0x%02x 0x%02x 0x00 0xff'
+                                      % (record_id & 0xff, record_id >> 8))
+        if rsp is None or len(rsp) < 18:
+            return None, None
+        return rsp[0] | (rsp[1] << 8), rsp[2:18]
+
+    def sensor_names(self):
+        if self.sdr_cache is None:
+            return {}
+        return dict([(number, name) for name, number in self.sdr_cache.load().items()])
+
+    ##
+    # @brief Every record, from one 'sel elist'
+    #
+    # @return list of SELRecord with the elist lines as text, or None if
+    #         the command failed
+    #
+    def list_all(self):
+        try:
+            output = self.ipmitool.run('sel elist')
+        except (CommandFailed, OpTestError):
+            return None
+        records = []
+        for line in output.splitlines():
+            f = line.split('|')
+            if len(f) < 5:
+                continue
+            try:
+                records.append(SELRecord(int(f[0], 16), line.strip()))
+            except ValueError:
+                continue
+        return records
+
+    def fetch(self):
+        info = self.ipmitool.raw_bytes('raw 0x0a 0x40')
+        if info is None or len(info) < 13:
+            return None
+        # entry count as well as the add timestamp, which is only to the second
+        added, erased = info[1:3] + info[5:9], info[9:13]
+        if erased != self.erased:
+            self.reset()
+            self.erased = erased
+        if self.added is not None and added == self.added:
+            return []
+
+        if self.last_id is not None:
+            next_id, data = self.get_entry(self.last_id)
+            if next_id is None:
+                # our last record is gone, the SEL was cleared under us
+                self.reset()
+        if self.last_id is None:
+            records = self.list_all()
+            if records is not None:
+                self.added = added
+            return records
+        records = []
+        names = None
+        while next_id is not None and next_id != self.LAST_ENTRY:
+            next_id, data = self.get_entry(next_id)
+            if data is None:
+                break
+            if names is None:
+                names = self.sensor_names()
+            records.append(IPMISELRecord(data, names))
+        self.added = added
+        return records
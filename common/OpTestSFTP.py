@@ -0,0 +1,504 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestSFTP.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestSFTP
+#  File transfers to and from the host and BMC over SSH.
+#
+#  With paramiko installed files go over SFTP with large channel windows
+#  and pipelined requests; without it, they stream over an exec channel of
+#  an OpenSSH ControlMaster connection (which needs sshpass for password
+#  logins). If neither is there, plain scp and ssh are driven through
+#  pexpect, as op-test always did, without resuming or compression.
+#  Either way a transfer:
+#   - reports progress and the MB/s it achieved,
+#   - resumes a partial copy left by an earlier attempt, once the part
+#     already there is confirmed by its SHA-256, and skips files that
+#     are already there whole,
+#   - checks the SHA-256 of the whole file on both ends, copying again
+#     from scratch once before giving up.
+#
+#  Uploads can also be streamed compressed (gzip, or xz with lzma
+#  installed here) into a decompressor on the target, for images like
+#  PNORs that are mostly erased flash. The SHA-256 checked at the end is
+#  of the decompressed file.
+
+import os
+import re
+import time
+import zlib
+import pipes
+import pexpect
+import hashlib
+import subprocess
+from collections import namedtuple
+
+try:
+    import paramiko
+except ImportError:
+    paramiko = None
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+from OpTestError import OpTestError
+from OpTestSSH import SSHChannelPool, SSH_OPTS
+
+TransferResult = namedtuple('TransferResult',
+                            'source destination size sent seconds rate sha256 resumed wire')
+
+# Compression for uploads: how to undo it on the target, and a compressor
+# here. In order of preference for 'auto', gzip being the cheaper one to
+# decompress on a BMC.
+COMPRESSION = [('gzip', 'gzip -dc',
+                lambda: zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS))]
+if lzma:
+    COMPRESSION.append(('xz', 'xz -dc', lambda: lzma.LZMACompressor(preset=1)))
+
+# 'auto' sends a file as it is unless its start compresses to less than this
+AUTO_RATIO = 0.9
+
+##
+# @brief SHA-256 of a local file, or of its first length bytes
+#
+def local_sha256(path, length=None, chunk=1024 * 1024):
+    h = hashlib.sha256()
+    left = length
+    with open(path, 'rb') as f:
+        while left is None or left > 0:
+            data = f.read(chunk if left is None else min(chunk, left))
+            if not data:
+                break
+            h.update(data)
+            if left is not None:
+                left -= len(data)
+    return h.hexdigest()
+
+class Progress():
+    def __init__(self, name, size, offset, interval):
+        self.name = name
+        self.size = size
+        self.done = offset
+        self.offset = offset
+        self.wire = 0
+        self.interval = interval
+        self.start = time.time()
+        self.last = self.start
+
+    def rate(self):
+        elapsed = max(time.time() - self.start, 0.001)
+        return (self.done - self.offset) / elapsed / (1024 * 1024)
+
+    ##
+    # @param wire @type int: bytes that went over the wire for count, if
+    #        not count
+    #
+    def update(self, count, wire=None):
+        self.done += count
+        self.wire += count if wire is None else wire
+        now = time.time()
+        if self.interval and now - self.last >= self.interval:
+            self.last = now
+            print "# %s: %.1f/%.1f MB (%d%%) %.1f MB/s" % (
+                self.name, self.done / 1048576.0, self.size / 1048576.0,
+                100 * self.done / max(self.size, 1), self.rate())
+
+##
+# @brief Standard input of a command on the other end
+#
+class RemoteWriter():
+    def __init__(self, engine, command):
+        engine.connect()
+        self.chan = None
+        self.p = None
+        if engine.sftp:
+            self.chan = engine.transport.open_session()
+            self.chan.exec_command(command)
+        else:
+            self.p = engine.pool.popen(command, stdin=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+
+    def write(self, data):
+        if self.chan:
+            self.chan.sendall(data)
+        else:
+            self.p.stdin.write(data)
+
+    ##
+    # @return (exit code, stderr) of the command
+    #
+    def close(self):
+        if self.chan:
+            self.chan.shutdown_write()
+            rc = self.chan.recv_exit_status()
+            return rc, self.chan.makefile_stderr('rb').read()
+        self.p.stdin.close()
+        error = self.p.stderr.read()
+        self.p.wait()
+        return self.p.returncode, error
+
+class SFTPEngine():
+    CHUNK = 1024 * 1024
+    WINDOW = 64 * 1024 * 1024
+    PACKET = 256 * 1024
+
+    ##
+    # @param progress @type int: seconds between progress reports, 0 for none
+    # @param compress @type string: upload compression, None (or 'none'),
+    #        'gzip', 'xz' or 'auto' (the first the target can undo, if the
+    #        file compresses)
+    #
+    def __init__(self, ip, username, password, port=22, progress=5, compress=None):
+        self.ip = ip
+        self.username = username
+        self.password = password
+        self.port = port
+        self.progress = progress
+        self.compress = compress
+        self.decompressors = None
+        self.transport = None
+        self.sftp = None
+        self.pool = None
+        self.scp = False
+        self.results = []
+
+    def connect(self):
+        if self.pool or self.scp or (self.sftp and self.transport.is_active()):
+            return
+        if paramiko:
+            print "#SFTP CONNECT %s@%s" % (self.username, self.ip)
+            t = paramiko.Transport((self.ip, self.port),
+                                   default_window_size=self.WINDOW,
+                                   default_max_packet_size=self.PACKET)
+            t.connect(username=self.username, password=self.password)
+            self.transport = t
+            self.sftp = paramiko.SFTPClient.from_transport(t, window_size=self.WINDOW,
+                                                           max_packet_size=self.PACKET)
+        else:
+            pool = SSHChannelPool(self.ip, self.username, self.password, port=self.port)
+            if pool.connect():
+                self.pool = pool
+            else:
+                pool.close()
+                print "# No paramiko or SSH ControlMaster for %s, copying with scp" % self.ip
+                self.scp = True
+
+    def close(self):
+        if self.sftp:
+            self.sftp.close()
+            self.transport.close()
+            self.sftp = None
+            self.transport = None
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+        self.scp = False
+
+    ##
+    # @brief Run ssh or scp on a pty, answering its password prompts
+    #
+    # @return (exit code, output less the prompts)
+    #
+    def spawn(self, args):
+        output, rc = pexpect.run(' '.join(pipes.quote(a) for a in args), timeout=None,
+                                 withexitstatus=True,
+                                 events={'(?i)password: ?': (self.password or '') + '\n'})
+        output = re.sub(r'(?im)^.*password: ?\r*\n?', '', output)
+        return rc, re.sub(r'\r+\n', '\n', output)
+
+    def scp_copy(self, source, destination):
+        rc, output = self.spawn(['scp', '-q'] + SSH_OPTS + ['-P', str(self.port),
+                                                           source, destination])
+        if rc != 0:
+            raise OpTestError("scp %s %s failed: %s" % (source, destination, output))
+
+    def scp_remote(self, path):
+        return '%s@%s:%s' % (self.username, self.ip, path)
+
+    ##
+    # @brief Run a command on the other end as the login user
+    #
+    # @return (exit code, stdout)
+    #
+    def execute(self, command):
+        self.connect()
+        if self.sftp:
+            chan = self.transport.open_session()
+            chan.exec_command(command)
+            output = chan.makefile('rb').read()
+            return chan.recv_exit_status(), output
+        if self.scp:
+            return self.spawn(['ssh'] + SSH_OPTS + ['-p', str(self.port),
+                                                    '%s@%s' % (self.username, self.ip),
+                                                    command])
+        p = self.pool.popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+        output, error = p.communicate()
+        return p.returncode, output
+
+    def remote_size(self, path):
+        self.connect()
+        if self.sftp:
+            try:
+                return self.sftp.stat(path).st_size
+            except IOError:
+                return None
+        rc, output = self.execute("wc -c < %s" % pipes.quote(path))
+        if rc != 0:
+            return None
+        return int(output.split()[0])
+
+    ##
+    # @return hex SHA-256 of the remote file (or of its first length bytes),
+    #         None if there is no sha256sum over there
+    #
+    def remote_sha256(self, path, length=None):
+        if length is None:
+            cmd = "sha256sum < %s" % pipes.quote(path)
+        else:
+            cmd = "head -c %d %s | sha256sum" % (length, pipes.quote(path))
+        rc, output = self.execute(cmd)
+        if rc != 0 or not output.split():
+            return None
+        return output.split()[0]
+
+    def remote_is_dir(self, path):
+        return self.execute("test -d %s" % pipes.quote(path))[0] == 0
+
+    ##
+    # @brief Copy a local file to the other end
+    #
+    # @param remote @type string: file name, or a directory to copy into
+    #
+    # @return TransferResult or raise OpTestError
+    #
+    def put(self, local, remote, resume=True):
+        self.connect()
+        if remote.endswith('/') or self.remote_is_dir(remote):
+            remote = os.path.join(remote, os.path.basename(local))
+        size = os.path.getsize(local)
+        sha256 = local_sha256(local)
+        name = "put %s" % os.path.basename(local)
+        method = self.compression(local)
+        if method:
+            def copy(source, destination, offset, progress):
+                self.send_compressed(source, destination, offset, progress, method)
+        else:
+            copy = self.send
+        return self.transfer(name, local, remote, size, sha256, resume,
+                             self.remote_size, self.remote_sha256,
+                             local_sha256, copy)
+
+    ##
+    # @brief How to compress local on its way over, if at all
+    #
+    # @return name of a COMPRESSION entry or None
+    #
+    def compression(self, local):
+        if self.compress in (None, 'none') or self.scp:
+            return None
+        if self.compress != 'auto' and self.compress not in [n for n, u, c in COMPRESSION]:
+            print "# Can't compress with %s here (no lzma module?), sending %s as it is" % (
+                self.compress, os.path.basename(local))
+            return None
+        if self.decompressors is None:
+            rc, output = self.execute(
+                "for c in %s; do command -v $c >/dev/null 2>&1 && echo $c; done"
+                % ' '.join(name for name, undo, compressor in COMPRESSION))
+            self.decompressors = output.split()
+        for name, undo, compressor in COMPRESSION:
+            if self.compress not in ('auto', name) or name not in self.decompressors:
+                continue
+            if self.compress == 'auto':
+                with open(local, 'rb') as f:
+                    sample = f.read(self.CHUNK)
+                c = compressor()
+                if len(c.compress(sample) + c.flush()) > AUTO_RATIO * len(sample):
+                    return None
+            return name
+        print "# No %s on %s to decompress with, sending %s as it is" % (
+            self.compress if self.compress != 'auto' else 'decompressor', self.ip,
+            os.path.basename(local))
+        return None
+
+    ##
+    # @brief Copy a file from the other end here
+    #
+    # @param local @type string: file name, or a directory to copy into
+    #
+    # @return TransferResult or raise OpTestError
+    #
+    def get(self, remote, local, resume=True):
+        self.connect()
+        if os.path.isdir(local):
+            local = os.path.join(local, os.path.basename(remote))
+        size = self.remote_size(remote)
+        if size is None:
+            raise OpTestError("No file %s on %s to copy" % (remote, self.ip))
+        sha256 = self.remote_sha256(remote)
+        def size_here(path):
+            return os.path.getsize(path) if os.path.exists(path) else None
+        name = "get %s" % os.path.basename(remote)
+        return self.transfer(name, remote, local, size, sha256, resume,
+                             size_here, local_sha256, self.remote_sha256, self.receive)
+
+    ##
+    # @param dest_size, dest_sha256, source_sha256: what the destination
+    #        holds so far, how to hash it and a prefix of the source
+    # @param copy: fn(source, destination, offset, progress)
+    #
+    def transfer(self, name, source, destination, size, sha256, resume,
+                 dest_size, dest_sha256, source_sha256, copy):
+        for attempt in range(2):
+            offset = 0
+            have = dest_size(destination) if resume and attempt == 0 else None
+            if have == size and sha256 and dest_sha256(destination) == sha256:
+                print "# %s: already there (%d bytes, sha256 %s)" % (name, size, sha256)
+                offset = size
+            elif have and have < size and sha256 and not self.scp \
+                 and dest_sha256(destination, have) == source_sha256(source, have):
+                print "# %s: resuming at %d of %d bytes" % (name, have, size)
+                offset = have
+            progress = Progress(name, size, offset, self.progress)
+            if offset < size:
+                copy(source, destination, offset, progress)
+            seconds = time.time() - progress.start
+            wire = progress.wire
+            got = dest_sha256(destination)
+            if sha256 is None or got is None:
+                # Nothing to hash with on one end, the size has to do
+                print "# %s: no sha256sum on %s, checking size only" % (name, self.ip)
+                ok = dest_size(destination) == size
+            else:
+                ok = got == sha256
+            if ok:
+                rate = (size - offset) / max(seconds, 0.001) / (1024 * 1024)
+                result = TransferResult(source, destination, size, size - offset, seconds,
+                                        rate, sha256, offset > 0, wire)
+                self.results.append(result)
+                if wire != result.sent:
+                    print "# %s: %d bytes as %d compressed (%.1f:1) in %.1fs, " \
+                        "%.1f MB/s effective, sha256 %s" % (
+                        name, result.sent, wire, float(result.sent) / max(wire, 1),
+                        seconds, result.rate, sha256)
+                else:
+                    print "# %s: %d bytes in %.1fs, %.1f MB/s, sha256 %s" % (
+                        name, result.sent, seconds, result.rate, sha256)
+                return result
+            print "# %s: sha256 mismatch (%s, expected %s), copying again" % (name, got, sha256)
+        raise OpTestError("%s to %s failed: copy doesn't match the original" % (name, self.ip))
+
+    def send(self, local, remote, offset, progress):
+        with open(local, 'rb') as f:
+            f.seek(offset)
+            if self.sftp:
+                rf = self.sftp.open(remote, 'r+' if offset else 'w')
+                try:
+                    rf.seek(offset)
+                    rf.set_pipelined(True)
+                    self.copy_stream(f, rf, progress)
+                finally:
+                    rf.close()
+                return
+            if self.scp:
+                self.scp_copy(local, self.scp_remote(remote))
+                progress.update(progress.size - offset)
+                return
+            p = self.pool.popen("cat %s %s" % ('>>' if offset else '>', pipes.quote(remote)),
+                                stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                self.copy_stream(f, p.stdin, progress)
+            finally:
+                p.stdin.close()
+                error = p.stderr.read()
+                p.wait()
+            if p.returncode != 0:
+                raise OpTestError("Copy to %s:%s failed: %s" % (self.ip, remote, error))
+
+    ##
+    # @brief Stream local from offset through a compressor here into its
+    #        decompressor on the other end
+    #
+    def send_compressed(self, local, remote, offset, progress, method):
+        undo, compressor = [(u, c) for n, u, c in COMPRESSION if n == method][0]
+        c = compressor()
+        writer = RemoteWriter(self, "%s %s %s" % (undo, '>>' if offset else '>',
+                                                 pipes.quote(remote)))
+        try:
+            with open(local, 'rb') as f:
+                f.seek(offset)
+                while True:
+                    data = f.read(self.CHUNK)
+                    if not data:
+                        break
+                    packed = c.compress(data)
+                    writer.write(packed)
+                    progress.update(len(data), len(packed))
+            packed = c.flush()
+            writer.write(packed)
+            progress.update(0, len(packed))
+        finally:
+            rc, error = writer.close()
+        if rc != 0:
+            raise OpTestError("Compressed copy to %s:%s failed: %s" % (self.ip, remote, error))
+
+    def receive(self, remote, local, offset, progress):
+        if self.scp:
+            self.scp_copy(self.scp_remote(remote), local)
+            progress.update(progress.size - offset)
+            return
+        with open(local, 'ab' if offset else 'wb') as f:
+            f.truncate(offset)
+            if self.sftp:
+                rf = self.sftp.open(remote, 'r')
+                try:
+                    rf.seek(offset)
+                    rf.prefetch(progress.size - offset)
+                    self.copy_stream(rf, f, progress)
+                finally:
+                    rf.close()
+                return
+            p = self.pool.popen("tail -c +%d %s" % (offset + 1, pipes.quote(remote)),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                self.copy_stream(p.stdout, f, progress)
+            finally:
+                error = p.stderr.read()
+                p.wait()
+            if p.returncode != 0:
+                raise OpTestError("Copy from %s:%s failed: %s" % (self.ip, remote, error))
+
+    def copy_stream(self, src, dst, progress):
+        while True:
+            data = src.read(self.CHUNK)
+            if not data:
+                break
+            dst.write(data)
+            progress.update(len(data))
@@ -0,0 +1,333 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestSSH.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestSSH
+#  Non-interactive SSH exec channels multiplexed over one authenticated
+#  connection.
+#
+#  SSHChannelPool logs in once with an OpenSSH ControlMaster and then runs
+#  each command on its own channel of that connection, so commands from
+#  several threads run side by side and come back with separate stdout,
+#  stderr and exit status, with no prompt to scrape. Anything that needs
+#  shell state (cd, exported variables) still belongs on SSHConnection.
+#
+#  Needs the OpenSSH client, and sshpass for password logins.
+
+import os
+import atexit
+import time
+import pipes
+import signal
+import shutil
+import Queue
+import tempfile
+import threading
+import subprocess
+from collections import namedtuple
+
+from Exceptions import CommandFailed
+from OpTestConsole import CommandBatch
+
+SSHResult = namedtuple('SSHResult', 'command stdout stderr exitcode latency wait channel')
+
+SSH_OPTS = ['-o', 'StrictHostKeyChecking=no',
+            '-o', 'UserKnownHostsFile=/dev/null',
+            '-o', 'LogLevel=ERROR']
+
+class SSHChannelPool():
+
+    ##
+    # @brief Initialize this object, nothing connects until the first command
+    #
+    # @param max_channels @type int: most commands to run at once
+    # @param fallback @type SSHConnection: where commands go, one at a time,
+    #        if a ControlMaster can't be set up
+    #
+    def __init__(self, ip, username, password, max_channels=4, port=22,
+                 fallback=None):
+        self.ip = ip
+        self.username = username
+        self.password = password
+        self.port = port
+        self.max_channels = max_channels
+        self.fallback = fallback
+        self.fallback_lock = threading.Lock()
+        self.master_lock = threading.Lock()
+        self.master = None
+        self.control_dir = None
+        self.channels = Queue.Queue()
+        for i in range(max_channels):
+            self.channels.put(i)
+        self.stats = {}
+        self.channel_stats = {}
+        self.stats_lock = threading.Lock()
+        # the master outlives us otherwise (ControlPersist)
+        atexit.register(self.close)
+
+    def control_path(self):
+        return os.path.join(self.control_dir, 'master')
+
+    def ssh_args(self, *args):
+        return (['ssh'] + SSH_OPTS + ['-o', 'ControlPath=%s' % self.control_path(),
+                                      '-p', str(self.port)]
+                + list(args) + ['%s@%s' % (self.username, self.ip)])
+
+    def master_alive(self):
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.call(self.ssh_args('-O', 'check'),
+                                   stdout=devnull, stderr=devnull) == 0
+
+    ##
+    # @brief Log in and leave the master connection running in the background
+    #
+    # @return True if channels can be opened over it
+    #
+    def connect(self):
+        with self.master_lock:
+            if self.master and self.master_alive():
+                return True
+            if self.control_dir is None:
+                self.control_dir = tempfile.mkdtemp(prefix='op-test-ssh-')
+            cmd = self.ssh_args('-o', 'ControlMaster=yes', '-o', 'ControlPersist=yes',
+                                '-o', 'ConnectTimeout=30', '-N', '-f')
+            env = None
+            if self.password:
+                # -e reads SSHPASS, so the password isn't on a command line
+                cmd = ['sshpass', '-e'] + cmd
+                env = dict(os.environ, SSHPASS=self.password)
+            print "#SSH MASTER CONNECT %s@%s" % (self.username, self.ip)
+            try:
+                rc = subprocess.call(cmd, env=env)
+            except OSError as e:
+                print "# Can't start SSH ControlMaster: %s" % e
+                rc = -1
+            self.master = rc == 0 and self.master_alive()
+            if not self.master and self.fallback:
+                print "# SSH channels unavailable, commands go over the shared SSH session"
+            return self.master
+
+    ##
+    # @brief Stop the master connection and remove its control directory.
+    #        Also run at exit.
+    #
+    def close(self):
+        with self.master_lock:
+            if self.master:
+                with open(os.devnull, 'w') as devnull:
+                    subprocess.call(self.ssh_args('-O', 'exit'),
+                                    stdout=devnull, stderr=devnull)
+            self.master = None
+            if self.control_dir:
+                shutil.rmtree(self.control_dir, ignore_errors=True)
+                self.control_dir = None
+
+    ##
+    # @brief Run a command on its own channel
+    #
+    #        Blocks while max_channels commands are already running. A
+    #        command still running after timeout comes back with exitcode
+    #        None. Only the local ssh client is killed then. The channel
+    #        has no tty, so the remote command isn't signalled: it goes
+    #        on running on the host until it exits or next writes output
+    #        (and gets SIGPIPE). Wrap commands that may hang in timeout(1)
+    #        on the host side.
+    #
+    # @return SSHResult
+    #
+    def run(self, command, timeout=300):
+        if self.master is None:
+            self.connect()
+        start = time.time()
+        channel = self.channels.get()
+        wait = time.time() - start
+        try:
+            if not self.master and self.fallback:
+                result = self.run_fallback(command, timeout, wait, channel)
+            else:
+                result = self.run_channel(command, timeout, wait, channel)
+                # 255 is ssh's own failure; the master may have gone with a reboot
+                if result.exitcode == 255 and not self.master_alive():
+                    print "# SSH master connection lost, reconnecting"
+                    self.master = None
+                    self.connect()
+                    result = self.run_channel(command, timeout, wait, channel)
+        finally:
+            self.channels.put(channel)
+        self.account(result)
+        return result
+
+    def run_channel(self, command, timeout, wait, channel):
+        stdin = None
+        remote = command
+        if self.username != 'root':
+            remote = "sudo -S -p '' sh -c %s" % pipes.quote(command)
+            stdin = self.password + '\n'
+        start = time.time()
+        p = subprocess.Popen(self.ssh_args('-o', 'ControlMaster=no', '-T') + [remote],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE, preexec_fn=os.setsid)
+        killed = []
+        def kill():
+            killed.append(True)
+            try:
+                os.killpg(p.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            stdout, stderr = p.communicate(stdin)
+        finally:
+            timer.cancel()
+        exitcode = None if killed else p.returncode
+        return SSHResult(command, stdout, stderr, exitcode, time.time() - start, wait, channel)
+
+    ##
+    # @brief A raw channel for streaming, as the login user (no sudo) and
+    #        outside the channel cap. Reconnects the master if it has gone.
+    #
+    # @return subprocess.Popen of the ssh client running command
+    #
+    def popen(self, command, **kwargs):
+        if not self.connect():
+            raise CommandFailed(command, ["No SSH master connection to %s" % self.ip], -1)
+        return subprocess.Popen(self.ssh_args('-o', 'ControlMaster=no', '-T') + [command],
+                                **kwargs)
+
+    def run_fallback(self, command, timeout, wait, channel):
+        with self.fallback_lock:
+            start = time.time()
+            try:
+                output = self.fallback.run_command(command, timeout)
+                exitcode = 0
+            except CommandFailed as cf:
+                output = cf.output
+                exitcode = None if cf.output == ["TIMEOUT"] else cf.exitcode
+        stdout = ''.join(l + '\n' for l in output)
+        return SSHResult(command, stdout, '', exitcode, time.time() - start, wait, channel)
+
+    ##
+    # @brief Run commands concurrently, at most max_channels at a time
+    #
+    # @return list of SSHResult in the order of commands
+    #
+    def map(self, commands, timeout=300):
+        results = [None] * len(commands)
+        def worker(i):
+            results[i] = self.run(commands[i], timeout)
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(commands))]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    ##
+    # @brief Like SSHConnection.run_command(), stderr is only in the exception
+    #
+    # @return list of stdout lines or raise CommandFailed
+    #
+    def run_command(self, command, timeout=300):
+        result = self.run(command, timeout)
+        if result.exitcode is None:
+            raise CommandFailed(command, ["TIMEOUT"], -1)
+        if result.exitcode != 0:
+            raise CommandFailed(command, (result.stdout + result.stderr).splitlines(),
+                                result.exitcode)
+        return result.stdout.splitlines()
+
+    # This command just runs and returns the ouput & ignores the failure
+    def run_command_ignore_fail(self, command, timeout=60):
+        try:
+            output = self.run_command(command, timeout)
+        except CommandFailed as cf:
+            output = cf.output
+        return output
+
+    ##
+    # @brief Run a list of commands in order on one channel, stderr merged
+    #        into the output as on a console
+    #
+    # @param timeout @type int: seconds per command
+    #
+    # @return list of CommandResult, or raise CommandFailed for the first
+    #         failing command (the rest are not run)
+    #
+    def run_batch(self, commands, timeout=300, ignore_fail=False):
+        batch = CommandBatch(commands, ignore_fail)
+        result = self.run('exec 2>&1; ' + batch.line, timeout * len(batch.commands))
+        complete = batch.parse(result.stdout)
+        if not complete:
+            if result.exitcode is None:
+                raise CommandFailed(batch.pending(), ["TIMEOUT"], -1)
+            raise CommandFailed(batch.pending(), (result.stdout + result.stderr).splitlines(),
+                                result.exitcode)
+        if not ignore_fail:
+            batch.check()
+        return batch.results
+
+    def run_batch_ignore_fail(self, commands, timeout=60):
+        return self.run_batch(commands, timeout, ignore_fail=True)
+
+    def account(self, result):
+        with self.stats_lock:
+            stat = self.stats.setdefault(result.command, {'count': 0, 'errors': 0,
+                                                          'total': 0.0, 'max': 0.0})
+            stat['count'] += 1
+            stat['total'] += result.latency
+            stat['max'] = max(stat['max'], result.latency)
+            if result.exitcode != 0:
+                stat['errors'] += 1
+            chan = self.channel_stats.setdefault(result.channel, {'count': 0, 'busy': 0.0,
+                                                                  'wait': 0.0})
+            chan['count'] += 1
+            chan['busy'] += result.latency
+            chan['wait'] += result.wait
+
+    ##
+    # @brief Per command latency and error counts
+    #
+    # @return dict of command to dict with count, errors, average and max (seconds)
+    #
+    def report(self):
+        with self.stats_lock:
+            report = {}
+            for cmd, stat in self.stats.items():
+                report[cmd] = {'count': stat['count'], 'errors': stat['errors'],
+                               'average': stat['total'] / stat['count'],
+                               'max': stat['max']}
+            return report
+
+    ##
+    # @brief Per channel use
+    #
+    # @return dict of channel number to dict with count, busy (seconds
+    #         running commands) and wait (seconds callers queued for it)
+    #
+    def channel_report(self):
+        with self.stats_lock:
+            return dict((c, dict(s)) for c, s in self.channel_stats.items())
@@ -0,0 +1,148 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestSysfs.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestSysfs
+#  Bulk sysfs/procfs reads on the host or in skiroot.
+#
+#  A small POSIX shell agent is pushed to the target the first time it is
+#  needed (and again whenever it has gone, e.g. after a reboot). It takes
+#  any number of path globs, expands them on the target and prints every
+#  matching file with its contents in one framed listing, so reading an
+#  attribute of every PCI device or every CPU costs one exchange rather
+#  than one per file.
+
+import re
+from collections import OrderedDict
+
+from Exceptions import CommandFailed
+
+AGENT_PATH = '/tmp/op-test-sysq.sh'
+
+# Pushed with printf '%s\n', so no single quotes in here
+AGENT = [
+    '# op-test sysfs/procfs query agent: sh op-test-sysq.sh GLOB...',
+    'for g in "$@"; do',
+    '  for f in $g; do',
+    '    if [ -d "$f" ]; then',
+    '      echo "@@D $f"',
+    '    elif [ ! -e "$f" ]; then',
+    '      echo "@@N $f"',
+    '    elif v=$(cat "$f" 2>&1); then',
+    '      echo "@@V $f"',
+    '      [ -n "$v" ] && printf "%s\\n" "$v"',
+    '    else',
+    '      echo "@@X $f"',
+    '      printf "%s\\n" "$v"',
+    '    fi',
+    '  done',
+    'done',
+    'echo "@@Z"',
+]
+
+##
+# @brief Values of the files that matched, in the order the target listed
+#        them, by path.
+#
+#        dirs lists matching directories, missing the globs (or paths)
+#        that matched nothing and errors the files that could not be read,
+#        with the error.
+#
+class SysfsValues(OrderedDict):
+    def __init__(self):
+        OrderedDict.__init__(self)
+        self.dirs = []
+        self.missing = []
+        self.errors = OrderedDict()
+
+##
+# @brief Reads sysfs/procfs through the agent
+#
+# @param console: the target shell, anything with run_command()
+#
+class SysfsAgent():
+    def __init__(self, console):
+        self.console = console
+
+    def push(self, timeout=60):
+        self.console.run_command("printf '%%s\\n' %s > %s" % (
+            ' '.join("'%s'" % l for l in AGENT), AGENT_PATH), timeout)
+
+    ##
+    # @brief Read every file matching globs
+    #
+    # @param globs @type list: shell globs, e.g.
+    #        "/sys/bus/pci/devices/*/eeh_pe_config_addr"
+    #
+    # @return SysfsValues
+    #
+    def query(self, globs, timeout=60):
+        for g in globs:
+            if "'" in g:
+                raise ValueError("Can't query %s" % g)
+        cmd = "sh %s %s" % (AGENT_PATH, ' '.join("'%s'" % g for g in globs))
+        try:
+            res = self.console.run_command(cmd, timeout)
+        except CommandFailed:
+            res = []
+        if '@@Z' not in res:
+            # Not there yet, or gone with a reboot
+            self.push(timeout)
+            res = self.console.run_command(cmd, timeout)
+        return self.parse(res)
+
+    def parse(self, lines):
+        values = SysfsValues()
+        current = None
+        for l in lines:
+            m = re.match('@@([DNVXZ]) ?(.*)', l)
+            if not m:
+                if current is not None:
+                    current.append(l)
+                continue
+            kind, path = m.groups()
+            current = None
+            if kind == 'D':
+                values.dirs.append(path)
+            elif kind == 'N':
+                values.missing.append(path)
+            elif kind in 'VX':
+                current = []
+                (values if kind == 'V' else values.errors)[path] = current
+        for d in (values, values.errors):
+            for path in d:
+                d[path] = '\n'.join(d[path])
+        return values
+
+    ##
+    # @brief Contents of one file
+    #
+    # @return string or raise CommandFailed
+    #
+    def read(self, path, timeout=60):
+        values = self.query([path], timeout)
+        if path not in values:
+            raise CommandFailed("cat %s" % path, values.errors.get(path, "No such file"), 1)
+        return values[path]
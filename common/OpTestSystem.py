@@ -30,6 +30,7 @@
 #  This class encapsulates all interfaces and classes required to do end to end
 #  automated flashing and testing of OpenPower systems.
 
+import os
 import time
 import subprocess
 import pexpect
@@ -42,6 +43,8 @@ from OpTestError import OpTestError
 from OpTestHost import OpTestHost
 from OpTestUtil import OpTestUtil
 from OpTestHost import SSHConnectionState
+from OpTestMilestones import BootMilestones, BootMilestone
+from Exceptions import BootFailure
 
 
 class OpSystemState():
@@ -78,6 +81,9 @@ class OpTestSystem(object):
         self.rest = self.bmc.get_rest_api()
         self.console = self.bmc.get_host_console()
         self.util = OpTestUtil()
+        # Boot milestones seen on the host console, which the state
+        # handlers below wait on
+        self.milestones = BootMilestones()
 
         # We have a state machine for going in between states of the system
         # initially, everything in UNKNOWN, so we reset things.
@@ -132,14 +138,26 @@ class OpTestSystem(object):
 
     def set_state(self, state):
         self.state = state
+        self.check_host_facts()
+
+    ##
+    # @brief Facts about the host OS only hold while we stay in the OS state
+    #
+    def check_host_facts(self):
+        if self.state != OpSystemState.OS and self.cv_HOST:
+            self.cv_HOST.facts.invalidate()
 
     def goto_state(self, state):
         print "OpTestSystem START STATE: %s (target %s)" % (self.state, state)
         while 1:
             self.state = self.stateHandlers[self.state](state)
             print "OpTestSystem TRANSITIONED TO: %s" % (self.state)
+            self.check_host_facts()
             if self.state == state:
                 break;
+        timeline = self.milestones.timeline()
+        if timeline:
+            print "OpTestSystem BOOT MILESTONES: %s" % timeline
 
     def run_UNKNOWN(self, state):
         self.sys_power_off()
@@ -162,6 +180,7 @@ class OpTestSystem(object):
         if state == OpSystemState.PETITBOOT or state == OpSystemState.PETITBOOT_SHELL:
             self.sys_set_bootdev_setup()
 
+        self.milestones.new_boot()
         r = self.sys_power_on()
         # Only retry once
         if r == BMC_CONST.FW_FAILED:
@@ -177,7 +196,8 @@ class OpTestSystem(object):
 
         try:
             self.wait_for_petitboot()
-        except pexpect.TIMEOUT:
+        except (pexpect.TIMEOUT, BootFailure) as e:
+            print str(e)
             self.sys_sel_check()
             return OpSystemState.UNKNOWN
 
@@ -540,6 +560,8 @@ class OpTestSystem(object):
         # Check if partition is active
         try:
             self.util.PingFunc(self.cv_HOST.ip, totalSleepTime=2)
+            # Actually talk to the host, not the facts from last time
+            self.cv_HOST.facts.invalidate()
             self.cv_HOST.host_get_OS_Level()
         except OpTestError as e:
             print("Trying to recover partition after error: %s" % (e) )
@@ -1224,13 +1246,39 @@ class OpTestSystem(object):
             raise OpTestError(l_msg)
 
         self.cv_IPMI.ipmi_set_boot_to_petitboot()
+        self.milestones.new_boot()
         self.cv_IPMI.ipmi_power_on()
 
         self.wait_for_petitboot()
         self.petitboot_exit_to_shell()
 
+    ##
+    # @brief Later expect()s on the console start after a milestone, as if
+    #        it had been expect()ed for
+    #
+    def consume_milestone(self, console, event):
+        if event.console is console:
+            console.skip_to(event.offset)
+
     def wait_for_petitboot(self):
         console = self.console.get_console()
+        if not self.milestones.attach(console):
+            return self.expect_petitboot(console)
+        # Wait for petitboot (for a *LOOONNNG* time due to verbose IPLs):
+        # its banner and menu. The console keeps being drained meanwhile,
+        # so only give up once it stops making progress, or on the
+        # overall timeout.
+        try:
+            event = self.milestones.wait_for([BootMilestone.PETITBOOT], count=2,
+                                             timeout=BMC_CONST.PETITBOOT_TIMEOUT,
+                                             idle=BMC_CONST.CONSOLE_IDLE_TIMEOUT)
+        except pexpect.TIMEOUT as e:
+            print "Timeout waiting for Petitboot!"
+            print str(e)
+            raise e
+        self.consume_milestone(console, event)
+
+    def expect_petitboot(self, console):
         try:
             # Wait for petitboot (for a *LOOONNNG* time due to verbose IPLs)
             seen = 0
@@ -1253,7 +1301,10 @@ class OpTestSystem(object):
     def wait_for_kexec(self):
         console = self.console.get_console()
         # Wait for kexec to start
-        console.expect(['Performing kexec','kexec_core: Starting new kernel'], timeout=60)
+        if not self.milestones.attach(console):
+            console.expect(['Performing kexec','kexec_core: Starting new kernel'], timeout=60)
+            return
+        self.consume_milestone(console, self.milestones.wait_for([BootMilestone.KEXEC], timeout=60))
 
     def petitboot_exit_to_shell(self):
         console = self.console.get_console()
@@ -1262,19 +1313,26 @@ class OpTestSystem(object):
         console.send('x')
         console.expect('Exiting petitboot')
         console.expect('#')
-        # we should have consumed everything in the buffer now.
+        # we should have consumed everything in the buffer now, and the
+        # milestones of the redraw along with it
+        self.milestones.consume()
         print console
 
     def exit_petitboot_shell(self):
         console = self.console.get_console()
         console.sendcontrol('l')
+        # only the Petitboot that 'exit' brings back counts
+        self.milestones.consume()
         console.sendline('exit')
         self.wait_for_petitboot()
 
     def wait_for_login(self, timeout=600):
         console = self.console.get_console()
         console.sendline('')
-        console.expect('login: ', timeout)
+        if not self.milestones.attach(console):
+            console.expect('login: ', timeout)
+            return
+        self.consume_milestone(console, self.milestones.wait_for([BootMilestone.LOGIN], timeout=timeout))
 
 
 class OpTestFSPSystem(OpTestSystem):
@@ -1293,8 +1351,8 @@ class OpTestFSPSystem(OpTestSystem):
         return self.cv_BMC.wait_for_standby(i_timeout)
 
     def wait_for_petitboot(self):
-        # Ensure IPMI console is open so not to miss petitboot
-        console = self.console.get_console()
+        # Ensure IPMI console is open and tracked so not to miss petitboot
+        self.milestones.attach(self.console.get_console())
         self.cv_BMC.wait_for_runtime()
         return super(OpTestFSPSystem, self).wait_for_petitboot()
 
@@ -1318,7 +1376,8 @@ class OpTestOpenBMCSystem(OpTestSystem):
                  i_ffdcDir=None,
                  host=None,
                  bmc=None,
-                 state=OpSystemState.UNKNOWN):
+                 state=OpSystemState.UNKNOWN,
+                 management=None):
         # Ensure we grab host console early, in order to not miss
         # any messages
         self.console = bmc.get_host_console()
@@ -1326,59 +1385,66 @@ class OpTestOpenBMCSystem(OpTestSystem):
                                               host=host,
                                               bmc=bmc,
                                               state=state)
+        # What the sys_ calls below go through: HostManagement (the D-Bus
+        # REST API) unless given another backend, such as RedfishManagement
+        self.management = management or self.rest
+        if i_ffdcDir:
+            self.management.sel_cursor.logfile = os.path.join(i_ffdcDir, 'host_sel_elist.log')
     # REST Based management
     def sys_inventory(self):
-        self.rest.get_inventory()
+        self.management.get_inventory()
 
     def sys_sensors(self):
-        self.rest.sensors()
+        self.management.sensors()
 
     def sys_bmc_state(self):
-        self.rest.get_bmc_state()
+        self.management.get_bmc_state()
 
     def sys_power_on(self):
-        self.rest.power_on()
+        self.management.power_on()
 
     def sys_power_off(self):
-        self.rest.power_off()
+        self.management.power_off()
 
     def sys_power_reset(self):
-        self.rest.hard_reboot()
+        self.management.hard_reboot()
 
     def sys_power_cycle(self):
-        self.rest.soft_reboot()
+        self.management.soft_reboot()
 
     def sys_power_soft(self):
         #self.rest.power_soft() currently rest command for softPowerOff failing
-        self.rest.power_off()
+        self.management.power_off()
 
     def sys_sdr_clear(self):
         # We can delete individual SEL entry by id
-        self.rest.clear_sel_by_id()
+        self.management.clear_sel_by_id()
         # Deleting complete SEL repository is not yet implemented
         #self.rest.clear_sel()
 
-    def sys_sel_check(self):
-        self.rest.list_sel()
+    def sys_sel_check(self, i_string="Transition to Non-recoverable"):
+        if self.management.check_sel(i_string):
+            return BMC_CONST.FW_FAILED
+        return BMC_CONST.FW_SUCCESS
 
     def sys_wait_for_standby_state(self, i_timeout=120):
-        self.rest.wait_for_standby()
+        self.management.wait_for_standby()
         return 0
 
     def wait_for_petitboot(self):
-        # Ensure IPMI console is open so not to miss petitboot
-        console = self.console.get_console()
-        self.rest.wait_for_runtime()
+        # Ensure IPMI console is open and tracked so not to miss petitboot
+        self.milestones.attach(self.console.get_console())
+        self.management.wait_for_runtime()
         return super(OpTestOpenBMCSystem, self).wait_for_petitboot()
 
     def sys_set_bootdev_setup(self):
-        self.rest.set_bootdev_to_setup()
+        self.management.set_bootdev_to_setup()
 
     def sys_set_bootdev_no_override(self):
-        self.rest.set_bootdev_to_none()
+        self.management.set_bootdev_to_none()
 
     def sys_warm_reset(self):
-        self.rest.bmc_reset()
+        self.management.bmc_reset()
 
 class OpTestQemuSystem(OpTestSystem):
     def __init__(self,
@@ -27,12 +27,104 @@
 
 ## @package OpTestTConnection
 #  TConnection-API to telnet connection
-#  This library of tconnection can use in cases if any platform has 
+#  This library of tconnection can use in cases if any platform has
 #  telnet connection to their SP/MC.(i.e EX: FSP uses tenet connection)
+#
+#  Each command goes out between begin/end markers, the end one carrying
+#  its exit code, so its output is found without relying on the prompt.
+#  Several commands can be in flight at once: the shell runs them in the
+#  order they were sent and a reader thread hands each its own output.
+#  Commands wait for ever unless given a timeout, as FSP operations like
+#  cupdmfg or a dump can take a long while. A command that doesn't finish
+#  by its timeout raises CommandFailed and drops the session, the next
+#  command logs in again.
 
+import re
+import time
+import socket
+import threading
 import telnetlib
+from collections import deque
+
+from Exceptions import CommandFailed
+from OpTestConsole import CommandFrame
+from OpTestError import OpTestError
+
+##
+# @brief One command sent on a TConnection, framed as
+#            echo @@OPT"B<id>"@@; { <command>; } </dev/null; echo @@OPT"E<id>:$?"@@
+#        stdin is /dev/null so a command can't eat the lines sent after it.
+#
+class TCommand():
+
+    def __init__(self, command):
+        self.command = command
+        self.id = '%s%d' % (CommandFrame.session, next(CommandFrame.counter))
+        separator = ' ' if command.rstrip().endswith('&') else '; '
+        self.line = 'echo @@OPT"B%s"@@; { %s%s} </dev/null; echo @@OPT"E%s:$?"@@' % (
+            self.id, command, separator, self.id)
+        self.begin = re.compile(re.escape('@@OPTB%s@@' % self.id) + r'\r?\n')
+        self.end = re.compile(re.escape('@@OPTE%s:' % self.id) + r'(\d+)@@')
+        self.started = False
+        self.sent = None
+        self.output = None
+        self.exitcode = None
+        self.elapsed = None
+        self.error = None
+        self.done = threading.Event()
+        self.on_timeout = None
+
+    def finish(self, output, exitcode):
+        self.output = output
+        self.exitcode = exitcode
+        self.elapsed = time.time() - self.sent
+        self.done.set()
+
+    def fail(self, output):
+        if not self.done.is_set():
+            self.error = CommandFailed(self.command, output, -1)
+            self.done.set()
+
+    def expire(self):
+        if not self.done.is_set():
+            self.on_timeout(self)
+
+    ##
+    # @brief Wait for the command to finish
+    #
+    # @param timeout @type int: seconds, None to wait for ever
+    #
+    # @return False if it hadn't within timeout (and the session has been
+    #         dropped), True otherwise
+    #
+    def wait(self, timeout=None):
+        if timeout is not None and not self.done.is_set():
+            # an untimed wait wakes as soon as the output is in, a timed
+            # one would sleep in slices
+            timer = threading.Timer(timeout, self.expire)
+            timer.daemon = True
+            timer.start()
+            self.done.wait()
+            timer.cancel()
+        else:
+            self.done.wait()
+        return self.error is None or self.error.output != "TIMEOUT"
+
+    ##
+    # @brief Output of the command as run_command() returns it
+    #
+    # @return output string whatever the exit code, or raise CommandFailed
+    #         if the command timed out or the session was lost
+    #
+    def result(self, timeout=None):
+        self.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return TConnection.clean(self.output)
 
 class TConnection():
+    # bytes of command lines in flight, a tty won't take a line over 4096
+    MAX_INFLIGHT = 2048
 
     ##
     # @brief Initialize this object
@@ -41,46 +133,200 @@ class TConnection():
     # @param user_name @type string: Userid to log into the SP/MC
     # @param password @type string: Password of the userid to log into the SP/MC
     # @param prompt @type string: $ or # type of prompt
+    # @param timeout @type int: seconds the login may take
+    # @param port @type int: telnet port
     #
-    def __init__(self, host_name, user_name, password, prompt):
+    def __init__(self, host_name, user_name, password, prompt, timeout=300, port=23):
         self.host_name = host_name
         self.user_name = user_name
         self.password = password
         self.prompt = prompt
+        self.timeout = timeout
+        self.port = port
         self.tn = None
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.inflight = 0
+        self.buffer = ''
+        # commands in flight at once, 1 if the shell's echo can't be
+        # turned off (it would land in the middle of earlier output)
+        self.depth = 1
 
     ##
     # @brief login to telnet connection of SP/MC
     #
     def login(self):
-        self.tn = telnetlib.Telnet(self.host_name)
-        self.tn.read_until('login: ')
-        self.tn.write(self.user_name + '\n')
-        self.tn.read_until('assword: ')
-        self.tn.write(self.password + '\n')
-        ret=self.tn.read_until(self.prompt)
-        assert self.prompt in ret
+        self.close()
+        deadline = time.time() + self.timeout
+        def read_until(text):
+            ret = tn.read_until(text, max(deadline - time.time(), 0))
+            if text not in ret:
+                tn.close()
+                raise OpTestError("Telnet login to %s failed, no '%s' in: %r" % (
+                    self.host_name, text, ret))
+            return ret
+        try:
+            tn = telnetlib.Telnet(self.host_name, self.port, self.timeout)
+            read_until('login: ')
+            tn.write(self.user_name + '\n')
+            read_until('assword: ')
+            tn.write(self.password + '\n')
+            read_until(self.prompt)
+        except (socket.error, EOFError) as e:
+            raise OpTestError("Telnet login to %s failed: %s" % (self.host_name, e))
+        tn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # the reader thread blocks in recv, close() shuts the socket down
+        tn.sock.settimeout(None)
+        with self.lock:
+            self.tn = tn
+            self.buffer = ''
+            self.depth = 1
+        reader = threading.Thread(target=self.read, args=(tn,))
+        reader.daemon = True
+        reader.start()
+        init = self.submit('stty -echo </dev/tty', login=False)
+        init.wait(self.timeout)
+        if init.error is None and init.exitcode == 0:
+            self.depth = 64
+
+    ##
+    # @brief Drop the session, failing any commands still in flight
+    #
+    # @param timed_out @type TCommand: the command that timed out, failed
+    #        with "TIMEOUT" once the session is detached so its caller's
+    #        next command can't go out on it
+    #
+    def close(self, reason="Telnet session closed", timed_out=None):
+        with self.lock:
+            tn, self.tn = self.tn, None
+            pending, self.pending = self.pending, deque()
+            self.inflight = 0
+        if timed_out is not None:
+            timed_out.fail("TIMEOUT")
+        if tn is not None:
+            try:
+                tn.sock.shutdown(socket.SHUT_RDWR)
+            except (socket.error, AttributeError):
+                pass
+            tn.close()
+        for command in pending:
+            command.fail(reason)
+
+    def timed_out(self, command):
+        self.close("Telnet session dropped after '%s' timed out" % command.command,
+                   timed_out=command)
+
+    def read(self, tn):
+        while True:
+            try:
+                data = tn.read_some()
+            except (socket.error, EOFError):
+                data = ''
+            with self.lock:
+                if self.tn is not tn:
+                    return
+                if not data:
+                    break
+                self.buffer += data
+                self.demux()
+        self.close("Telnet session to %s closed by the other end" % self.host_name)
+
+    def demux(self):
+        while self.pending:
+            head = self.pending[0]
+            if not head.started:
+                m = head.begin.search(self.buffer)
+                if not m:
+                    # prompts and the like, keep what could be half a marker
+                    self.buffer = self.buffer[-64:]
+                    return
+                head.started = True
+                self.buffer = self.buffer[m.end():]
+            m = head.end.search(self.buffer)
+            if not m:
+                return
+            head.finish(self.buffer[:m.start()], int(m.group(1)))
+            self.buffer = self.buffer[m.end():]
+            self.pending.popleft()
+            self.inflight -= len(head.line)
+        self.buffer = ''
+
+    ##
+    # @brief Send a command without waiting for it, logging in first if
+    #        there's no session. Waits while the shell already has as much
+    #        as it can take.
+    #
+    # @return TCommand
+    #
+    def submit(self, command, login=True):
+        cmd = TCommand(command)
+        cmd.on_timeout = self.timed_out
+        while True:
+            with self.lock:
+                if self.tn is None:
+                    if not login:
+                        cmd.fail("No telnet session to %s" % self.host_name)
+                        return cmd
+                    head = None
+                elif self.pending and (len(self.pending) >= self.depth or
+                                       self.inflight + len(cmd.line) > self.MAX_INFLIGHT):
+                    head = self.pending[0]
+                else:
+                    cmd.sent = time.time()
+                    self.pending.append(cmd)
+                    self.inflight += len(cmd.line)
+                    try:
+                        self.tn.write(cmd.line + '\n')
+                    except socket.error as e:
+                        cmd.fail("Telnet write to %s failed: %s" % (self.host_name, e))
+                    return cmd
+            if head is None:
+                self.login()
+            else:
+                # the head's own caller decides how long it may take
+                head.done.wait()
 
     ##
     # @brief run the given command on telnet connection
     # @param command @type string: command to run
+    # @param timeout @type int: seconds, None to wait for ever
+    #
+    # @return output whatever the exit code, or raise CommandFailed if the
+    #         command didn't finish in time
+    #
+    def run_command(self, command, timeout=None):
+        return self.submit(command).result(timeout)
+
+    ##
+    # @brief Run several commands in one go: all are sent before the
+    #        first result is awaited, so they take about one round trip
+    #        rather than one each. They still run one after another.
+    #
+    # @param timeout @type int: seconds for each command, None to wait for ever
+    #
+    # @return list of outputs, or raise CommandFailed for the first
+    #         command that didn't finish
+    #
+    def run_commands(self, commands, timeout=None):
+        sent = [self.submit(command) for command in commands]
+        return [cmd.result(timeout) for cmd in sent]
+
+    ##
+    # @brief Send a command that may take the session (or the FSP) down
+    #        with it, e.g. a reset
+    #
+    # @param wait @type int: seconds to give it before returning anyway
     #
-    def run_command(self, command):
-        self.tn.write(command + '\n')
-        response = self.tn.read_until(self.prompt)
-        return self._send_only_result(command, response)
-
-    def issue_forget(self,command):
-        self.tn.write(command + '\n')
-        response = self.tn.read_very_eager()
-        return self._send_only_result(command, response)
-
-    def _send_only_result(self, command, response):
-        output = response.splitlines()
-        if command in output[0]:
-            output.pop(0)
-        output.pop()
-        output = [ element.lstrip()+'\n' for element in output]
-        response = ''.join(output)
-        response = response.strip()
-        return ''.join(response)
+    # @return output if it finished within wait, else ''
+    #
+    def issue_forget(self, command, wait=5):
+        cmd = self.submit(command)
+        cmd.done.wait(wait)
+        if cmd.done.is_set() and cmd.error is None:
+            return self.clean(cmd.output)
+        return ''
+
+    @staticmethod
+    def clean(output):
+        output = [element.lstrip() + '\n' for element in output.splitlines()]
+        return ''.join(output).strip()
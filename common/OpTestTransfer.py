@@ -0,0 +1,221 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestTransfer.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestTransfer
+#  Bulk transfers over a console with no network behind it (skiroot over
+#  SOL, mostly).
+#
+#  Instead of streaming a large output as text, the target writes it to a
+#  temporary file and compresses it (xz or gzip, whatever it has and we can
+#  decode). The controller then pulls the file in chunks, each base64
+#  encoded and followed by its md5sum, and fetches a chunk again (smaller,
+#  on a link that keeps dropping characters) if it arrives damaged. Targets
+#  without the tools get the staged output as plain text, so a command is
+#  never run twice.
+
+import re
+import zlib
+import base64
+import hashlib
+import binascii
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+from Exceptions import CommandFailed
+
+# Compressors in order of preference, with how to undo them here
+DECOMPRESSORS = [('gzip', lambda d: zlib.decompress(d, 16 + zlib.MAX_WBITS)),
+                 ('cat', lambda d: d)]
+if lzma:
+    DECOMPRESSORS.insert(0, ('xz', lzma.decompress))
+
+##
+# @brief Moves command output and files from a target shell to here.
+#
+#        console is anything with run_command(command, timeout) returning
+#        a list of lines: IPMIConsole, HostConsole, QemuConsole or an SSH
+#        connection.
+#
+class ConsoleTransfer():
+    BLOCK = 512
+    MIN_CHUNK = 1024
+
+    def __init__(self, console, chunk_size=16384, retries=3, tmpdir='/tmp'):
+        self.console = console
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.tmpdir = tmpdir
+        self.count = 0
+        self.stats = {'raw': 0, 'compressed': 0, 'chunks': 0, 'retransmits': 0}
+
+    ##
+    # @brief Run a command on the target, getting its output back compressed
+    #
+    #        The command runs in a subshell with stderr merged into stdout,
+    #        like it would on the console.
+    #
+    # @return list of output lines or raise CommandFailed
+    #
+    def run_command(self, command, timeout=60):
+        rc, data = self.stage('( %s ) > $F 2>&1' % command, timeout)
+        output = data.splitlines()
+        if rc != 0:
+            raise CommandFailed(command, output, rc)
+        return output
+
+    # This command just runs and returns the ouput & ignores the failure
+    def run_command_ignore_fail(self, command, timeout=60):
+        try:
+            output = self.run_command(command, timeout)
+        except CommandFailed as cf:
+            output = cf.output
+        return output
+
+    ##
+    # @brief Fetch a file from the target
+    #
+    # @param path @type string: file on the target
+    # @param local @type string: where to save it here, if anywhere
+    #
+    # @return file contents or raise CommandFailed
+    #
+    def pull_file(self, path, local=None, timeout=60):
+        rc, data = self.stage("cat '%s' > $F" % path, timeout)
+        if rc != 0:
+            raise CommandFailed("cat %s" % path, data.splitlines(), rc)
+        if local:
+            with open(local, 'wb') as f:
+                f.write(data)
+        return data
+
+    ##
+    # @brief Produce $F on the target, compress it and bring it over
+    #
+    # @param producer @type string: shell writing $F
+    #
+    # @return (exit code of producer, data)
+    #
+    def stage(self, producer, timeout):
+        self.count += 1
+        f = '%s/optx.%d' % (self.tmpdir, self.count)
+        compressors = ' '.join(name for name, fn in DECOMPRESSORS if name != 'cat')
+        # One line, one exchange: run, compress with the first compressor
+        # we both know, pick an encoder, report what we got
+        cmd = ('F=%s; %s; echo $? > $F.rc; '
+               'Z=cat; for z in %s; do command -v $z >/dev/null && { Z=$z; break; }; done; '
+               '$Z < $F > $F.z; '
+               'E=none; command -v md5sum >/dev/null && for e in base64 uuencode; do '
+               'command -v $e >/dev/null && { E=$e; break; }; done; '
+               'echo OPTX $Z $E $(cat $F.rc) $(wc -c < $F) $(wc -c < $F.z) $(md5sum < $F.z)'
+               % (f, producer, compressors))
+        try:
+            res = self.console.run_command(cmd, timeout)
+            m = None
+            for l in res:
+                m = re.match(r'OPTX (\S+) (\S+) (\d+) (\d+) (\d+) ?(\S*)', l) or m
+            if not m:
+                raise CommandFailed(cmd, res, -1)
+            z, e, rc, raw, size, md5 = m.groups()
+            rc, raw, size = int(rc), int(raw), int(size)
+            if e == 'none':
+                print "# No md5sum/base64 on target, transferring %s as text" % producer
+                data = '\n'.join(self.console.run_command_ignore_fail('cat %s' % f, timeout)) + '\n'
+            else:
+                data = self.pull('%s.z' % f, size, e, timeout)
+                if hashlib.md5(data).hexdigest() != md5:
+                    raise CommandFailed(cmd, ["%s.z changed during transfer" % f], -1)
+                data = dict(DECOMPRESSORS)[z](data)
+            self.stats['raw'] += raw
+            self.stats['compressed'] += size
+            print "# Transferred %d bytes as %d (%s/%s)" % (raw, size, z, e)
+            return rc, data
+        finally:
+            self.console.run_command_ignore_fail('rm -f %s %s.*' % (f, f))
+
+    ##
+    # @brief Pull size bytes of a target file in checksummed chunks.
+    #
+    #        A damaged chunk is fetched again at half the size, down to
+    #        MIN_CHUNK; clean ones let the size grow back to chunk_size.
+    #
+    def pull(self, path, size, encoder, timeout):
+        chunks = []
+        offset = 0
+        length = self.chunk_size
+        failures = 0
+        while offset < size:
+            data = self.pull_chunk(path, offset, length, encoder, timeout)
+            if data is None:
+                self.stats['retransmits'] += 1
+                if length > self.MIN_CHUNK:
+                    length = max(self.MIN_CHUNK, length / 2 / self.BLOCK * self.BLOCK)
+                else:
+                    failures += 1
+                    if failures > self.retries:
+                        raise CommandFailed("dd if=%s" % path,
+                                            ["chunk at %d failed %d times" % (offset, failures)], -1)
+                print "# Chunk at %d of %s arrived damaged, fetching %d bytes again" % (
+                    offset, path, length)
+                continue
+            chunks.append(data)
+            offset += len(data)
+            failures = 0
+            length = min(self.chunk_size, length * 2)
+        return ''.join(chunks)
+
+    ##
+    # @return the chunk, or None if it didn't survive the trip
+    #
+    def pull_chunk(self, path, offset, length, encoder, timeout):
+        if encoder == 'base64':
+            encode = 'base64 %s.c' % path
+        else:
+            encode = 'uuencode -m %s.c -' % path
+        cmd = ('dd if=%s of=%s.c bs=%d skip=%d count=%d 2>/dev/null; %s; md5sum < %s.c'
+               % (path, path, self.BLOCK, offset / self.BLOCK, length / self.BLOCK,
+                  encode, path))
+        self.stats['chunks'] += 1
+        try:
+            res = self.console.run_command(cmd, timeout)
+        except CommandFailed:
+            return None
+        if not res:
+            return None
+        lines = [l.strip() for l in res[:-1]
+                 if not l.startswith('begin-base64') and l.strip() != '====']
+        try:
+            data = base64.b64decode(''.join(lines))
+        except (TypeError, binascii.Error):
+            return None
+        if [hashlib.md5(data).hexdigest()] != res[-1].split()[:1]:
+            return None
+        return data
@@ -34,11 +34,11 @@ import telnetlib
 import socket
 import select
 import time
-import pty
 import pexpect
 
 from OpTestConstants import OpTestConstants as BMC_CONST
 from OpTestError import OpTestError
+from OpTestSFTP import SFTPEngine
 
 class OpTestUtil():
 
@@ -81,20 +81,21 @@ class OpTestUtil():
 
 
     ##
-    #   @brief    This method does a scp from local system (where files are found)
-    #             to destination(Path where files will be stored) or
-    #             scp to local system(where files will be stored) from
-    #             destination(where files are found).
-    #   @param    hostfile
-    #   @param    destid
-    #   @param    destName
-    #   @param    destPath
+    #   @brief    This method copies a file from the local system to the
+    #             destination or, the other way round, from the destination
+    #             to the local system, with an OpTestSFTP.SFTPEngine: progress
+    #             and rate reporting, resuming a partial copy and checking the
+    #             SHA-256 of the result.
+    #   @param    hostfile: local file (or directory to copy into)
+    #   @param    destid: user name on the destination
+    #   @param    destName: destination host name or IP
+    #   @param    destPath: file (or directory to copy into) at the destination
     #   @param    passwd
-    #   @param    ssh_ver
+    #   @param    ssh_ver: unused, kept for existing callers
     #   @param    i_function @type int: SCP_TO_REMOTE = 1(scp to remote system(default))
     #                                   SCP_TO_LOCAL = 2 (scp to local system)
-    #   @return   output from terminal
-    #   @throw    subprocess or OpTestError
+    #   @return   summary of the transfer
+    #   @throw    OpTestError
     #
     def copyFilesToDest(
             self,
@@ -105,94 +106,17 @@ class OpTestUtil():
             passwd,
             ssh_ver="2",
             i_function=1):
-        pid, fd = pty.fork()
-        Password = passwd + "\r\n"
-        list = ''
-        destinationPath = destid.strip() + "@" + destName.strip() + \
-            ":" + destPath
-
-        # We've spawned a separate process with the .fork above so one process
-        # will execute the scp command, and the other process will handle the
-        # back and forth of the password and the error paths
-        if pid == 0:
-            if i_function == 1:
-                arglist = (
-                    "/usr/bin/scp",
-                    "-o AfsTokenPassing=no",
-                    "-" +
-                    ssh_ver.strip(),
-                    hostfile,
-                    destinationPath)
-            elif i_function == 2:
-                arglist = (
-                    "/usr/bin/scp",
-                    "-" +
-                    ssh_ver.strip(),
-                    destinationPath,
-                    hostfile)
+        if i_function not in (BMC_CONST.SCP_TO_REMOTE, BMC_CONST.SCP_TO_LOCAL):
+            l_msg = "Please provide valid scp function"
+            print l_msg
+            raise OpTestError(l_msg)
+        engine = SFTPEngine(destName.strip(), destid.strip(), passwd)
+        try:
+            if i_function == BMC_CONST.SCP_TO_REMOTE:
+                res = engine.put(hostfile, destPath)
             else:
-                l_msg = "Please provide valid scp function"
-                print l_msg
-                raise OpTestError(l_msg)
-            print(arglist)
-            os.execv("/usr/bin/scp", arglist)
-        else:
-            while True:
-                try:
-                    x = os.read(fd, 1024)
-                    print("x=" + x)
-                    if(x.__contains__('(yes/no)')):
-                        l_res = "yes\r\n"
-                        os.write(fd, l_res)
-                    if(x.__contains__('s password:')):
-                        x = ''
-                        print("Entered password")
-                        pwd = Password
-                        os.write(fd, pwd)
-                    if(x.__contains__('Password:')):
-                        x = ''
-                        os.write(fd, Password)
-                    if(x.__contains__('password')):
-                        response = Password
-                        os.write(fd, response)
-                    if(x.__contains__('yes')):
-                        response = '1' + "\r\n"
-                        os.write(fd, response)
-                    if(x.__contains__('100%')):
-                        # We copied 100% of file so break out
-                        break
-                    if(x.__contains__("Invalid ssh2 packet type")):
-                        print(x)
-                        raise OpTestError(x)
-                    if(x.__contains__("Protocol major versions differ: 1 vs. 2")):
-                        print (x)
-                        raise OpTestError(x)
-                    if(x.__contains__("Connection refused")):
-                        print (x)
-                        raise OpTestError(x)
-                    if(x.__contains__('Connection closed by')):
-                        print (x)
-                        raise OpTestError(x)
-                    if(x.__contains__("WARNING: REMOTE HOST IDENTIFICATION HAS CHANGED")):
-                        print (x)
-                        raise OpTestError("Its a RSA key problem : \n" + x)
-                    if(x.__contains__("WARNING: POSSIBLE DNS SPOOFING DETECTED")):
-                        print(x)
-                        raise OpTestError("Its a RSA key problem : \n" + x)
-                    if(x.__contains__("Permission denied")):
-                        print(x)
-                        raise OpTestError("Wrong Login or Password :" + x)
-                    list = list + x
-                    time.sleep(1)
-                except OSError as e:
-                    print("OSError string: " + e.strerror)
-                    raise OpTestError(e.strerror)
-
-        if list.__contains__("Name or service not known"):
-            reason = 'SSH Failed for :' + destid + \
-                "\n Please provide a valid Hostname"
-            print("scp command failed!")
-            raise OpTestError(reason)
-
-        print(list)
-        return list
+                res = engine.get(destPath, hostfile)
+        finally:
+            engine.close()
+        return "%s -> %s: %d bytes, %.1f MB/s, sha256 %s" % (
+            res.source, res.destination, res.size, res.rate, res.sha256)
@@ -0,0 +1,210 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/OpTestWebSocket.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestWebSocket
+#  Just enough of a WebSocket (RFC 6455) client over TLS for the BMC's
+#  event subscriptions: text messages both ways, ping answered, close
+#  noticed. No extensions, no subprotocols.
+
+import os
+import ssl
+import socket
+import base64
+import struct
+import hashlib
+
+from Exceptions import WebSocketError
+
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xa
+
+def mask(key, data):
+    # XOR with the 4 byte key repeated, as one long integer
+    if not data:
+        return data
+    key = (key * (len(data) / 4 + 1))[:len(data)]
+    return ('%0*x' % (2 * len(data), int(data.encode('hex'), 16) ^
+                      int(key.encode('hex'), 16))).decode('hex')
+
+class WebSocket():
+
+    ##
+    # @param host @type string: "ip" or "ip:port", port 443 by default
+    # @param headers @type dict: extra handshake headers (Cookie)
+    #
+    def __init__(self, host, path, headers=None, timeout=30, context=None):
+        self.host = host
+        self.path = path
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.context = context or ssl._create_unverified_context()
+        self.url = 'wss://%s%s' % (host, path)
+        self.sock = None
+        self.buffer = ''
+        self.fragments = []
+
+    def connect(self):
+        if ':' in self.host:
+            ip, port = self.host.rsplit(':', 1)
+            port = int(port)
+        else:
+            ip, port = self.host, 443
+        try:
+            raw = socket.create_connection((ip, port), self.timeout)
+            raw.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock = self.context.wrap_socket(raw, server_hostname=ip)
+        except (socket.error, ssl.SSLError) as e:
+            raise WebSocketError(self.url, "can't connect: %s" % e)
+        key = base64.b64encode(os.urandom(16))
+        request = ["GET %s HTTP/1.1" % self.path, "Host: %s" % self.host,
+                   "Upgrade: websocket", "Connection: Upgrade",
+                   "Sec-WebSocket-Key: %s" % key, "Sec-WebSocket-Version: 13"]
+        request += ["%s: %s" % h for h in self.headers.items()]
+        self.sock.sendall('\r\n'.join(request) + '\r\n\r\n')
+        while '\r\n\r\n' not in self.buffer:
+            self.fill()
+        head, self.buffer = self.buffer.split('\r\n\r\n', 1)
+        lines = head.split('\r\n')
+        status = lines[0].split(None, 2)
+        headers = dict((k.strip().lower(), v.strip())
+                       for k, v in (l.split(':', 1) for l in lines[1:] if ':' in l))
+        if len(status) < 2 or status[1] != '101':
+            self.sock.close()
+            self.sock = None
+            code = int(status[1]) if len(status) > 1 and status[1].isdigit() else None
+            raise WebSocketError(self.url, "handshake refused: %s" % lines[0], code)
+        accept = base64.b64encode(hashlib.sha1(key + GUID).digest())
+        if headers.get('sec-websocket-accept') != accept:
+            self.sock.close()
+            self.sock = None
+            raise WebSocketError(self.url, "bad Sec-WebSocket-Accept")
+
+    def fill(self):
+        try:
+            data = self.sock.recv(65536)
+        except ssl.SSLError as e:
+            if 'timed out' in str(e):
+                raise socket.timeout()
+            raise WebSocketError(self.url, str(e))
+        except socket.timeout:
+            raise
+        except socket.error as e:
+            raise WebSocketError(self.url, str(e))
+        if not data:
+            raise WebSocketError(self.url, "connection closed")
+        self.buffer += data
+
+    def read(self, n):
+        while len(self.buffer) < n:
+            self.fill()
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+    def send_frame(self, opcode, data):
+        header = chr(0x80 | opcode)
+        if len(data) < 126:
+            header += chr(0x80 | len(data))
+        elif len(data) < 65536:
+            header += chr(0x80 | 126) + struct.pack('>H', len(data))
+        else:
+            header += chr(0x80 | 127) + struct.pack('>Q', len(data))
+        key = os.urandom(4)
+        try:
+            self.sock.sendall(header + key + mask(key, data))
+        except (socket.error, ssl.SSLError) as e:
+            raise WebSocketError(self.url, str(e))
+
+    def send(self, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        self.send_frame(OP_TEXT, text)
+
+    def recv_frame(self):
+        b0, b1 = struct.unpack('BB', self.read(2))
+        length = b1 & 0x7f
+        if length == 126:
+            length = struct.unpack('>H', self.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', self.read(8))[0]
+        key = self.read(4) if b1 & 0x80 else None
+        data = self.read(length)
+        if key:
+            data = mask(key, data)
+        return bool(b0 & 0x80), b0 & 0x0f, data
+
+    ##
+    # @brief Wait for the next message
+    #
+    # @param timeout @type float: seconds, None for the connect timeout
+    #
+    # @return the message, None if nothing came within timeout, or raise
+    #         WebSocketError if the connection closed
+    #
+    def recv(self, timeout=None):
+        if self.sock is None:
+            raise WebSocketError(self.url, "not connected")
+        while True:
+            if not self.buffer:
+                self.sock.settimeout(self.timeout if timeout is None else timeout)
+                try:
+                    self.fill()
+                except socket.timeout:
+                    return None
+            # once a frame has started, it is read to the end
+            self.sock.settimeout(self.timeout)
+            try:
+                fin, opcode, data = self.recv_frame()
+            except socket.timeout:
+                raise WebSocketError(self.url, "timed out in the middle of a frame")
+            if opcode == OP_PING:
+                self.send_frame(OP_PONG, data)
+            elif opcode == OP_CLOSE:
+                self.close()
+                raise WebSocketError(self.url, "closed by the server")
+            elif opcode in (OP_TEXT, OP_BINARY, OP_CONTINUATION):
+                self.fragments.append(data)
+                if fin:
+                    message = ''.join(self.fragments)
+                    self.fragments = []
+                    return message
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.send_frame(OP_CLOSE, struct.pack('>H', 1000))
+            except WebSocketError:
+                pass
+            try:
+                self.sock.close()
+            except socket.error:
+                pass
+        self.sock = None
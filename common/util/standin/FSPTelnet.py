@@ -0,0 +1,380 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/util/standin/FSPTelnet.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package FSPTelnet
+#  A local telnet server standing in for an FSP: a login, then a shell on
+#  a pty with a network latency each way and scripts answering like
+#  smgr, errl, fipsdump, registry, sysdump (slow), panlexec and
+#  plckIPLRequest, which walks the IPL progress code (ls
+#  /opt/p1/srci/curripl) through ipl_steps before runtime. The benchmarks
+#  compare FSP queries one at a time against pipelined on one
+#  TConnection, a status query behind a long command on one session
+#  against a second session, a hung command timing out, and waiting for
+#  runtime with three queries every 5s against status_snapshot():
+#
+#      python -m common.util.standin.FSPTelnet [rounds] [latency ms]
+#      python -m common.util.standin.FSPTelnet status [latency ms]
+
+import os
+import re
+import pty
+import sys
+import time
+import Queue
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import SocketServer
+
+from common.OpTestTConnection import TConnection
+from common.OpTestFSP import OpTestFSP
+from common.Exceptions import CommandFailed
+
+IAC = '\xff'
+WILL = '\xfb'
+ECHO = '\x01'
+SGA = '\x03'
+
+COMMANDS = {
+    'smgr': '''case "$1" in
+mfgState) cat "$FSP_STATE" ;;
+toolReset|resetReload) echo "resetting" ;;
+esac''',
+    'errl': '''case "$1" in
+-l) i=0; while [ $i -lt 20 ]; do
+        echo "0x$i  BC8A1E07  04/17/2017 10:$i:00  Informational  Hypervisor"; i=$((i+1)); done ;;
+-p) echo "ERRL repository purged all entries successfully" ;;
+esac''',
+    'fipsdump': '''case "$1" in
+-l) echo "FSPDUMP.13A2F0.20170417 1048576 04/17/2017" ;;
+esac''',
+    'registry': '''case "$2" in
+menu/HypMode) echo 03 ;;
+svpd/Raw_MachineTypeModel) echo "8286-42A" ;;
+svpd/NebsEnabled) printf "NebsEnabled\\n0\\n" ;;
+esac''',
+    'gard': 'echo "No GARD entries to clear"',
+    'sysdump': 'sleep ${SYSDUMP_SECONDS:-3}',
+    'plckIPLRequest': '''echo ipling > "$FSP_STATE"
+(for step in $IPL_STEPS; do
+    sleep ${step%%:*}; echo "curripl.0.${step#*:}" > "$FSP_IPL"
+done
+sleep ${IPL_END:-1}; echo runtime > "$FSP_STATE") >/dev/null 2>&1 &
+echo SUCCESS''',
+    'ls': '''if [ "$1" = /opt/p1/srci/curripl ]; then cat "$FSP_IPL"; else exec /bin/ls "$@"; fi''',
+    'panlexec': '''echo standby > "$FSP_STATE"
+echo success''',
+}
+
+def strip_telnet(data):
+    # the client's answers to our WILLs, and any subnegotiation
+    data = re.sub(r'\xff\xfa.*?\xff\xf0', '', data, flags=re.S)
+    data = re.sub(r'\xff[\xfb-\xfe].', '', data, flags=re.S)
+    return data.replace(IAC + IAC, IAC)
+
+##
+# @brief Pass data on latency seconds after it was handed over, whatever
+#        else is in flight, as a network link would
+#
+class DelayLine(threading.Thread):
+    def __init__(self, write, latency):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.write = write
+        self.latency = latency
+        self.queue = Queue.Queue()
+        self.start()
+
+    def put(self, data):
+        self.queue.put((time.time() + self.latency, data))
+
+    def run(self):
+        while True:
+            due, data = self.queue.get()
+            if data is None:
+                return
+            time.sleep(max(due - time.time(), 0))
+            try:
+                self.write(data)
+            except (socket.error, OSError):
+                return
+
+class _Handler(SocketServer.BaseRequestHandler):
+
+    def readline(self, buffer):
+        while '\n' not in buffer[0]:
+            data = self.request.recv(4096)
+            if not data:
+                raise EOFError()
+            buffer[0] += strip_telnet(data)
+        line, buffer[0] = buffer[0].split('\n', 1)
+        return line.strip('\r\0 ')
+
+    def handle(self):
+        server = self.server
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(IAC + WILL + ECHO + IAC + WILL + SGA)
+        buffer = ['']
+        try:
+            sock.sendall('\r\nFSP standin\r\nlogin: ')
+            user = self.readline(buffer)
+            sock.sendall('Password: ')
+            password = self.readline(buffer)
+        except (EOFError, socket.error):
+            return
+        if (user, password) != (server.username, server.password):
+            sock.sendall('\r\nLogin incorrect\r\n')
+            return
+        env = dict(os.environ, PS1='$ ', FSP_STATE=server.state_file, FSP_IPL=server.ipl_file,
+                   IPL_STEPS=' '.join('%s:%s' % step for step in server.ipl_steps),
+                   IPL_END=str(server.ipl_end),
+                   PATH=server.bindir + ':' + os.environ.get('PATH', '/bin:/usr/bin'))
+        pid, fd = pty.fork()
+        if pid == 0:
+            os.execvpe('sh', ['sh', '-i'], env)
+        with server.lock:
+            server.shells.append(pid)
+        to_shell = DelayLine(lambda data: os.write(fd, data), server.latency)
+        to_client = DelayLine(sock.sendall, server.latency)
+        if buffer[0]:
+            to_shell.put(buffer[0])
+        reader = threading.Thread(target=self.relay_output, args=(fd, to_client))
+        reader.daemon = True
+        reader.start()
+        try:
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                data = strip_telnet(data)
+                with server.lock:
+                    server.commands += data.count('@@OPT"B')
+                to_shell.put(data)
+        except socket.error:
+            pass
+        to_shell.put(None)
+        try:
+            os.kill(pid, signal.SIGHUP)
+            os.waitpid(pid, 0)
+        except OSError:
+            pass
+        with server.lock:
+            server.shells.remove(pid)
+        os.close(fd)
+
+    def relay_output(self, fd, to_client):
+        while True:
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                break
+            if not data:
+                break
+            to_client.put(data.replace(IAC, IAC + IAC))
+        to_client.put(None)
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+class FSPTelnetServer(SocketServer.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    ##
+    # @param latency @type float: seconds each way between client and FSP
+    # @param ipl_steps @type list: (seconds, progress code) an IPL goes
+    #        through, ipl_end seconds after the last one it is at runtime
+    #
+    def __init__(self, host='127.0.0.1', port=0, username='dev', password='FipSdev',
+                 latency=0.02, state='standby', ipl_steps=None, ipl_end=1):
+        SocketServer.ThreadingTCPServer.__init__(self, (host, port), _Handler)
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.shells = []
+        self.commands = 0
+        self.ipl_steps = ipl_steps or [(0.5, 'C1001F00'), (0.5, 'C1009003')]
+        self.ipl_end = ipl_end
+        self.bindir = tempfile.mkdtemp(prefix='op-test-fsp-')
+        self.state_file = os.path.join(self.bindir, 'mfgState')
+        self.ipl_file = os.path.join(self.bindir, 'curripl')
+        self.set_state(state)
+        for name, body in COMMANDS.items():
+            path = os.path.join(self.bindir, name)
+            with open(path, 'w') as f:
+                f.write('#!/bin/sh\n%s\n' % body)
+            os.chmod(path, 0755)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def set_state(self, state, progress_code='C7004091'):
+        with open(self.state_file, 'w') as f:
+            f.write(state + '\n')
+        with open(self.ipl_file, 'w') as f:
+            f.write('curripl.0.%s\n' % progress_code)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        with self.lock:
+            for pid in self.shells:
+                try:
+                    os.kill(pid, signal.SIGHUP)
+                except OSError:
+                    pass
+        shutil.rmtree(self.bindir, ignore_errors=True)
+
+QUERIES = ['smgr mfgState', 'registry -Hr menu/HypMode', 'fipsdump -l', 'errl -l']
+
+def benchmark(rounds=10, latency=20):
+    server = FSPTelnetServer(latency=latency / 1000.0).start()
+    try:
+        fspc = TConnection('127.0.0.1', 'dev', 'FipSdev', '$', timeout=60, port=server.port)
+        fspc.login()
+        start = time.time()
+        for i in range(rounds):
+            serial = [fspc.run_command(q) for q in QUERIES]
+        one_by_one = (time.time() - start) / rounds
+        start = time.time()
+        for i in range(rounds):
+            pipelined = fspc.run_commands(QUERIES)
+        together = (time.time() - start) / rounds
+        assert serial == pipelined and serial[0] == 'standby' and len(serial[3].splitlines()) == 20
+
+        # a status query behind a long command, on the same session and
+        # on a second one
+        status = TConnection('127.0.0.1', 'dev', 'FipSdev', '$', timeout=60, port=server.port)
+        status.login()
+        dump = fspc.submit('sysdump -idall')
+        start = time.time()
+        fspc.run_command('smgr mfgState')
+        behind = time.time() - start
+        dump = fspc.submit('sysdump -idall')
+        start = time.time()
+        status.run_command('smgr mfgState')
+        alongside = time.time() - start
+        dump.result()
+
+        start = time.time()
+        try:
+            fspc.run_command('sleep 600', timeout=1)
+            assert False
+        except CommandFailed as cf:
+            assert cf.output == "TIMEOUT"
+        timed_out = time.time() - start
+        start = time.time()
+        assert fspc.run_command('smgr mfgState') == 'standby'
+        relogin = time.time() - start
+        fspc.close()
+        status.close()
+    finally:
+        server.stop()
+    print "%d FSP queries over a telnet session with %dms latency each way" % (len(QUERIES),
+                                                                             latency)
+    print "  one at a time : %.0f ms" % (one_by_one * 1000)
+    print "  pipelined     : %.0f ms (%.1fx)" % (together * 1000, one_by_one / together)
+    print "smgr mfgState while sysdump runs"
+    print "  same session   : %.0f ms" % (behind * 1000)
+    print "  second session : %.0f ms" % (alongside * 1000)
+    print "'sleep 600' with a 1s timeout raised after %.1f s, next command logged in again" \
+          " and ran in %.0f ms" % (timed_out, relogin * 1000)
+
+##
+# @brief wait_for_runtime() as it was: state, state again and progress
+#        code every 5 seconds
+#
+def three_queries_wait_for_runtime(fsp):
+    while True:
+        if fsp.is_sys_powered_on():
+            print "Current system status: %s" % fsp.get_sys_status()
+            print "Current progress code: %s" % fsp.get_progress_code()
+            break
+        print "Current system status: %s" % fsp.get_sys_status()
+        print "Current progress code: %s" % fsp.get_progress_code()
+        time.sleep(5)
+
+##
+# @brief OpTestFSP on a TConnection to the stand-in, without the ASM
+#        web interface the real one sets up
+#
+class StandinFSP(OpTestFSP):
+    def __init__(self, fspc):
+        self.fspc = fspc
+        self.fspc_status = None
+
+# bursts of progress codes and long isteps, as an IPL goes
+IPL = [(0.3, 'C1001F00'), (0.3, 'C1001FFF'), (0.4, 'C1009003'), (11, 'C1009015'),
+       (0.5, 'C100D009'), (0.5, 'C1009025'), (0.5, 'C1009033'), (8, 'C1009058'),
+       (0.5, 'C100C1FF'), (0.5, 'C10091B0')]
+
+def status_benchmark(latency=20):
+    server = FSPTelnetServer(latency=latency / 1000.0, ipl_steps=IPL, ipl_end=6).start()
+    fsp = StandinFSP(TConnection('127.0.0.1', 'dev', 'FipSdev', '$', timeout=60,
+                                 port=server.port))
+    results = []
+    try:
+        fsp.fspc.login()
+        for name, wait in (('3 queries every 5s', three_queries_wait_for_runtime),
+                           ('status_snapshot()', OpTestFSP.wait_for_runtime)):
+            server.set_state('standby')
+            fsp.fspc.run_command('plckIPLRequest 0x01')
+            before = server.commands
+            stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+            try:
+                wait(fsp)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            late = time.time() - os.path.getmtime(server.state_file)
+            results.append((name, server.commands - before, late))
+        fsp.fspc.close()
+    finally:
+        server.stop()
+    print "wait_for_runtime over a %.0f s IPL, %dms latency each way" % (
+        sum(s for s, c in IPL) + 6, latency)
+    for name, commands, late in results:
+        print "  %-20s: %2d FSP commands, runtime seen %.1f s after it was reached" % (
+            name, commands, late)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'status':
+        status_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 20)
+    else:
+        benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 20)
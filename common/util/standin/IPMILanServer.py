@@ -0,0 +1,326 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/util/standin/IPMILanServer.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package IPMILanServer
+#  A small UDP stand-in BMC speaking IPMI 2.0 lanplus (RMCP+).
+#
+#  It implements enough of the session setup and of the chassis/app command
+#  set for both ipmitool and common.OpTestRMCP to talk to it, which makes it
+#  possible to compare the native session against fork-per-command ipmitool:
+#
+#      python -m common.util.standin.IPMILanServer [iterations]
+
+import os
+import sys
+import time
+import struct
+import socket
+import threading
+
+from common.OpTestError import OpTestError
+from common.OpTestRMCP import *
+
+class _Session():
+    def __init__(self, bmc_sid, console_sid, privilege, integ, conf):
+        self.bmc_sid = bmc_sid
+        self.console_sid = console_sid
+        self.privilege = privilege
+        self.codec = RMCPPlusCodec(integ, conf)
+        self.seq = 0
+        self.rm = None
+        self.rc = None
+        self.user = None
+
+class IPMILanServer(threading.Thread):
+    def __init__(self, username='ADMIN', password='admin',
+                 host='127.0.0.1', port=0, latency=0.0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.host, self.port = self.sock.getsockname()
+        self.guid = os.urandom(16)
+        self.sessions = {}
+        self.stopped = threading.Event()
+        self.requests = 0
+        # Machine state the chassis commands act on
+        self.power = False
+        self.bootdev = 0
+        self.handlers = {
+            (NETFN_APP, CMD_GET_DEVICE_ID): self.get_device_id,
+            (NETFN_APP, CMD_COLD_RESET): self.mc_reset,
+            (NETFN_APP, CMD_WARM_RESET): self.mc_reset,
+            (NETFN_APP, CMD_GET_CHANNEL_AUTH_CAP): self.get_channel_auth_cap,
+            (NETFN_APP, CMD_SET_SESSION_PRIV): self.set_session_priv,
+            (NETFN_CHASSIS, 0x01): self.get_chassis_status,
+            (NETFN_CHASSIS, 0x02): self.chassis_control,
+            (NETFN_CHASSIS, 0x08): self.set_boot_options,
+            (NETFN_SENSOR, 0x2d): self.get_sensor_reading,
+            (NETFN_STORAGE, 0x40): self.get_sel_info,
+            (NETFN_STORAGE, 0x43): self.get_sel_entry,
+        }
+        # SEL records, 16 bytes each, and the add/erase timestamps
+        self.sel = []
+        self.sel_added = 0
+        self.sel_erased = 0
+        # sensor number -> function returning the asserted state offsets
+        self.sensors = {
+            0x50: lambda: [0] if self.power else [6],  # Host Status
+            0x51: lambda: [1] if self.power else [],   # OS Boot
+        }
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.sock.close()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                packet, addr = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            try:
+                reply = self.handle_packet(packet)
+            except (OpTestError, IndexError, struct.error) as e:
+                print "# IPMI stand-in dropped bad packet: %s" % str(e)
+                continue
+            if reply:
+                self.sock.sendto(reply, addr)
+
+    def handle_packet(self, packet):
+        if packet[:4] != RMCP_HEADER:
+            return None
+        if ord(packet[4]) == AUTHTYPE_NONE:
+            return self.handle_ipmi15(packet)
+        ptype, sid = struct.unpack('<BI', packet[5:10])
+        ptype &= 0x3f
+        if ptype == PAYLOAD_OPEN_SESSION_REQ:
+            return self.open_session(RMCPPlusCodec().unwrap(packet)[3])
+        if ptype == PAYLOAD_RAKP1:
+            return self.rakp1(RMCPPlusCodec().unwrap(packet)[3])
+        if ptype == PAYLOAD_RAKP3:
+            return self.rakp3(RMCPPlusCodec().unwrap(packet)[3])
+        session = self.sessions.get(sid)
+        if session is None or not session.codec.active():
+            return None
+        ptype, sid, seq, payload = session.codec.unwrap(packet)
+        netfn, rq_seq, cmd, data = unpack_ipmi_message(payload)
+        if (netfn, cmd) == (NETFN_APP, CMD_CLOSE_SESSION):
+            del self.sessions[session.bmc_sid]
+            code, rsp = 0, ''
+        else:
+            code, rsp = self.dispatch(netfn, cmd, data, session)
+        msg = pack_ipmi_message(CONSOLE_ADDR, netfn | 1, BMC_ADDR, rq_seq, cmd,
+                                chr(code) + rsp)
+        session.seq += 1
+        return session.codec.wrap(PAYLOAD_IPMI, msg, session.console_sid, session.seq)
+
+    def dispatch(self, netfn, cmd, data, session=None):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        handler = self.handlers.get((netfn, cmd))
+        if handler is None:
+            return 0xc1, ''
+        return handler(data, session)
+
+    # IPMI v1.5 framing is only used for the sessionless
+    # Get Channel Authentication Capabilities that ipmitool sends first.
+    def handle_ipmi15(self, packet):
+        length = ord(packet[13])
+        netfn, rq_seq, cmd, data = unpack_ipmi_message(packet[14:14 + length])
+        code, rsp = self.dispatch(netfn, cmd, data)
+        msg = pack_ipmi_message(CONSOLE_ADDR, netfn | 1, BMC_ADDR, rq_seq, cmd,
+                                chr(code) + rsp)
+        return RMCP_HEADER + struct.pack('<BIIB', AUTHTYPE_NONE, 0, 0, len(msg)) + msg
+
+    def open_session(self, req):
+        tag, privilege = ord(req[0]), ord(req[1]) or PRIV_ADMIN
+        console_sid = struct.unpack('<I', req[4:8])[0]
+        auth, integ, conf = ord(req[12]), ord(req[20]), ord(req[28])
+        status = 0
+        if auth != 0x01 or integ not in (0, 1) or conf not in (0, 1) \
+           or (conf and AES is None):
+            status = 0x11  # no matching cipher suite
+        bmc_sid = struct.unpack('<I', os.urandom(4))[0] | 1
+        self.sessions[bmc_sid] = _Session(bmc_sid, console_sid, privilege, integ, conf)
+        rsp = struct.pack('<BBBxII', tag, status, privilege, console_sid, bmc_sid) + req[8:32]
+        return RMCPPlusCodec().wrap(PAYLOAD_OPEN_SESSION_RSP, rsp)
+
+    def rakp1(self, req):
+        tag = ord(req[0])
+        session = self.sessions.get(struct.unpack('<I', req[4:8])[0])
+        if session is None:
+            return None
+        session.rm = req[8:24]
+        role, ulen = ord(req[24]), ord(req[27])
+        username = req[28:28 + ulen]
+        session.user = chr(role) + chr(ulen) + username
+        session.rc = os.urandom(16)
+        status = 0
+        if username != self.username:
+            status = 0x0d  # unauthorized name
+        kuid = self.password.ljust(20, '\x00')[:20]
+        auth = hmac_sha1(kuid, struct.pack('<II', session.console_sid, session.bmc_sid)
+                         + session.rm + session.rc + self.guid + session.user)
+        rsp = struct.pack('<BBxxI', tag, status, session.console_sid) \
+              + session.rc + self.guid + auth
+        return RMCPPlusCodec().wrap(PAYLOAD_RAKP2, rsp)
+
+    def rakp3(self, req):
+        tag = ord(req[0])
+        session = self.sessions.get(struct.unpack('<I', req[4:8])[0])
+        if session is None or session.rc is None:
+            return None
+        kuid = self.password.ljust(20, '\x00')[:20]
+        expect = hmac_sha1(kuid, session.rc + struct.pack('<I', session.console_sid)
+                           + session.user)
+        if req[8:28] != expect:
+            rsp = struct.pack('<BBxxI', tag, 0x0f, session.console_sid)
+            return RMCPPlusCodec().wrap(PAYLOAD_RAKP4, rsp)
+        sik = hmac_sha1(kuid, session.rm + session.rc + session.user)
+        icv = hmac_sha1(sik, session.rm + struct.pack('<I', session.console_sid) + self.guid)
+        session.codec.set_sik(sik)
+        rsp = struct.pack('<BBxxI', tag, 0, session.console_sid) + icv[:12]
+        return RMCPPlusCodec().wrap(PAYLOAD_RAKP4, rsp)
+
+    def get_device_id(self, data, session):
+        return 0, '\x20\x01\x02\x16\x02\xbf\x00\x00\x00\xbb\xaa\x4d\x4c\x01\x00'
+
+    def get_channel_auth_cap(self, data, session):
+        # channel 1, IPMI v2.0 extended capabilities, RMCP+ supported
+        return 0, '\x01\x80\x04\x02\x00\x00\x00\x00'
+
+    def set_session_priv(self, data, session):
+        return 0, data[:1]
+
+    def mc_reset(self, data, session):
+        return 0, ''
+
+    def get_chassis_status(self, data, session):
+        return 0, chr(int(self.power)) + '\x00\x00'
+
+    def chassis_control(self, data, session):
+        action = ord(data[0])
+        if action == 0x00:
+            self.power = False
+        elif action in (0x01, 0x02, 0x03):
+            self.power = True
+        elif action == 0x05:
+            self.power = False
+        return 0, ''
+
+    def get_sensor_reading(self, data, session):
+        sensor = self.sensors.get(ord(data[0]))
+        if sensor is None:
+            return 0xcb, ''
+        bits = 0
+        for offset in sensor():
+            bits |= 1 << offset
+        return 0, struct.pack('<BBBB', 0, 0xc0, bits & 0xff, 0x80 | (bits >> 8))
+
+    ##
+    # @brief Append a system event record to the stand-in SEL
+    #
+    def add_sel(self, sensor_type, sensor, event_type, offset, deassert=False):
+        record_id = (self.sel[-1][0] + 1) if self.sel else 1
+        self.sel_added = int(time.time())
+        record = struct.pack('<HBIHBBBBBBB', record_id, 0x02, self.sel_added,
+                             0x0020, 0x04, sensor_type, sensor,
+                             event_type | (0x80 if deassert else 0),
+                             offset, 0xff, 0xff)
+        self.sel.append((record_id, record))
+        return record_id
+
+    def clear_sel(self):
+        self.sel = []
+        self.sel_erased = int(time.time())
+
+    def get_sel_info(self, data, session):
+        return 0, struct.pack('<BHHIIB', 0x51, len(self.sel), 0xffff,
+                              self.sel_added, self.sel_erased, 0x02)
+
+    def get_sel_entry(self, data, session):
+        record_id = struct.unpack('<H', data[2:4])[0]
+        for i, (rid, record) in enumerate(self.sel):
+            if rid == record_id or (record_id == 0 and i == 0) \
+               or (record_id == 0xffff and i == len(self.sel) - 1):
+                if i + 1 < len(self.sel):
+                    next_id = self.sel[i + 1][0]
+                else:
+                    next_id = 0xffff
+                return 0, struct.pack('<H', next_id) + record
+        return 0xcb, ''
+
+    def set_boot_options(self, data, session):
+        if ord(data[0]) & 0x7f == 0x05:
+            self.bootdev = ord(data[2])
+        return 0, ''
+
+##
+# @brief Compare a native RMCP+ session with fork-per-command ipmitool
+#        against a local stand-in BMC.
+#
+def benchmark(iterations=200):
+    from common.OpTestIPMI import IPMITool, IPMILanTool
+    suite = 3 if AES is not None else 2
+    server = IPMILanServer()
+    server.start()
+    try:
+        native = IPMILanTool(ip=server.host, port=server.port,
+                             username=server.username, password=server.password,
+                             cipher_suite=suite)
+        start = time.time()
+        for i in range(iterations):
+            native.run('chassis power status', logcmd=False)
+        elapsed = time.time() - start
+        native.session.close()
+        print "native RMCP+  : %d commands in %.3fs (%.1f cmd/s)" % (
+            iterations, elapsed, iterations / elapsed)
+
+        forked = IPMITool(binary='ipmitool -C %d' % suite, ip=server.host,
+                          port=server.port, username=server.username,
+                          password=server.password)
+        if os.system('which ipmitool >/dev/null 2>&1') != 0:
+            print "fork per call : skipped, ipmitool not installed"
+            return
+        count = min(iterations, 50)
+        start = time.time()
+        for i in range(count):
+            forked.run('chassis power status', logcmd=False)
+        elapsed = time.time() - start
+        print "fork per call : %d commands in %.3fs (%.1f cmd/s)" % (
+            count, elapsed, count / elapsed)
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
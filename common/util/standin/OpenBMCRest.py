@@ -0,0 +1,585 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/util/standin/OpenBMCRest.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpenBMCRest
+#  A local HTTPS stand-in for the OpenBMC D-Bus REST API.
+#
+#  It serves a tree of D-Bus objects (chassis, host and BMC state, software
+#  images, logging entries) with GET of an object, an attr and enumerate,
+#  PUT of an attr, image upload, the /subscribe websocket of property
+#  changes, and cookie sessions from /login that expire_sessions() can drop. It talks HTTP/1.1 with keep-alive over TLS
+#  with a throwaway self-signed certificate (made with the openssl command).
+#  The benchmark polls the BMC state through HostManagement, with curl and
+#  with the kept-alive client:
+#
+#      python -m common.util.standin.OpenBMCRest [polls]
+#
+#  The software benchmark counts the requests it takes to find the Ready
+#  Host image after an upload on a BMC holding many images:
+#
+#      python -m common.util.standin.OpenBMCRest software [images]
+#
+#  The events benchmark measures how soon the wait helpers see the chassis
+#  power on and off, with /subscribe and with polling:
+#
+#      python -m common.util.standin.OpenBMCRest events
+
+import os
+import re
+import sys
+import ssl
+import json
+import Queue
+import zlib
+import tarfile
+import StringIO
+import base64
+import struct
+import time
+import shutil
+import socket
+import hashlib
+import tempfile
+import threading
+import subprocess
+import BaseHTTPServer
+import SocketServer
+
+from common.OpTestOpenBMC import HostManagement, CurlTool, BMCStateCache
+from common.OpTestWebSocket import GUID, mask
+
+SOFTWARE = '/xyz/openbmc_project/software'
+ACTIVATION = 'xyz.openbmc_project.Software.Activation.Activations.'
+PURPOSE = 'xyz.openbmc_project.Software.Version.VersionPurpose.'
+
+def default_objects():
+    return {
+        '/xyz/openbmc_project/state/chassis0': {
+            'CurrentPowerState': 'xyz.openbmc_project.State.Chassis.PowerState.Off',
+            'RequestedPowerTransition': 'xyz.openbmc_project.State.Chassis.Transition.Off'},
+        '/xyz/openbmc_project/state/host0': {
+            'CurrentHostState': 'xyz.openbmc_project.State.Host.HostState.Off',
+            'RequestedHostTransition': 'xyz.openbmc_project.State.Host.Transition.Off'},
+        '/xyz/openbmc_project/state/bmc0': {
+            'CurrentBMCState': 'xyz.openbmc_project.State.BMC.BMCState.Ready',
+            'RequestedBMCTransition': 'xyz.openbmc_project.State.BMC.Transition.None'},
+        '/org/openbmc/sensors/host/BootProgress': {'value': 'Off'},
+        '/org/openbmc/settings/host0': {'boot_flags': 'Default'},
+        '/xyz/openbmc_project/sensors/temperature/ambient': {'Unit': 'DegreesC',
+                                                             'Value': 24},
+        '/xyz/openbmc_project/inventory/system/chassis/motherboard': {'Present': 1},
+        SOFTWARE + '/1a2b3c4d': {'Activation': ACTIVATION + 'Active',
+                                 'Purpose': PURPOSE + 'BMC', 'Priority': 0,
+                                 'Version': 'v2.0-standin'},
+        SOFTWARE + '/5e6f7a8b': {'Activation': ACTIVATION + 'Active',
+                                 'Purpose': PURPOSE + 'Host', 'Priority': 0,
+                                 'Version': 'op-build-standin'},
+        SOFTWARE + '/functional': {'endpoints': [SOFTWARE + '/1a2b3c4d',
+                                                 SOFTWARE + '/5e6f7a8b']},
+    }
+
+def make_certificate(directory):
+    cert = os.path.join(directory, 'cert.pem')
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+                               '-subj', '/CN=openbmc-standin', '-days', '1',
+                               '-keyout', cert, '-out', cert],
+                              stdout=devnull, stderr=devnull)
+    return cert
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # whole responses in one write, flushed after each request
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body, headers=()):
+        data = json.dumps(body, indent=1, sort_keys=True)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def ok(self, data=None, headers=()):
+        self.reply(200, {'data': data, 'message': '200 OK', 'status': 'ok'}, headers)
+
+    def error(self, status, message, description):
+        self.reply(status, {'data': {'description': description},
+                            'message': message, 'status': 'error'})
+
+    def body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = ''
+        while len(data) < length:
+            chunk = self.rfile.read(min(length - len(data), 1024 * 1024))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def session(self):
+        m = re.search(r'\bsid=([0-9a-f]+)', self.headers.get('Cookie', ''))
+        return m is not None and m.group(1) in self.server.sessions
+
+    def handle_request(self, method):
+        self.server.count(method, self.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        path = '/' + self.path.split('?')[0].strip('/')
+        body = self.body()
+        if path == '/login' and method == 'POST':
+            try:
+                username, password = json.loads(body)['data']
+            except (ValueError, KeyError, TypeError):
+                return self.error(400, '400 Bad Request', 'Bad login data')
+            if (username, password) != (self.server.username, self.server.password):
+                return self.error(401, '401 Unauthorized', 'Invalid username or password')
+            sid = hashlib.sha1(os.urandom(16)).hexdigest()
+            with self.server.lock:
+                self.server.sessions.add(sid)
+            return self.ok('User \'%s\' logged in' % username,
+                           [('Set-Cookie', 'sid=%s; Secure; HttpOnly' % sid)])
+        if not self.session():
+            return self.error(401, '401 Unauthorized', 'Login required')
+        if path == '/logout':
+            return self.ok('User logged out')
+        if path == '/upload/image' and method == 'POST':
+            return self.ok(self.server.upload(body))
+        with self.server.lock:
+            return self.dispatch(method, path, body)
+
+    def dispatch(self, method, path, body):
+        objects = self.server.objects
+        if path.endswith('/enumerate') and method == 'GET':
+            base = path[:-len('/enumerate')]
+            return self.ok(dict((p, dict(v)) for p, v in objects.items()
+                                if p.startswith(base + '/')))
+        m = re.match(r'(.*)/attr/(\w+)$', path)
+        if m:
+            obj, prop = m.groups()
+            if obj not in objects or (method == 'GET' and prop not in objects[obj]):
+                return self.error(404, '404 Not Found', 'The specified property cannot be found')
+            if method == 'GET':
+                return self.ok(objects[obj][prop])
+            if method == 'PUT':
+                try:
+                    value = json.loads(body)['data']
+                except (ValueError, KeyError, TypeError):
+                    return self.error(400, '400 Bad Request', 'Bad property data')
+                self.server.set_property(obj, prop, value)
+                return self.ok()
+        if path in objects and method == 'GET':
+            return self.ok(dict(objects[path]))
+        m = re.match(r'(/xyz/openbmc_project/(?:logging/entry/\d+|software/\w+))/action/Delete$',
+                     path)
+        if m and method == 'POST' and m.group(1) in objects:
+            del objects[m.group(1)]
+            return self.ok()
+        if path == '/xyz/openbmc_project/logging/action/deleteAll' and method == 'POST':
+            for p in [p for p in objects if p.startswith('/xyz/openbmc_project/logging/entry/')]:
+                del objects[p]
+            return self.ok()
+        return self.error(404, '404 Not Found', 'org.freedesktop.DBus.Error.FileNotFound: '
+                          'path or object not found: %s' % path)
+
+    def do_GET(self):
+        if self.path == '/subscribe' and self.headers.get('Upgrade', '').lower() == 'websocket':
+            self.server.count('GET', self.path)
+            return self.subscribe()
+        self.handle_request('GET')
+
+    def read_message(self):
+        b0, b1 = struct.unpack('BB', self.rfile.read(2))
+        length = b1 & 0x7f
+        if length == 126:
+            length = struct.unpack('>H', self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', self.rfile.read(8))[0]
+        key = self.rfile.read(4) if b1 & 0x80 else None
+        data = self.rfile.read(length)
+        return mask(key, data) if key else data
+
+    def send_message(self, text):
+        if len(text) < 126:
+            header = struct.pack('BB', 0x81, len(text))
+        elif len(text) < 65536:
+            header = struct.pack('>BBH', 0x81, 126, len(text))
+        else:
+            header = struct.pack('>BBQ', 0x81, 127, len(text))
+        self.wfile.write(header + text)
+        self.wfile.flush()
+
+    ##
+    # @brief The /subscribe websocket: the client sends {"paths": [...]}
+    #        and gets a PropertiesChanged message for every change under
+    #        those paths
+    #
+    def subscribe(self):
+        if not self.server.events:
+            return self.error(404, '404 Not Found', 'path or object not found: /subscribe')
+        if not self.session():
+            return self.error(401, '401 Unauthorized', 'Login required')
+        key = self.headers.get('Sec-WebSocket-Key', '')
+        self.send_response(101, 'Switching Protocols')
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept',
+                         base64.b64encode(hashlib.sha1(key + GUID).digest()))
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = 1
+        try:
+            paths = json.loads(self.read_message()).get('paths', ['/'])
+        except (ValueError, struct.error, AttributeError):
+            return
+        queue = self.server.add_subscriber(paths)
+        try:
+            while True:
+                event = queue.get()
+                if event is None:
+                    break
+                self.send_message(json.dumps(event))
+        except (socket.error, ssl.SSLError):
+            pass
+        finally:
+            self.server.remove_subscriber(queue)
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+class OpenBMCRestServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    ##
+    # @param latency @type float: seconds the BMC takes over each request
+    # @param transition_delay @type float: seconds between a requested
+    #        state change and the current state changing
+    # @param events @type bool: serve /subscribe
+    #
+    def __init__(self, host='127.0.0.1', port=0, username='root', password='0penBmc',
+                 latency=0.0, transition_delay=0.0, events=True):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), _Handler)
+        self.certdir = tempfile.mkdtemp(prefix='op-test-rest-')
+        self.socket = ssl.wrap_socket(self.socket, certfile=make_certificate(self.certdir),
+                                      server_side=True)
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.transition_delay = transition_delay
+        self.events = events
+        self.subscribers = []
+        self.changed = {}
+        self.lock = threading.RLock()
+        self.sessions = set()
+        self.objects = default_objects()
+        self.requests = {}
+        self.connections = 0
+        self.thread = None
+
+    @property
+    def address(self):
+        return '%s:%d' % self.server_address
+
+    def get_request(self):
+        request = BaseHTTPServer.HTTPServer.get_request(self)
+        with self.lock:
+            self.connections += 1
+        return request
+
+    def handle_error(self, request, client_address):
+        # clients dropping kept-alive connections is business as usual
+        if not isinstance(sys.exc_info()[1], (socket.error, ssl.SSLError)):
+            BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+    def count(self, method, path):
+        with self.lock:
+            key = '%s %s' % (method, path)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.lock:
+            for paths, queue in self.subscribers:
+                queue.put(None)
+        self.shutdown()
+        self.server_close()
+        shutil.rmtree(self.certdir, ignore_errors=True)
+
+    ##
+    # @brief Forget every session, as a BMC reboot or session timeout does
+    #
+    def expire_sessions(self):
+        with self.lock:
+            self.sessions.clear()
+
+    ##
+    # @brief Change properties of an object and notify the subscribers
+    #        watching it
+    #
+    def change(self, obj, props):
+        with self.lock:
+            self.objects.setdefault(obj, {}).update(props)
+            now = time.time()
+            for prop in props:
+                self.changed[(obj, prop)] = now
+            for paths, queue in self.subscribers:
+                if any(obj == p or obj.startswith(p.rstrip('/') + '/') for p in paths):
+                    queue.put({'event': 'PropertiesChanged', 'path': obj,
+                               'interface': 'org.openbmc.standin', 'properties': props})
+
+    ##
+    # @brief Set a D-Bus property; the state changes it requests take
+    #        transition_delay seconds
+    #
+    def set_property(self, obj, prop, value):
+        with self.lock:
+            self.change(obj, {prop: value})
+            changes = []
+            if prop == 'RequestedPowerTransition':
+                on = value.endswith('.On')
+                changes.append((obj, {'CurrentPowerState':
+                    'xyz.openbmc_project.State.Chassis.PowerState.%s' % ('On' if on else 'Off')}))
+            elif prop == 'RequestedHostTransition':
+                on = value.endswith('.On') or value.endswith('.Reboot')
+                changes.append((obj, {'CurrentHostState':
+                    'xyz.openbmc_project.State.Host.HostState.%s' % ('Running' if on else 'Off')}))
+                changes.append(('/org/openbmc/sensors/host/BootProgress',
+                                {'value': 'FW Progress, Starting OS' if on else 'Off'}))
+                # the host transition takes the chassis with it
+                changes.append(('/xyz/openbmc_project/state/chassis0', {'CurrentPowerState':
+                    'xyz.openbmc_project.State.Chassis.PowerState.%s' % ('On' if on else 'Off')}))
+            elif prop == 'RequestedActivation' and value.endswith('.Active'):
+                purpose = self.objects[obj]['Purpose']
+                for path, props in self.objects.items():
+                    if path.startswith(SOFTWARE + '/') and props.get('Purpose') == purpose \
+                       and path != obj:
+                        changes.append((path, {'Priority': props.get('Priority', 0) + 1}))
+                changes.append((obj, {'Activation': ACTIVATION + 'Active', 'Priority': 0}))
+        def apply():
+            for path, props in changes:
+                self.change(path, props)
+        if self.transition_delay and changes:
+            timer = threading.Timer(self.transition_delay, apply)
+            timer.daemon = True
+            timer.start()
+        else:
+            apply()
+
+    def add_subscriber(self, paths):
+        queue = Queue.Queue()
+        with self.lock:
+            self.subscribers.append((paths, queue))
+        return queue
+
+    def remove_subscriber(self, queue):
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if s[1] is not queue]
+
+    ##
+    # @brief Take an uploaded image as a new Host image, Ready to activate.
+    #        Like a BMC, its Version is the one in the MANIFEST of a
+    #        (possibly gzipped) tarball and its id comes from the Version,
+    #        so uploading a Version it already has makes no new image.
+    #
+    # @return the image id
+    #
+    def upload(self, data):
+        version = 'uploaded-%s' % hashlib.sha1(data).hexdigest()[:8]
+        try:
+            with tarfile.open(fileobj=StringIO.StringIO(data)) as tar:
+                for line in tar.extractfile('MANIFEST').read().splitlines():
+                    if line.startswith('version='):
+                        version = line[len('version='):].strip()
+        except (tarfile.TarError, KeyError, AttributeError, IOError, zlib.error):
+            pass
+        id = hashlib.sha512(version).hexdigest()[:8]
+        if '%s/%s' % (SOFTWARE, id) in self.objects:
+            return id
+        self.change('%s/%s' % (SOFTWARE, id), {
+            'Activation': ACTIVATION + 'Ready', 'Purpose': PURPOSE + 'Host',
+            'Priority': 255, 'Version': version,
+            'RequestedActivation':
+                'xyz.openbmc_project.Software.Activation.RequestedActivations.None'})
+        return id
+
+    ##
+    # @brief Add n Host images, Active on the alternate sides
+    #
+    def add_images(self, n):
+        with self.lock:
+            for i in range(n):
+                self.objects['%s/%08x' % (SOFTWARE, 0xf0000000 + i)] = {
+                    'Activation': ACTIVATION + 'Active', 'Purpose': PURPOSE + 'Host',
+                    'Priority': i + 1, 'Version': 'op-build-old-%d' % i}
+
+    ##
+    # @brief Add n logging entries
+    #
+    def add_log_entries(self, n):
+        with self.lock:
+            ids = [int(p.rsplit('/', 1)[1]) for p in self.objects
+                   if p.startswith('/xyz/openbmc_project/logging/entry/')]
+            start = max(ids or [0]) + 1
+            for id in range(start, start + n):
+                self.objects['/xyz/openbmc_project/logging/entry/%d' % id] = {
+                    'Id': id, 'Timestamp': int(time.time() * 1000),
+                    'Severity': 'xyz.openbmc_project.Logging.Entry.Level.Informational',
+                    'Message': 'org.open_power.Host.Event.Standin', 'AdditionalData': [],
+                    'Resolved': False}
+
+def benchmark(polls=50):
+    server = OpenBMCRestServer().start()
+    workdir = tempfile.mkdtemp(prefix='op-test-rest-')
+    cwd = os.getcwd()
+    try:
+        # curl keeps its cookie jar in the current directory
+        os.chdir(workdir)
+        rest = HostManagement(server.address, 'root', '0penBmc')
+        rest.curl.logresult = False
+        start = time.time()
+        for i in range(polls):
+            rest.get_bmc_state()
+        kept = time.time() - start
+        kept_connections = server.connections
+        report = rest.curl.report()
+
+        server.expire_sessions()
+        rest.get_bmc_state()
+        relogin = server.requests.get('POST /login', 0)
+
+        curl = None
+        if subprocess.call('command -v curl >/dev/null', shell=True) == 0:
+            rest.curl = CurlTool(ip=server.address, username='root', password='0penBmc')
+            rest.curl.logresult = False
+            rest.login()
+            connections = server.connections
+            start = time.time()
+            for i in range(polls):
+                rest.get_bmc_state()
+            curl = time.time() - start
+            curl_connections = server.connections - connections
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.stop()
+
+    stat = report['GET /xyz/openbmc_project/state/bmc0/attr/CurrentBMCState']
+    print "Kept-alive client: %d polls in %.2fs (%.1f ms each, max %.1f ms), %d TLS connections" % (
+        polls, kept, kept * 1000 / polls, stat['max'] * 1000, kept_connections)
+    if curl is not None:
+        print "curl per request : %d polls in %.2fs (%.1f ms each), %d TLS connections (%.1fx)" % (
+            polls, curl, curl * 1000 / polls, curl_connections, curl / kept)
+    else:
+        print "curl not installed, no comparison"
+    print "Expired session: logged in again by itself (%d logins in all)" % relogin
+
+##
+# @brief Requests to find the Ready Host image after an upload, image by
+#        image as host_image_ids() used to and from one enumerate
+#
+def software_benchmark(images=16):
+    server = OpenBMCRestServer().start()
+    try:
+        server.add_images(images)
+        rest = HostManagement(server.address, 'root', '0penBmc')
+        rest.curl.logresult = False
+        rest.upload_image(__file__)
+        before = sum(server.requests.values())
+        start = time.time()
+        for id in rest.get_list_of_image_ids():
+            d = rest.image_data(id)
+            if d['data']['Purpose'].endswith('.Host') \
+               and d['data']['Activation'] == ACTIVATION + 'Ready':
+                by_image = id
+        by_image_time = time.time() - start
+        by_image_requests = sum(server.requests.values()) - before
+        before = sum(server.requests.values())
+        start = time.time()
+        ready = rest.wait_for_ready_image("Host")
+        snapshot_time = time.time() - start
+        snapshot_requests = sum(server.requests.values()) - before
+    finally:
+        server.stop()
+    print "%d images, found %s image by image: %d requests, %.1f ms" % (
+        images + 3, by_image, by_image_requests, by_image_time * 1000)
+    print "%d images, found %s from one enumerate: %d requests, %.1f ms" % (
+        images + 3, ready, snapshot_requests, snapshot_time * 1000)
+
+##
+# @brief How long after the chassis powers on and off wait_for_runtime()
+#        and wait_for_standby() notice, through /subscribe and by polling
+#
+def events_benchmark(trials=3, delay=1.0):
+    chassis = ('/xyz/openbmc_project/state/chassis0', 'CurrentPowerState')
+    results = []
+    for events in (True, False):
+        server = OpenBMCRestServer(transition_delay=delay, events=events).start()
+        try:
+            rest = HostManagement(server.address, 'root', '0penBmc')
+            rest.curl.logresult = False
+            rest.subscribe()
+            time.sleep(0.5)
+            latencies = []
+            before = sum(server.requests.values())
+            for i in range(trials):
+                rest.power_on()
+                rest.wait_for_runtime(timeout=1)
+                latencies.append(time.time() - server.changed[chassis])
+                rest.power_off()
+                rest.wait_for_standby(timeout=1)
+                latencies.append(time.time() - server.changed[chassis])
+            requests = sum(server.requests.values()) - before
+            rest.state.stop()
+        finally:
+            server.stop()
+        results.append((events, latencies, requests))
+    for events, latencies, requests in results:
+        print "%s: state changes noticed %.1f ms after on average (max %.1f ms), " \
+            "%d requests for %d waits" % (
+            "/subscribe events" if events else "polling every %ds" % BMCStateCache.POLL,
+            sum(latencies) * 1000 / len(latencies), max(latencies) * 1000, requests,
+            len(latencies))
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'events':
+        events_benchmark()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'software':
+        software_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 16)
+    else:
+        benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,435 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/util/standin/RedfishMock.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package RedfishMock
+#  A local HTTPS Redfish service shaped like OpenBMC's bmcweb: one system
+#  with processors, DIMMs and an event log, one chassis with sensors, the
+#  BMC manager, token sessions, the Reset/ClearLog actions, boot override
+#  by PATCH, and $expand=.($levels=n), $select and paged collections
+#  ($skip). With expand=False it doesn't offer $expand, as older BMCs
+#  don't. Powering on steps BootProgress.LastState through the host's
+#  boot after PowerState is On; with boot_progress=False there is no
+#  BootProgress, as on older BMCs. The benchmark reads sensors, SEL and
+#  inventory through RedfishManagement with and without $expand:
+#
+#      python -m common.util.standin.RedfishMock [sensors] [log entries]
+
+import os
+import re
+import sys
+import ssl
+import json
+import time
+import shutil
+import socket
+import urllib
+import urlparse
+import tempfile
+import threading
+import BaseHTTPServer
+import SocketServer
+
+from common.OpTestRedfish import RedfishManagement
+from common.util.standin.OpenBMCRest import make_certificate
+
+def link(path):
+    return {'@odata.id': path}
+
+def collection(path, members):
+    return {'@odata.id': path, 'Members': [link(m) for m in members],
+            'Members@odata.count': len(members)}
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=None, headers=()):
+        data = json.dumps(body, indent=1, sort_keys=True) if body is not None else ''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def error(self, status, message):
+        self.reply(status, {'error': {'code': 'Base.1.8.GeneralError', 'message': message}})
+
+    def body(self):
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            return json.loads(data) if data else {}
+        except ValueError:
+            return None
+
+    def handle_request(self, method):
+        server = self.server
+        url = urlparse.urlsplit(self.path)
+        path = url.path.rstrip('/')
+        query = dict(urlparse.parse_qsl(url.query))
+        server.count(method, path)
+        if server.latency:
+            time.sleep(server.latency)
+        body = self.body()
+        if body is None:
+            return self.error(400, 'Malformed JSON')
+        if method == 'POST' and path == server.SESSIONS:
+            if (body.get('UserName'), body.get('Password')) != (server.username, server.password):
+                return self.error(401, 'Invalid username or password')
+            token, location = server.new_session()
+            return self.reply(201, {'@odata.id': location, 'Id': location.rsplit('/', 1)[1]},
+                              [('X-Auth-Token', token), ('Location', location)])
+        if path != '/redfish/v1' and self.headers.get('X-Auth-Token') not in server.sessions:
+            return self.error(401, 'Unauthorized')
+        with server.lock:
+            if method == 'GET':
+                resource = server.read(path, query)
+                if resource is None:
+                    return self.error(404, 'Resource %s not found' % path)
+                return self.reply(200, resource)
+            if method == 'DELETE' and path.startswith(server.SESSIONS + '/'):
+                server.sessions.pop(self.headers.get('X-Auth-Token'), None)
+                return self.reply(204)
+            if method == 'PATCH' and path in server.resources:
+                server.patch(path, body)
+                return self.reply(204)
+            if method == 'POST' and path in server.actions:
+                status = server.actions[path](body)
+                if status != 204:
+                    return self.error(status, 'Bad action parameters')
+                return self.reply(204)
+        return self.error(405, 'Method not allowed')
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+class RedfishMock(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    SESSIONS = '/redfish/v1/SessionService/Sessions'
+    BOOT_STEPS = ['PrimaryProcessorInitializationStarted', 'MemoryInitializationStarted',
+                  'SystemHardwareInitializationComplete', 'OSBootStarted', 'OSRunning']
+
+    ##
+    # @param expand @type bool: offer $expand and $select
+    # @param page @type int: most members in one page of a collection
+    # @param latency @type float: seconds the BMC takes over each request
+    # @param transition_delay @type float: seconds a power change takes,
+    #        and each boot progress step after it
+    # @param boot_progress @type bool: report BootProgress
+    #
+    def __init__(self, host='127.0.0.1', port=0, username='root', password='0penBmc',
+                 sensors=40, log_entries=100, expand=True, page=1000, latency=0.0,
+                 transition_delay=0.0, boot_progress=True):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), _Handler)
+        self.certdir = tempfile.mkdtemp(prefix='op-test-redfish-')
+        self.socket = ssl.wrap_socket(self.socket, certfile=make_certificate(self.certdir),
+                                      server_side=True)
+        self.username = username
+        self.password = password
+        self.expand = expand
+        self.page = page
+        self.latency = latency
+        self.transition_delay = transition_delay
+        self.boot_progress = boot_progress
+        # bumped by each reset, so the steps of an earlier one stop
+        self.resets = 0
+        self.lock = threading.RLock()
+        self.sessions = {}
+        self.requests = {}
+        self.resources = {}
+        self.log_ids = 0
+        self.build(sensors)
+        self.add_log_entries(log_entries)
+        self.actions = {
+            '/redfish/v1/Systems/system/Actions/ComputerSystem.Reset': self.reset_system,
+            '/redfish/v1/Managers/bmc/Actions/Manager.Reset': lambda body: 204,
+            '/redfish/v1/Systems/system/LogServices/EventLog/Actions/LogService.ClearLog':
+                self.clear_log,
+        }
+
+    def build(self, sensors):
+        r = self.resources
+        features = {'SelectQuery': True,
+                    'ExpandQuery': {'ExpandAll': True, 'Levels': True, 'Links': True,
+                                    'NoLinks': True, 'MaxLevels': 6}} if self.expand else {}
+        r['/redfish/v1'] = {'@odata.id': '/redfish/v1', 'RedfishVersion': '1.11.0',
+                            'ProtocolFeaturesSupported': features,
+                            'Systems': link('/redfish/v1/Systems'),
+                            'Chassis': link('/redfish/v1/Chassis'),
+                            'Managers': link('/redfish/v1/Managers'),
+                            'SessionService': link('/redfish/v1/SessionService')}
+        r['/redfish/v1/Systems'] = collection('/redfish/v1/Systems',
+                                              ['/redfish/v1/Systems/system'])
+        system = '/redfish/v1/Systems/system'
+        r[system] = {'@odata.id': system, 'Id': 'system', 'PowerState': 'Off',
+                     'Boot': {'BootSourceOverrideEnabled': 'Disabled',
+                              'BootSourceOverrideTarget': 'None'},
+                     'Processors': link(system + '/Processors'),
+                     'Memory': link(system + '/Memory'),
+                     'LogServices': link(system + '/LogServices'),
+                     'Links': {'Chassis': [link('/redfish/v1/Chassis/chassis')]},
+                     'Actions': {'#ComputerSystem.Reset': {
+                         'target': system + '/Actions/ComputerSystem.Reset'}}}
+        if self.boot_progress:
+            r[system]['BootProgress'] = {'LastState': 'None'}
+        cpus = ['%s/Processors/cpu%d' % (system, i) for i in range(2)]
+        r[system + '/Processors'] = collection(system + '/Processors', cpus)
+        for p in cpus:
+            r[p] = {'@odata.id': p, 'Id': p.rsplit('/', 1)[1], 'Model': 'POWER9',
+                    'TotalCores': 22, 'Status': {'State': 'Enabled', 'Health': 'OK'}}
+        dimms = ['%s/Memory/dimm%d' % (system, i) for i in range(16)]
+        r[system + '/Memory'] = collection(system + '/Memory', dimms)
+        for d in dimms:
+            r[d] = {'@odata.id': d, 'Id': d.rsplit('/', 1)[1], 'CapacityMiB': 32768,
+                    'PartNumber': '36ASF4G72PZ', 'Status': {'State': 'Enabled', 'Health': 'OK'}}
+        logs = system + '/LogServices'
+        r[logs] = collection(logs, [logs + '/EventLog'])
+        r[logs + '/EventLog'] = {'@odata.id': logs + '/EventLog', 'Id': 'EventLog',
+                                 'Entries': link(logs + '/EventLog/Entries')}
+        r[logs + '/EventLog/Entries'] = collection(logs + '/EventLog/Entries', [])
+
+        r['/redfish/v1/Chassis'] = collection('/redfish/v1/Chassis',
+                                              ['/redfish/v1/Chassis/chassis'])
+        chassis = '/redfish/v1/Chassis/chassis'
+        r[chassis] = {'@odata.id': chassis, 'Id': 'chassis', 'ChassisType': 'RackMount',
+                      'Sensors': link(chassis + '/Sensors'),
+                      'Links': {'ComputerSystems': [link(system)]}}
+        names = ['%s/Sensors/sensor%d' % (chassis, i) for i in range(sensors)]
+        r[chassis + '/Sensors'] = collection(chassis + '/Sensors', names)
+        for i, s in enumerate(names):
+            kind = ('temperature', 'Cel', 25 + i % 40) if i % 2 else ('fan', 'RPM', 4000 + i)
+            r[s] = {'@odata.id': s, 'Id': s.rsplit('/', 1)[1], 'Name': '%s_%d' % (kind[0], i),
+                    'ReadingType': kind[0].capitalize(), 'ReadingUnits': kind[1],
+                    'Reading': kind[2], 'Status': {'State': 'Enabled', 'Health': 'OK'}}
+
+        r['/redfish/v1/Managers'] = collection('/redfish/v1/Managers',
+                                               ['/redfish/v1/Managers/bmc'])
+        r['/redfish/v1/Managers/bmc'] = {
+            '@odata.id': '/redfish/v1/Managers/bmc', 'Id': 'bmc',
+            'Status': {'State': 'Enabled', 'Health': 'OK'},
+            'Actions': {'#Manager.Reset': {
+                'target': '/redfish/v1/Managers/bmc/Actions/Manager.Reset'}}}
+
+    @property
+    def address(self):
+        return '%s:%d' % self.server_address
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (socket.error, ssl.SSLError)):
+            BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+    def count(self, method, path):
+        with self.lock:
+            key = '%s %s' % (method, path)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def total_requests(self):
+        with self.lock:
+            return sum(self.requests.values())
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        shutil.rmtree(self.certdir, ignore_errors=True)
+
+    def new_session(self):
+        token = os.urandom(16).encode('hex')
+        location = '%s/%s' % (self.SESSIONS, token[:8])
+        with self.lock:
+            self.sessions[token] = location
+        return token, location
+
+    def expire_sessions(self):
+        with self.lock:
+            self.sessions.clear()
+
+    ##
+    # @brief A resource as served for a GET with query
+    #
+    def read(self, path, query):
+        if path not in self.resources:
+            return None
+        resource = json.loads(json.dumps(self.resources[path]))
+        if 'Members' in resource:
+            skip = int(query.get('$skip', 0))
+            members = resource['Members']
+            resource['Members'] = members[skip:skip + self.page]
+            if skip + self.page < len(members):
+                q = dict(query, **{'$skip': str(skip + self.page)})
+                resource['Members@odata.nextLink'] = '%s?%s' % (path, urllib.urlencode(q))
+        if self.expand and '$expand' in query:
+            m = re.match(r'\.\(\$levels=(\d+)\)$', query['$expand'])
+            if not m:
+                return None
+            resource = self.fill(resource, int(m.group(1)))
+        if self.expand and '$select' in query:
+            keep = set(query['$select'].split(','))
+            resource = dict((k, v) for k, v in resource.items()
+                            if k in keep or k.startswith('@odata'))
+        return resource
+
+    def fill(self, value, levels):
+        if levels == 0:
+            return value
+        if isinstance(value, list):
+            return [self.fill(v, levels) for v in value]
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        for key, v in value.items():
+            if key == 'Links':
+                result[key] = v
+            elif isinstance(v, dict) and v.keys() == ['@odata.id'] and v['@odata.id'] in self.resources:
+                result[key] = self.fill(self.read(v['@odata.id'], {}), levels - 1)
+            elif isinstance(v, list):
+                result[key] = [self.fill(self.read(m['@odata.id'], {}), levels - 1)
+                               if isinstance(m, dict) and m.keys() == ['@odata.id']
+                               and m['@odata.id'] in self.resources
+                               else self.fill(m, levels) for m in v]
+            else:
+                result[key] = self.fill(v, levels)
+        return result
+
+    def patch(self, path, body):
+        for key, value in body.items():
+            if isinstance(value, dict) and isinstance(self.resources[path].get(key), dict):
+                self.resources[path][key].update(value)
+            else:
+                self.resources[path][key] = value
+
+    def reset_system(self, body):
+        states = {'On': 'On', 'ForceOn': 'On', 'ForceOff': 'Off', 'GracefulShutdown': 'Off',
+                  'ForceRestart': 'On', 'GracefulRestart': 'On', 'PowerCycle': 'On'}
+        if body.get('ResetType') not in states:
+            return 400
+        steps = [('PowerState', states[body['ResetType']])]
+        if self.boot_progress:
+            if states[body['ResetType']] == 'On':
+                steps += [('BootProgress', step) for step in self.BOOT_STEPS]
+            else:
+                steps.insert(0, ('BootProgress', 'None'))
+        with self.lock:
+            self.resets += 1
+            reset = self.resets
+        def apply(steps):
+            with self.lock:
+                if reset != self.resets:
+                    return
+                system = self.resources['/redfish/v1/Systems/system']
+                key, value = steps[0]
+                if key == 'BootProgress':
+                    system[key]['LastState'] = value
+                else:
+                    system[key] = value
+            if len(steps) > 1:
+                later(steps[1:])
+        def later(steps):
+            if self.transition_delay:
+                timer = threading.Timer(self.transition_delay, apply, (steps,))
+                timer.daemon = True
+                timer.start()
+            else:
+                apply(steps)
+        later(steps)
+        return 204
+
+    def clear_log(self, body):
+        entries = '/redfish/v1/Systems/system/LogServices/EventLog/Entries'
+        for m in self.resources[entries]['Members']:
+            del self.resources[m['@odata.id']]
+        self.resources[entries]['Members'] = []
+        self.resources[entries]['Members@odata.count'] = 0
+        self.log_ids = 0
+        return 204
+
+    def add_log_entries(self, n, message='Standin event'):
+        entries = '/redfish/v1/Systems/system/LogServices/EventLog/Entries'
+        with self.lock:
+            for i in range(n):
+                self.log_ids += 1
+                path = '%s/%d' % (entries, self.log_ids)
+                self.resources[path] = {
+                    '@odata.id': path, 'Id': str(self.log_ids), 'EntryType': 'Event',
+                    'Created': time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime()),
+                    'Severity': 'OK', 'Message': '%s %d' % (message, self.log_ids)}
+                self.resources[entries]['Members'].append(link(path))
+            self.resources[entries]['Members@odata.count'] = \
+                len(self.resources[entries]['Members'])
+
+def benchmark(sensors=60, log_entries=200, latency=0.005):
+    results = []
+    for expand in (True, False):
+        server = RedfishMock(sensors=sensors, log_entries=log_entries, expand=expand,
+                             page=100, latency=latency).start()
+        try:
+            redfish = RedfishManagement(server.address, 'root', '0penBmc')
+            redfish.protocol_features()
+            row = []
+            for name, fn in (('sensors', lambda: redfish.sensors()),
+                             ('SEL', lambda: redfish.check_sel('Non-recoverable')),
+                             ('inventory', lambda: redfish.get_inventory())):
+                before = server.total_requests()
+                start = time.time()
+                stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+                try:
+                    fn()
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+                row.append((name, server.total_requests() - before, time.time() - start))
+            server.add_log_entries(5, 'Transition to Non-recoverable')
+            found = len(redfish.check_sel('Non-recoverable'))
+        finally:
+            server.stop()
+        results.append((expand, row, found))
+    print "%d sensors, %d event log entries, %.0f ms per request on the BMC" % (
+        sensors, log_entries, latency * 1000)
+    for expand, row, found in results:
+        print "%-16s %s (%d new SEL errors found)" % (
+            "with $expand:" if expand else "without $expand:",
+            ", ".join("%s %d requests %.0f ms" % (n, c, t * 1000) for n, c, t in row), found)
+
+if __name__ == '__main__':
+    benchmark(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,258 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/util/standin/SlowSOL.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package SlowSOL
+#  A local shell behind a link that behaves like Serial over LAN: a round
+#  trip latency each way, a 115200 baud byte rate and optionally the odd
+#  dropped character. The benchmarks compare console run_command()
+#  throughput with the old prompt + 'echo $?' exchange against the framed
+#  single exchange, a list of commands one by one against run_batch(),
+#  reading a sysfs attribute per device against one SysfsAgent query, and
+#  pulling a large log as text against ConsoleTransfer:
+#
+#      python -m common.util.standin.SlowSOL [commands] [latency ms]
+#      python -m common.util.standin.SlowSOL bulk [KB] [drops per MB]
+#      python -m common.util.standin.SlowSOL batch [commands] [latency ms]
+#      python -m common.util.standin.SlowSOL sysfs [devices] [latency ms]
+#
+#  'python -m common.util.standin.SlowSOL relay <latency ms> <baud> [drops]'
+#  is the relay itself.
+
+import os
+import pty
+import sys
+import tty
+import time
+import random
+import select
+import shutil
+import tempfile
+
+import pexpect
+
+from common.OpTestConsole import ConsoleStream, run_framed, run_batch_framed
+from common.OpTestTransfer import ConsoleTransfer
+from common.OpTestSysfs import SysfsAgent
+from common.Exceptions import CommandFailed
+
+PROMPT = r"\[console-pexpect\]#$"
+
+##
+# @brief Run bash on a pty, relaying stdin/stdout with latency and a
+#        byte rate limit in each direction, dropping on average drops
+#        characters per MB of shell output
+#
+def relay(latency=0.02, baud=115200, drops=0):
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.execvp('bash', ['bash', '--norc', '--noprofile'])
+    byte_time = 10.0 / baud
+    stdin = sys.stdin.fileno()
+    stdout = sys.stdout.fileno()
+    # Only the shell's pty echoes and translates line endings
+    tty.setraw(stdin)
+    while True:
+        r, w, x = select.select([fd, stdin], [], [])
+        if fd in r:
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                break
+            if not data:
+                break
+            time.sleep(latency + len(data) * byte_time)
+            if drops and random.random() < len(data) * drops / 1048576.0:
+                i = random.randrange(len(data))
+                data = data[:i] + data[i + 1:]
+            os.write(stdout, data)
+        if stdin in r:
+            data = os.read(stdin, 4096)
+            if not data:
+                break
+            time.sleep(latency + len(data) * byte_time)
+            os.write(fd, data)
+
+##
+# @brief run_command() as the consoles did it before framing
+#
+def run_two_exchanges(console, command, timeout=60):
+    console.sendline(command)
+    console.expect("\n") # from us
+    console.expect(PROMPT, timeout)
+    output = console.before
+    console.sendline("echo $?")
+    console.expect("\n") # from us
+    console.expect(PROMPT, timeout)
+    exitcode = int(console.before)
+    if exitcode != 0:
+        raise CommandFailed(command, output.splitlines(), exitcode)
+    return output.splitlines()
+
+def connect(latency, drops=0):
+    child = pexpect.spawn('%s -m common.util.standin.SlowSOL relay %d 115200 %d'
+                          % (sys.executable, latency, drops))
+    console = ConsoleStream(child, echo=None)
+    # The relay is raw by the time bash's first prompt comes through
+    console.expect(r'[#$] ')
+    console.sendline("bind 'set enable-bracketed-paste off'; PS1=[console-pexpect]\\#")
+    console.expect("\n") # from us
+    console.expect(PROMPT)
+    return console
+
+def rate(console, run, commands):
+    start = time.time()
+    for i in range(commands):
+        assert run(console, 'echo line %d; true' % i) == ['line %d' % i]
+    try:
+        run(console, 'false')
+        assert False
+    except CommandFailed as cf:
+        assert cf.exitcode == 1
+    return commands / (time.time() - start)
+
+def benchmark(commands=50, latency=20):
+    console = connect(latency)
+    before = rate(console, run_two_exchanges, commands)
+    after = rate(console, run_framed, commands)
+    console.close()
+    print "%d commands over a %dms, 115200 baud link" % (commands, latency)
+    print "  prompt + 'echo $?' : %.1f commands/s" % before
+    print "  framed             : %.1f commands/s (%.1fx)" % (after, after / before)
+
+##
+# @brief run_command() for a bare ConsoleStream, as the console classes have
+#
+class FramedShell():
+    def __init__(self, console):
+        self.console = console
+
+    def run_command(self, command, timeout=60):
+        return run_framed(self.console, command, timeout)
+
+    def run_command_ignore_fail(self, command, timeout=60):
+        try:
+            return self.run_command(command, timeout)
+        except CommandFailed as cf:
+            return cf.output
+
+def msglog(kb):
+    lines = []
+    size = 0
+    i = 0
+    while size < kb * 1024:
+        line = ('[%5d.%09d,%d] PHB#%04x[%d:%d]: CRESET: Unexpected slot state %08x, resetting...'
+                % (i / 100, i * 7919 % 1000000000, 5 + i % 3, i % 6, i % 2, i % 6, i * 31))
+        lines.append(line)
+        size += len(line) + 1
+        i += 1
+    return lines
+
+def bulk(kb=128, drops=0):
+    expected = msglog(kb)
+    with tempfile.NamedTemporaryFile(suffix='.msglog', delete=False) as f:
+        f.write('\n'.join(expected) + '\n')
+    shell = FramedShell(connect(20, drops))
+    try:
+        start = time.time()
+        text = shell.run_command_ignore_fail('cat %s' % f.name, timeout=600)
+        text_time = time.time() - start
+        text_bad = sum(1 for a, b in zip(text, expected) if a != b) + abs(len(text) - len(expected))
+        transfer = ConsoleTransfer(shell)
+        start = time.time()
+        pulled = transfer.run_command('cat %s' % f.name, timeout=30)
+        transfer_time = time.time() - start
+        assert pulled == expected
+    finally:
+        shell.console.close()
+        os.unlink(f.name)
+    print "%d KB msglog over a 115200 baud link, %d dropped characters per MB" % (kb, drops)
+    print "  as text          : %.1f s, %d damaged lines" % (text_time, text_bad)
+    print "  ConsoleTransfer  : %.1f s (%.1fx), intact, %d chunks, %d retransmitted" % (
+        transfer_time, text_time / transfer_time,
+        transfer.stats['chunks'], transfer.stats['retransmits'])
+
+def batch(commands=8, latency=20, rounds=5):
+    console = connect(latency)
+    cmds = ['echo line %d; ls / >/dev/null' % i for i in range(commands)]
+    try:
+        start = time.time()
+        for i in range(rounds):
+            for cmd in cmds:
+                run_framed(console, cmd)
+        single = (time.time() - start) / rounds
+        start = time.time()
+        for i in range(rounds):
+            results = run_batch_framed(console, cmds)
+        batched = (time.time() - start) / rounds
+        assert [r.output for r in results] == [['line %d' % i] for i in range(commands)]
+    finally:
+        console.close()
+    print "%d commands over a %dms, 115200 baud link" % (commands, latency)
+    print "  run_command() each : %.0f ms" % (single * 1000)
+    print "  run_batch()        : %.0f ms (%.1fx)" % (batched * 1000, single / batched)
+
+def sysfs(devices=200, latency=20):
+    root = tempfile.mkdtemp()
+    for i in range(devices):
+        os.makedirs('%s/%04x:00:00.0' % (root, i))
+        with open('%s/%04x:00:00.0/eeh_pe_config_addr' % (root, i), 'w') as f:
+            f.write('0x%x\n' % (i * 8))
+    shell = FramedShell(connect(latency))
+    try:
+        start = time.time()
+        one = {}
+        for dev in shell.run_command('ls -1 %s' % root):
+            one[dev] = shell.run_command('cat %s/%s/eeh_pe_config_addr' % (root, dev))[0]
+        single = time.time() - start
+        agent = SysfsAgent(shell)
+        agent.push()
+        start = time.time()
+        values = agent.query(['%s/*/eeh_pe_config_addr' % root])
+        queried = time.time() - start
+        assert dict((p.split('/')[-2], v) for p, v in values.items()) == one
+    finally:
+        shell.console.close()
+        shutil.rmtree(root)
+    print "eeh_pe_config_addr of %d devices over a %dms, 115200 baud link" % (devices, latency)
+    print "  cat per device : %.1f s" % single
+    print "  SysfsAgent     : %.2f s (%.0fx)" % (queried, single / queried)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'relay':
+        relay(int(sys.argv[2]) / 1000.0, int(sys.argv[3]),
+              int(sys.argv[4]) if len(sys.argv) > 4 else 0)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'bulk':
+        bulk(int(sys.argv[2]) if len(sys.argv) > 2 else 128,
+             int(sys.argv[3]) if len(sys.argv) > 3 else 0)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'sysfs':
+        sysfs(int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+              int(sys.argv[3]) if len(sys.argv) > 3 else 20)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        batch(int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+              int(sys.argv[3]) if len(sys.argv) > 3 else 20)
+    else:
+        benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 20)
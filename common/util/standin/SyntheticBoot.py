@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/util/standin/SyntheticBoot.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package SyntheticBoot
+#  Synthetic verbose IPL console output, and a microbenchmark of the boot
+#  milestone matcher against what the expect() based waits cost on it:
+#
+#      python -m common.util.standin.SyntheticBoot [istep lines]
+
+import re
+import sys
+import time
+
+from common.OpTestMilestones import MultiPatternMatcher, SIGNATURES, BootMilestone
+
+def ipl_log(isteps=20000):
+    lines = ['--== Welcome to Hostboot hostboot-5113a2b/hbicore.bin ==--']
+    for i in range(isteps):
+        lines.append('%3d.%05d|ISTEP %2d.%2d - host_step_%d ..................................'
+                     % (i / 1000, i % 100000, i / 1000, i % 30, i))
+    lines.append('[   41.812345] OPAL skiboot-v5.9-112-g1af4b3f starting...')
+    for i in range(isteps / 4):
+        lines.append('[   42.%06d] PHB#%04x: ... probing device %d' % (i, i & 0xffff, i))
+    lines.append('[    0.000000] Linux version 4.13.0-openpower1 (petitboot)')
+    lines.append(' Petitboot (v1.6.1-p9c3d0a2)')
+    lines.append(' Enter=accept, e=edit, n=new, x=exit, l=language, h=help')
+    lines.append('Performing kexec')
+    lines.append('[    0.000000] Linux version 4.13.0 (host)')
+    for i in range(isteps / 4):
+        lines.append('[    %d.%06d] systemd[1]: Starting unit %d...' % (i / 1000, i, i))
+    lines.append('host login: ')
+    return '\n'.join(lines)
+
+def chunks(data, size=4096):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+##
+# @brief The old waits: a pexpect style buffer re-searched in full for
+#        each new read, one expect() at a time
+#
+def expect_waits(reads):
+    steps = [(['x=exit', 'Petitboot'], 2),
+             (['Performing kexec', 'kexec_core: Starting new kernel'], 1),
+             (['login: '], 1)]
+    scanned = 0
+    buf = ''
+    step = 0
+    seen = 0
+    for data in reads:
+        buf += data
+        while step < len(steps):
+            regex = re.compile('|'.join(steps[step][0]))
+            scanned += len(buf)
+            m = regex.search(buf)
+            if not m:
+                break
+            buf = buf[m.end():]
+            seen += 1
+            if seen == steps[step][1]:
+                step += 1
+                seen = 0
+    return scanned, step == len(steps)
+
+def matcher_waits(reads):
+    matcher = MultiPatternMatcher([s for m, s in SIGNATURES])
+    hits = []
+    for data in reads:
+        hits.extend(matcher.feed(data))
+    return sum(len(d) for d in reads), [SIGNATURES[i][0] for e, i in hits]
+
+def benchmark(isteps=20000):
+    log = ipl_log(isteps)
+    reads = chunks(log)
+    start = time.time()
+    scanned, done = expect_waits(reads)
+    expect_time = time.time() - start
+    assert done
+    start = time.time()
+    matched, hits = matcher_waits(reads)
+    matcher_time = time.time() - start
+    assert BootMilestone.LOGIN in hits
+    print "IPL log %d KB in %d reads" % (len(log) / 1024, len(reads))
+    print "  expect() per wait   : %.1f ms, %d MB scanned" % (
+        expect_time * 1000, scanned / (1024 * 1024))
+    print "  milestone automaton : %.1f ms, %d MB scanned, %d milestones: %s" % (
+        matcher_time * 1000, matched / (1024 * 1024), len(hits), ', '.join(hits))
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
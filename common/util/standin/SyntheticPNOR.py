@@ -0,0 +1,267 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/util/standin/SyntheticPNOR.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package SyntheticPNOR
+#  A 64MB PNOR image with an FFS TOC and a typical set of partitions, and
+#  a BMC standing in for a real one: a local shell whose pflash works on a
+#  flash file at SPI speeds (scaled down, reads 20 times faster than erase
+#  plus program as on an AST2400). The benchmark flashes an image that
+#  differs from flash in PAYLOAD only, first whole as pnor_img_flash_openbmc
+#  does, then with pnor_img_flash_diff. The ffs benchmark times OpTestFFS
+#  listing, ECC checking and extracting the image against reading it into
+#  memory, copying partitions out and checking ECC a word at a time:
+#
+#      python -m common.util.standin.SyntheticPNOR [changed partition...]
+#      python -m common.util.standin.SyntheticPNOR ffs
+#      python -m common.util.standin.SyntheticPNOR build <file> [seed] [changed...]
+#
+#  'python -m common.util.standin.SyntheticPNOR pflash <flash> <args>'
+#  is the pflash emulation.
+
+import os
+import sys
+import time
+import struct
+import getopt
+import shutil
+import hashlib
+import tempfile
+import subprocess
+
+from common.OpTestFFS import FFS_HDR, FFS_ENTRY, FFS_MAGIC, FFS_VERSION_1, \
+    FFS_TYPE_DATA, FFS_TYPE_PARTITION, FFS_ENTRY_INTEG_ECC, ECC_MATRIX, \
+    FFSImage, ffs_checksum, ecc_encode
+from common.OpTestBMC import OpTestBMC
+from common.Exceptions import CommandFailed
+
+FLASH_SIZE = 64 * 1024 * 1024
+BLOCK = 0x1000
+TOC_SIZE = 0x8000
+
+# bytes per second, scaled down from a real SPI flash
+READ_RATE = 160 * 1024 * 1024
+WRITE_RATE = 8 * 1024 * 1024
+
+# name, size, ECC protected
+PARTITIONS = [('HBEL', 0x24000, True), ('GUARD', 0x5000, True),
+              ('NVRAM', 0x90000, False), ('SECBOOT', 0x24000, True),
+              ('DJVPD', 0x120000, True), ('MVPD', 0x90000, True),
+              ('CVPD', 0x48000, True), ('HBB', 0x100000, True),
+              ('HBD', 0x120000, True), ('HBI', 0x1200000, True),
+              ('SBE', 0x5d000, True), ('HCODE', 0x120000, True),
+              ('HBRT', 0x480000, True), ('PAYLOAD', 0x100000, False),
+              ('BOOTKERNEL', 0x1800000, False), ('OCC', 0x120000, True),
+              ('FIRDATA', 0x3000, True), ('CAPP', 0x24000, True),
+              ('BMC_INV', 0x22000, False), ('HBBL', 0x9000, True),
+              ('ATTR_TMP', 0x8000, True), ('ATTR_PERM', 0x8000, True),
+              ('VERSION', 0x2000, False), ('IMA_CATALOG', 0x48000, True),
+              ('RINGOVD', 0x20000, False), ('WOFDATA', 0x300000, True),
+              ('HB_VOLATILE', 0x5000, True), ('MEMD', 0x9000, True),
+              ('SBKT', 0x4000, True), ('HDAT', 0x8000, True)]
+
+def entry(i, name, base, size, type, ecc):
+    words = [base / BLOCK, size / BLOCK, 0xffffffff, i + 1, type, 0, size, 0, 0, 0, 0]
+    user = [FFS_ENTRY_INTEG_ECC if ecc else 0] + [0] * 15
+    raw = FFS_ENTRY.pack(name, *(words + user + [0]))
+    return FFS_ENTRY.pack(name, *(words + user + [ffs_checksum(raw)]))
+
+def toc(parts):
+    hdr = [FFS_MAGIC, FFS_VERSION_1, TOC_SIZE / BLOCK, FFS_ENTRY.size, len(parts),
+           BLOCK, FLASH_SIZE / BLOCK, 0, 0, 0, 0]
+    raw = FFS_HDR.pack(*(hdr + [0]))
+    raw = FFS_HDR.pack(*(hdr + [ffs_checksum(raw)]))
+    entries = ''.join(entry(i, *p) for i, p in enumerate(parts))
+    return (raw + entries).ljust(TOC_SIZE, '\xff')
+
+def contents(name, size, seed):
+    pattern = hashlib.sha256(name + seed).digest() * 32
+    return (pattern * (size / len(pattern) + 1))[:size]
+
+##
+# @brief Write a PNOR image, with the partitions in changed filled from a
+#        different seed
+#
+def build(path, seed='op-test', changed=()):
+    parts = [('part', 0, TOC_SIZE, FFS_TYPE_PARTITION, False)]
+    base = TOC_SIZE
+    for name, size, ecc in PARTITIONS:
+        parts.append((name, base, size, FFS_TYPE_DATA, ecc))
+        base += size
+    parts.append(('BACKUP_PART', FLASH_SIZE - TOC_SIZE, TOC_SIZE, FFS_TYPE_PARTITION, False))
+    assert base <= FLASH_SIZE - TOC_SIZE
+    table = toc(parts)
+    with open(path, 'wb') as f:
+        f.write(table)
+        for name, base, size, type, ecc in parts[1:-1]:
+            part_seed = seed + ('*' if name in changed else '')
+            if ecc:
+                words = size / 9
+                f.write(ecc_encode(contents(name, words * 8, part_seed)).ljust(size, '\xff'))
+            else:
+                f.write(contents(name, size, part_seed))
+        f.write('\xff' * (FLASH_SIZE - TOC_SIZE - f.tell()))
+        f.write(table)
+
+##
+# @brief pflash -r/-p/-e/-E by address on a flash file, at READ_RATE and
+#        WRITE_RATE
+#
+def pflash(flash, args):
+    opts, rest = getopt.getopt(args, 'r:p:a:s:eEf')
+    opts = dict(opts)
+    address = int(opts.get('-a', 0))
+    with open(flash, 'r+b') as f:
+        if '-r' in opts:
+            size = int(opts.get('-s', FLASH_SIZE - address))
+            f.seek(address)
+            data = f.read(size)
+            time.sleep(float(len(data)) / READ_RATE)
+            with open(opts['-r'], 'wb') as out:
+                out.write(data)
+            return
+        if '-E' in opts:
+            f.write('\xff' * FLASH_SIZE)
+            time.sleep(float(FLASH_SIZE) / WRITE_RATE)
+        data = open(opts['-p'], 'rb').read()
+        size = int(opts.get('-s', len(data)))
+        f.seek(address)
+        f.write(data[:size])
+        time.sleep(float(size) / WRITE_RATE)
+
+class StandinBMC(OpTestBMC):
+    def __init__(self, flash):
+        OpTestBMC.__init__(self, ip='standin', username='root', password='')
+        self.bin = tempfile.mkdtemp(prefix='op-test-standin-')
+        with open(os.path.join(self.bin, 'pflash'), 'w') as f:
+            f.write('#!/bin/sh\nexec %s -m common.util.standin.SyntheticPNOR pflash %s "$@"\n'
+                    % (sys.executable, flash))
+        os.chmod(os.path.join(self.bin, 'pflash'), 0755)
+        self.env = dict(os.environ, PATH=self.bin + ':' + os.environ['PATH'],
+                        PYTHONPATH=os.getcwd())
+
+    def run_command(self, command, timeout=300):
+        p = subprocess.Popen(['sh', '-c', command], stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT, env=self.env)
+        output = p.communicate()[0].splitlines()
+        if p.returncode != 0:
+            raise CommandFailed(command, output, p.returncode)
+        return output
+
+    def image_transfer(self, i_imageName, copy_as=None, force=False):
+        shutil.copy(i_imageName, '/tmp/' + (copy_as or os.path.basename(i_imageName)))
+        return 0
+
+    def close(self):
+        shutil.rmtree(self.bin, ignore_errors=True)
+
+def benchmark(changed=('PAYLOAD',)):
+    workdir = tempfile.mkdtemp(prefix='op-test-pnor-')
+    flash = os.path.join(workdir, 'flash')
+    image = os.path.join(workdir, 'new.pnor')
+    build(flash)
+    build(image, changed=changed)
+    bmc = StandinBMC(flash)
+    try:
+        start = time.time()
+        bmc.image_transfer(image)
+        bmc.pnor_img_flash_openbmc(os.path.basename(image))
+        full = time.time() - start
+        build(flash)
+        start = time.time()
+        diff = bmc.pnor_img_flash_diff(image)
+        partial = time.time() - start
+        same = open(flash, 'rb').read() == open(image, 'rb').read()
+        print "Full flash: %.2fs, %d bytes written" % (full, FLASH_SIZE)
+        print "Diff flash: %.2fs, %d bytes written, %d skipped (%s), flash %s the image" % (
+            partial, diff.bytes_written, diff.bytes_skipped, ' '.join(diff.written),
+            "matches" if same else "DOES NOT MATCH")
+    finally:
+        bmc.close()
+        os.remove('/tmp/' + os.path.basename(image))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def word_ecc_errors(data):
+    errors = 0
+    for i in range(0, len(data) - 8, 9):
+        word = struct.unpack('>Q', data[i:i + 8])[0]
+        ecc = sum((bin(ECC_MATRIX[b] & word).count('1') & 1) << b for b in range(8))
+        if ecc != ord(data[i + 8]):
+            errors += 1
+    return errors
+
+def ffs_benchmark():
+    workdir = tempfile.mkdtemp(prefix='op-test-pnor-')
+    path = os.path.join(workdir, 'image.pnor')
+    build(path)
+    try:
+        start = time.time()
+        with FFSImage.from_file(path) as image:
+            image.info()
+        mapped_toc = time.time() - start
+        start = time.time()
+        FFSImage(open(path, 'rb').read(), path).info()
+        read_toc = time.time() - start
+
+        with FFSImage.from_file(path) as image:
+            ecc_bytes = sum(p.size for p in image.partitions.values() if p.ecc)
+            start = time.time()
+            errors = image.verify()
+            columns = time.time() - start
+            hbb = image.partition('HBB')
+            start = time.time()
+            word_errors = word_ecc_errors(str(image.read(hbb)))
+            words = time.time() - start
+            start = time.time()
+            for p in image.ranges():
+                image.extract(p, os.devnull)
+            mapped_extract = time.time() - start
+        start = time.time()
+        data = open(path, 'rb').read()
+        for p in FFSImage(data, path).ranges():
+            with open(os.devnull, 'wb') as f:
+                f.write(data[p.base:p.base + p.size])
+        read_extract = time.time() - start
+
+        print "TOC listing: %.1fms mapped, %.1fms reading the image" % (
+            mapped_toc * 1000, read_toc * 1000)
+        print "ECC check: %.1f MB/s by columns (%d MB, %d bad partitions), " \
+            "%.1f MB/s a word at a time (HBB, %d bad words)" % (
+            ecc_bytes / columns / 1048576, ecc_bytes / 1048576, len(errors),
+            hbb.size / words / 1048576, word_errors)
+        print "Extracting every partition: %.1fms from the map, %.1fms reading and copying" % (
+            mapped_extract * 1000, read_extract * 1000)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'pflash':
+        pflash(sys.argv[2], sys.argv[3:])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'ffs':
+        ffs_benchmark()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'build':
+        build(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else 'op-test', sys.argv[4:])
+    else:
+        benchmark(sys.argv[1:] or ('PAYLOAD',))
@@ -0,0 +1,154 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-test-framework/common/util/standin/SyntheticSEL.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2017
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package SyntheticSEL
+#  Synthetic 'sel elist' / 'sdr elist' output standing in for a BMC with a
+#  long event log, and a microbenchmark of the OpTestIPMI parsers on it
+#  against the regex-per-line approach:
+#
+#      python -m common.util.standin.SyntheticSEL [entries]
+
+import re
+import sys
+import time
+
+from common.OpTestIPMI import parse_sel_list, parse_sdr_elist
+
+EVENTS = [('OS Boot #0x51', 'C: boot completed', 'Asserted'),
+          ('System ACPI Power State Host Status', 'S0/G0: working', 'Asserted'),
+          ('System ACPI Power State Host Status', 'S5/G2: soft-off', 'Asserted'),
+          ('Processor #0x52', 'Presence detected', 'Asserted'),
+          ('Memory #0x53', 'Correctable ECC', 'Asserted'),
+          ('System Event #0x01', 'OEM System boot event', 'Asserted'),
+          ('Temperature Ambient Temp', 'Upper Critical going high', 'Deasserted'),
+          ('Processor #0x54', 'Transition to Non-recoverable', 'Asserted')]
+
+def sel_elist(entries=10000):
+    lines = []
+    stamp = 1497435723
+    for i in range(entries):
+        sensor, event, direction = EVENTS[(i * 7) % len(EVENTS)]
+        when = time.strftime('%m/%d/%Y | %H:%M:%S', time.gmtime(stamp + i * 13))
+        lines.append('%4x | %s | %s | %s | %s' % (i + 1, when, sensor, event, direction))
+    return '\n'.join(lines) + '\n'
+
+def sdr_elist(sensors=500):
+    lines = []
+    for i in range(sensors):
+        if i % 3:
+            lines.append('Temp %-11d | %02xh | ok  | 3.%d | %d degrees C'
+                         % (i, i & 0xff, i % 16, 20 + i % 40))
+        else:
+            lines.append('State %-10d | %02xh | ok  | 35.%d | Device Enabled'
+                         % (i, i & 0xff, i % 16))
+    return '\n'.join(lines) + '\n'
+
+SEL_LINE = re.compile(r'^\s*([0-9a-fA-F]+)\s*\|\s*([^|]*?)\s*\|\s*([^|]*?)\s*\|'
+                      r'\s*([^|]*?)\s*\|\s*([^|]*?)\s*\|\s*([^|]*?)\s*$')
+
+##
+# @brief The baseline: one regex match per line, one dict per record
+#
+def regex_sel(output):
+    rows = []
+    for line in output.splitlines():
+        m = SEL_LINE.match(line)
+        if m:
+            rows.append({'id': int(m.group(1), 16), 'date': m.group(2),
+                         'time': m.group(3), 'sensor': m.group(4),
+                         'event': m.group(5), 'direction': m.group(6)})
+    return rows
+
+##
+# @brief Memory held by the records, following containers and counting
+#        every object once, so the dict keys all records share are only
+#        counted once
+#
+# @return bytes per record
+#
+def record_size(records):
+    seen = set()
+    stack = list(records)
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (tuple, list)):
+            stack.extend(obj)
+    return size / len(records)
+
+def best_of(fn, repeat=5):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        result = fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+def benchmark(entries=10000):
+    output = sel_elist(entries)
+    regex_time, dicts = best_of(lambda: regex_sel(output))
+    parse_time, table = best_of(lambda: parse_sel_list(output))
+    assert len(dicts) == len(table) == entries
+    assert dicts[-1]['event'] == table[-1].event
+    print "SEL %d entries, %d KB of text" % (entries, len(output) / 1024)
+    print "  regex per line -> dicts : %.1f ms, %d bytes/record" % (
+        regex_time * 1000, record_size(dicts))
+    print "  split -> namedtuples    : %.1f ms, %d bytes/record (%.1fx)" % (
+        parse_time * 1000, record_size(table.rows), regex_time / parse_time)
+
+    # Several assertions against one fetch: rescanning the text every time
+    # versus sharing the parsed table and its index
+    ids = [1, entries / 2, entries]
+    def rescan():
+        for i in ids:
+            [d for d in regex_sel(output) if d['id'] == i]
+        return 'Transition to Non-recoverable' in output
+    def shared():
+        for i in ids:
+            table.get(i)
+        return len(table.find('Transition to Non-recoverable')) > 0
+    rescan_time = best_of(rescan)[0]
+    shared_time = best_of(shared)[0]
+    print "  %d lookups + error scan, reparse each : %.1f ms" % (len(ids), rescan_time * 1000)
+    print "  %d lookups + error scan, shared fetch : %.1f ms" % (len(ids), shared_time * 1000)
+
+    sdr = sdr_elist()
+    sdr_time, sdr_table = best_of(lambda: parse_sdr_elist(sdr))
+    temps = [v for v in sdr_table.column('value') if v == v]
+    print "SDR %d sensors parsed in %.2f ms, %d numeric readings, max %.0f" % (
+        len(sdr_table), sdr_time * 1000, len(temps), max(temps))
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -42,6 +42,7 @@ import OpTestConfiguration
 from common.OpTestUtil import OpTestUtil
 from common.OpTestSystem import OpSystemState
 from common.Exceptions import CommandFailed, KernelModuleNotLoaded, KernelConfigNotSet
+from common.OpTestSysfs import SysfsAgent
 class I2CDetectUnsupported(Exception):
     """Asked to do i2c detect on a bus that doesn't support detection
     """
@@ -344,12 +345,11 @@ class FullI2C(I2C, unittest.TestCase):
         except CommandFailed as cf:
             self.assertEqual(cf.exitcode, 0, str(cf))
 
-        # Checking the sysfs entry of each i2c bus
-        for l_bus in l_list1:
-            try:
-                l_res = self.c.run_command("ls -l /sys/class/i2c-adapter/%s" % l_bus)
-            except CommandFailed as cf:
-                self.assertEqual(cf.exitcode, 0, str(cf))
+        # Checking the sysfs entry of each i2c bus, all in one exchange
+        l_res = SysfsAgent(self.c).query(["/sys/class/i2c-adapter/%s/name" % l_bus
+                                          for l_bus in l_list1])
+        self.assertEqual(l_res.missing + l_res.errors.keys(), [],
+                         "i2c buses without a sysfs entry")
 
         return BMC_CONST.FW_SUCCESS
 
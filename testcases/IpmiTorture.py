@@ -72,7 +72,8 @@ class InbandIpmiThread(threading.Thread):
 
     def inband_ipmi_thread(self, threadName, cmd, t):
         execution_time = time.time() + 60*t
-        self.c = self.host.get_ssh_connection()
+        # Each thread gets its own SSH channel, the shell isn't shared
+        self.c = self.host.get_ssh_pool()
         print "Starting %s for inband-ipmi %s" % (threadName, cmd)
         while True:
             try:
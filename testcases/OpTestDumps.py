@@ -55,8 +55,7 @@ class OpTestDumps():
         self.cv_SYSTEM.goto_state(OpSystemState.OS)
 
     def tearDown(self):
-        self.cv_HOST.host_gather_opal_msg_log()
-        self.cv_HOST.host_gather_kernel_log()
+        self.cv_HOST.host_gather_logs()
 
     def trigger_dump(self):
         if self.test == "nmi_dump":
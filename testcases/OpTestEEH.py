@@ -42,6 +42,7 @@ import OpTestConfiguration
 from common.OpTestUtil import OpTestUtil
 from common.OpTestSystem import OpSystemState
 from common.Exceptions import CommandFailed
+from common.OpTestSysfs import SysfsAgent
 
 EEH_HIT = 0
 EEH_MISS = 1
@@ -133,13 +134,11 @@ class OpTestEEH(unittest.TestCase):
         pe_dic = {}
         # Get list of PE's
         console = self.cv_SYSTEM.sys_get_ipmi_console()
-        res = console.run_command("ls /sys/bus/pci/devices/ | awk {'print $1'}")
-        for pe in res:
-            if not pe:
-                continue
-            cmd = "cat /sys/bus/pci/devices/%s/eeh_pe_config_addr" % pe
-            addr = console.run_command(cmd)
-            pe_dic[pe] = ((addr[0]).split("x"))[1]
+        # One exchange for every device, rather than one per device
+        res = SysfsAgent(console).query(["/sys/bus/pci/devices/*/eeh_pe_config_addr"])
+        for path, addr in res.items():
+            pe = path.split("/")[-2]
+            pe_dic[pe] = (addr.split("x"))[1]
         return pe_dic
 
 
@@ -276,8 +275,7 @@ class OpTestEEHbasic_fenced_phb(OpTestEEH):
         pci_domains = self.cv_HOST.host_get_list_of_pci_domains()
         print "Skipping the root phb %s for fenced PHB Testcase" % root_domain
         pci_domains.remove(root_domain)
-        self.cv_HOST.host_gather_opal_msg_log()
-        self.cv_HOST.host_gather_kernel_log()
+        self.cv_HOST.host_gather_logs()
         l_con = self.cv_SYSTEM.sys_get_ipmi_console()
         self.cv_SYSTEM.host_console_login()
         self.cv_SYSTEM.host_console_unique_prompt()
@@ -332,8 +330,7 @@ class OpTestEEHmax_fenced_phb(OpTestEEH):
         pci_domains = self.cv_HOST.host_get_list_of_pci_domains()
         print "Skipping the root phb %s for fenced PHB Testcase" % root_domain
         pci_domains.remove(root_domain)
-        self.cv_HOST.host_gather_opal_msg_log()
-        self.cv_HOST.host_gather_kernel_log()
+        self.cv_HOST.host_gather_logs()
         # Set the max EEH freeze count to 1
         cmd = "echo 1 > /sys/kernel/debug/powerpc/eeh_max_freezes"
         self.cv_HOST.host_run_command(cmd)
@@ -396,8 +393,7 @@ class OpTestEEHbasic_frozen_pe(OpTestEEH):
         print "Skipping the root phb %s for frozen PE Testcase" % root_domain
         pci_domains.remove(root_domain)
         pe_dic = self.get_dic_of_pe_vs_addr()
-        self.cv_HOST.host_gather_opal_msg_log()
-        self.cv_HOST.host_gather_kernel_log()
+        self.cv_HOST.host_gather_logs()
         l_con = self.cv_SYSTEM.sys_get_ipmi_console()
         self.cv_SYSTEM.host_console_login()
         self.cv_SYSTEM.host_console_unique_prompt()
@@ -481,8 +477,7 @@ class OpTestEEHmax_frozen_pe(OpTestEEH):
         cmd = "echo 1 > /sys/kernel/debug/powerpc/eeh_max_freezes"
         self.cv_HOST.host_run_command(cmd)
         pe_dic = self.get_dic_of_pe_vs_addr()
-        self.cv_HOST.host_gather_opal_msg_log()
-        self.cv_HOST.host_gather_kernel_log()
+        self.cv_HOST.host_gather_logs()
         l_con = self.cv_SYSTEM.sys_get_ipmi_console()
         self.cv_SYSTEM.host_console_login()
         self.cv_SYSTEM.host_console_unique_prompt()
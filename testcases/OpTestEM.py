@@ -44,6 +44,7 @@ from common.OpTestUtil import OpTestUtil
 from common.OpTestSystem import OpSystemState
 from common.Exceptions import CommandFailed
 from common.OpTestIPMI import IPMIConsoleState
+from common.OpTestSysfs import SysfsAgent
 
 
 class OpTestEM():
@@ -183,18 +184,22 @@ class OpTestEM():
     #
     # @param i_idle @type str: this is the cpu idle state to be verified for enable
     def verify_enable_idle_state(self, i_idle):
-        l_cmd = "cat /sys/devices/system/cpu/cpu0/cpuidle/state%s/disable" % i_idle
-        cur_value = self.c.run_command(l_cmd)
-        self.assertEqual(cur_value[0], "0", "CPU state%s not enabled" % i_idle)
+        self.verify_idle_state(i_idle, "0", "enabled")
 
     ##
     # @brief verify whether cpu idle state i_idle disabled
     #
     # @param i_idle @type str: this is the cpu idle state to be verified for disable
     def verify_disable_idle_state(self, i_idle):
-        l_cmd = "cat /sys/devices/system/cpu/cpu0/cpuidle/state%s/disable" % i_idle
-        cur_value = self.c.run_command(l_cmd)
-        self.assertEqual(cur_value[0], "1", "CPU state%s not disabled" % i_idle)
+        self.verify_idle_state(i_idle, "1", "disabled")
+
+    # Every CPU, in one exchange
+    def verify_idle_state(self, i_idle, i_value, i_what):
+        l_glob = "/sys/devices/system/cpu/cpu*/cpuidle/state%s/disable" % i_idle
+        values = SysfsAgent(self.c).query([l_glob])
+        self.assertTrue(values, "No CPU has idle state%s" % i_idle)
+        wrong = [path.split("/")[5] for path, value in values.items() if value != i_value]
+        self.assertEqual(wrong, [], "CPU state%s not %s on %s" % (i_idle, i_what, ' '.join(wrong)))
 
 
 class slw_info(OpTestEM, unittest.TestCase):
@@ -51,6 +51,7 @@ from common.OpTestUtil import OpTestUtil
 from common.OpTestSystem import OpSystemState
 from common.OpTestConstants import OpTestConstants as BMC_CONST
 from common.OpTestError import OpTestError
+from common.OpTestImageCache import PNOR
 
 class OpTestFlashBase(unittest.TestCase):
     def setUp(self):
@@ -66,6 +67,8 @@ class OpTestFlashBase(unittest.TestCase):
         self.bmc_ip = conf.args.bmc_ip
         self.bmc_username = conf.args.bmc_username
         self.bmc_password = conf.args.bmc_password
+        self.force_flash = conf.args.force_flash
+        self.image_compression = conf.args.image_compression
 
     def validate_side_activated(self):
         l_bmc_side, l_pnor_side = self.cv_IPMI.ipmi_get_side_activated()
@@ -93,8 +96,28 @@ class OpTestFlashBase(unittest.TestCase):
         return True
 
     def scp_file(self, src_file_path, dst_file_path):
-        self.util.copyFilesToDest(src_file_path, self.bmc_username, self.bmc_ip,
-                                  dst_file_path, self.bmc_password, "2", BMC_CONST.SCP_TO_REMOTE)
+        self.cv_BMC.get_image_cache().stage(src_file_path, dst_file_path, self.force_flash)
+
+    ##
+    # @brief Whether image is what was last flashed into slot (a pflash
+    #        partition, PNOR for the whole image, or an installed lid file)
+    #
+    def already_flashed(self, image, slot):
+        if self.force_flash:
+            return False
+        if self.cv_BMC.get_image_cache().flashed(image, slot):
+            print "# %s is already flashed in %s, not flashing it again" % (image, slot)
+            return True
+        return False
+
+    def record_flashed(self, image, slot):
+        self.cv_BMC.get_image_cache().record_flash(image, slot)
+
+    ##
+    # @brief Flash is about to be rewritten behind the image cache's back
+    #
+    def forget_flashed(self):
+        self.cv_BMC.get_image_cache().forget_flashed()
 
     def get_version_tar(self, file_path):
         tar = tarfile.open(file_path)
@@ -120,6 +143,7 @@ class PNORFLASH(OpTestFlashBase):
         conf = OpTestConfiguration.conf
         self.pnor = conf.args.host_pnor
         self.pflash = conf.args.pflash
+        self.flash_mode = conf.args.pnor_flash_mode
         super(PNORFLASH, self).setUp()
 
     def runTest(self):
@@ -128,35 +152,44 @@ class PNORFLASH(OpTestFlashBase):
         if any(s in self.bmc_type for s in ("FSP", "QEMU")):
             self.skipTest("OP AMI/OpenBMC PNOR Flash test")
         if self.pflash:
-            self.cv_BMC.image_transfer(self.pflash, "pflash")
+            self.cv_BMC.image_transfer(self.pflash, "pflash", self.force_flash)
 
         if "AMI" in self.bmc_type:
             if not self.cv_BMC.validate_pflash_tool("/tmp"):
                 raise OpTestError("No pflash on BMC")
             self.validate_side_activated()
+        # a code update through REST takes the image tarball, not a raw
+        # PNOR the image cache could compare with flash
+        rest = "OpenBMC" in self.bmc_type and self.cv_BMC.has_new_pnor_code_update()
+        if not rest and self.already_flashed(self.pnor, PNOR):
+            return
         self.cv_SYSTEM.goto_state(OpSystemState.OFF)
         self.cv_SYSTEM.sys_sdr_clear()
         if "AMI" in self.bmc_type:
-            self.cv_BMC.image_transfer(self.pnor)
-            self.cv_BMC.pnor_img_flash_ami("/tmp", os.path.basename(self.pnor))
+            if self.flash_mode == "diff":
+                self.cv_BMC.pnor_img_flash_diff(self.pnor, "/tmp")
+            else:
+                self.cv_BMC.image_transfer(self.pnor, force=self.force_flash)
+                self.cv_BMC.pnor_img_flash_ami("/tmp", os.path.basename(self.pnor))
         elif "OpenBMC" in self.bmc_type:
-            if self.cv_BMC.has_new_pnor_code_update():
+            if rest:
                 print "BMC has code for the new PNOR Code update via REST"
+                self.forget_flashed()
                 version = self.get_version_tar(self.pnor)
-                self.cv_REST.upload_image(self.pnor)
-                img_ids = self.cv_REST.host_image_ids()
-                img_id = None
-                for img_id in img_ids:
-                    d = self.cv_REST.image_data(img_id)
-                    if d['data']['Activation'] == "xyz.openbmc_project.Software.Activation.Activations.Ready":
-                        break
+                self.cv_REST.upload_image(self.pnor, compress=(self.image_compression == "gzip"))
+                img_id = self.cv_REST.wait_for_ready_image("Host")
                 print "Going to activate image id: %s" % img_id 
                 self.cv_REST.activate_image(img_id)
                 self.cv_REST.wait_for_image_active_complete(img_id)
             else:
                 print "Fallback to old code update method using pflash tool"
-                self.cv_BMC.image_transfer(self.pnor)
-                self.cv_BMC.pnor_img_flash_openbmc(os.path.basename(self.pnor))
+                if self.flash_mode == "diff":
+                    self.cv_BMC.pnor_img_flash_diff(self.pnor)
+                else:
+                    self.cv_BMC.image_transfer(self.pnor, force=self.force_flash)
+                    self.cv_BMC.pnor_img_flash_openbmc(os.path.basename(self.pnor))
+        if not rest:
+            self.record_flashed(self.pnor, PNOR)
 
         console = self.cv_SYSTEM.console.get_console()
         if "AMI" in self.bmc_type:
@@ -186,50 +219,60 @@ class OpalLidsFLASH(OpTestFlashBase):
                 raise OpTestError("No pflash on BMC")
             self.validate_side_activated()
 
-        self.cv_SYSTEM.goto_state(OpSystemState.OFF)
-        self.cv_SYSTEM.sys_sdr_clear()
         if "FSP" in self.bmc_type:
             self.cv_BMC.fsp_get_console()
             if not self.cv_BMC.mount_exists():
                 raise OpTestError("Please mount NFS and retry the test")
             self.cv_BMC.fsp_run_command("/usr/sbin/sshd")
-            cmd = "rm -fr {0} 2> dev/null; mkdir -p {0}".format(self.ext_lid_test_path)
-            self.cv_BMC.fsp_run_command(cmd)
-            if self.skiboot:
-                self.cv_BMC.fsp_run_command("cp /opt/extucode/80f00100.lid %s/80f00100_bkp.lid" % self.ext_lid_test_path)
-                print "Backup of skiboot lid is in %s/80f00100_bkp.lid" % self.ext_lid_test_path
-                self.scp_file(self.skiboot, self.ext_lid_test_path + "/80f00100.lid")
-                self.cv_BMC.fsp_run_command("cp %s/80f00100.lid /opt/extucode/" % self.ext_lid_test_path)
-
-            if not self.skiroot_kernel and not self.skiroot_initramfs:
-                print "No skiroot lids provided, Flashing only skiboot"
-            else:
-                self.cv_BMC.fsp_run_command("cp /opt/extucode/80f00101.lid %s/80f00101_bkp.lid" % self.ext_lid_test_path)
-                print "Backup of skiroot kernel lid is in %s/80f00101_bkp.lid" % self.ext_lid_test_path
-                self.cv_BMC.fsp_run_command("cp /opt/extucode/80f00102.lid %s/80f00102_bkp.lid" % self.ext_lid_test_path)
-                print "Backup of skiroot initrd lid is in %s/80f00102_bkp.lid" % self.ext_lid_test_path
-                self.scp_file(self.skiroot_kernel, self.ext_lid_test_path + "/80f00101.lid")
-                self.scp_file(self.skiroot_initramfs, self.ext_lid_test_path + "/80f00102.lid")
-                self.cv_BMC.fsp_run_command("cp %s/80f00101.lid /opt/extucode/" % self.ext_lid_test_path)
-                self.cv_BMC.fsp_run_command("cp %s/80f00102.lid /opt/extucode/" % self.ext_lid_test_path)
+            slots = [(self.skiboot, "/opt/extucode/80f00100.lid"),
+                     (self.skiroot_kernel, "/opt/extucode/80f00101.lid"),
+                     (self.skiroot_initramfs, "/opt/extucode/80f00102.lid")]
+        elif "AMI" in self.bmc_type or "OpenBMC" in self.bmc_type:
+            slots = [(self.skiboot, "PAYLOAD"), (self.skiroot_kernel, "BOOTKERNEL")]
+        else:
+            slots = []
+        # lid -> where it goes, for those not already flashed there
+        changed = dict((lid, slot) for lid, slot in slots
+                       if lid and not self.already_flashed(lid, slot))
+        if slots and not changed:
+            print "All the lids given are already flashed, nothing to do"
+            return
+
+        self.cv_SYSTEM.goto_state(OpSystemState.OFF)
+        self.cv_SYSTEM.sys_sdr_clear()
+        if "FSP" in self.bmc_type:
+            # Lids staged by an earlier run are kept, so unchanged ones aren't copied again
+            self.cv_BMC.fsp_run_command("mkdir -p %s" % self.ext_lid_test_path)
+            for lid, slot in slots:
+                if lid not in changed:
+                    continue
+                name = os.path.basename(slot)
+                backup = name.replace(".lid", "_bkp.lid")
+                self.cv_BMC.fsp_run_command("cp %s %s/%s" % (slot, self.ext_lid_test_path, backup))
+                print "Backup of lid %s is in %s/%s" % (name, self.ext_lid_test_path, backup)
+                self.scp_file(lid, "%s/%s" % (self.ext_lid_test_path, name))
+                self.cv_BMC.fsp_run_command("cp %s/%s /opt/extucode/" % (self.ext_lid_test_path, name))
             print "Regenerating the hashes by running command cupdmfg -opt"
             self.cv_BMC.fsp_run_command("cupdmfg -opt")
 
         if "AMI" in self.bmc_type:
-            if self.skiboot:
-                self.cv_BMC.image_transfer(self.skiboot)
+            if self.skiboot in changed:
+                self.cv_BMC.image_transfer(self.skiboot, force=self.force_flash)
                 self.cv_BMC.skiboot_img_flash_ami("/tmp", os.path.basename(self.skiboot))
-            if self.skiroot_kernel:
-                self.cv_BMC.image_transfer(self.skiroot_kernel)
+            if self.skiroot_kernel in changed:
+                self.cv_BMC.image_transfer(self.skiroot_kernel, force=self.force_flash)
                 self.cv_BMC.skiroot_img_flash_ami("/tmp", os.path.basename(self.skiroot_kernel))
 
         if "OpenBMC" in self.bmc_type:
-            if self.skiboot:
-                self.cv_BMC.image_transfer(self.skiboot)
+            if self.skiboot in changed:
+                self.cv_BMC.image_transfer(self.skiboot, force=self.force_flash)
                 self.cv_BMC.skiboot_img_flash_openbmc(os.path.basename(self.skiboot))
-            if self.skiroot_kernel:
-                self.cv_BMC.image_transfer(self.skiroot_kernel)
-                self.cv_BMC.skiroot_img_flash_openbmc("/tmp", os.path.basename(self.skiroot_kernel))
+            if self.skiroot_kernel in changed:
+                self.cv_BMC.image_transfer(self.skiroot_kernel, force=self.force_flash)
+                self.cv_BMC.skiroot_img_flash_openbmc(os.path.basename(self.skiroot_kernel))
+
+        for lid, slot in changed.items():
+            self.record_flashed(lid, slot)
 
         console = self.cv_SYSTEM.console.get_console()
         if "AMI" in self.bmc_type:
@@ -251,6 +294,7 @@ class OOBHpmFLASH(OpTestFlashBase):
             self.skipTest("OP AMI BMC Out-of-band firmware Update test")
         self.cv_SYSTEM.sys_sdr_clear()
         self.validate_side_activated()
+        self.forget_flashed()
         self.cv_SYSTEM.goto_state(OpSystemState.OFF)
         try:
             self.cv_IPMI.ipmi_code_update(self.hpm_path, str(BMC_CONST.BMC_FWANDPNOR_IMAGE_UPDATE))
@@ -276,6 +320,7 @@ class InbandHpmFLASH(OpTestFlashBase):
             self.skipTest("OP AMI BMC In-band firmware Update test")
         self.cv_SYSTEM.sys_sdr_clear()
         self.validate_side_activated()
+        self.forget_flashed()
         try:
             self.cv_HOST.host_code_update(self.hpm_path, str(BMC_CONST.BMC_FWANDPNOR_IMAGE_UPDATE))
         except OpTestError:
@@ -305,6 +350,9 @@ class FSPFWImageFLASH(OpTestFlashBase):
         print "System boot side %s, build: %s" % (preup_boot, preup_build)
         preup_boot = re.search('.*([T|P])', preup_boot)
         preup_boot = preup_boot.group(1)
+        # the image cache talks to the FSP over SSH
+        self.cv_BMC.fsp_run_command("/usr/sbin/sshd")
+        self.forget_flashed()
 
         self.cv_SYSTEM.goto_state(OpSystemState.PETITBOOT_SHELL)
         self.cv_SYSTEM.host_console_unique_prompt()
@@ -137,14 +137,14 @@ class OpTestHMIHandling(unittest.TestCase):
         # [['00000000', ['4', '5', '6', 'c', 'd', 'e']], ['00000001', ['4', '5', '6', 'c', 'd', 'e']], ['00000010', ['4', '5', '6', 'c', 'd', 'e']]]
 
         # In-order to inject HMI errors on cpu's, cpu should be running, so disabling the sleep states 1 and 2 of all CPU's
-        self.cv_HOST.host_run_command(BMC_CONST.GET_CPU_SLEEP_STATE2)
-        self.cv_HOST.host_run_command(BMC_CONST.GET_CPU_SLEEP_STATE1)
-        self.cv_HOST.host_run_command(BMC_CONST.GET_CPU_SLEEP_STATE0)
-        self.cv_HOST.host_run_command(BMC_CONST.DISABLE_CPU_SLEEP_STATE1)
-        self.cv_HOST.host_run_command(BMC_CONST.DISABLE_CPU_SLEEP_STATE2)
-        self.cv_HOST.host_run_command(BMC_CONST.GET_CPU_SLEEP_STATE2)
-        self.cv_HOST.host_run_command(BMC_CONST.GET_CPU_SLEEP_STATE1)
-        self.cv_HOST.host_run_command(BMC_CONST.GET_CPU_SLEEP_STATE0)
+        self.cv_HOST.host_run_batch([BMC_CONST.GET_CPU_SLEEP_STATE2,
+                                     BMC_CONST.GET_CPU_SLEEP_STATE1,
+                                     BMC_CONST.GET_CPU_SLEEP_STATE0,
+                                     BMC_CONST.DISABLE_CPU_SLEEP_STATE1,
+                                     BMC_CONST.DISABLE_CPU_SLEEP_STATE2,
+                                     BMC_CONST.GET_CPU_SLEEP_STATE2,
+                                     BMC_CONST.GET_CPU_SLEEP_STATE1,
+                                     BMC_CONST.GET_CPU_SLEEP_STATE0])
 
         l_oslevel = self.cv_HOST.host_get_OS_Level()
         try:
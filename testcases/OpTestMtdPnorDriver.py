@@ -29,7 +29,7 @@
 #
 #  This class will test the functionality of following
 #   This test has mainly to view open power's PNOR flash contents in an x86 machine
-#   using fcp utility. The corresponding pnor file is taking from /dev/mtd0.
+#   using OpTestFFS. The corresponding pnor file is taking from /dev/mtd0.
 #
 import time
 import subprocess
@@ -42,8 +42,15 @@ import unittest
 import OpTestConfiguration
 from common.OpTestError import OpTestError
 from common.OpTestSystem import OpSystemState
+from common.OpTestFFS import FFSImage
+from common.Exceptions import CommandFailed, FFSError
 
 class OpTestMtdPnorDriver(unittest.TestCase):
+    # Partitions firmware writes while the host is up (skiboot, opal-prd,
+    # hostboot runtime, the OCC on a checkstop): a copy taken now can
+    # catch one of them half written, so their ECC isn't held against it
+    RUNTIME_WRITTEN = ['NVRAM', 'GUARD', 'HBEL', 'FIRDATA', 'ATTR_PERM', 'HB_VOLATILE']
+
     def setUp(self):
         conf = OpTestConfiguration.conf
         self.cv_IPMI = conf.ipmi()
@@ -57,8 +64,7 @@ class OpTestMtdPnorDriver(unittest.TestCase):
         self.cv_SYSTEM.goto_state(OpSystemState.OS)
 
     def tearDown(self):
-        self.cv_HOST.host_gather_opal_msg_log()
-        self.cv_HOST.host_gather_kernel_log()
+        self.cv_HOST.host_gather_logs()
 
     ##
     # @brief  This function has following test steps
@@ -67,11 +73,8 @@ class OpTestMtdPnorDriver(unittest.TestCase):
     #         3. Check /dev/mtd0 character device file existence on host
     #         4. Copying the contents of the flash in a file /tmp/pnor
     #         5. Getting the /tmp/pnor file into local x86 machine using scp utility
-    #         6. Remove existing /tmp/ffs directory and
-    #            Clone latest ffs git repository in local x86 working machine
-    #         7. Compile ffs repository to get fcp utility
-    #         8. Check existence of fcp utility in ffs repository, after compiling
-    #         9. Get the PNOR flash contents on an x86 machine using fcp utility
+    #         6. Read the TOC of the PNOR data, checking its checksums, and list it
+    #         7. Check the ECC of the ECC protected partitions
     #
     # @return BMC_CONST.FW_SUCCESS-success or raise OpTestError-fail
     #
@@ -111,30 +114,23 @@ class OpTestMtdPnorDriver(unittest.TestCase):
         l_list =  commands.getstatusoutput("ls -l %s" % l_path)
         print l_list
 
-        l_workdir = "/tmp/ffs"
-        # Remove existing /tmp/ffs directory
-        l_res = commands.getstatusoutput("rm -rf %s" % l_workdir)
-
-        # Clone latest ffs git repository in local x86 working machine
-        l_cmd = "git clone   https://github.com/open-power/ffs/ %s" % l_workdir
-        l_res = commands.getstatusoutput(l_cmd)
-        self.assertEqual(int(l_res[0]), 0,
-                "Cloning ffs repository is failed")
-
-        # Compile ffs repository to get fcp utility
-        l_cmd = "cd %s/; make" % l_workdir
-        l_res = commands.getstatusoutput(l_cmd)
-        self.assertEqual(int(l_res[0]), 0, "Compiling fcp utility is failed")
-
-        # Check existence of fcp utility in ffs repository, after compiling.
-        l_cmd = "test -f %s/fcp/x86/fcp" % l_workdir
-        l_res = commands.getstatusoutput(l_cmd)
-        self.assertEqual(int(l_res[0]), 0, "Compiling fcp utility is failed")
-
-        # Check the PNOR flash contents on an x86 machine using fcp utility
-        l_cmd = "%s/fcp/x86/fcp -o 0x0 -L %s" % (l_workdir, l_file)
-        l_res = commands.getstatusoutput(l_cmd)
-        print l_res[1]
-        self.assertEqual(int(l_res[0]), 0,
-            "Getting the PNOR data using fcp utility failed")
-        print "Getting PNOR data successfull using fcp utility"
+        # Read the TOC of the PNOR data
+        try:
+            l_image = FFSImage.from_file(l_file)
+        except FFSError as e:
+            self.fail("Reading the PNOR TOC failed: %s" % e)
+        with l_image:
+            print "\n".join(l_image.info())
+            self.assertTrue(l_image.partitions, "PNOR TOC lists no partitions")
+
+            # Check the ECC protected partitions
+            l_errors = l_image.verify()
+            l_failed = []
+            for l_name, l_bad in l_errors.items():
+                print "Partition %s has %d bad ECC words, first at 0x%x" % (
+                    l_name, len(l_bad), l_bad[0])
+                if l_name not in self.RUNTIME_WRITTEN:
+                    l_failed.append(l_name)
+            self.assertEqual(l_failed, [],
+                             "Bad ECC in PNOR partitions %s" % ', '.join(l_failed))
+        print "Getting PNOR data successfull using OpTestFFS"
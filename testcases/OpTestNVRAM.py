@@ -87,12 +87,12 @@ class OpTestNVRAM(unittest.TestCase):
     def doNVRAMTest(self, console):
         c = console
         self.console = c
-        c.run_command("uname -a")
-        c.run_command("cat /etc/os-release")
-        c.run_command("nvram -v")
+        c.run_batch(["uname -a",
+                     "cat /etc/os-release",
+                     "nvram -v"])
         try:
-            c.run_command("nvram --print-config -p ibm,skiboot")
-            c.run_command("nvram --print-config -p lnx,oops-log")
+            c.run_batch(["nvram --print-config -p ibm,skiboot",
+                         "nvram --print-config -p lnx,oops-log"])
         except CommandFailed as cf:
             # These partitions may not exist, so not existing is not a failure
             print cf.output
@@ -104,18 +104,18 @@ class OpTestNVRAM(unittest.TestCase):
         c.run_command("nvram --print-config -p common")
 
         with self.assertRaises(CommandFailed) as cm:
-            c.run_command("nvram --print-config -p wwwwwwwwwwww")
-            c.run_command("nvram --print-vpd")
-            c.run_command("nvram --print-all-vpd")
-            c.run_command("nvram --print-err-log")
-            c.run_command("nvram --print-event-scan")
+            c.run_batch(["nvram --print-config -p wwwwwwwwwwww",
+                         "nvram --print-vpd",
+                         "nvram --print-all-vpd",
+                         "nvram --print-err-log",
+                         "nvram --print-event-scan"])
         self.assertEqual(cm.exception.exitcode, 255)
 
-        c.run_command("nvram --partitions")
-        c.run_command("nvram --dump common|head")
+        c.run_batch(["nvram --partitions",
+                     "nvram --dump common|head"])
         try:
-            c.run_command("nvram --dump ibm,skiboot|head")
-            c.run_command("nvram --dump lnx,oops-log|head")
+            c.run_batch(["nvram --dump ibm,skiboot|head",
+                         "nvram --dump lnx,oops-log|head"])
         except CommandFailed as cf:
             # These partitions may not exist, so not existing is not a failure
             print cf.output
@@ -127,8 +127,8 @@ class OpTestNVRAM(unittest.TestCase):
 
         c.run_command("nvram --ascii common|head -c512; echo")
         try:
-            c.run_command("nvram --ascii ibm,skiboot|head -c512; echo")
-            c.run_command("nvram --ascii lnx,oops-log|head -c512; echo")
+            c.run_batch(["nvram --ascii ibm,skiboot|head -c512; echo",
+                         "nvram --ascii lnx,oops-log|head -c512; echo"])
         except CommandFailed as cf:
             # These partitions may not exist, so not existing is not a failure
             print cf.output
@@ -67,13 +67,44 @@ class OpTestOOBIPMIBase(unittest.TestCase):
     def run_ipmi_cmd(self, i_cmd):
         l_cmd = i_cmd
         time.sleep(0.2)
-        l_res = self.cv_IPMI.ipmitool.run(l_cmd + "; echo $?")
-        print l_res
-        l_res = l_res.splitlines()
-        if int(l_res[-1]):
-            l_msg = "IPMI: command failed %s" % l_cmd
+        # through the executor, so it counts against --ipmi-max-inflight
+        l_result = self.cv_IPMI.get_executor().run(l_cmd, self.cv_IPMI.ipmitool)
+        return self.check_ipmi_result(l_result)
+
+    ##
+    # @brief  Run independent read-only queries concurrently, within the
+    #         --ipmi-max-inflight limit, and check each as run_ipmi_cmd does.
+    #         They run when called, so the outputs are as current as the
+    #         ones run one at a time.
+    #
+    # @param i_cmds @type list: ipmitool commands that don't change BMC state
+    #
+    # @return list of outputs of the commands or raise OpTestError
+    #
+    def run_ipmi_cmds(self, i_cmds):
+        l_results = self.cv_IPMI.get_executor().map(i_cmds)
+        return [self.check_ipmi_result(l_result) for l_result in l_results]
+
+    def check_ipmi_result(self, i_result):
+        if i_result.error:
+            raise OpTestError("IPMI: command failed %s: %s" % (i_result.cmd, i_result.error))
+        print i_result.output
+        if i_result.exitcode:
+            l_msg = "IPMI: command failed %s" % i_result.cmd
             raise OpTestError(l_msg)
-        return l_res
+        return i_result.output.splitlines()
+
+    ##
+    # @brief  Print latency and error counts of the IPMI commands run
+    #
+    @classmethod
+    def report_ipmi_cmds(self):
+        l_report = self.cv_IPMI.get_executor().report()
+        for l_cmd in sorted(l_report):
+            l_stat = l_report[l_cmd]
+            print "IPMI: %-40s x%d %d errors avg %.2fs max %.2fs" % (
+                l_cmd, l_stat['count'], l_stat['errors'],
+                l_stat['average'], l_stat['max'])
 
 
 class OpTestOOBIPMI(OpTestOOBIPMIBase):
@@ -304,8 +335,8 @@ class OpTestOOBIPMI(OpTestOOBIPMIBase):
     #
     def test_channel(self):
         print "OOB IPMI: Channel Tests"
-        self.run_ipmi_cmd(BMC_CONST.IPMI_CHANNEL_AUTHCAP)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_CHANNEL_INFO)
+        self.run_ipmi_cmds([BMC_CONST.IPMI_CHANNEL_AUTHCAP,
+                            BMC_CONST.IPMI_CHANNEL_INFO])
 
 
     ##
@@ -402,10 +433,10 @@ class OpTestOOBIPMI(OpTestOOBIPMIBase):
     #
     def test_Info(self):
         print "OOB IPMI: info tests"
-        self.run_ipmi_cmd(BMC_CONST.IPMI_CHANNEL_INFO)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_MC_INFO)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SEL_INFO)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_INFO)
+        self.run_ipmi_cmds([BMC_CONST.IPMI_CHANNEL_INFO,
+                            BMC_CONST.IPMI_MC_INFO,
+                            BMC_CONST.IPMI_SEL_INFO,
+                            BMC_CONST.IPMI_SDR_INFO])
 
     ##
     # @brief  It will execute and test the ipmi sdr list <all/fru/event/mcloc/compact/full/generic>
@@ -413,14 +444,14 @@ class OpTestOOBIPMI(OpTestOOBIPMIBase):
     # @return l_res @type list: output of command or raise OpTestError
     #
     def test_sdr_list_by_type(self):
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_LIST)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_LIST_ALL)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_LIST_FRU)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_LIST_EVENT)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_LIST_MCLOC)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_LIST_COMPACT)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_LIST_FULL)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_LIST_GENERIC)
+        self.run_ipmi_cmds([BMC_CONST.IPMI_SDR_LIST,
+                            BMC_CONST.IPMI_SDR_LIST_ALL,
+                            BMC_CONST.IPMI_SDR_LIST_FRU,
+                            BMC_CONST.IPMI_SDR_LIST_EVENT,
+                            BMC_CONST.IPMI_SDR_LIST_MCLOC,
+                            BMC_CONST.IPMI_SDR_LIST_COMPACT,
+                            BMC_CONST.IPMI_SDR_LIST_FULL,
+                            BMC_CONST.IPMI_SDR_LIST_GENERIC])
 
     ##
     # @brief  It will execute and test the ipmi sdr elist <all/fru/event/mcloc/compact/full/generic>
@@ -429,14 +460,14 @@ class OpTestOOBIPMI(OpTestOOBIPMIBase):
     # @return l_res @type list: output of command or raise OpTestError
     #
     def test_sdr_elist_by_type(self):
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_ELIST)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_ELIST_ALL)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_ELIST_FRU)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_ELIST_EVENT)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_ELIST_MCLOC)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_ELIST_COMPACT)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_ELIST_FULL)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_ELIST_GENERIC)
+        self.run_ipmi_cmds([BMC_CONST.IPMI_SDR_ELIST,
+                            BMC_CONST.IPMI_SDR_ELIST_ALL,
+                            BMC_CONST.IPMI_SDR_ELIST_FRU,
+                            BMC_CONST.IPMI_SDR_ELIST_EVENT,
+                            BMC_CONST.IPMI_SDR_ELIST_MCLOC,
+                            BMC_CONST.IPMI_SDR_ELIST_COMPACT,
+                            BMC_CONST.IPMI_SDR_ELIST_FULL,
+                            BMC_CONST.IPMI_SDR_ELIST_GENERIC])
 
     ##
     # @brief  It will execute and test the ipmi sdr type <Temp/fan/Powersupply> commands
@@ -444,10 +475,10 @@ class OpTestOOBIPMI(OpTestOOBIPMIBase):
     # @return l_res @type list: output of command or raise OpTestError
     #
     def test_sdr_type_list(self):
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_TYPE_LIST)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_TYPE_TEMPERATURE)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_TYPE_FAN)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_SDR_TYPE_POWER_SUPPLY)
+        self.run_ipmi_cmds([BMC_CONST.IPMI_SDR_TYPE_LIST,
+                            BMC_CONST.IPMI_SDR_TYPE_TEMPERATURE,
+                            BMC_CONST.IPMI_SDR_TYPE_FAN,
+                            BMC_CONST.IPMI_SDR_TYPE_POWER_SUPPLY])
 
     ##
     # @brief  It will execute and test the ipmi sdr get <sensor-id> command
@@ -674,14 +705,14 @@ class OpTestOOBIPMI(OpTestOOBIPMIBase):
     #
     def test_dcmi(self):
         print "OOB IPMI: dcmi tests"
-        self.run_ipmi_cmd(BMC_CONST.IPMI_DCMI_DISCOVER)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_DCMI_POWER_READING)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_DCMI_POWER_GET_LIMIT)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_DCMI_SENSORS)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_DCMI_GET_MC_ID_STRING)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_DCMI_GET_TEMP_READING)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_DCMI_GET_CONF_PARAM)
-        self.run_ipmi_cmd(BMC_CONST.IPMI_DCMI_OOB_DISCOVER)
+        self.run_ipmi_cmds([BMC_CONST.IPMI_DCMI_DISCOVER,
+                            BMC_CONST.IPMI_DCMI_POWER_READING,
+                            BMC_CONST.IPMI_DCMI_POWER_GET_LIMIT,
+                            BMC_CONST.IPMI_DCMI_SENSORS,
+                            BMC_CONST.IPMI_DCMI_GET_MC_ID_STRING,
+                            BMC_CONST.IPMI_DCMI_GET_TEMP_READING,
+                            BMC_CONST.IPMI_DCMI_GET_CONF_PARAM,
+                            BMC_CONST.IPMI_DCMI_OOB_DISCOVER])
 
     ##
     # @brief  It will execute and test the functionality of ipmi echo command.
@@ -818,6 +849,7 @@ class OOBIPMIStandby(OpTestOOBIPMI):
 
     @classmethod
     def tearDownClass(self):
+        self.report_ipmi_cmds()
         OpTestConfiguration.conf.system().goto_state(OpSystemState.OFF)
         OpTestConfiguration.conf.system().goto_state(OpSystemState.OS)
 
@@ -834,6 +866,7 @@ class OOBIPMIRuntime(OpTestOOBIPMI):
 
     @classmethod
     def tearDownClass(self):
+        self.report_ipmi_cmds()
         OpTestConfiguration.conf.system().goto_state(OpSystemState.OFF)
         OpTestConfiguration.conf.system().goto_state(OpSystemState.OS)
 
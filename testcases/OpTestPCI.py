@@ -44,6 +44,7 @@ from distutils.version import LooseVersion
 from common.OpTestConstants import OpTestConstants as BMC_CONST
 from common.OpTestSystem import OpSystemState
 from common.Exceptions import CommandFailed
+from common.OpTestTransfer import ConsoleTransfer
 
 
 class TestPCI():
@@ -54,6 +55,7 @@ class TestPCI():
         self.cv_SYSTEM = conf.system()
         self.pci_good_data_file = conf.lspci_file()
         self.bmc_type = conf.args.bmc_type
+        self.ffdcdir = conf.args.ffdcdir
 
     def pcie_link_errors(self):
         total_entries = link_down_entries = timeout_entries = []
@@ -114,6 +116,23 @@ class TestPCI():
             pass
 
 
+    ##
+    # @brief Keep the output of a command run through ConsoleTransfer, which
+    #        unlike the console doesn't show it as it goes: in the FFDC
+    #        directory if there is one, else printed
+    #
+    # @param name @type string: file name for it
+    # @param output @type list: output lines
+    #
+    def save_output(self, name, output):
+        if not self.ffdcdir:
+            print '\n'.join(output)
+            return
+        path = os.path.join(self.ffdcdir, name)
+        with open(path, 'w') as f:
+            f.write('\n'.join(output) + '\n')
+        print "Saved %d lines to %s" % (len(output), path)
+
     def check_pci_devices(self):
         c = self.c
         l_res = c.run_command("lspci -mm -n")
@@ -139,20 +158,24 @@ class TestPCI():
                                      "lspci -nn",
                                      "cat /proc/bus/pci/devices",
                                      "ls /sys/bus/pci/devices/ -l",
-                                     "lspci -vvxxx",
                                      ]
-        for cmd in list_pci_devices_commands:
-            c.run_command(cmd, timeout=300)
+        c.run_batch(list_pci_devices_commands, timeout=300)
+
+        # The big ones come back compressed rather than as text over SOL
+        bulk = ConsoleTransfer(c)
+        self.save_output("lspci-vvxxx.txt",
+                         bulk.run_command("lspci -vvxxx", timeout=300))
 
         list_usb_devices_commands = ["lsusb",
                                      "lsusb -t",
                                      "lsusb -v",
                                      ]
-        for cmd in list_usb_devices_commands:
-            c.run_command(cmd)
+        c.run_batch(list_usb_devices_commands)
 
         # Test we don't EEH on reading all config space
-        c.run_command("hexdump -C /sys/bus/pci/devices/*/config", timeout=600)
+        self.save_output("pci-config-hexdump.txt",
+                         bulk.run_command("hexdump -C /sys/bus/pci/devices/*/config",
+                                          timeout=600))
 
         if not self.pci_good_data_file:
             self.skipTest("No good pci data provided")
@@ -45,6 +45,8 @@ from common.OpTestUtil import OpTestUtil
 from common.OpTestSystem import OpSystemState
 from common.OpTestConstants import OpTestConstants as BMC_CONST
 from common.Exceptions import CommandFailed
+from common.OpTestFFS import FFSImage, FFS_TOC_READ_SIZE
+from common.OpTestTransfer import ConsoleTransfer
 
 class OpTestPNOR(unittest.TestCase):
     def setUp(self):
@@ -52,7 +54,9 @@ class OpTestPNOR(unittest.TestCase):
         self.host = conf.host()
         self.ipmi = conf.ipmi()
         self.system = conf.system()
+        self.bmc = conf.bmc()
         self.util = OpTestUtil()
+        self.toc = None
 
     def pflashErase(self, offset, length):
         self.c.run_command("pflash -e -f -a %d -s %d" % (offset,length))
@@ -72,16 +76,18 @@ class OpTestPNOR(unittest.TestCase):
     def pflashWritePartition(self, filename, partition):
         self.c.run_command("pflash -f -p %s -P %s" % (filename,partition))
 
+    ##
+    # @brief Offset and length of a partition, from the TOC read out of
+    #        flash once and parsed here
+    #
     def pflashGetPartition(self, partition):
-        d = self.c.run_command("pflash --info")
-        for line in d:
-            s = re.search(partition, line)
-            if s:
-                m = re.match(r'ID=\d+\s+\S+\s+((0[xX])?[0-9a-fA-F]+)..(0[xX])?[0-9a-fA-F]+\s+\(actual=((0[xX])?[0-9a-fA-F]+)\).*', line)
-                offset = int(m.group(1), 16)
-                length = int(m.group(4), 16)
-                ret = {'offset': offset, 'length': length}
-                return ret
+        if self.toc is None:
+            self.pflashRead("/tmp/toc.ffs", 0, FFS_TOC_READ_SIZE)
+            data = ConsoleTransfer(self.c).pull_file("/tmp/toc.ffs")
+            self.toc = FFSImage(data, "flash TOC")
+            print "\n".join(self.toc.info())
+        p = self.toc.partition(partition)
+        return {'offset': p.base, 'length': p.actual}
 
     def comparePartitionFile(self, filename, partition):
         self.c.run_command("pflash -r /tmp/tmp -P %s" % (partition))
@@ -140,6 +146,11 @@ class OpTestPNOR(unittest.TestCase):
         if not self.system.has_mtd_pnor_access():
             self.skipTest("Host doesn't have MTD PNOR access")
 
+        # Flash gets written from the host here, any record of what was
+        # flashed from the BMC is no good afterwards
+        if hasattr(self.bmc, 'get_image_cache'):
+            self.bmc.get_image_cache().forget_flashed()
+
         self.system.goto_state(OpSystemState.PETITBOOT_SHELL)
         self.c = self.system.sys_get_ipmi_console()
         self.system.host_console_unique_prompt()
@@ -50,8 +50,7 @@ class OpTestSensors(unittest.TestCase):
         self.cv_HOST = conf.host()
 
     def tearDown(self):
-        self.cv_HOST.host_gather_opal_msg_log()
-        self.cv_HOST.host_gather_kernel_log()
+        self.cv_HOST.host_gather_logs()
 
     ##
     # @brief This function will cover following test steps
@@ -101,8 +100,7 @@ class OpTestSensors(unittest.TestCase):
 
         # Checking sensors command functionality with different options
         try:
-            for cmd in ["", "-f", "-A", "-u"]:
-                response = self.cv_HOST.host_run_command("sensors " + cmd)
+            self.cv_HOST.host_run_batch(["sensors " + cmd for cmd in ["", "-f", "-A", "-u"]])
         except CommandFailed as c:
             self.assertEqual(c.exitcode, 0, str(c))
 
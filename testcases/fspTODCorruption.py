@@ -52,8 +52,7 @@ class fspTODCorruption():
         self.cv_SYSTEM.goto_state(OpSystemState.OS)
 
     def tearDown(self):
-        self.cv_HOST.host_gather_opal_msg_log()
-        self.cv_HOST.host_gather_kernel_log()
+        self.cv_HOST.host_gather_logs()
 
     def get_tod(self):
         print "Running command on FSP: rtim timeofday"
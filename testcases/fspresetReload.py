@@ -52,8 +52,7 @@ class fspresetReload(unittest.TestCase):
         self.cv_SYSTEM.goto_state(OpSystemState.OS)
 
     def tearDown(self):
-        self.cv_HOST.host_gather_opal_msg_log()
-        self.cv_HOST.host_gather_kernel_log()
+        self.cv_HOST.host_gather_logs()
 
     def number_of_resets(self):
         return 1